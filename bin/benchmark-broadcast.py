@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+
+import argparse
+from time import time
+
+from bitcoin.core import CMutableTransaction, CMutableTxIn, CMutableTxOut, b2x
+from bitcoin.core.script import CScript
+
+from script_utils import print_section
+
+from clove.network import BitcoinTestNet
+from clove.network.bitcoin.simulator import NodeSimulator
+
+
+def make_raw_transactions(count):
+    return [
+        b2x(CMutableTransaction([CMutableTxIn()], [CMutableTxOut(number, CScript([number]))]).serialize())
+        for number in range(1, count + 1)
+    ]
+
+
+def percentile(values, percent):
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(percent / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def print_report(name, total_time, latencies):
+    print_section(name)
+    print(f'  transactions: {len(latencies)}')
+    print(f'  throughput:   {len(latencies) / total_time:.1f} tx/s')
+    for percent in (50, 95, 99):
+        print(f'  p{percent}:          {percentile(latencies, percent) * 1000:.2f} ms')
+    print(f'  max:          {max(latencies) * 1000:.2f} ms')
+
+
+def benchmark_single(network, raw_transactions, reject_timeout):
+    latencies = []
+    started = time()
+    for raw_transaction in raw_transactions:
+        transaction_started = time()
+        network.broadcast_transaction(raw_transaction, reject_timeout)
+        latencies.append(time() - transaction_started)
+    return time() - started, latencies
+
+
+def benchmark_batch(network, raw_transactions, batch_size, reject_timeout):
+    latencies = []
+    started = time()
+    for start in range(0, len(raw_transactions), batch_size):
+        batch = raw_transactions[start:start + batch_size]
+        batch_started = time()
+        network.publish_many(batch, reject_timeout=reject_timeout)
+        # every transaction in the batch waits for the whole batch
+        latencies.extend([time() - batch_started] * len(batch))
+    return time() - started, latencies
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark transaction broadcasting against a local node simulator.')
+    parser.add_argument('-n', '--transactions', type=int, default=200, help='number of transactions')
+    parser.add_argument('-b', '--batch-size', type=int, default=50, help='transactions per publish_many call')
+    parser.add_argument('-l', '--latency', type=float, default=0, help='simulated node latency (seconds)')
+    parser.add_argument('-r', '--reject', type=float, default=0, help='probability of rejecting a transaction')
+    parser.add_argument('-f', '--fragment-size', type=int, default=None, help='split node messages into chunks')
+    parser.add_argument('-t', '--reject-timeout', type=float, default=0.05,
+                        help='seconds to wait for reject messages (the default 10s would dominate the results)')
+    parser.add_argument('--no-pool', action='store_true', help='do not reuse connections between broadcasts')
+    parser.add_argument('--seed', type=int, default=0, help='random seed of the simulator')
+    args = parser.parse_args()
+
+    raw_transactions = make_raw_transactions(args.transactions)
+
+    with NodeSimulator(
+        BitcoinTestNet,
+        latency=args.latency,
+        reject=args.reject,
+        fragment_size=args.fragment_size,
+        seed=args.seed,
+    ) as simulator:
+        network_class = simulator.network_class(pooled_connections=not args.no_pool)
+
+        print_report(
+            'broadcast_transaction', *benchmark_single(network_class(), raw_transactions, args.reject_timeout)
+        )
+        print_report(
+            f'publish_many (batches of {args.batch_size})',
+            *benchmark_batch(network_class(), raw_transactions, args.batch_size, args.reject_timeout)
+        )
+
+        print_section('simulator')
+        print(f'  connections:  {simulator.connections}')
+        print(f'  messages:     {dict(simulator.messages)}')
+        print(f'  rejected:     {len(simulator.rejected)}')
@@ -1,8 +1,10 @@
 #!/usr/bin/env python3
 
-import socket
+import argparse
 
+from clove.constants import HEALTH_CHECK_CONCURRENCY, HEALTH_CHECK_CONNECT_TIMEOUT, HEALTH_CHECK_HANDSHAKE_TIMEOUT
 from clove.network import __all__ as networks
+from clove.network.bitcoin.health import HealthChecker, save_report
 
 
 class Colors:
@@ -11,60 +13,68 @@ class Colors:
     ENDC = '\033[0m'
 
 
-def hostname_resolves(hostname):
-    try:
-        response = socket.gethostbyname_ex(hostname)
-        return response[2]
-    except socket.error:
-        return False
+def format_node(result, indent):
+    if result['reachable'] and not result['error']:
+        latency = result['handshake_latency'] or result['connect_latency']
+        details = f'{latency * 1000:.0f} ms'
+        if result['user_agent']:
+            details += f' {result["user_agent"]} height: {result["start_height"]}'
+        return f'{Colors.OKGREEN} {indent}{result["node"]} ✓ {details}{Colors.ENDC}'
+    return f'{Colors.FAIL} {indent}{result["node"]} ☠ {result["error"]}{Colors.ENDC}'
 
 
-def check_node(node, port):
-    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    sock.settimeout(2)
-    return sock.connect_ex((node, port))
+def print_network(name, report):
+    print(name)
+    results = {result['node']: result for result in report['nodes']}
+    if not report['seeds']:
+        for result in report['nodes']:
+            print(format_node(result, ''))
+        return
+    for seed, nodes in report['seeds'].items():
+        if not nodes:
+            print(Colors.FAIL, '', seed, '☠', Colors.ENDC)
+            continue
+        print(Colors.OKGREEN, '', seed, Colors.ENDC)
+        for node in nodes:
+            print(format_node(results[node], '   '))
 
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Check seeds and nodes of all Bitcoin-based networks.')
+    parser.add_argument('symbols', nargs='*', help='check only networks with these symbols')
+    parser.add_argument('--handshake', action='store_true', help='exchange version messages with every node')
+    parser.add_argument('-o', '--output', help='save JSON report to this file')
+    parser.add_argument('--connect-timeout', type=float, default=HEALTH_CHECK_CONNECT_TIMEOUT)
+    parser.add_argument('--handshake-timeout', type=float, default=HEALTH_CHECK_HANDSHAKE_TIMEOUT)
+    parser.add_argument('-c', '--concurrency', type=int, default=HEALTH_CHECK_CONCURRENCY,
+                        help='maximum number of nodes checked at the same time')
+    args = parser.parse_args()
 
-    dead_networks = []
+    symbols = {symbol.upper() for symbol in args.symbols}
+    selected = [network for network in networks
+                if not symbols or symbols.intersection(symbol.upper() for symbol in network.symbols)]
+    checker = HealthChecker(
+        selected,
+        handshake=args.handshake,
+        connect_timeout=args.connect_timeout,
+        handshake_timeout=args.handshake_timeout,
+        concurrency=args.concurrency,
+    )
+    report = checker.run()
 
-    for network in networks:
-        print(network.name)
-        if network.nodes:
-            nodes = len(network.nodes)
-            for node in network.nodes:
-                result = check_node(node, network.port)
-                if result == 0:
-                    print(Colors.OKGREEN, '', node, '✓', Colors.ENDC)
-                else:
-                    print(Colors.FAIL, '', node, '☠', Colors.ENDC)
-                    nodes -= 1
-            if not nodes:
-                dead_networks.append(network)
-        else:
-            seeds = len(network.seeds)
-            for seed in network.seeds:
+    dead_networks = []
+    for name, network_report in report['networks'].items():
+        print_network(name, network_report)
+        if not network_report['alive']:
+            dead_networks.append(name)
 
-                nodes = hostname_resolves(seed)
-                nodes_counter = 0
-                if not nodes:
-                    print(Colors.FAIL, '', seed, '☠', Colors.ENDC)
-                    continue
-                print(Colors.OKGREEN, '', seed, Colors.ENDC)
-                nodes_counter = len(nodes)
-                for node in nodes:
-                    result = check_node(node, network.port)
-                    if result == 0:
-                        print(Colors.OKGREEN, '   ', node, '✓', Colors.ENDC)
-                    else:
-                        print(Colors.FAIL, '   ', node, '☠', Colors.ENDC)
-                        nodes_counter -= 1
-                if not nodes_counter:
-                    dead_networks.append(network)
+    print(f'\nChecked {len(report["networks"])} networks in {report["duration"]:.1f}s')
+    if args.output:
+        save_report(report, args.output)
+        print(f'Report saved to {args.output}')
 
     if dead_networks:
         print(Colors.FAIL, '\n\n☠ DEAD NETWORKS: ☠')
-        for network in dead_networks:
-            print('  ', network)
+        for name in dead_networks:
+            print('  ', name)
         print(Colors.ENDC)
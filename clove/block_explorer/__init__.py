@@ -1,4 +1,5 @@
 from .blockcypher import BlockcypherAPI
+from .composite import CompositeAPI
 from .cryptoid import CryptoidAPI
 from .etherscan import EtherscanAPI
 from .insight import InsightAPIv4
@@ -6,6 +7,7 @@ from .graphql import GraphQL
 
 __all__ = (
     BlockcypherAPI,
+    CompositeAPI,
     CryptoidAPI,
     EtherscanAPI,
     InsightAPIv4,
@@ -1,3 +1,35 @@
+import asyncio
+from functools import wraps
+from typing import Callable, Iterable, Iterator, List, Optional
+
+from clove.constants import UTXO_BATCH_MAX_ADDRESSES, UTXO_BATCH_MAX_URL_LENGTH
+from clove.utils.logging import logger
+
+
+def served_by_header_chain(method: Callable) -> Callable:
+    '''
+    Decorator returning the tip of the local header chain (if it's fresh) instead of calling the explorer.
+
+    Explorers that are not mixed into a network with the header chain always reach the explorer.
+    It has to be placed above `cached`.
+    '''
+
+    if asyncio.iscoroutinefunction(method):
+        @wraps(method)
+        async def async_wrapper(cls):
+            get_local_latest_block = getattr(cls, 'get_local_latest_block', None)
+            latest_block = get_local_latest_block() if get_local_latest_block else None
+            return latest_block if latest_block is not None else await method(cls)
+        return async_wrapper
+
+    @wraps(method)
+    def wrapper(cls):
+        get_local_latest_block = getattr(cls, 'get_local_latest_block', None)
+        latest_block = get_local_latest_block() if get_local_latest_block else None
+        return latest_block if latest_block is not None else method(cls)
+    return wrapper
+
+
 class BaseAPI(object):
 
     API = True
@@ -5,3 +37,94 @@ class BaseAPI(object):
     @classmethod
     def get_confirmations_from_tx_json(cls, tx_json: dict) -> int:
         return tx_json['confirmations']
+
+    @classmethod
+    def get_block_hash_from_tx_json(cls, tx_json: dict) -> Optional[str]:
+        return tx_json.get('blockhash')
+
+    @classmethod
+    def get_block_height_from_tx_json(cls, tx_json: dict) -> Optional[int]:
+        '''Returns height of the transaction's block or None if explorer doesn't return it.'''
+        return
+
+    @staticmethod
+    def _chunk_addresses(
+        addresses: Iterable[str],
+        separator: str,
+        max_addresses: int=UTXO_BATCH_MAX_ADDRESSES,
+        max_length: Optional[int]=UTXO_BATCH_MAX_URL_LENGTH,
+    ) -> Iterator[List[str]]:
+        '''
+        Splitting addresses (without duplicates) into chunks for the multi-address requests.
+
+        `max_length` limits the length of the addresses joined with the separator (`None` for requests
+        sending addresses in the body).
+        '''
+        chunk = []
+        length = 0
+        for address in dict.fromkeys(addresses):
+            added_length = len(address) + (len(separator) if chunk else 0)
+            too_long = max_length is not None and length + added_length > max_length
+            if chunk and (len(chunk) == max_addresses or too_long):
+                yield chunk
+                chunk = []
+                added_length = len(address)
+                length = 0
+            chunk.append(address)
+            length += added_length
+        if chunk:
+            yield chunk
+
+    @staticmethod
+    def _merge_utxo(utxo_lists: Iterable[list]) -> list:
+        '''Merging UTXO lists into one list without duplicated outputs, sorted by value (highest first).'''
+        merged = {}
+        for utxo_list in utxo_lists:
+            for utxo in utxo_list:
+                merged.setdefault((utxo.tx_id, utxo.vout), utxo)
+        return sorted(merged.values(), key=lambda utxo: utxo.value, reverse=True)
+
+    @classmethod
+    def select_utxo_from_stream(cls, address: str, amount: float) -> Optional[list]:
+        '''
+        Taking unspent outputs in the order they come from `iter_utxo` until their value exceeds the amount.
+
+        Unlike `get_utxo` it doesn't pick the biggest outputs, but only the pages that are needed are downloaded,
+        which matters for addresses with thousands of outputs.
+
+        Args:
+            address (str): wallet address
+            amount (float): amount to cover
+
+        Returns:
+            list, None: list of UTXO objects or `None` if there are not enough funds
+
+        Example:
+            >>> from clove.network import Ravencoin
+            >>> Ravencoin.select_utxo_from_stream('RM7w75BcC21LzxRe62jy8JhFYykRedqu8k', 2.5)
+            [Utxo(tx_id='8a673e9f...', vout='1', value='8.99', ...)]
+        '''
+        selected = []
+        total = 0
+
+        for output in cls.iter_utxo(address):
+            selected.append(output)
+            total += output.value
+            if total > amount:
+                return selected
+
+        logger.debug(f'Cannot find enough UTXO\'s. Found %.8f from %.8f.', total, amount)
+
+    @staticmethod
+    def _select_utxo(utxo: list, amount: float) -> Optional[list]:
+        '''Picking the biggest outputs until their value exceeds the amount.'''
+        selected = []
+        total = 0
+
+        for output in sorted(utxo, key=lambda output: output.value, reverse=True):
+            selected.append(output)
+            total += output.value
+            if total > amount:
+                return selected
+
+        logger.debug(f'Cannot find enough UTXO\'s. Found %.8f from %.8f.', total, amount)
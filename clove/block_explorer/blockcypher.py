@@ -1,17 +1,21 @@
-from typing import Optional
+import asyncio
+from typing import Iterator, Optional
 
 from bitcoin.core import CTxOut
 
-from clove.block_explorer.base import BaseAPI
-from clove.network.bitcoin.utxo import Utxo
+from clove.block_explorer.base import BaseAPI, served_by_header_chain
 from clove.utils.bitcoin import from_base_units
-from clove.utils.external_source import clove_req_json
+from clove.utils.cache import arefresh_confirmations, cached, is_confirmed_transaction, refresh_confirmations
+from clove.utils.external_source import aclove_req_json, clove_req_json
 from clove.utils.logging import logger
+from clove.utxo import Utxo
 
 
 class BlockcypherAPI(BaseAPI):
 
     api_url = 'https://api.blockcypher.com'
+    utxo_page_size = 2000
+    '''Number of unspent outputs per page (maximum allowed by the API).'''
 
     @classmethod
     def blockcypher_url(cls):
@@ -19,49 +23,138 @@ class BlockcypherAPI(BaseAPI):
         return f'{cls.api_url}/v1/{cls.symbols[0].lower()}/{chain}'
 
     @classmethod
+    @served_by_header_chain
+    @cached('latest_block')
     def get_latest_block(cls) -> int:
         '''Returns the number of the latest block.'''
         return clove_req_json(f'{cls.blockcypher_url()}')['height']
 
     @classmethod
+    @served_by_header_chain
+    @cached('latest_block')
+    async def aget_latest_block(cls) -> int:
+        '''Asynchronous version of the `get_latest_block` method.'''
+        return (await aclove_req_json(f'{cls.blockcypher_url()}'))['height']
+
+    @classmethod
+    @cached('transaction', immutable=is_confirmed_transaction, refresh=refresh_confirmations)
     def get_transaction(cls, tx_address: str) -> dict:
         return clove_req_json(f'{cls.blockcypher_url()}/txs/{tx_address}?includeHex=true')
 
+    @classmethod
+    @cached('transaction', immutable=is_confirmed_transaction, refresh=arefresh_confirmations)
+    async def aget_transaction(cls, tx_address: str) -> dict:
+        '''Asynchronous version of the `get_transaction` method.'''
+        return await aclove_req_json(f'{cls.blockcypher_url()}/txs/{tx_address}?includeHex=true')
+
+    @classmethod
+    def _utxo_url(cls, addresses: str, before: Optional[int]=None) -> str:
+        url = (
+            f'{cls.blockcypher_url()}/addrs/{addresses}'
+            f'?limit={cls.utxo_page_size}&unspentOnly=true&includeScript=true&confirmations=6'
+        )
+        return url if before is None else f'{url}&before={before}'
+
     @classmethod
     def get_utxo(cls, address: str, amount: float):
-        data = clove_req_json(
-            f'{cls.blockcypher_url()}/addrs/{address}'
-            '?limit=2000&unspentOnly=true&includeScript=true&confirmations=6'
+        return cls._parse_utxo(clove_req_json(cls._utxo_url(address)), amount)
+
+    @classmethod
+    async def aget_utxo(cls, address: str, amount: float):
+        '''Asynchronous version of the `get_utxo` method.'''
+        return cls._parse_utxo(await aclove_req_json(cls._utxo_url(address)), amount)
+
+    @classmethod
+    def iter_utxo(cls, address: str) -> Iterator[Utxo]:
+        '''
+        Yielding unspent outputs of the address page by page (newest first).
+
+        Pages are requested lazily with the `before` block height. The lowest block of the page is requested
+        again because the page can end in the middle of it, outputs already yielded from that block are skipped.
+        '''
+        before = None
+        seen = set()
+        while True:
+            data = clove_req_json(cls._utxo_url(address, before))
+            if data is None:
+                raise ValueError('Unexpected response from blockcypher')
+            txrefs = data.get('txrefs', [])
+            for output in txrefs:
+                if (output['tx_hash'], output['tx_output_n']) in seen:
+                    continue
+                yield cls._utxo_from_txref(output)
+            if not data.get('hasMore') or not txrefs:
+                return
+            lowest_block = min(output['block_height'] for output in txrefs)
+            if before == lowest_block + 1:
+                logger.warning('Block %d has more outputs than the page size, some can be skipped', lowest_block)
+                before = lowest_block
+            else:
+                before = lowest_block + 1
+            seen = {
+                (output['tx_hash'], output['tx_output_n'])
+                for output in txrefs if output['block_height'] == lowest_block
+            }
+
+    @classmethod
+    def get_utxos_for_addresses(cls, addresses: list) -> list:
+        '''Returns all unspent outputs of the given addresses, asking for many addresses at once.'''
+        return cls._merge_utxo(
+            cls._utxo_list(clove_req_json(cls._utxo_url(';'.join(chunk))))
+            for chunk in cls._chunk_addresses(addresses, ';')
         )
-        unspent = data.get('txrefs', [])
 
-        for output in unspent:
-            output['value'] = int(output['value'])
+    @classmethod
+    async def aget_utxos_for_addresses(cls, addresses: list) -> list:
+        '''Asynchronous version of the `get_utxos_for_addresses` method.'''
+        responses = await asyncio.gather(*(
+            aclove_req_json(cls._utxo_url(';'.join(chunk))) for chunk in cls._chunk_addresses(addresses, ';')
+        ))
+        return cls._merge_utxo(cls._utxo_list(response) for response in responses)
 
-        unspent = sorted(unspent, key=lambda k: k['value'], reverse=True)
+    @classmethod
+    def _parse_utxo(cls, data: dict, amount: float):
+        return cls._select_utxo(cls._utxo_list(data), amount)
 
+    @classmethod
+    def _utxo_list(cls, data) -> list:
+        '''Parsing response for a single address (dict) or for many addresses (list of dicts).'''
+        if data is None:
+            raise ValueError('Unexpected response from blockcypher')
         utxo = []
-        total = 0
-
-        for output in unspent:
-            value = from_base_units(output['value'])
-            utxo.append(
-                Utxo(
-                    tx_id=output['tx_hash'],
-                    vout=output['tx_output_n'],
-                    value=value,
-                    tx_script=output['script'],
+        for address_data in data if isinstance(data, list) else [data]:
+            if 'error' in address_data:
+                raise ValueError(f'Unexpected response from blockcypher: {address_data["error"]}')
+            if address_data.get('hasMore'):
+                logger.warning(
+                    'Only the first %d outputs of %s were fetched, use iter_utxo to get all of them',
+                    cls.utxo_page_size, address_data.get('address'),
                 )
-            )
-            total += value
-            if total > amount:
-                return utxo
-
-        logger.debug(f'Cannot find enough UTXO\'s. Found %.8f from %.8f.', total, amount)
+            utxo.extend(cls._utxo_from_txref(output) for output in address_data.get('txrefs', []))
+        return utxo
+
+    @staticmethod
+    def _utxo_from_txref(output: dict) -> Utxo:
+        return Utxo(
+            tx_id=output['tx_hash'],
+            vout=output['tx_output_n'],
+            value=from_base_units(int(output['value'])),
+            tx_script=output['script'],
+        )
 
     @classmethod
     def extract_secret_from_redeem_transaction(cls, contract_address: str) -> Optional[str]:
-        data = clove_req_json(f'{cls.blockcypher_url()}/addrs/{contract_address}/full')
+        return cls._parse_redeem_secret(clove_req_json(f'{cls.blockcypher_url()}/addrs/{contract_address}/full'))
+
+    @classmethod
+    async def aextract_secret_from_redeem_transaction(cls, contract_address: str) -> Optional[str]:
+        '''Asynchronous version of the `extract_secret_from_redeem_transaction` method.'''
+        return cls._parse_redeem_secret(
+            await aclove_req_json(f'{cls.blockcypher_url()}/addrs/{contract_address}/full')
+        )
+
+    @classmethod
+    def _parse_redeem_secret(cls, data: dict) -> Optional[str]:
         if not data:
             logger.error('Unexpected response from blockcypher')
             raise ValueError('Unexpected response from blockcypher')
@@ -74,8 +167,22 @@ class BlockcypherAPI(BaseAPI):
         return cls.extract_secret(scriptsig=transactions[0]['inputs'][0]['script'])
 
     @classmethod
+    @cached('balance')
     def get_balance(cls, wallet_address: str) -> Optional[float]:
-        data = clove_req_json(f'{cls.blockcypher_url()}/addrs/{wallet_address}/balance')
+        return cls._parse_balance(
+            clove_req_json(f'{cls.blockcypher_url()}/addrs/{wallet_address}/balance'), wallet_address
+        )
+
+    @classmethod
+    @cached('balance')
+    async def aget_balance(cls, wallet_address: str) -> Optional[float]:
+        '''Asynchronous version of the `get_balance` method.'''
+        return cls._parse_balance(
+            await aclove_req_json(f'{cls.blockcypher_url()}/addrs/{wallet_address}/balance'), wallet_address
+        )
+
+    @classmethod
+    def _parse_balance(cls, data: dict, wallet_address: str) -> Optional[float]:
         if data is None:
             logger.error('Could not get details for address %s in %s network', wallet_address, cls.symbols[0])
             return
@@ -91,9 +198,19 @@ class BlockcypherAPI(BaseAPI):
         return f'{url}/{network_name}/tx/{tx_hash}/'
 
     @classmethod
+    @cached('fee')
     def get_fee(cls) -> Optional[float]:
         '''Returns actual fee per kb.'''
-        response = clove_req_json(cls.blockcypher_url())
+        return cls._parse_fee(clove_req_json(cls.blockcypher_url()))
+
+    @classmethod
+    @cached('fee')
+    async def aget_fee(cls) -> Optional[float]:
+        '''Asynchronous version of the `get_fee` method.'''
+        return cls._parse_fee(await aclove_req_json(cls.blockcypher_url()))
+
+    @classmethod
+    def _parse_fee(cls, response: dict) -> Optional[float]:
         fee = response.get('high_fee_per_kb')
         if not fee:
             logger.error('Cannot find the right key (high_fee_per_kb) while getting fee in blockcypher.')
@@ -104,3 +221,11 @@ class BlockcypherAPI(BaseAPI):
     def get_first_vout_from_tx_json(cls, tx_json: dict) -> CTxOut:
         tx = cls.deserialize_raw_transaction(tx_json['hex'])
         return tx.vout[0]
+
+    @classmethod
+    def get_block_hash_from_tx_json(cls, tx_json: dict) -> Optional[str]:
+        return tx_json.get('block_hash')
+
+    @classmethod
+    def get_block_height_from_tx_json(cls, tx_json: dict) -> Optional[int]:
+        return tx_json.get('block_height')
@@ -0,0 +1,433 @@
+import asyncio
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import threading
+from time import time
+from typing import Iterator, Optional
+
+from bitcoin.core import CTxOut
+
+from clove.block_explorer.base import BaseAPI, served_by_header_chain
+from clove.constants import (
+    EXPLORER_BREAKER_FAILURES,
+    EXPLORER_BREAKER_RESET_TIMEOUT,
+    EXPLORER_HEDGE_DELAY,
+    EXPLORER_LATENCY_SMOOTHING,
+    EXPLORER_MAX_WORKERS,
+)
+from clove.exceptions import NoBackendAvailable
+from clove.utils.logging import logger
+
+EXPLORER_KEY = 'explorer'
+'''Key added to the transaction JSON with the name of the backend that returned it.'''
+
+
+class ExplorerHealth(object):
+    '''
+    Circuit breaker and latency statistics of a single explorer backend.
+
+    Backend is skipped (circuit is open) after `failures` consecutive failed calls. After `reset_timeout`
+    seconds a single trial call is let through (half-open circuit), its result closes or reopens the circuit.
+    '''
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(self, failures: int=EXPLORER_BREAKER_FAILURES, reset_timeout: float=EXPLORER_BREAKER_RESET_TIMEOUT):
+        self.max_failures = failures
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_progress = False
+        self.latency = None
+        self.lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return self.CLOSED
+        if time() - self.opened_at >= self.reset_timeout:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    def allow_request(self) -> bool:
+        with self.lock:
+            state = self.state
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self.trial_in_progress:
+                self.trial_in_progress = True
+                return True
+            return False
+
+    def record_success(self, latency: float):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_in_progress = False
+            if self.latency is None:
+                self.latency = latency
+            else:
+                self.latency += EXPLORER_LATENCY_SMOOTHING * (latency - self.latency)
+
+    def reset(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_in_progress = False
+            self.latency = None
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            self.trial_in_progress = False
+            if self.opened_at is not None or self.failures >= self.max_failures:
+                self.opened_at = time()
+
+
+class CompositeAPI(BaseAPI):
+    '''
+    Block explorer using several backends of the same network.
+
+    The fastest healthy backend is asked first. If it doesn't answer in `explorer_hedge_delay` seconds
+    the next one is asked as well (hedged request), a failed or empty answer starts the next backend
+    immediately. The first valid answer is returned. Backends failing repeatedly are skipped for a while
+    (circuit breaker).
+
+    Backends are explorer mixins (e.g. `InsightAPIv4`) combined with the network class, so they use its
+    attributes (`api_url`, `symbols`, `testnet`, ...). Every backend can also get its own attributes.
+
+    Example:
+        >>> class Bitcoin(CompositeAPI, BitcoinBaseNetwork):
+        ...     api_url = 'https://insight.bitpay.com/api'
+        ...     explorer_backends = (InsightAPIv4, (BlockcypherAPI, {'api_url': 'https://api.blockcypher.com'}))
+        >>> Bitcoin.get_latest_block()
+        541783
+        >>> Bitcoin.get_explorer_health()
+        {'InsightAPIv4': {'state': 'closed', 'latency': 0.31, 'failures': 0}, 'BlockcypherAPI': {...}}
+    '''
+
+    explorer_backends = ()
+    '''Explorer mixins (or pairs of the mixin and its attributes) in the order of preference.'''
+    explorer_hedge_delay = EXPLORER_HEDGE_DELAY
+    '''Seconds to wait for the backend before asking the next one.'''
+
+    @classmethod
+    def get_backends(cls) -> list:
+        '''Returns backend classes of this network (created once per network class).'''
+        backends = cls.__dict__.get('_backends')
+        if backends is None:
+            backends = []
+            for backend in cls.explorer_backends:
+                explorer, attributes = backend if isinstance(backend, tuple) else (backend, {})
+                attributes = dict(attributes, explorer_name=explorer.__name__, health=ExplorerHealth())
+                backends.append(type(f'{cls.__name__}{explorer.__name__}', (explorer, cls), attributes))
+            cls._backends = backends
+            explorer_health.extend(backend.health for backend in backends)
+        return backends
+
+    @classmethod
+    def is_backend(cls) -> bool:
+        '''
+        Backend classes inherit from the network, so methods missing in the explorer mixin
+        (e.g. `get_confirmations_from_tx_json`) are looked up in this class.
+        '''
+        return 'explorer_name' in cls.__dict__
+
+    @classmethod
+    def get_backend(cls, explorer_name: str):
+        for backend in cls.get_backends():
+            if backend.explorer_name == explorer_name:
+                return backend
+        raise ValueError(f'Unknown explorer backend {explorer_name} ({cls.symbols[0]})')
+
+    @classmethod
+    def get_explorer_health(cls) -> dict:
+        return {
+            backend.explorer_name: {
+                'state': backend.health.state,
+                'latency': backend.health.latency,
+                'failures': backend.health.failures,
+            } for backend in cls.get_backends()
+        }
+
+    @classmethod
+    def ordered_backends(cls) -> list:
+        '''Backends with closed circuit sorted by latency (unknown latency keeps the configured order).'''
+        backends = cls.get_backends()
+        closed = [backend for backend in backends if backend.health.state == ExplorerHealth.CLOSED]
+        known = sorted((backend for backend in closed if backend.health.latency is not None),
+                       key=lambda backend: backend.health.latency)
+        unknown = [backend for backend in closed if backend.health.latency is None]
+        others = [backend for backend in backends if backend not in closed]
+        return known + unknown + others
+
+    @staticmethod
+    def call_backend(backend, method: str, args: tuple):
+        '''Calling backend method, returns `(result, exception)`, health of the backend is updated.'''
+        started = time()
+        try:
+            result = getattr(backend, method)(*args)
+        except Exception as e:
+            logger.debug('[%s] %s failed: %r', backend.explorer_name, method, e)
+            backend.health.record_failure()
+            return None, e
+        backend.health.record_success(time() - started)
+        return result, None
+
+    @classmethod
+    def race(cls, method: str, *args):
+        '''
+        Calling the method on backends with hedging, returns the first valid (not `None`) result.
+
+        Returns `None` if every backend answered with `None`, raises the last exception if every backend failed
+        and `NoBackendAvailable` if circuits of all backends are open (so no backend was asked).
+        '''
+        candidates = iter(cls.ordered_backends())
+        pending = {}
+        last_exception = None
+        empty_answer = False
+
+        def start_next() -> bool:
+            for backend in candidates:
+                if backend.health.allow_request():
+                    pending[get_executor().submit(cls.call_backend, backend, method, args)] = backend
+                    return True
+            return False
+
+        if not start_next():
+            raise cls.no_backend_available(method)
+        while pending:
+            done, _ = wait(list(pending), timeout=cls.explorer_hedge_delay, return_when=FIRST_COMPLETED)
+            if not done:
+                logger.debug('No answer for %s in %.2fs, asking the next backend', method, cls.explorer_hedge_delay)
+                start_next()
+                continue
+            for future in done:
+                backend = pending.pop(future)
+                result, exception = future.result()
+                if exception is None and result is not None:
+                    return cls.tag_result(backend, result)
+                if exception is None:
+                    empty_answer = True
+                else:
+                    last_exception = exception
+                start_next()
+
+        if last_exception is not None and not empty_answer:
+            raise last_exception
+
+    @staticmethod
+    async def acall_backend(backend, method: str, args: tuple):
+        started = time()
+        try:
+            result = await getattr(backend, method)(*args)
+        except Exception as e:
+            logger.debug('[%s] %s failed: %r', backend.explorer_name, method, e)
+            backend.health.record_failure()
+            return None, e
+        backend.health.record_success(time() - started)
+        return result, None
+
+    @classmethod
+    async def arace(cls, method: str, *args):
+        '''Asynchronous version of the `race` method, `method` is the name of the coroutine method.'''
+        candidates = iter(cls.ordered_backends())
+        pending = {}
+        last_exception = None
+        empty_answer = False
+
+        def start_next() -> bool:
+            for backend in candidates:
+                if backend.health.allow_request():
+                    pending[asyncio.ensure_future(cls.acall_backend(backend, method, args))] = backend
+                    return True
+            return False
+
+        if not start_next():
+            raise cls.no_backend_available(method)
+        while pending:
+            done, _ = await asyncio.wait(
+                list(pending), timeout=cls.explorer_hedge_delay, return_when=asyncio.FIRST_COMPLETED
+            )
+            if not done:
+                start_next()
+                continue
+            for future in done:
+                backend = pending.pop(future)
+                result, exception = future.result()
+                if exception is None and result is not None:
+                    for task in pending:
+                        task.cancel()
+                    return cls.tag_result(backend, result)
+                if exception is None:
+                    empty_answer = True
+                else:
+                    last_exception = exception
+                start_next()
+
+        if last_exception is not None and not empty_answer:
+            raise last_exception
+
+    @classmethod
+    def no_backend_available(cls, method: str) -> NoBackendAvailable:
+        logger.warning('Circuits of all %s explorers are open, cannot call %s', cls.symbols[0], method)
+        return NoBackendAvailable(f'Circuits of all explorers are open ({cls.symbols[0]}: {method})')
+
+    @staticmethod
+    def tag_result(backend, result):
+        if isinstance(result, dict):
+            result[EXPLORER_KEY] = backend.explorer_name
+        return result
+
+    @classmethod
+    def backend_for_tx_json(cls, tx_json: dict):
+        '''Returns backend that returned the transaction (its JSON format differs between explorers).'''
+        explorer_name = tx_json.get(EXPLORER_KEY)
+        if explorer_name:
+            return cls.get_backend(explorer_name)
+        return cls.get_backends()[0]
+
+    @classmethod
+    @served_by_header_chain
+    def get_latest_block(cls) -> Optional[int]:
+        return cls.race('get_latest_block')
+
+    @classmethod
+    def get_transaction(cls, tx_address: str) -> Optional[dict]:
+        return cls.race('get_transaction', tx_address)
+
+    @classmethod
+    def get_utxo(cls, address: str, amount: float):
+        return cls.race('get_utxo', address, amount)
+
+    @classmethod
+    def get_utxos_for_addresses(cls, addresses: list) -> list:
+        return cls.race('get_utxos_for_addresses', addresses)
+
+    @classmethod
+    def iter_utxo(cls, address: str) -> Iterator:
+        '''
+        Streaming UTXO from the fastest healthy backend.
+
+        Streams can't be hedged, the next backend is used only if the first page couldn't be fetched.
+        '''
+        last_exception = None
+        asked = False
+        for backend in cls.ordered_backends():
+            if not backend.health.allow_request():
+                continue
+            asked = True
+            started = time()
+            stream = backend.iter_utxo(address)
+            try:
+                first_output = next(stream)
+            except StopIteration:
+                backend.health.record_success(time() - started)
+                return
+            except Exception as e:
+                logger.debug('[%s] iter_utxo failed: %r', backend.explorer_name, e)
+                backend.health.record_failure()
+                last_exception = e
+                continue
+            backend.health.record_success(time() - started)
+            yield first_output
+            yield from stream
+            return
+
+        if not asked:
+            raise cls.no_backend_available('iter_utxo')
+        if last_exception is not None:
+            raise last_exception
+
+    @classmethod
+    def get_balance(cls, wallet_address: str) -> Optional[float]:
+        return cls.race('get_balance', wallet_address)
+
+    @classmethod
+    def get_fee(cls) -> Optional[float]:
+        return cls.race('get_fee')
+
+    @classmethod
+    def extract_secret_from_redeem_transaction(cls, contract_address: str) -> Optional[str]:
+        return cls.race('extract_secret_from_redeem_transaction', contract_address)
+
+    @classmethod
+    @served_by_header_chain
+    async def aget_latest_block(cls) -> Optional[int]:
+        return await cls.arace('aget_latest_block')
+
+    @classmethod
+    async def aget_transaction(cls, tx_address: str) -> Optional[dict]:
+        return await cls.arace('aget_transaction', tx_address)
+
+    @classmethod
+    async def aget_utxo(cls, address: str, amount: float):
+        return await cls.arace('aget_utxo', address, amount)
+
+    @classmethod
+    async def aget_utxos_for_addresses(cls, addresses: list) -> list:
+        return await cls.arace('aget_utxos_for_addresses', addresses)
+
+    @classmethod
+    async def aget_balance(cls, wallet_address: str) -> Optional[float]:
+        return await cls.arace('aget_balance', wallet_address)
+
+    @classmethod
+    async def aget_fee(cls) -> Optional[float]:
+        return await cls.arace('aget_fee')
+
+    @classmethod
+    async def aextract_secret_from_redeem_transaction(cls, contract_address: str) -> Optional[str]:
+        return await cls.arace('aextract_secret_from_redeem_transaction', contract_address)
+
+    @classmethod
+    def get_transaction_url(cls, tx_hash: str) -> Optional[str]:
+        return cls.get_backends()[0].get_transaction_url(tx_hash)
+
+    @classmethod
+    def get_first_vout_from_tx_json(cls, tx_json: dict) -> CTxOut:
+        if cls.is_backend():
+            return super().get_first_vout_from_tx_json(tx_json)
+        return cls.backend_for_tx_json(tx_json).get_first_vout_from_tx_json(tx_json)
+
+    @classmethod
+    def get_confirmations_from_tx_json(cls, tx_json: dict) -> int:
+        if cls.is_backend():
+            return super().get_confirmations_from_tx_json(tx_json)
+        return cls.backend_for_tx_json(tx_json).get_confirmations_from_tx_json(tx_json)
+
+    @classmethod
+    def get_block_hash_from_tx_json(cls, tx_json: dict) -> Optional[str]:
+        if cls.is_backend():
+            return super().get_block_hash_from_tx_json(tx_json)
+        return cls.backend_for_tx_json(tx_json).get_block_hash_from_tx_json(tx_json)
+
+    @classmethod
+    def get_block_height_from_tx_json(cls, tx_json: dict) -> Optional[int]:
+        if cls.is_backend():
+            return super().get_block_height_from_tx_json(tx_json)
+        return cls.backend_for_tx_json(tx_json).get_block_height_from_tx_json(tx_json)
+
+
+explorer_health = []
+'''Health of the backends of all composite explorers.'''
+
+
+def reset_explorer_health():
+    '''Closing all circuits and forgetting measured latencies.'''
+    for health in explorer_health:
+        health.reset()
+
+
+executor = None
+executor_lock = threading.Lock()
+
+
+def get_executor() -> ThreadPoolExecutor:
+    '''Thread pool shared by the hedged requests of all composite explorers.'''
+    global executor
+    with executor_lock:
+        if executor is None:
+            executor = ThreadPoolExecutor(max_workers=EXPLORER_MAX_WORKERS, thread_name_prefix='clove-explorer')
+        return executor
@@ -1,13 +1,19 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 import os
-from typing import Optional
+import threading
+from typing import Iterator, Optional
 
 from bitcoin.core import CTxOut, script
 
-from clove.block_explorer.base import BaseAPI
-from clove.network.bitcoin.utxo import Utxo
+from clove.block_explorer.base import BaseAPI, served_by_header_chain
+from clove.block_explorer.fees import served_by_fee_oracle
+from clove.constants import FEE_ORACLE_MAX_WORKERS
 from clove.utils.bitcoin import from_base_units, to_base_units
-from clove.utils.external_source import clove_req_json
+from clove.utils.cache import arefresh_confirmations, cached, is_confirmed_transaction, refresh_confirmations
+from clove.utils.external_source import aclove_req_json, clove_req_json
 from clove.utils.logging import logger
+from clove.utxo import Utxo
 
 
 class CryptoidAPI(BaseAPI):
@@ -19,53 +25,118 @@ class CryptoidAPI(BaseAPI):
         return f'{cls.api_url}/{cls.symbols[0].lower()}'
 
     @classmethod
+    @served_by_header_chain
+    @cached('latest_block')
     def get_latest_block(cls) -> int:
         '''Returns the number of the latest block.'''
         return clove_req_json(f'{cls.cryptoid_url()}/api.dws?q=getblockcount')
 
     @classmethod
+    @served_by_header_chain
+    @cached('latest_block')
+    async def aget_latest_block(cls) -> int:
+        '''Asynchronous version of the `get_latest_block` method.'''
+        return await aclove_req_json(f'{cls.cryptoid_url()}/api.dws?q=getblockcount')
+
+    @classmethod
+    @cached('transaction', immutable=is_confirmed_transaction, refresh=refresh_confirmations)
     def get_transaction(cls, tx_address: str) -> dict:
         return clove_req_json(f'{cls.cryptoid_url()}/api.dws?q=txinfo&t={tx_address}')
 
     @classmethod
-    def get_utxo(cls, address: str, amount: float):
+    @cached('transaction', immutable=is_confirmed_transaction, refresh=arefresh_confirmations)
+    async def aget_transaction(cls, tx_address: str) -> dict:
+        '''Asynchronous version of the `get_transaction` method.'''
+        return await aclove_req_json(f'{cls.cryptoid_url()}/api.dws?q=txinfo&t={tx_address}')
+
+    @classmethod
+    def _utxo_url(cls, addresses: str) -> str:
         api_key = os.environ.get('CRYPTOID_API_KEY')
         if not api_key:
             raise ValueError('API key for cryptoid is required to get UTXOs.')
-        data = clove_req_json(f'{cls.cryptoid_url()}/api.dws?q=unspent&key={api_key}&active={address}')
-        unspent = data.get('unspent_outputs', [])
+        return f'{cls.cryptoid_url()}/api.dws?q=unspent&key={api_key}&active={addresses}'
+
+    @classmethod
+    def get_utxo(cls, address: str, amount: float):
+        return cls._parse_utxo(clove_req_json(cls._utxo_url(address)), amount)
 
-        for output in unspent:
-            output['value'] = int(output['value'])
+    @classmethod
+    async def aget_utxo(cls, address: str, amount: float):
+        '''Asynchronous version of the `get_utxo` method.'''
+        return cls._parse_utxo(await aclove_req_json(cls._utxo_url(address)), amount)
+
+    @classmethod
+    def iter_utxo(cls, address: str) -> Iterator[Utxo]:
+        '''Yielding unspent outputs of the address (the API doesn't support pagination, so all of them are fetched).'''
+        yield from cls._utxo_list(clove_req_json(cls._utxo_url(address)))
 
-        unspent = sorted(unspent, key=lambda k: k['value'], reverse=True)
+    @classmethod
+    def get_utxos_for_addresses(cls, addresses: list) -> list:
+        '''Returns all unspent outputs of the given addresses, asking for many addresses at once.'''
+        return cls._merge_utxo(
+            cls._utxo_list(clove_req_json(cls._utxo_url('|'.join(chunk))))
+            for chunk in cls._chunk_addresses(addresses, '|')
+        )
 
-        utxo = []
-        total = 0
+    @classmethod
+    async def aget_utxos_for_addresses(cls, addresses: list) -> list:
+        '''Asynchronous version of the `get_utxos_for_addresses` method.'''
+        responses = await asyncio.gather(*(
+            aclove_req_json(cls._utxo_url('|'.join(chunk))) for chunk in cls._chunk_addresses(addresses, '|')
+        ))
+        return cls._merge_utxo(cls._utxo_list(response) for response in responses)
 
-        for output in unspent:
-            value = from_base_units(output['value'])
-            utxo.append(
-                Utxo(
-                    tx_id=output['tx_hash'],
-                    vout=output['tx_ouput_n'],
-                    value=value,
-                    tx_script=output['script'],
-                )
-            )
-            total += value
-            if total > amount:
-                return utxo
+    @classmethod
+    def _parse_utxo(cls, data: dict, amount: float):
+        return cls._select_utxo(cls._utxo_list(data), amount)
 
-        logger.debug(f'Cannot find enough UTXO\'s. Found %.8f from %.8f.', total, amount)
+    @classmethod
+    def _utxo_list(cls, data: dict) -> list:
+        if data is None:
+            raise ValueError(f'Cannot get UTXO ({cls.symbols[0]})')
+        return [
+            Utxo(
+                tx_id=output['tx_hash'],
+                vout=output['tx_ouput_n'],
+                value=from_base_units(int(output['value'])),
+                tx_script=output['script'],
+            ) for output in data.get('unspent_outputs', [])
+        ]
 
     @classmethod
     def extract_secret_from_redeem_transaction(cls, contract_address: str) -> Optional[str]:
+        redeem_tx_hash = cls._get_redeem_transaction_hash(
+            clove_req_json(cls._contract_transactions_url(contract_address))
+        )
+        if not redeem_tx_hash:
+            return
+        logger.warning('Using undocumented endpoint used by chainz.cryptoid.info site.')
+        return cls._parse_redeem_secret(clove_req_json(cls._raw_transaction_url(redeem_tx_hash)))
+
+    @classmethod
+    async def aextract_secret_from_redeem_transaction(cls, contract_address: str) -> Optional[str]:
+        '''Asynchronous version of the `extract_secret_from_redeem_transaction` method.'''
+        redeem_tx_hash = cls._get_redeem_transaction_hash(
+            await aclove_req_json(cls._contract_transactions_url(contract_address))
+        )
+        if not redeem_tx_hash:
+            return
+        logger.warning('Using undocumented endpoint used by chainz.cryptoid.info site.')
+        return cls._parse_redeem_secret(await aclove_req_json(cls._raw_transaction_url(redeem_tx_hash)))
+
+    @classmethod
+    def _contract_transactions_url(cls, contract_address: str) -> str:
         api_key = os.environ.get('CRYPTOID_API_KEY')
         if not api_key:
             raise ValueError('API key for cryptoid is required.')
+        return f'{cls.cryptoid_url()}/api.dws?q=multiaddr&active={contract_address}&key={api_key}'
 
-        data = clove_req_json(f'{cls.cryptoid_url()}/api.dws?q=multiaddr&active={contract_address}&key={api_key}')
+    @classmethod
+    def _raw_transaction_url(cls, tx_hash: str) -> str:
+        return f'{cls.api_url}/explorer/tx.raw.dws?coin={cls.symbols[0].lower()}&id={tx_hash}'
+
+    @classmethod
+    def _get_redeem_transaction_hash(cls, data: dict) -> Optional[str]:
         if not data:
             logger.debug('Unexpected response from cryptoid')
             raise ValueError('Unexpected response from cryptoid')
@@ -75,9 +146,10 @@ class CryptoidAPI(BaseAPI):
             logger.debug('Contract was not redeemed yet.')
             return
 
-        redeem_tx_hash = transactions[0]['hash']
-        logger.warning('Using undocumented endpoint used by chainz.cryptoid.info site.')
-        data = clove_req_json(f'{cls.api_url}/explorer/tx.raw.dws?coin={cls.symbols[0].lower()}&id={redeem_tx_hash}')
+        return transactions[0]['hash']
+
+    @classmethod
+    def _parse_redeem_secret(cls, data: dict) -> str:
         if not data:
             logger.debug('Unexpected response from cryptoid')
             raise ValueError('Unexpected response from cryptoid')
@@ -85,11 +157,25 @@ class CryptoidAPI(BaseAPI):
         return cls.extract_secret(scriptsig=data['vin'][0]['scriptSig']['hex'])
 
     @classmethod
+    @cached('balance')
     def get_balance(cls, wallet_address: str) -> float:
+        return cls._parse_balance(clove_req_json(cls._balance_url(wallet_address)), wallet_address)
+
+    @classmethod
+    @cached('balance')
+    async def aget_balance(cls, wallet_address: str) -> float:
+        '''Asynchronous version of the `get_balance` method.'''
+        return cls._parse_balance(await aclove_req_json(cls._balance_url(wallet_address)), wallet_address)
+
+    @classmethod
+    def _balance_url(cls, wallet_address: str) -> str:
         api_key = os.environ.get('CRYPTOID_API_KEY')
         if api_key is None:
             raise ValueError('API key for cryptoid is required to get balance.')
-        data = clove_req_json(f'{cls.cryptoid_url()}/api.dws?q=getbalance&a={wallet_address}&key={api_key}')
+        return f'{cls.cryptoid_url()}/api.dws?q=getbalance&a={wallet_address}&key={api_key}'
+
+    @classmethod
+    def _parse_balance(cls, data: float, wallet_address: str) -> float:
         if data is None:
             logger.debug('Could not get details for address %s in %s network', wallet_address, cls.symbols[0])
             return
@@ -104,10 +190,20 @@ class CryptoidAPI(BaseAPI):
         transactions = clove_req_json(f'{cls.cryptoid_url()}/api.dws?q=lasttxs')
         return [tx['hash'] for tx in transactions]
 
+    @classmethod
+    async def _aget_last_transactions(cls) -> Optional[list]:
+        transactions = await aclove_req_json(f'{cls.cryptoid_url()}/api.dws?q=lasttxs')
+        return [tx['hash'] for tx in transactions]
+
     @classmethod
     def _get_transaction_size(cls, tx_hash: str) -> Optional[int]:
         """WARNING: this method is using undocumented endpoint used by chainz.cryptoid.info site."""
-        tx_details = clove_req_json(f'{cls.api_url}/explorer/tx.raw.dws?coin={cls.symbols[0].lower()}&id={tx_hash}')
+        tx_details = clove_req_json(cls._raw_transaction_url(tx_hash))
+        return tx_details.get('size')
+
+    @classmethod
+    async def _aget_transaction_size(cls, tx_hash: str) -> Optional[int]:
+        tx_details = await aclove_req_json(cls._raw_transaction_url(tx_hash))
         return tx_details.get('size')
 
     @classmethod
@@ -116,36 +212,73 @@ class CryptoidAPI(BaseAPI):
         return tx_details.get('fees')
 
     @classmethod
-    def get_fee(cls, tx_limit: int=5) -> Optional[float]:
-        """Counting fee based on tx_limit transactions (max 10)"""
+    async def _aget_transaction_fee(cls, tx_hash: str) -> Optional[float]:
+        tx_details = await aclove_req_json(f'{cls.cryptoid_url()}/api.dws?q=txinfo&t={tx_hash}')
+        return tx_details.get('fees')
 
+    @classmethod
+    def get_fee_rates(cls, tx_limit: int=10) -> list:
+        '''Returns fee rates (per kb) of the latest transactions, transactions are checked concurrently.'''
         last_transactions = cls._get_last_transactions()
-
         if not last_transactions:
-            return
-
+            return []
         last_transactions = last_transactions[:tx_limit]
+        sizes = get_executor().map(cls._get_transaction_size, last_transactions)
+        tx_fees = get_executor().map(cls._get_transaction_fee, last_transactions)
+        return [
+            (tx_fee * 1000) / tx_size for tx_size, tx_fee in zip(list(sizes), list(tx_fees))
+            if tx_size and tx_fee
+        ]
 
-        fees = []
+    @classmethod
+    @served_by_fee_oracle
+    @cached('fee')
+    def get_fee(cls, tx_limit: int=5) -> Optional[float]:
+        """Counting fee based on tx_limit transactions (max 10), transactions are checked concurrently."""
+        fees = cls.get_fee_rates(tx_limit)
+        return round(sum(fees) / len(fees), 8) if fees else None
 
-        for tx_hash in last_transactions:
+    @classmethod
+    @served_by_fee_oracle
+    @cached('fee')
+    async def aget_fee(cls, tx_limit: int=5) -> Optional[float]:
+        """Asynchronous version of the `get_fee` method, transactions are checked concurrently."""
 
-            tx_size = cls._get_transaction_size(tx_hash)
-            if not tx_size:
-                continue
+        last_transactions = await cls._aget_last_transactions()
 
-            tx_fee = cls._get_transaction_fee(tx_hash)
-            if not tx_fee:
-                continue
+        if not last_transactions:
+            return
 
-            tx_fee_per_kb = (tx_fee * 1000) / tx_size
-            fees.append(tx_fee_per_kb)
+        last_transactions = last_transactions[:tx_limit]
+        sizes = await asyncio.gather(*(cls._aget_transaction_size(tx_hash) for tx_hash in last_transactions))
+        sized_transactions = [(tx_hash, tx_size) for tx_hash, tx_size in zip(last_transactions, sizes) if tx_size]
+        tx_fees = await asyncio.gather(*(cls._aget_transaction_fee(tx_hash) for tx_hash, _ in sized_transactions))
+        fees = [
+            (tx_fee * 1000) / tx_size for (_, tx_size), tx_fee in zip(sized_transactions, tx_fees) if tx_fee
+        ]
 
         return round(sum(fees) / len(fees), 8) if fees else None
 
+    @classmethod
+    def get_block_height_from_tx_json(cls, tx_json: dict) -> Optional[int]:
+        return tx_json.get('block')
+
     @classmethod
     def get_first_vout_from_tx_json(cls, tx_json: dict) -> CTxOut:
         incorrect_cscript = script.CScript.fromhex(tx_json['outputs'][0]['script'])
         correct_cscript = script.CScript([script.OP_HASH160, list(incorrect_cscript)[2], script.OP_EQUAL])
         nValue = to_base_units(tx_json['outputs'][0]['amount'])
         return CTxOut(nValue, correct_cscript)
+
+
+executor = None
+executor_lock = threading.Lock()
+
+
+def get_executor() -> ThreadPoolExecutor:
+    '''Thread pool shared by the concurrent transaction requests of Cryptoid explorers.'''
+    global executor
+    with executor_lock:
+        if executor is None:
+            executor = ThreadPoolExecutor(max_workers=FEE_ORACLE_MAX_WORKERS, thread_name_prefix='clove-cryptoid')
+        return executor
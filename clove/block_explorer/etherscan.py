@@ -2,47 +2,72 @@ import os
 from typing import Optional
 
 from clove.block_explorer.base import BaseAPI
-from clove.utils.external_source import clove_req_json
+from clove.utils.external_source import aclove_req_json, clove_req_json
 from clove.utils.logging import logger
 
 
 class EtherscanAPI(BaseAPI):
 
     def find_redeem_transaction(self, recipient_address: str, contract_address: str, value: int) -> Optional[str]:
-        recipient_address = recipient_address.lower()
-        contract_address = contract_address.lower()
-        value = str(value)
+        data = clove_req_json(self._internal_transactions_url(recipient_address))
+        return self._find_redeem_transaction(data, recipient_address, contract_address, value)
+
+    async def afind_redeem_transaction(self, recipient_address: str, contract_address: str,
+                                       value: int) -> Optional[str]:
+        '''Asynchronous version of the `find_redeem_transaction` method.'''
+        data = await aclove_req_json(self._internal_transactions_url(recipient_address))
+        return self._find_redeem_transaction(data, recipient_address, contract_address, value)
+
+    def find_redeem_token_transaction(self, recipient_address: str, token_address: str, value: int) -> Optional[str]:
+        data = clove_req_json(self._token_transactions_url(recipient_address, token_address))
+        return self._find_redeem_token_transaction(data, recipient_address, token_address, value)
 
+    async def afind_redeem_token_transaction(self, recipient_address: str, token_address: str,
+                                             value: int) -> Optional[str]:
+        '''Asynchronous version of the `find_redeem_token_transaction` method.'''
+        data = await aclove_req_json(self._token_transactions_url(recipient_address, token_address))
+        return self._find_redeem_token_transaction(data, recipient_address, token_address, value)
+
+    @staticmethod
+    def _get_api_key() -> str:
         etherscan_api_key = os.getenv('ETHERSCAN_API_KEY')
         if not etherscan_api_key:
             raise ValueError('API key for etherscan is required.')
+        return etherscan_api_key
 
-        data = clove_req_json(
+    def _internal_transactions_url(self, recipient_address: str) -> str:
+        return (
             f'http://{self.etherscan_api_subdomain}.etherscan.io/api?module=account&action=txlistinternal'
-            f'&address={recipient_address}&apikey={etherscan_api_key}'
+            f'&address={recipient_address.lower()}&apikey={self._get_api_key()}'
         )
 
+    def _token_transactions_url(self, recipient_address: str, token_address: str) -> str:
+        return (
+            f'http://{self.etherscan_api_subdomain}.etherscan.io/api?module=account&action=tokentx'
+            f'&contractaddress={token_address.lower()}&address={recipient_address.lower()}'
+            f'&apikey={self._get_api_key()}'
+        )
+
+    @staticmethod
+    def _find_redeem_transaction(data: dict, recipient_address: str, contract_address: str,
+                                 value: int) -> Optional[str]:
+        recipient_address = recipient_address.lower()
+        contract_address = contract_address.lower()
+        value = str(value)
+
         for result in reversed(data['result']):
             if result['to'] == recipient_address and result['from'] == contract_address and result['value'] == value:
                 return result['hash']
 
         logger.debug('Redeem transaction not found.')
 
-    def find_redeem_token_transaction(self, recipient_address: str, token_address: str, value: int) -> Optional[str]:
+    @staticmethod
+    def _find_redeem_token_transaction(data: dict, recipient_address: str, token_address: str,
+                                       value: int) -> Optional[str]:
         recipient_address = recipient_address.lower()
         token_address = token_address.lower()
         value = str(value)
 
-        etherscan_api_key = os.getenv('ETHERSCAN_API_KEY')
-        if not etherscan_api_key:
-            raise ValueError('API key for etherscan is required.')
-
-        data = clove_req_json(
-            f'http://{self.etherscan_api_subdomain}.etherscan.io/api?module=account&action=tokentx'
-            f'&contractaddress={token_address}&address={recipient_address}'
-            f'&apikey={etherscan_api_key}'
-        )
-
         for result in reversed(data['result']):
             if result['to'] == recipient_address \
                     and result['contractAddress'] == token_address \
@@ -0,0 +1,219 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
+import threading
+from time import time
+from typing import Callable, Iterable, Optional
+
+from clove.constants import (
+    FEE_ORACLE_DEFAULT_PERCENTILE,
+    FEE_ORACLE_MAX_AGE,
+    FEE_ORACLE_MAX_WORKERS,
+    FEE_ORACLE_PERCENTILES,
+    FEE_ORACLE_REFRESH_INTERVAL,
+)
+from clove.utils.logging import logger
+
+
+def percentile(values: list, percent: float) -> float:
+    '''Percentile of the values with linear interpolation between the closest ranks.'''
+    values = sorted(values)
+    position = (len(values) - 1) * percent / 100
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+class FeeEstimate(object):
+    '''
+    Fee rates (per kb) of the network at the given percentiles.
+
+    Args:
+        rates (dict): percentile -> fee per kb
+        samples (int): number of transactions used for the estimate (1 for the fee returned by the API)
+    '''
+
+    def __init__(self, rates: dict, samples: int, updated_at: Optional[float]=None):
+        self.rates = rates
+        self.samples = samples
+        self.updated_at = time() if updated_at is None else updated_at
+
+    @classmethod
+    def from_fee_rates(cls, fee_rates: list, percentiles: Iterable[float]=FEE_ORACLE_PERCENTILES) -> 'FeeEstimate':
+        return cls({p: round(percentile(fee_rates, p), 8) for p in percentiles}, len(fee_rates))
+
+    @property
+    def age(self) -> float:
+        return time() - self.updated_at
+
+    def fee_per_kb(self, percent: float=FEE_ORACLE_DEFAULT_PERCENTILE) -> float:
+        '''Fee rate at the percentile, the closest higher one is used if it wasn't computed.'''
+        available = sorted(self.rates)
+        for computed in available:
+            if computed >= percent:
+                return self.rates[computed]
+        return self.rates[available[-1]]
+
+    def __repr__(self):
+        return f'FeeEstimate(rates={self.rates}, samples={self.samples}, age={self.age:.0f}s)'
+
+
+class FeeOracle(object):
+    '''
+    Refreshing fee estimates of the registered networks in the background.
+
+    Networks with the `get_fee_rates` method (explorers calculating fee from the recent transactions)
+    get percentile estimates, for others the fee returned by `get_fee` is used. Networks are refreshed
+    concurrently every `interval` seconds and estimates older than `max_age` seconds are not served,
+    so callers fall back to asking the explorer directly.
+
+    Example:
+        >>> from clove.network import Litecoin, Ravencoin
+        >>> from clove.block_explorer.fees import fee_oracle
+        >>> fee_oracle.register(Litecoin, Ravencoin)
+        >>> fee_oracle.start()
+        >>> Litecoin.get_fee()  # served from memory
+        0.00112233
+        >>> fee_oracle.get_estimate(Litecoin)
+        FeeEstimate(rates={10: 0.0005, 25: 0.00081, 50: 0.00112233, 75: 0.0019, 90: 0.0031}, samples=412, age=12s)
+    '''
+
+    local = threading.local()
+    '''Thread state shared by all oracles, so `served_by_fee_oracle` knows when any of them is refreshing.'''
+
+    def __init__(
+        self,
+        interval: float=FEE_ORACLE_REFRESH_INTERVAL,
+        max_age: float=FEE_ORACLE_MAX_AGE,
+        percentiles: Iterable[float]=FEE_ORACLE_PERCENTILES,
+        max_workers: int=FEE_ORACLE_MAX_WORKERS,
+    ):
+        self.interval = interval
+        self.max_age = max_age
+        self.percentiles = tuple(percentiles)
+        self.max_workers = max_workers
+        self.networks = {}
+        self.estimates = {}
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.thread = None
+        self.executor = None
+
+    @staticmethod
+    def network_class(network) -> type:
+        return network if isinstance(network, type) else type(network)
+
+    def register(self, *networks):
+        with self.lock:
+            for network in networks:
+                network = self.network_class(network)
+                self.networks[network] = network
+
+    def unregister(self, *networks):
+        with self.lock:
+            for network in networks:
+                network = self.network_class(network)
+                self.networks.pop(network, None)
+                self.estimates.pop(network, None)
+
+    def refresh(self, network) -> Optional[FeeEstimate]:
+        '''Computing the new estimate, the previous one is kept if it cannot be computed.'''
+        network = self.network_class(network)
+        self.local.refreshing = True
+        try:
+            if hasattr(network, 'get_fee_rates'):
+                fee_rates = network.get_fee_rates()
+                estimate = FeeEstimate.from_fee_rates(fee_rates, self.percentiles) if fee_rates else None
+            else:
+                fee = network.get_fee()
+                estimate = FeeEstimate({p: fee for p in self.percentiles}, 1) if fee else None
+        except Exception:
+            logger.exception('Cannot refresh fee estimate (%s)', network.symbols[0])
+            return
+        finally:
+            self.local.refreshing = False
+        if estimate is None:
+            logger.warning('No fee estimate for %s', network.symbols[0])
+            return
+        with self.lock:
+            self.estimates[network] = estimate
+        logger.debug('Fee estimate for %s: %s', network.symbols[0], estimate)
+        return estimate
+
+    def refresh_all(self):
+        with self.lock:
+            networks = list(self.networks)
+        if not networks:
+            return
+        list(self.get_executor().map(self.refresh, networks))
+
+    def get_executor(self) -> ThreadPoolExecutor:
+        '''Thread pool refreshing estimates of many networks at once, kept for the next refreshes.'''
+        with self.lock:
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='clove-fee-oracle')
+            return self.executor
+
+    def get_estimate(self, network) -> Optional[FeeEstimate]:
+        '''Returns the estimate if it's not older than `max_age`.'''
+        estimate = self.estimates.get(self.network_class(network))
+        if estimate is None or estimate.age > self.max_age:
+            return
+        return estimate
+
+    @property
+    def refreshing(self) -> bool:
+        '''Whether the current thread is refreshing an estimate (`get_fee` has to reach the explorer then).'''
+        return getattr(self.local, 'refreshing', False)
+
+    def get_fee(self, network, percent: float=FEE_ORACLE_DEFAULT_PERCENTILE) -> Optional[float]:
+        estimate = self.get_estimate(network)
+        if estimate is not None:
+            return estimate.fee_per_kb(percent)
+
+    def start(self):
+        if self.thread and self.thread.is_alive():
+            return
+        self.stopped.clear()
+        self.thread = threading.Thread(target=self.keep_refreshing, name='clove-fee-oracle', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+
+    def keep_refreshing(self):
+        while not self.stopped.is_set():
+            started = time()
+            self.refresh_all()
+            self.stopped.wait(max(self.interval - (time() - started), 0))
+
+    def clear(self):
+        with self.lock:
+            self.networks.clear()
+            self.estimates.clear()
+
+
+fee_oracle = FeeOracle()
+'''Fee oracle used by `get_fee` and `get_current_fee_per_kb` of the networks.'''
+
+
+def served_by_fee_oracle(method: Callable) -> Callable:
+    '''
+    Decorator returning the fee estimate from `fee_oracle` (if it's fresh) instead of calling the explorer.
+
+    Calls with arguments (e.g. custom number of transactions) and calls made by the oracle itself
+    while refreshing always reach the explorer. It has to be placed above `cached`.
+    '''
+
+    if asyncio.iscoroutinefunction(method):
+        @wraps(method)
+        async def async_wrapper(cls, *args, **kwargs):
+            fee = None if args or kwargs or fee_oracle.refreshing else fee_oracle.get_fee(cls)
+            return fee if fee is not None else await method(cls, *args, **kwargs)
+        return async_wrapper
+
+    @wraps(method)
+    def wrapper(cls, *args, **kwargs):
+        fee = None if args or kwargs or fee_oracle.refreshing else fee_oracle.get_fee(cls)
+        return fee if fee is not None else method(cls, *args, **kwargs)
+    return wrapper
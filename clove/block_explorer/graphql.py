@@ -1,13 +1,164 @@
-from typing import Optional
+import asyncio
+from functools import lru_cache
+from typing import Iterator, Optional, Tuple
 import json
 
 from bitcoin.core import CTxOut, script
 
-from clove.block_explorer.base import BaseAPI
-from clove.network.bitcoin.utxo import Utxo
+from clove.block_explorer.base import BaseAPI, served_by_header_chain
+from clove.constants import GRAPHQL_BATCH_MAX_SIZE
 from clove.utils.bitcoin import from_base_units, to_base_units
-from clove.utils.external_source import clove_req_json
+from clove.utils.cache import cached, is_confirmed_transaction
+from clove.utils.external_source import aclove_req_json, clove_req_json
 from clove.utils.logging import logger
+from clove.utxo import Utxo
+
+TRANSACTION_FIELDS = '''{
+    txId
+    version
+    locktime
+    vinsByTxId { nodes { txId vout n scriptSig address value } }
+    voutsByTxId { nodes { txId n value scriptPubKey spendingN spendingTxId } }
+    blockHash
+    blockByBlockHash { hash height }
+}'''
+'''Transaction fields used by `get_transaction` (all of them are needed to build the contract).'''
+
+UTXO_FIELDS = '{ nodes { voutsByTxId(condition: { spendingN: null }) { nodes { txId n value scriptPubKey } } } }'
+UTXO_PAGE_FIELDS = '''{
+    pageInfo { hasNextPage endCursor }
+    nodes { voutsByTxId(condition: { spendingN: null }) { nodes { txId n value scriptPubKey } } }
+}'''
+BALANCE_FIELDS = '{ nodes { voutsByTxId(condition: { spendingN: null }) { nodes { value } } } }'
+REDEEM_FIELDS = '{ nodes { txId txByTxId { vinsByTxId(first: 1) { nodes { scriptSig } } } } }'
+'''Contract transactions with just the script of the first input, enough to extract the secret.'''
+
+
+@lru_cache(maxsize=None)
+def compile_query(operation: str, variables: Tuple[tuple, ...], fields: Tuple[tuple, ...]) -> str:
+    '''
+    Building GraphQL document, every document shape is compiled only once and values are sent as variables.
+
+    Args:
+        operation (str): operation name
+        variables (tuple): tuples of (variable name, variable type)
+        fields (tuple): tuples of (alias, root field, arguments, selection), arguments are tuples
+            of (argument name, value) where value is written as in the document (e.g. `$txId` or `HEIGHT_DESC`)
+
+    Returns:
+        str: GraphQL document
+
+    Example:
+        >>> fields = (('tx', 'txByTxId', (('txId', '$txId'), ), '{ txId }'), )
+        >>> compile_query('Transaction', (('txId', 'String!'), ), fields)
+        'query Transaction($txId: String!) { tx: txByTxId(txId: $txId) { txId } }'
+    '''
+    definitions = ', '.join(f'${name}: {variable_type}' for name, variable_type in variables)
+    selections = []
+    for alias, field, arguments, selection in fields:
+        values = ', '.join(f'{name}: {value}' for name, value in arguments)
+        selections.append(
+            (f'{alias}: ' if alias != field else '') + field + (f'({values})' if values else '') + f' {selection}'
+        )
+    return f'query {operation}' + (f'({definitions})' if definitions else '') + ' { ' + ' '.join(selections) + ' }'
+
+
+LATEST_BLOCK_QUERY = compile_query('LatestBlock', (), (
+    ('allBlocks', 'allBlocks', (('orderBy', 'HEIGHT_DESC'), ('first', '1')), '{ nodes { height } }'),
+))
+TRANSACTION_QUERY = compile_query('Transaction', (('txId', 'String!'), ), (
+    ('txByTxId', 'txByTxId', (('txId', '$txId'), ), TRANSACTION_FIELDS),
+))
+UTXO_PAGE_QUERY = compile_query('UtxoPage', (('address', 'String!'), ('first', 'Int'), ('after', 'Cursor')), (
+    ('getAddressTxs', 'getAddressTxs', (('_address', '$address'), ('first', '$first'), ('after', '$after')),
+     UTXO_PAGE_FIELDS),
+))
+BALANCE_QUERY = compile_query('Balance', (('address', 'String!'), ), (
+    ('getAddressTxs', 'getAddressTxs', (('_address', '$address'), ), BALANCE_FIELDS),
+))
+REDEEM_QUERY = compile_query('RedeemTransaction', (('address', 'String!'), ), (
+    ('allAddressTxes', 'allAddressTxes', (
+        ('orderBy', 'TIME_ASC'), ('first', '2'), ('condition', '{ address: $address }'),
+    ), REDEEM_FIELDS),
+))
+
+
+class GraphQLBatch(object):
+    '''
+    Folding many lookups into aliased requests (at most `max_size` lookups per request).
+
+    Example:
+        >>> from clove.network import DrivechainTestDrive
+        >>> batch = GraphQLBatch(DrivechainTestDrive, 'Transactions')
+        >>> first = batch.add('txByTxId', {'txId': ('String!', '5d0c0a...')}, '{ txId blockHash }')
+        >>> second = batch.add('txByTxId', {'txId': ('String!', '7ab3ff...')}, '{ txId blockHash }')
+        >>> results = batch.execute()
+        >>> results[first]
+        {'txId': '5d0c0a...', 'blockHash': '000000...'}
+    '''
+
+    def __init__(self, explorer, operation: str='Batch', max_size: int=GRAPHQL_BATCH_MAX_SIZE):
+        self.explorer = explorer
+        self.operation = operation
+        self.max_size = max_size
+        self.lookups = []
+
+    def add(self, field: str, arguments: dict, selection: str) -> str:
+        '''
+        Adding lookup to the batch.
+
+        Args:
+            field (str): root field
+            arguments (dict): argument name -> (variable type, value)
+            selection (str): requested fields
+
+        Returns:
+            str: alias of the lookup in the results
+        '''
+        alias = f'q{len(self.lookups)}'
+        self.lookups.append((alias, field, arguments, selection))
+        return alias
+
+    def requests(self) -> list:
+        '''Returns (document, variables) pairs, aliases and variables are numbered inside each request.'''
+        requests = []
+        for start in range(0, len(self.lookups), self.max_size):
+            definitions = []
+            fields = []
+            variables = {}
+            for index, (alias, field, arguments, selection) in enumerate(self.lookups[start:start + self.max_size]):
+                field_arguments = []
+                for argument, (variable_type, value) in sorted(arguments.items()):
+                    variable = f'{argument.lstrip("_")}{index}'
+                    definitions.append((variable, variable_type))
+                    field_arguments.append((argument, f'${variable}'))
+                    variables[variable] = value
+                fields.append((f'q{index}', field, tuple(field_arguments), selection))
+            requests.append((start, compile_query(self.operation, tuple(definitions), tuple(fields)), variables))
+        return requests
+
+    def parse(self, start: int, response: dict) -> dict:
+        if not response or 'data' not in response:
+            raise ValueError(f'Unexpected response from GraphQL API ({self.explorer.symbols[0]})')
+        return {f'q{start + int(alias[1:])}': data for alias, data in response['data'].items()}
+
+    def execute(self) -> dict:
+        '''Returns alias -> result of the lookup.'''
+        results = {}
+        for start, document, variables in self.requests():
+            results.update(self.parse(start, self.explorer.graphql(document, variables)))
+        return results
+
+    async def aexecute(self) -> dict:
+        '''Asynchronous version of the `execute` method, requests are sent concurrently.'''
+        requests = self.requests()
+        responses = await asyncio.gather(*(
+            self.explorer.agraphql(document, variables) for _, document, variables in requests
+        ))
+        results = {}
+        for (start, _, _), response in zip(requests, responses):
+            results.update(self.parse(start, response))
+        return results
 
 
 class GraphQL(BaseAPI):
@@ -17,23 +168,43 @@ class GraphQL(BaseAPI):
 
     api_url = None
     ui_url = None
+    utxo_page_size = 100
+    '''Number of address transactions per page when streaming UTXO.'''
 
     @classmethod
+    def graphql(cls, query: str, variables: Optional[dict]=None) -> Optional[dict]:
+        '''Sending GraphQL document with its variables.'''
+        return clove_req_json(f'{cls.api_url}/graphql', post_data=cls._graphql_data(query, variables))
+
+    @classmethod
+    async def agraphql(cls, query: str, variables: Optional[dict]=None) -> Optional[dict]:
+        '''Asynchronous version of the `graphql` method.'''
+        return await aclove_req_json(f'{cls.api_url}/graphql', post_data=cls._graphql_data(query, variables))
+
+    @staticmethod
+    def _graphql_data(query: str, variables: Optional[dict]=None) -> dict:
+        data = {'query': query}
+        if variables:
+            data['variables'] = json.dumps(variables)
+        return data
+
+    @classmethod
+    @served_by_header_chain
+    @cached('latest_block')
     def get_latest_block(cls) -> Optional[int]:
         '''Returns the number of the latest block.'''
+        return cls._parse_latest_block(cls.graphql(LATEST_BLOCK_QUERY))
 
-        query = '''
-        {
-            allBlocks(orderBy: HEIGHT_DESC, first: 1) {
-                nodes {
-                    height
-                }
-            }
-        }
-        '''
+    @classmethod
+    @served_by_header_chain
+    @cached('latest_block')
+    async def aget_latest_block(cls) -> Optional[int]:
+        '''Asynchronous version of the `get_latest_block` method.'''
+        return cls._parse_latest_block(await cls.agraphql(LATEST_BLOCK_QUERY))
 
+    @classmethod
+    def _parse_latest_block(cls, json_response: dict) -> Optional[int]:
         try:
-            json_response = clove_req_json(f'{cls.api_url}/graphql', post_data={'query': query})
             latest_block = json_response['data']['allBlocks']['nodes'][0]['height']
         except (TypeError, KeyError):
             logger.error(f'Cannot get latest block, bad response ({cls.symbols[0]})')
@@ -45,104 +216,122 @@ class GraphQL(BaseAPI):
         return latest_block
 
     @classmethod
+    @cached('transaction', immutable=is_confirmed_transaction)
     def get_transaction(cls, tx_address: str) -> dict:
-        query = '''
-        {
-          txByTxId(txId: "%s") {
-            txId
-            version
-            locktime
-            vinsByTxId {
-              nodes {
-                txId
-                vout
-                n
-                scriptSig
-                address
-                value
-              }
-            }
-            voutsByTxId {
-                nodes {
-                    txId
-                    n
-                    value
-                    scriptPubKey
-                    spendingN
-                    spendingTxId
-                }
-            }
-            blockHash
-            blockByBlockHash {
-              hash
-              height
-            }
-          }
-        }
-        ''' % (tx_address)
-        json_response = clove_req_json(f'{cls.api_url}/graphql', post_data={'query': query})
+        json_response = cls.graphql(TRANSACTION_QUERY, {'txId': tx_address})
         return json_response['data']['txByTxId']
 
+    @classmethod
+    @cached('transaction', immutable=is_confirmed_transaction)
+    async def aget_transaction(cls, tx_address: str) -> dict:
+        '''Asynchronous version of the `get_transaction` method.'''
+        json_response = await cls.agraphql(TRANSACTION_QUERY, {'txId': tx_address})
+        return json_response['data']['txByTxId']
+
+    @classmethod
+    def _transactions_batch(cls, tx_addresses: list) -> Tuple[GraphQLBatch, list]:
+        batch = GraphQLBatch(cls, 'Transactions')
+        aliases = [
+            batch.add('txByTxId', {'txId': ('String!', tx_address)}, TRANSACTION_FIELDS) for tx_address in tx_addresses
+        ]
+        return batch, aliases
+
+    @classmethod
+    def get_transactions(cls, tx_addresses: list) -> dict:
+        '''
+        Getting many transactions with aliased requests instead of a request per transaction.
+
+        Args:
+            tx_addresses (list): transaction hashes
+
+        Returns:
+            dict: transaction hash -> transaction details (None for unknown transactions)
+        '''
+        batch, aliases = cls._transactions_batch(tx_addresses)
+        results = batch.execute()
+        return {tx_address: results.get(alias) for tx_address, alias in zip(tx_addresses, aliases)}
+
+    @classmethod
+    async def aget_transactions(cls, tx_addresses: list) -> dict:
+        '''Asynchronous version of the `get_transactions` method.'''
+        batch, aliases = cls._transactions_batch(tx_addresses)
+        results = await batch.aexecute()
+        return {tx_address: results.get(alias) for tx_address, alias in zip(tx_addresses, aliases)}
+
     @classmethod
     def get_utxo(cls, address, amount):
-        query = """
-        {
-            getAddressTxs(_address: "%s") {
-                nodes {
-                    voutsByTxId(condition: { spendingN: null }) {
-                        nodes {
-                            txId
-                            n
-                            value
-                            scriptPubKey
-                        }
-                    }
-                }
-            }
-        }
-        """ % (address)
-
-        data = clove_req_json(f'{cls.api_url}/graphql', post_data={'query': query})
-        vouts = []
-        for node in data['data']['getAddressTxs']['nodes']:
-            for vout in node['voutsByTxId']['nodes']:
-                vouts.append(vout)
+        return cls._select_utxo(cls.get_utxos_for_addresses([address]), amount)
 
-        unspent = sorted(vouts, key=lambda k: k['value'], reverse=True)
+    @classmethod
+    async def aget_utxo(cls, address, amount):
+        '''Asynchronous version of the `get_utxo` method.'''
+        return cls._select_utxo(await cls.aget_utxos_for_addresses([address]), amount)
 
-        utxo = []
-        total = 0
+    @classmethod
+    def iter_utxo(cls, address: str) -> Iterator[Utxo]:
+        '''Yielding unspent outputs of the address, following the pagination cursor of address transactions.'''
+        cursor = None
+        while True:
+            data = cls.graphql(UTXO_PAGE_QUERY, {'address': address, 'first': cls.utxo_page_size, 'after': cursor})
+            if not data or not data.get('data'):
+                raise ValueError(f'Cannot get UTXO ({cls.symbols[0]})')
+            address_txs = data['data']['getAddressTxs']
+            yield from cls._utxo_list({'data': {'a0': address_txs}})
+            page_info = address_txs['pageInfo']
+            if not page_info['hasNextPage']:
+                return
+            cursor = page_info['endCursor']
 
-        for output in unspent:
-            value = float(output['value'])
-            utxo.append(
-                Utxo(
-                    tx_id=output['txId'],
-                    vout=output['n'],
-                    value=value,
-                    tx_script=output['scriptPubKey'],
-                )
-            )
-            total += value
-            if total > amount:
-                return utxo
+    @classmethod
+    def _utxo_batch(cls, addresses: list) -> GraphQLBatch:
+        '''Batch with unspent outputs of the addresses, every address (without duplicates) gets its own alias.'''
+        batch = GraphQLBatch(cls, 'Utxo')
+        for address in dict.fromkeys(addresses):
+            batch.add('getAddressTxs', {'_address': ('String!', address)}, UTXO_FIELDS)
+        return batch
+
+    @classmethod
+    def get_utxos_for_addresses(cls, addresses: list) -> list:
+        '''Returns all unspent outputs of the given addresses, asking for many addresses in a single query.'''
+        return cls._merge_utxo([cls._utxo_list({'data': cls._utxo_batch(addresses).execute()})])
+
+    @classmethod
+    async def aget_utxos_for_addresses(cls, addresses: list) -> list:
+        '''Asynchronous version of the `get_utxos_for_addresses` method.'''
+        return cls._merge_utxo([cls._utxo_list({'data': await cls._utxo_batch(addresses).aexecute()})])
 
-        logger.debug(f'Cannot find enough UTXO\'s. Found %.8f from %.8f.', total, amount)
+    @classmethod
+    def _utxo_list(cls, data: dict) -> list:
+        if not data or not data.get('data'):
+            raise ValueError(f'Cannot get UTXO ({cls.symbols[0]})')
+        return [
+            Utxo(
+                tx_id=vout['txId'],
+                vout=vout['n'],
+                value=float(vout['value']),
+                tx_script=vout['scriptPubKey'],
+            )
+            for address_txs in data['data'].values()
+            for node in address_txs['nodes']
+            for vout in node['voutsByTxId']['nodes']
+        ]
 
     @classmethod
     def extract_secret_from_redeem_transaction(cls, contract_address: str) -> Optional[str]:
+        return cls._extract_secret_from_redeem_transaction(
+            cls._get_redeem_transaction(cls.graphql(REDEEM_QUERY, {'address': contract_address}))
+        )
+
+    @classmethod
+    async def aextract_secret_from_redeem_transaction(cls, contract_address: str) -> Optional[str]:
+        '''Asynchronous version of the `extract_secret_from_redeem_transaction` method.'''
+        return cls._extract_secret_from_redeem_transaction(
+            cls._get_redeem_transaction(await cls.agraphql(REDEEM_QUERY, {'address': contract_address}))
+        )
 
-        query = """
-        {
-            allAddressTxes(orderBy: TIME_ASC, condition: { address: "%s" }) {
-                nodes {
-                    txId
-                }
-            }
-        }
-        """ % (contract_address)
-
-        data = clove_req_json(f'{cls.api_url}/graphql', post_data={'query': query})
+    @classmethod
+    def _get_redeem_transaction(cls, data: dict) -> Optional[dict]:
+        '''Redeem transaction is the second transaction of the contract, it comes with the contract transactions.'''
         contract_transactions = data['data']['allAddressTxes']['nodes']
 
         if not contract_transactions:
@@ -151,8 +340,12 @@ class GraphQL(BaseAPI):
         if len(contract_transactions) < 2:
             logger.debug('There is no redeem transaction on this contract yet.')
             return
+        return contract_transactions[1]['txByTxId'] or {}
 
-        redeem_transaction = cls.get_transaction(contract_transactions[1]['txId'])
+    @classmethod
+    def _extract_secret_from_redeem_transaction(cls, redeem_transaction: Optional[dict]) -> Optional[str]:
+        if redeem_transaction is None:
+            return
         if not redeem_transaction:
             logger.error(f'Cannot get redeem transaction ({cls.symbols[0]})')
             return
@@ -160,6 +353,7 @@ class GraphQL(BaseAPI):
         return cls.extract_secret(scriptsig=redeem_transaction['vinsByTxId']['nodes'][0]['scriptSig'])
 
     @classmethod
+    @cached('balance')
     def get_balance(cls, wallet_address: str) -> float:
         '''
         Returns wallet balance without unconfirmed transactions.
@@ -176,22 +370,16 @@ class GraphQL(BaseAPI):
             >>> r.get_balance('RM7w75BcC21LzxRe62jy8JhFYykRedqu8k')
             >>> 18.99
         '''
+        return cls._parse_balance(cls.graphql(BALANCE_QUERY, {'address': wallet_address}))
+
+    @classmethod
+    @cached('balance')
+    async def aget_balance(cls, wallet_address: str) -> float:
+        '''Asynchronous version of the `get_balance` method.'''
+        return cls._parse_balance(await cls.agraphql(BALANCE_QUERY, {'address': wallet_address}))
 
-        query = """
-        {
-            getAddressTxs(_address: "%s") {
-                nodes {
-                    voutsByTxId(condition: { spendingN: null }) {
-                        nodes {
-                            value
-                        }
-                    }
-                }
-            }
-        }
-        """ % (wallet_address)
-
-        data = clove_req_json(f'{cls.api_url}/graphql', post_data={'query': query})
+    @classmethod
+    def _parse_balance(cls, data: dict) -> float:
         total = 0
         for node in data['data']['getAddressTxs']['nodes']:
             for vout in node['voutsByTxId']['nodes']:
@@ -218,6 +406,11 @@ class GraphQL(BaseAPI):
     def get_fee(cls) -> Optional[float]:
         return 0.0001
 
+    @classmethod
+    async def aget_fee(cls) -> Optional[float]:
+        '''Asynchronous version of the `get_fee` method.'''
+        return cls.get_fee()
+
     @classmethod
     def get_first_vout_from_tx_json(cls, tx_json: dict) -> CTxOut:
         vout = tx_json['voutsByTxId']['nodes'][0]
@@ -1,12 +1,27 @@
-from typing import Optional
+import asyncio
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import threading
+from typing import Iterator, Optional
 
 from bitcoin.core import CTxOut, script
 
-from clove.block_explorer.base import BaseAPI
-from clove.network.bitcoin.utxo import Utxo
+from clove.block_explorer.base import BaseAPI, served_by_header_chain
+from clove.block_explorer.fees import served_by_fee_oracle
+from clove.constants import (
+    FEE_ORACLE_BLOCKS,
+    FEE_ORACLE_SAMPLES,
+    INSIGHT_FEE_SAMPLES,
+    INSIGHT_SCAN_MAX_BLOCKS,
+    INSIGHT_SCAN_MAX_ERRORS,
+    INSIGHT_SCAN_MAX_THREADS,
+    INSIGHT_SCAN_WORKERS,
+)
 from clove.utils.bitcoin import from_base_units, to_base_units
-from clove.utils.external_source import clove_req_json
+from clove.utils.cache import arefresh_confirmations, cached, is_confirmed_transaction, refresh_confirmations
+from clove.utils.external_source import aclove_req_json, clove_req_json
 from clove.utils.logging import logger
+from clove.utxo import Utxo
 
 
 class InsightAPIv4(BaseAPI):
@@ -17,12 +32,27 @@ class InsightAPIv4(BaseAPI):
 
     api_url = None
     ui_url = None
+    utxo_page_size = 50
+    '''Number of transactions per page when streaming UTXO (maximum allowed by the API).'''
 
     @classmethod
+    @served_by_header_chain
+    @cached('latest_block')
     def get_latest_block(cls) -> Optional[int]:
         '''Returns the number of the latest block.'''
+        return cls._parse_latest_block(clove_req_json(f'{cls.api_url}/status?q=getInfo'))
+
+    @classmethod
+    @served_by_header_chain
+    @cached('latest_block')
+    async def aget_latest_block(cls) -> Optional[int]:
+        '''Asynchronous version of the `get_latest_block` method.'''
+        return cls._parse_latest_block(await aclove_req_json(f'{cls.api_url}/status?q=getInfo'))
+
+    @classmethod
+    def _parse_latest_block(cls, response: dict) -> Optional[int]:
         try:
-            latest_block = clove_req_json(f'{cls.api_url}/status?q=getInfo')['info']['blocks']
+            latest_block = response['info']['blocks']
         except (TypeError, KeyError):
             logger.error(f'Cannot get latest block, bad response ({cls.symbols[0]})')
             return
@@ -33,49 +63,143 @@ class InsightAPIv4(BaseAPI):
         return latest_block
 
     @classmethod
+    @cached('transaction', immutable=is_confirmed_transaction, refresh=refresh_confirmations)
     def get_transaction(cls, tx_address: str) -> dict:
         return clove_req_json(f'{cls.api_url}/tx/{tx_address}')
 
+    @classmethod
+    @cached('transaction', immutable=is_confirmed_transaction, refresh=arefresh_confirmations)
+    async def aget_transaction(cls, tx_address: str) -> dict:
+        '''Asynchronous version of the `get_transaction` method.'''
+        return await aclove_req_json(f'{cls.api_url}/tx/{tx_address}')
+
     @classmethod
     def get_utxo(cls, address, amount):
-        data = clove_req_json(f'{cls.api_url}/addrs/{address}/utxo')
-        unspent = sorted(data, key=lambda k: k['satoshis'], reverse=True)
-
-        utxo = []
-        total = 0
-
-        for output in unspent:
-            value = from_base_units(output['satoshis'])
-            utxo.append(
-                Utxo(
-                    tx_id=output['txid'],
-                    vout=output['vout'],
-                    value=value,
-                    tx_script=output['scriptPubKey'],
-                )
-            )
-            total += value
-            if total > amount:
-                return utxo
+        return cls._parse_utxo(clove_req_json(cls._utxo_url(address)), amount)
+
+    @classmethod
+    async def aget_utxo(cls, address, amount):
+        '''Asynchronous version of the `get_utxo` method.'''
+        return cls._parse_utxo(await aclove_req_json(cls._utxo_url(address)), amount)
+
+    @classmethod
+    def iter_utxo(cls, address: str) -> Iterator[Utxo]:
+        '''
+        Yielding unspent outputs of the address page by page (newest transactions first).
+
+        The UTXO endpoint of Insight is not paginated, so unspent outputs are read from the paginated
+        list of address transactions. Outputs already yielded are skipped if new transactions shift the pages.
+        '''
+        start = 0
+        seen = set()
+        while True:
+            page = clove_req_json(f'{cls.api_url}/addrs/{address}/txs?from={start}&to={start + cls.utxo_page_size}')
+            if page is None:
+                raise ValueError(f'Cannot get transactions of {address} ({cls.symbols[0]})')
+            for transaction in page['items']:
+                for output in transaction['vout']:
+                    if output.get('spentTxId') or address not in output['scriptPubKey'].get('addresses', []):
+                        continue
+                    key = (transaction['txid'], output['n'])
+                    if key in seen:
+                        continue
+                    seen.add(key)
+                    yield Utxo(
+                        tx_id=transaction['txid'],
+                        vout=output['n'],
+                        value=float(output['value']),
+                        tx_script=output['scriptPubKey']['hex'],
+                    )
+            start += cls.utxo_page_size
+            if not page['items'] or start >= page['totalItems']:
+                return
 
-        logger.debug(f'Cannot find enough UTXO\'s. Found %.8f from %.8f.', total, amount)
+    @classmethod
+    def get_utxos_for_addresses(cls, addresses: list) -> list:
+        '''
+        Returns all unspent outputs of the given addresses, asking for many addresses at once.
+
+        Args:
+            addresses (list): wallet addresses
+
+        Returns:
+            list: UTXO objects without duplicates, sorted by value (highest first)
+
+        Example:
+            >>> from clove.network import Ravencoin
+            >>> Ravencoin.get_utxos_for_addresses(['RM7w75BcC21LzxRe62jy8JhFYykRedqu8k', ...])
+            [Utxo(tx_id='8a673e9f...', vout='1', value='18.99', ...), ...]
+        '''
+        return cls._merge_utxo(
+            cls._utxo_list(clove_req_json(cls._utxo_url(','.join(chunk))))
+            for chunk in cls._chunk_addresses(addresses, ',')
+        )
+
+    @classmethod
+    async def aget_utxos_for_addresses(cls, addresses: list) -> list:
+        '''Asynchronous version of the `get_utxos_for_addresses` method.'''
+        responses = await asyncio.gather(*(
+            aclove_req_json(cls._utxo_url(','.join(chunk))) for chunk in cls._chunk_addresses(addresses, ',')
+        ))
+        return cls._merge_utxo(cls._utxo_list(response) for response in responses)
+
+    @classmethod
+    def _utxo_url(cls, addresses: str) -> str:
+        return f'{cls.api_url}/addrs/{addresses}/utxo'
+
+    @classmethod
+    def _parse_utxo(cls, data: list, amount: float):
+        return cls._select_utxo(cls._utxo_list(data), amount)
+
+    @classmethod
+    def _utxo_list(cls, data: list) -> list:
+        if data is None:
+            raise ValueError(f'Cannot get UTXO ({cls.symbols[0]})')
+        return [
+            Utxo(
+                tx_id=output['txid'],
+                vout=output['vout'],
+                value=from_base_units(output['satoshis']),
+                tx_script=output['scriptPubKey'],
+            ) for output in data
+        ]
 
     @classmethod
     def extract_secret_from_redeem_transaction(cls, contract_address: str) -> Optional[str]:
         contract_transactions = clove_req_json(f'{cls.api_url}/txids/{contract_address}')
+        redeem_transaction_address = cls._get_redeem_transaction_address(contract_transactions)
+        if not redeem_transaction_address:
+            return
+        return cls._extract_secret_from_redeem_transaction(cls.get_transaction(redeem_transaction_address))
+
+    @classmethod
+    async def aextract_secret_from_redeem_transaction(cls, contract_address: str) -> Optional[str]:
+        '''Asynchronous version of the `extract_secret_from_redeem_transaction` method.'''
+        contract_transactions = await aclove_req_json(f'{cls.api_url}/txids/{contract_address}')
+        redeem_transaction_address = cls._get_redeem_transaction_address(contract_transactions)
+        if not redeem_transaction_address:
+            return
+        return cls._extract_secret_from_redeem_transaction(await cls.aget_transaction(redeem_transaction_address))
+
+    @classmethod
+    def _get_redeem_transaction_address(cls, contract_transactions: list) -> Optional[str]:
         if not contract_transactions:
             logger.error(f'Cannot get contract transactions ({cls.symbols[0]})')
             return
         if len(contract_transactions) < 2:
             logger.debug('There is no redeem transaction on this contract yet.')
             return
-        redeem_transaction = cls.get_transaction(contract_transactions[1])
+        return contract_transactions[1]
+
+    @classmethod
+    def _extract_secret_from_redeem_transaction(cls, redeem_transaction: dict) -> Optional[str]:
         if not redeem_transaction:
             logger.error(f'Cannot get redeem transaction ({cls.symbols[0]})')
             return
         return cls.extract_secret(redeem_transaction['hex'])
 
     @classmethod
+    @cached('balance')
     def get_balance(cls, wallet_address: str) -> float:
         '''
         Returns wallet balance without unconfirmed transactions.
@@ -92,7 +216,16 @@ class InsightAPIv4(BaseAPI):
             >>> r.get_balance('RM7w75BcC21LzxRe62jy8JhFYykRedqu8k')
             >>> 18.99
         '''
-        wallet_utxo = clove_req_json(f'{cls.api_url}/addr/{wallet_address}/balance')
+        return cls._parse_balance(clove_req_json(f'{cls.api_url}/addr/{wallet_address}/balance'))
+
+    @classmethod
+    @cached('balance')
+    async def aget_balance(cls, wallet_address: str) -> float:
+        '''Asynchronous version of the `get_balance` method.'''
+        return cls._parse_balance(await aclove_req_json(f'{cls.api_url}/addr/{wallet_address}/balance'))
+
+    @classmethod
+    def _parse_balance(cls, wallet_utxo: int) -> float:
         if not wallet_utxo:
             return 0
         return from_base_units(wallet_utxo)
@@ -119,8 +252,16 @@ class InsightAPIv4(BaseAPI):
     @classmethod
     def _get_block_hash(cls, block_number: int) -> str:
         '''Getting block hash by its number'''
+        return cls._parse_block_hash(clove_req_json(f'{cls.api_url}/block-index/{block_number}'), block_number)
+
+    @classmethod
+    async def _aget_block_hash(cls, block_number: int) -> str:
+        return cls._parse_block_hash(await aclove_req_json(f'{cls.api_url}/block-index/{block_number}'), block_number)
+
+    @classmethod
+    def _parse_block_hash(cls, response: dict, block_number: int) -> Optional[str]:
         try:
-            block_hash = clove_req_json(f'{cls.api_url}/block-index/{block_number}')['blockHash']
+            block_hash = response['blockHash']
         except (TypeError, KeyError):
             logger.error(f'Cannot get block hash for block {block_number} ({cls.symbols[0]})')
             return
@@ -128,12 +269,7 @@ class InsightAPIv4(BaseAPI):
         return block_hash
 
     @classmethod
-    def _get_transactions_from_block(cls, block_number: int):
-        '''Getting transactions from block by given block number'''
-        block_hash = cls._get_block_hash(block_number)
-        if not block_hash:
-            return
-        transactions_page = clove_req_json(f'{cls.api_url}/txs/?block={block_hash}')
+    def _parse_block_transactions(cls, transactions_page: dict, block_number: int) -> Optional[list]:
         if not transactions_page:
             return
         transactions = transactions_page['txs']
@@ -141,25 +277,27 @@ class InsightAPIv4(BaseAPI):
         return transactions
 
     @classmethod
-    def _get_transactions(cls):
-        '''Getting 10 latest transactions.'''
-        from_block = cls.get_latest_block()
-        if not from_block:
-            return
-        transactions = []
-        errors_counter = 0
-        while len(transactions) < 10:
-            if errors_counter > 10:
-                raise RuntimeError(f'Cannot get transactions from block ({cls.symbols[0]})')
-            block_transactions = cls._get_transactions_from_block(from_block)
-            if not block_transactions:
-                errors_counter += 1
-                from_block -= 1
-                continue
-            transactions.extend(block_transactions)
-            from_block -= 1
-            if from_block == 1:
-                raise RuntimeError(f'Not enought number of blocks ({cls.symbols[0]})')
+    def _block_transactions_url(cls, block_hash: str, page: int=0) -> str:
+        url = f'{cls.api_url}/txs/?block={block_hash}'
+        return f'{url}&pageNum={page}' if page else url
+
+    @classmethod
+    def _get_transactions(cls, samples: int=INSIGHT_FEE_SAMPLES, max_blocks: int=INSIGHT_SCAN_MAX_BLOCKS):
+        '''Getting latest transactions until `samples` of them have fees, blocks are scanned concurrently.'''
+        latest_block = cls.get_latest_block()
+        if not latest_block:
+            return
+        transactions = BlockScanner(cls, latest_block, samples, max_blocks).run()
+        logger.debug(f'Returning {len(transactions)} transactions')
+        return transactions
+
+    @classmethod
+    async def _aget_transactions(cls, samples: int=INSIGHT_FEE_SAMPLES, max_blocks: int=INSIGHT_SCAN_MAX_BLOCKS):
+        '''Asynchronous version of the `_get_transactions` method.'''
+        latest_block = await cls.aget_latest_block()
+        if not latest_block:
+            return
+        transactions = await BlockScanner(cls, latest_block, samples, max_blocks).arun()
         logger.debug(f'Returning {len(transactions)} transactions')
         return transactions
 
@@ -170,33 +308,236 @@ class InsightAPIv4(BaseAPI):
             transactions = cls._get_transactions()
         except RuntimeError:
             return
+        return cls._average_fee(transactions)
+
+    @classmethod
+    async def _acalculate_fee(cls):
+        try:
+            transactions = await cls._aget_transactions()
+        except RuntimeError:
+            return
+        return cls._average_fee(transactions)
+
+    @classmethod
+    def _average_fee(cls, transactions: Optional[list]) -> Optional[float]:
         if not transactions:
             return
         fees = [tx['fees'] for tx in transactions if 'fees' in tx]
-        return sum(fees) / len(fees)
+        return sum(fees) / len(fees) if fees else None
+
+    @classmethod
+    def get_fee_rates(cls, blocks: int=FEE_ORACLE_BLOCKS, samples: int=FEE_ORACLE_SAMPLES) -> Optional[list]:
+        '''
+        Returns fee rates (per kb) of the transactions from the latest blocks, blocks are scanned concurrently.
+
+        Returns `None` if the blocks could not be scanned.
+        '''
+        try:
+            transactions = cls._get_transactions(samples, max_blocks=blocks)
+        except RuntimeError as e:
+            logger.warning('Cannot get fee rates: %s', e)
+            return
+        return cls._fee_rates(transactions or [])
+
+    @staticmethod
+    def _fee_rates(transactions: list) -> list:
+        return [
+            tx['fees'] * 1000 / tx['size'] for tx in transactions
+            if tx.get('fees') and tx.get('size') and not tx.get('isCoinBase')
+        ]
 
     @classmethod
+    @served_by_fee_oracle
+    @cached('fee')
     def get_fee(cls) -> Optional[float]:
         # This endpoint is available from v0.3.1
+        fee = cls._parse_fee(clove_req_json(f'{cls.api_url}/utils/estimatefee?nbBlocks=1'))
+        return fee if fee is not None else cls._calculate_fee()
+
+    @classmethod
+    @served_by_fee_oracle
+    @cached('fee')
+    async def aget_fee(cls) -> Optional[float]:
+        '''Asynchronous version of the `get_fee` method.'''
+        fee = cls._parse_fee(await aclove_req_json(f'{cls.api_url}/utils/estimatefee?nbBlocks=1'))
+        return fee if fee is not None else await cls._acalculate_fee()
+
+    @classmethod
+    def _parse_fee(cls, response: dict) -> Optional[float]:
+        '''Returns estimated fee or None if it has to be calculated manually.'''
         try:
-            fee = clove_req_json(f'{cls.api_url}/utils/estimatefee?nbBlocks=1')['1']
+            fee = response['1']
         except (TypeError, KeyError):
             logger.error(
                 f'Incorrect response from API when getting fee from {cls.api_url}/utils/estimatefee?nbBlocks=1'
             )
-            return cls._calculate_fee()
+            return
 
         if fee == -1:
             logger.debug(f'Incorrect value in estimatedFee: {fee}')
-            return cls._calculate_fee()
+            return
         fee = float(fee)
         if fee > 0:
-            logger.warning(f'Got fee = 0 for ({cls.symbols[0]}), calculating manually')
             return fee
-        return cls._calculate_fee()
+        logger.warning(f'Got fee = 0 for ({cls.symbols[0]}), calculating manually')
+
+    @classmethod
+    def get_block_height_from_tx_json(cls, tx_json: dict) -> Optional[int]:
+        return tx_json.get('blockheight')
 
     @classmethod
     def get_first_vout_from_tx_json(cls, tx_json: dict) -> CTxOut:
         cscript = script.CScript.fromhex(tx_json['vout'][0]['scriptPubKey']['hex'])
         nValue = to_base_units(float(tx_json['vout'][0]['value']))
         return CTxOut(nValue, cscript)
+
+
+class BlockScanner(object):
+    '''
+    Fetching transactions of the latest blocks over a bounded pool of concurrent requests.
+
+    Requests are pipelined: block hash of the next block (`block-index`) is resolved while pages
+    of the previous blocks (`txs?block=`) are fetched. Remaining pages of the block are fetched before
+    starting new blocks and scanning stops as soon as enough transactions with fees are collected.
+    Failed requests are skipped (the block is replaced with the next one) up to `max_errors` failures.
+
+    Args:
+        explorer: Insight explorer class
+        latest_block (int): number of the first scanned block
+        samples (int): number of transactions with fees to collect, all pages of `max_blocks` are fetched if `None`
+        max_blocks (int): maximum number of scanned blocks
+        workers (int): maximum number of concurrent requests (run in the thread pool shared by all scans)
+        max_errors (int): number of tolerated failed requests
+
+    Example:
+        >>> from clove.block_explorer.insight import BlockScanner
+        >>> from clove.network import Ravencoin
+        >>> transactions = BlockScanner(Ravencoin, Ravencoin.get_latest_block(), samples=50).run()
+    '''
+
+    BLOCK_HASH = 'block-hash'
+    PAGE = 'page'
+
+    def __init__(
+        self,
+        explorer,
+        latest_block: int,
+        samples: Optional[int],
+        max_blocks: int=INSIGHT_SCAN_MAX_BLOCKS,
+        workers: int=INSIGHT_SCAN_WORKERS,
+        max_errors: int=INSIGHT_SCAN_MAX_ERRORS,
+    ):
+        self.explorer = explorer
+        self.next_block = latest_block
+        self.last_block = max(latest_block - max_blocks, 0)
+        self.samples = samples
+        self.workers = workers
+        self.max_errors = max_errors
+        self.errors = 0
+        self.fee_samples = 0
+        self.transactions = []
+        self.queue = deque()
+
+    @property
+    def enough(self) -> bool:
+        return self.samples is not None and self.fee_samples >= self.samples
+
+    def next_task(self) -> Optional[tuple]:
+        '''Pages of the started blocks go first, then the hash of the next block.'''
+        if self.queue:
+            return self.queue.popleft()
+        if self.next_block <= self.last_block:
+            return
+        block_number = self.next_block
+        self.next_block -= 1
+        return self.BLOCK_HASH, block_number, None, 0
+
+    def handle(self, task: tuple, result):
+        kind, block_number, block_hash, page = task
+        if not result:
+            self.errors += 1
+            if self.errors > self.max_errors:
+                raise RuntimeError(f'Cannot get transactions from block ({self.explorer.symbols[0]})')
+            return
+        if kind == self.BLOCK_HASH:
+            self.queue.appendleft((self.PAGE, block_number, result, 0))
+            return
+        transactions = self.explorer._parse_block_transactions(result, block_number) or []
+        self.transactions.extend(transactions)
+        self.fee_samples += sum(1 for tx in transactions if 'fees' in tx)
+        if page == 0:
+            self.queue.extend(
+                (self.PAGE, block_number, block_hash, next_page) for next_page in range(1, result.get('pagesTotal', 1))
+            )
+
+    def fetch(self, task: tuple):
+        kind, block_number, block_hash, page = task
+        try:
+            if kind == self.BLOCK_HASH:
+                return self.explorer._get_block_hash(block_number)
+            return clove_req_json(self.explorer._block_transactions_url(block_hash, page))
+        except Exception as e:
+            logger.debug('Cannot fetch %s of block %d: %r', kind, block_number, e)
+
+    async def afetch(self, task: tuple):
+        kind, block_number, block_hash, page = task
+        try:
+            if kind == self.BLOCK_HASH:
+                return await self.explorer._aget_block_hash(block_number)
+            return await aclove_req_json(self.explorer._block_transactions_url(block_hash, page))
+        except Exception as e:
+            logger.debug('Cannot fetch %s of block %d: %r', kind, block_number, e)
+
+    def run(self) -> list:
+        pending = {}
+        executor = get_executor()
+        try:
+            while not self.enough:
+                while len(pending) < self.workers:
+                    task = self.next_task()
+                    if task is None:
+                        break
+                    pending[executor.submit(self.fetch, task)] = task
+                if not pending:
+                    break
+                done, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+                for future in done:
+                    self.handle(pending.pop(future), future.result())
+        finally:
+            # requests still in progress are not needed anymore, do not wait for them
+            for future in pending:
+                future.cancel()
+        return self.transactions
+
+    async def arun(self) -> list:
+        '''Asynchronous version of the `run` method.'''
+        pending = {}
+        try:
+            while not self.enough:
+                while len(pending) < self.workers:
+                    task = self.next_task()
+                    if task is None:
+                        break
+                    pending[asyncio.ensure_future(self.afetch(task))] = task
+                if not pending:
+                    break
+                done, _ = await asyncio.wait(list(pending), return_when=asyncio.FIRST_COMPLETED)
+                for future in done:
+                    self.handle(pending.pop(future), future.result())
+        finally:
+            for future in pending:
+                future.cancel()
+        return self.transactions
+
+
+executor = None
+executor_lock = threading.Lock()
+
+
+def get_executor() -> ThreadPoolExecutor:
+    '''Thread pool shared by the block scans of all Insight explorers.'''
+    global executor
+    with executor_lock:
+        if executor is None:
+            executor = ThreadPoolExecutor(max_workers=INSIGHT_SCAN_MAX_THREADS, thread_name_prefix='clove-insight')
+        return executor
@@ -7,14 +7,153 @@ COLORED_LOGS_STYLES = {
 NODE_COMMUNICATION_TIMEOUT = 2 * 60
 TRANSACTION_BROADCASTING_MAX_ATTEMPTS = 10
 
+# How many peers should get the transaction announcement at once in the fan-out broadcast
+# and how many of them have to ask for the transaction to treat broadcast as successful
+FAN_OUT_PEERS = 8
+FAN_OUT_QUORUM = 2
+
+# Handshaken connections kept alive per network, closed after CONNECTION_POOL_IDLE_TIMEOUT seconds
+# without use and pinged every CONNECTION_POOL_PING_INTERVAL seconds
+CONNECTION_POOL_MAX_IDLE_CONNECTIONS = 3
+CONNECTION_POOL_IDLE_TIMEOUT = 10 * 60
+CONNECTION_POOL_PING_INTERVAL = 60
+
+# Resolved DNS seeds are cached for DNS_SEED_TTL seconds, seeds that didn't respond
+# are skipped for at least DNS_SEED_NEGATIVE_TTL seconds
+DNS_SEED_TTL = 60 * 60
+DNS_SEED_NEGATIVE_TTL = 5 * 60
+DNS_RESOLVE_TIMEOUT = 10
+DNS_RESOLVE_MAX_WORKERS = 8
+
+# Peer score is the expected handshake latency in seconds increased by penalties for the failure
+# and reject rates, nodes without history are treated as PEER_UNKNOWN_LATENCY fast
+PEER_UNKNOWN_LATENCY = 1.0
+PEER_FAILURE_PENALTY = 5.0
+PEER_REJECT_PENALTY = 10.0
+PEER_LATENCY_SMOOTHING = 0.3
+
+# How many nodes are handshaking at once while connecting and how many seconds
+# should we wait before starting the next attempt
+CONNECT_RACE_PEERS = 4
+CONNECT_RACE_STAGGER = 0.25
+
+# How often should the mempool watcher check its connection and how many
+# announced transactions should it remember to avoid asking for them twice
+MEMPOOL_WATCHER_RECONNECT_INTERVAL = 5
+MEMPOOL_WATCHER_SEEN_INVENTORY = 50000
+
+# How many compact block filters should the light client ask for at once (BIP157 allows 1000),
+# how many seconds should it wait for a response and how many nodes should it try
+# before giving up on finding one that serves filters
+LIGHT_CLIENT_FILTERS_BATCH = 1000
+LIGHT_CLIENT_TIMEOUT = 30
+LIGHT_CLIENT_CONNECT_ATTEMPTS = 3
+# Queries answered from the light client index sync it only if the last sync is older than this (in seconds)
+LIGHT_CLIENT_SYNC_INTERVAL = 60
+
+# How many seconds should we wait for every batch of block headers
+HEADERS_SYNC_TIMEOUT = 30
+# Local header chain is used only if it was synced or got new headers not longer than this ago (in seconds),
+# block explorers are used otherwise
+HEADER_CHAIN_MAX_AGE = 30 * 60
+# Header chains and light clients of the networks start after these blocks (height, block hash) instead of
+# the genesis block, so they don't download the whole history (assumed valid blocks of Bitcoin Core 0.21)
+HEADER_CHAIN_CHECKPOINTS = {
+    'bitcoin': (654683, '0000000000000000000b9d2ec5a352ecba0592946514a92f14319dc2b367fc72'),
+    'test-bitcoin': (1864000, '000000000000006433d1efec504c53ca332b64963c425395515b01977bd7b3b0'),
+}
+
+# Maximum number of nodes probed at the same time by the health checker
+HEALTH_CHECK_CONCURRENCY = 200
+
+# How many seconds should the health checker wait for TCP connection and handshake
+HEALTH_CHECK_CONNECT_TIMEOUT = 2
+HEALTH_CHECK_HANDSHAKE_TIMEOUT = 5
+
 SIGNATURE_SIZE = 110
 
+# Maximum number of items in a single inv message accepted by nodes
+MAX_INV_SIZE = 50000
+
 # How many seconds should we wait for the reject message to appear
 # after publishing transaction
 REJECT_TIMEOUT = 10
 
 CLOVE_API_URL = 'https://clove-api.lamden.io'
 
+# Seconds to wait for connecting to the block explorer and for its response
+HTTP_CONNECT_TIMEOUT = 5
+HTTP_READ_TIMEOUT = 30
+
+# Seconds for which block explorer responses are cached, per endpoint
+RESPONSE_CACHE_TTL = {
+    'latest_block': 15,
+    'transaction': 15,
+    'balance': 30,
+    'fee': 5 * 60,
+}
+# Transactions with this many confirmations are cached without expiration
+RESPONSE_CACHE_IMMUTABLE_CONFIRMATIONS = 6
+# Maximum number of responses kept in the in-memory cache
+RESPONSE_CACHE_MAX_SIZE = 4096
+
+# Block explorer quotas per host: (requests per second, burst size),
+# hosts not listed here are limited to RATE_LIMIT_DEFAULT
+RATE_LIMIT_QUOTAS = {
+    'api.blockcypher.com': (3, 3),
+    'chainz.cryptoid.info': (1, 2),
+}
+RATE_LIMIT_DEFAULT = (10, 10)
+# Backoff after HTTP 429 without the Retry-After header: RATE_LIMIT_BACKOFF_BASE * 2 ** attempt seconds,
+# requests are retried RATE_LIMIT_MAX_RETRIES times before giving up
+RATE_LIMIT_BACKOFF_BASE = 1
+RATE_LIMIT_BACKOFF_MAX = 60
+RATE_LIMIT_MAX_RETRIES = 4
+# Throttled host rate is halved (down to this fraction of its quota) and grows back
+# by this fraction of its quota with every successful request
+RATE_LIMIT_MIN_RATE_RATIO = 0.1
+RATE_LIMIT_RECOVERY = 0.05
+
+# Seconds to wait for the block explorer backend before sending the same request to the next one
+EXPLORER_HEDGE_DELAY = 1.0
+# Explorer backend is skipped after this many consecutive failures, for EXPLORER_BREAKER_RESET_TIMEOUT seconds
+EXPLORER_BREAKER_FAILURES = 3
+EXPLORER_BREAKER_RESET_TIMEOUT = 30
+# Weight of the newest response time in the explorer backend latency average
+EXPLORER_LATENCY_SMOOTHING = 0.3
+# Number of threads sending hedged block explorer requests
+EXPLORER_MAX_WORKERS = 16
+
+# Multi-address UTXO requests are split into chunks of at most UTXO_BATCH_MAX_ADDRESSES addresses
+# and UTXO_BATCH_MAX_URL_LENGTH characters of joined addresses (to stay below the URL length limits)
+UTXO_BATCH_MAX_ADDRESSES = 100
+UTXO_BATCH_MAX_URL_LENGTH = 1800
+
+# Fee oracle refreshes estimates every FEE_ORACLE_REFRESH_INTERVAL seconds and doesn't serve
+# estimates older than FEE_ORACLE_MAX_AGE seconds
+FEE_ORACLE_REFRESH_INTERVAL = 60
+FEE_ORACLE_MAX_AGE = 300
+# Percentiles of the recent transactions fee rates, the median is used by default
+FEE_ORACLE_PERCENTILES = (10, 25, 50, 75, 90)
+FEE_ORACLE_DEFAULT_PERCENTILE = 50
+# Number of the latest blocks used for the estimate (at most FEE_ORACLE_SAMPLES transactions)
+# and number of networks refreshed concurrently
+FEE_ORACLE_BLOCKS = 3
+FEE_ORACLE_SAMPLES = 200
+FEE_ORACLE_MAX_WORKERS = 8
+# Insight fee fallback averages INSIGHT_FEE_SAMPLES latest transactions, blocks are scanned with
+# INSIGHT_SCAN_WORKERS concurrent requests, giving up after INSIGHT_SCAN_MAX_ERRORS failed requests
+INSIGHT_FEE_SAMPLES = 10
+INSIGHT_SCAN_WORKERS = 4
+INSIGHT_SCAN_MAX_BLOCKS = 20
+INSIGHT_SCAN_MAX_ERRORS = 10
+# Number of threads shared by the concurrent block scans of all Insight explorers
+INSIGHT_SCAN_MAX_THREADS = 16
+
+# Number of hosts with kept-alive connections per session and connections kept per host
+HTTP_POOL_CONNECTIONS = 20
+HTTP_POOL_MAXSIZE = 10
+
 ETH_REDEEM_GAS_LIMIT = 100000
 ETH_REFUND_GAS_LIMIT = 100000
 
@@ -210,3 +349,6 @@ ETHEREUM_CONTRACT_ABI = [{
     "name": "RefundSwap",
     "type": "event"
 }]
+
+# Number of lookups (e.g. transactions or addresses) folded into a single aliased GraphQL request
+GRAPHQL_BATCH_MAX_SIZE = 50
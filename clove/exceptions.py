@@ -26,3 +26,7 @@ class UnsupportedTransactionType(CloveException):
 
 class ExternalApiRequestLimitExceeded(CloveException):
     pass
+
+
+class NoBackendAvailable(CloveException):
+    pass
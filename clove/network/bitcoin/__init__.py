@@ -1,13 +1,17 @@
 from typing import Optional
 
+from clove.block_explorer.blockcypher import BlockcypherAPI
+from clove.block_explorer.composite import CompositeAPI
+from clove.block_explorer.fees import served_by_fee_oracle
 from clove.block_explorer.insight import InsightAPIv4
 from clove.network.bitcoin.base import BitcoinBaseNetwork
 from clove.utils.bitcoin import from_base_units
-from clove.utils.external_source import clove_req_json
+from clove.utils.cache import cached
+from clove.utils.external_source import aclove_req_json, clove_req_json
 from clove.utils.logging import logger
 
 
-class Bitcoin(InsightAPIv4, BitcoinBaseNetwork):
+class Bitcoin(CompositeAPI, BitcoinBaseNetwork):
     """
     Class with all the necessary BTC network information based on
     https://github.com/bitcoin/bitcoin/blob/master/src/chainparams.cpp
@@ -25,6 +29,8 @@ class Bitcoin(InsightAPIv4, BitcoinBaseNetwork):
     )
     port = 8333
     message_start = b'\xf9\xbe\xb4\xd9'
+    genesis_hash = '000000000019d6689c085ae165831e934ff763ae46a2a6c172b3f1b60a8ce26f'
+    pow_limit = 0x00000000ffffffffffffffffffffffffffffffffffffffffffffffffffffffff
     base58_prefixes = {
         'PUBKEY_ADDR': 0,
         'SCRIPT_ADDR': 5,
@@ -33,12 +39,28 @@ class Bitcoin(InsightAPIv4, BitcoinBaseNetwork):
     source_code_url = 'https://github.com/bitcoin/bitcoin/blob/master/src/chainparams.cpp'
     api_url = 'https://insight.bitpay.com/api'
     ui_url = 'https://insight.bitpay.com'
+    explorer_backends = (
+        (InsightAPIv4, {'api_url': api_url, 'ui_url': ui_url}),
+        BlockcypherAPI,
+    )
     fee_endpoint = 'https://api.blockcypher.com/v1/btc/main'
 
     @classmethod
+    @served_by_fee_oracle
+    @cached('fee')
     def get_fee(cls) -> Optional[float]:
         '''Returns actual fee per kb.'''
-        response = clove_req_json(cls.fee_endpoint)
+        return cls._parse_blockcypher_fee(clove_req_json(cls.fee_endpoint))
+
+    @classmethod
+    @served_by_fee_oracle
+    @cached('fee')
+    async def aget_fee(cls) -> Optional[float]:
+        '''Asynchronous version of the `get_fee` method.'''
+        return cls._parse_blockcypher_fee(await aclove_req_json(cls.fee_endpoint))
+
+    @classmethod
+    def _parse_blockcypher_fee(cls, response: dict) -> Optional[float]:
         fee = response.get('high_fee_per_kb')
         if not fee:
             logger.error('Cannot find the right key (high_fee_per_kb) while getting fee in blockcypher.')
@@ -61,6 +83,9 @@ class BitcoinTestNet(Bitcoin):
     )
     port = 18333
     message_start = b'\x0b\x11\x09\x07'
+    genesis_hash = '000000000933ea01ad0ee984209779baaec3ced90fa3f408719526f8d77f4943'
+    pow_limit = 0x00000000ffffffffffffffffffffffffffffffffffffffffffffffffffffffff
+    pow_allow_min_difficulty_blocks = True
     base58_prefixes = {
         'PUBKEY_ADDR': 111,
         'SCRIPT_ADDR': 196,
@@ -69,4 +94,8 @@ class BitcoinTestNet(Bitcoin):
     testnet = True
     api_url = 'https://test-insight.bitpay.com/api'
     ui_url = 'https://test-insight.bitpay.com'
+    explorer_backends = (
+        (InsightAPIv4, {'api_url': api_url, 'ui_url': ui_url}),
+        BlockcypherAPI,
+    )
     fee_endpoint = 'https://api.blockcypher.com/v1/btc/test3'
@@ -1,30 +1,25 @@
+import asyncio
+from concurrent.futures import TimeoutError as FutureTimeoutError
+import os
 from random import shuffle
 import socket
 from time import sleep, time
 from typing import Optional
 
-import bitcoin
-from bitcoin import SelectParams
-from bitcoin.base58 import Base58ChecksumError, InvalidBase58Error
+from bitcoin import MainParams, TestNetParams
 from bitcoin.core import CTransaction, b2lx, b2x, script, x
-from bitcoin.core.serialize import Hash, SerializationError, SerializationTruncationError
-from bitcoin.messages import (
-    MSG_TX,
-    MsgSerializable,
-    msg_getdata,
-    msg_inv,
-    msg_ping,
-    msg_pong,
-    msg_reject,
-    msg_tx,
-    msg_verack,
-    msg_version,
-)
+from bitcoin.core.serialize import Hash
+from bitcoin.messages import MSG_TX, msg_getdata, msg_inv, msg_ping, msg_pong, msg_tx, msg_verack, msg_version
 from bitcoin.net import CInv
-from bitcoin.wallet import CBitcoinAddress, CBitcoinAddressError
 
+from clove.block_explorer.fees import fee_oracle
 from clove.constants import (
     CLOVE_API_URL,
+    CONNECT_RACE_PEERS,
+    FAN_OUT_PEERS,
+    FAN_OUT_QUORUM,
+    HEADER_CHAIN_CHECKPOINTS,
+    MAX_INV_SIZE,
     NODE_COMMUNICATION_TIMEOUT,
     REJECT_TIMEOUT,
     TRANSACTION_BROADCASTING_MAX_ATTEMPTS,
@@ -37,12 +32,28 @@ from clove.exceptions import (
 )
 from clove.network.base import BaseNetwork
 from clove.network.bitcoin.contract import BitcoinContract
+from clove.network.bitcoin.dispatcher import Channel, message_dispatcher
+from clove.network.bitcoin.headers import HeaderChain
+from clove.network.bitcoin.light_client import CompactFilterClient
+from clove.network.bitcoin.messages import msg_reject
+from clove.network.bitcoin.p2p import (
+    AsyncNodeConnection,
+    BatchBroadcast,
+    BroadcastReport,
+    FanOutBroadcast,
+    MessageDecoder,
+    run_sync,
+)
+from clove.network.bitcoin.peers import peer_store
+from clove.network.bitcoin.pool import PeerConnection, connection_pool
+from clove.network.bitcoin.race import ConnectionRace
 from clove.network.bitcoin.transaction import BitcoinAtomicSwapTransaction
 from clove.network.bitcoin.wallet import BitcoinWallet
-from clove.utils.bitcoin import auto_switch_params
+from clove.utils.bitcoin import auto_switch_params, is_valid_address, select_params
+from clove.utils.dns import seed_resolver
 from clove.utils.external_source import clove_req_json
 from clove.utils.logging import logger
-from clove.utils.network import generate_params_object
+from clove.utils.network import ChainParams, convert_params_object, generate_params_object
 
 
 class BitcoinBaseNetwork(BaseNetwork):
@@ -53,31 +64,129 @@ class BitcoinBaseNetwork(BaseNetwork):
     nodes = ()
     port = None
     connection = None
+    decoder = None
+    channel = None
     protocol_version = None
+    connected_at = None
     blacklist_nodes = {}
+    '''Failed connection attempts per node, every network instance gets its own copy.'''
+    pooled_connections = True
+    '''Flag for borrowing handshaken connections from the process-wide connection pool.'''
+    connect_race_peers = CONNECT_RACE_PEERS
+    '''How many nodes can be handshaking at once when looking for a new connection.'''
     message_start = b''
+    genesis_hash = None
+    '''Hash of the first block, used as the starting point of the header chain and the light client.'''
+    pow_limit = None
+    '''Highest proof-of-work target, headers are verified only for networks that set it.'''
+    pow_target_timespan = 14 * 24 * 60 * 60
+    pow_target_spacing = 10 * 60
+    pow_allow_min_difficulty_blocks = False
     base58_prefixes = {}
     bitcoin_based = True
 
+    def __init__(self):
+        self.blacklist_nodes = {}
+
     @classmethod
-    def switch_params(cls):
-        if cls.name == 'bitcoin':
-            SelectParams('mainnet')
-        elif cls.name == 'test-bitcoin':
-            SelectParams('testnet')
-        else:
-            SelectParams(
-                name=cls.name,
-                generic_params_object=generate_params_object(
+    def get_params(cls) -> ChainParams:
+        '''
+        Returns immutable chain params of the network.
+
+        Params object is created once per network class and can be passed explicitly to the codecs
+        from `clove.utils.bitcoin` (eg. `address_to_script_pubkey`), which do not rely on global params.
+        '''
+        params = cls.__dict__.get('_params')
+        if params is None:
+            if cls.name == 'bitcoin':
+                params = convert_params_object(MainParams())
+            elif cls.name == 'test-bitcoin':
+                params = convert_params_object(TestNetParams())
+            else:
+                params = generate_params_object(
                     name=cls.name,
                     message_start=cls.message_start,
                     base58_prefixes=cls.base58_prefixes,
+                    default_port=cls.port,
                 )
-            )
+            cls._params = params
+        return params
+
+    @classmethod
+    def reset_params(cls):
+        '''Dropping cached chain params (needed only if network definition is changed at runtime).'''
+        if '_params' in cls.__dict__:
+            del cls._params
+
+    @classmethod
+    def get_header_chain(cls) -> HeaderChain:
+        '''
+        Returns the header chain shared by all instances of the network.
+
+        Chain starts at the network checkpoint from `HEADER_CHAIN_CHECKPOINTS` (genesis block if there is none).
+        Headers are kept in memory unless the `CLOVE_HEADERS_DIR` environment variable points
+        to a directory for the headers files.
+        '''
+        chain = cls.__dict__.get('_header_chain')
+        if chain is None:
+            headers_dir = os.environ.get('CLOVE_HEADERS_DIR')
+            path = os.path.join(headers_dir, f'{cls.name}.headers') if headers_dir else None
+            chain = HeaderChain(cls(), checkpoint=HEADER_CHAIN_CHECKPOINTS.get(cls.name), path=path)
+            cls._header_chain = chain
+        return chain
+
+    @classmethod
+    def get_local_confirmations(cls, block_hash: str) -> Optional[int]:
+        '''
+        Returns number of confirmations of the block counted from the local header chain.
+
+        Returns `None` if the header chain was not created yet, it's stale or it doesn't know the block.
+        '''
+        chain = cls.__dict__.get('_header_chain')
+        if chain is None or chain.is_stale():
+            return
+        return chain.get_confirmations(block_hash)
+
+    @classmethod
+    def get_local_latest_block(cls) -> Optional[int]:
+        '''Returns the height of the local header chain tip (if the chain was created and it's not stale).'''
+        chain = cls.__dict__.get('_header_chain')
+        if chain is not None and not chain.is_stale():
+            return chain.tip_height
+
+    @classmethod
+    def get_light_client(cls) -> CompactFilterClient:
+        '''Returns the compact block filters light client shared by all instances of the network.'''
+        client = cls.__dict__.get('_light_client')
+        if client is None:
+            client = CompactFilterClient(cls(), chain=cls.get_header_chain())
+            cls._light_client = client
+        return client
+
+    @classmethod
+    def switch_params(cls):
+        '''Selecting network params for python-bitcoinlib in the current thread.'''
+        select_params(cls.get_params())
+
+    def publish(self, raw_transaction: str, peers: int=None, quorum: int=FAN_OUT_QUORUM,
+                reject_timeout: int=REJECT_TIMEOUT):
+        '''
+        Publishing transaction in the network.
+
+        Args:
+            raw_transaction (str): signed transaction in hex format
+            peers (int): if given, transaction is announced to that many peers at once (fan-out broadcast)
+            quorum (int): how many peers have to ask for the transaction in the fan-out broadcast
+            reject_timeout (int): how many seconds should we wait for the reject message after sending transaction
+
+        Returns:
+            str, None: transaction address or `None` if the broadcast failed
+        '''
+        if peers:
+            return self.broadcast_to_peers(raw_transaction, peers, quorum, reject_timeout).transaction_address
 
-    def publish(self, raw_transaction: str):
         for attempt in range(1, TRANSACTION_BROADCASTING_MAX_ATTEMPTS + 1):
-            transaction_address = self.broadcast_transaction(raw_transaction)
+            transaction_address = self.broadcast_transaction(raw_transaction, reject_timeout)
 
             if transaction_address is None:
                 logger.warning('Transaction broadcast attempt no. %s failed. Retrying...', attempt)
@@ -91,72 +200,259 @@ class BitcoinBaseNetwork(BaseNetwork):
             TRANSACTION_BROADCASTING_MAX_ATTEMPTS
         )
 
-    @staticmethod
-    def get_nodes(seed) -> list:
-        logger.debug('Getting nodes from seed node %s', seed)
+    def publish_many(self, raw_transactions: list, timeout: int=20, reject_timeout: int=REJECT_TIMEOUT) -> list:
+        '''
+        Publishing many transactions at once.
+
+        Transactions are announced to a single node with one `inv` message (up to the protocol limit
+        of inventory items) and sent as soon as the node asks for them.
+
+        Args:
+            raw_transactions (list): signed transactions in hex format
+            timeout (int): how many seconds should we wait for the node to ask for all transactions
+            reject_timeout (int): how many seconds should we wait for reject messages after the last request
+
+        Returns:
+            list: `TransactionPublishResult` for every transaction, in the order of `raw_transactions`
+
+        Example:
+            >>> from clove.network import Litecoin
+            >>> Litecoin().publish_many([refund_transaction, redeem_transaction])
+            [TransactionPublishResult(transaction_address='5e4d8b3f...', status='accepted', reason=None),
+             TransactionPublishResult(transaction_address=None, status='rejected', reason='insufficient fee')]
+        '''
+        transactions = [self.deserialize_raw_transaction(raw_transaction) for raw_transaction in raw_transactions]
+        results = []
+        for start in range(0, len(transactions), MAX_INV_SIZE):
+            results.extend(self.broadcast_batch(transactions[start:start + MAX_INV_SIZE], timeout, reject_timeout))
+        return results
+
+    def broadcast_batch(self, transactions: list, timeout: int=20, reject_timeout: int=REJECT_TIMEOUT) -> list:
+        batch = BatchBroadcast(transactions)
+        node = self.connect()
+        if node is None:
+            logger.debug(ConnectionProblem('Clove could not get connected with any of the nodes.'))
+            self.reset_connection()
+            return batch.results()
+
+        channel = self.get_channel()
+
+        def handle_getdata(message):
+            batch.handle_getdata(message, channel.send)
+
+        message_dispatcher.subscribe(channel, msg_getdata, handle_getdata)
+        message_dispatcher.subscribe(channel, msg_reject, batch.handle_reject)
         try:
-            hostname, alias, nodes = socket.gethostbyname_ex(seed)
-        except (socket.herror, socket.gaierror):
-            return []
-        logger.debug('Got %s nodes', len(nodes))
-        return nodes
+            if not self.send_message(batch.inventory_message()):
+                self.terminate(node)
+                return batch.results()
+            logger.info('[%s] Announced %s transactions.', node, len(transactions))
+            batch.all_requested.wait(timeout)
+
+            remaining = batch.last_activity + reject_timeout - time()
+            while remaining > 0 and not channel.closed:
+                sleep(min(remaining, 0.1))
+                remaining = batch.last_activity + reject_timeout - time()
+        finally:
+            message_dispatcher.unsubscribe(channel, msg_getdata, handle_getdata)
+            message_dispatcher.unsubscribe(channel, msg_reject, batch.handle_reject)
+
+        results = batch.results()
+        statuses = {result.status for result in results}
+        if BatchBroadcast.REJECTED in statuses:
+            peer_store.record_rejected(self.name, node)
+        elif BatchBroadcast.ACCEPTED in statuses:
+            peer_store.record_accepted(self.name, node)
+
+        if channel.closed:
+            self.reset_connection()
+        else:
+            self.release_connection()
+        logger.info(
+            '[%s] %s of %s transactions sent.', node,
+            sum(1 for result in results if result.status == BatchBroadcast.ACCEPTED), len(results)
+        )
+        return results
+
+    async def apublish(self, raw_transaction: str, reject_timeout: int=REJECT_TIMEOUT) -> Optional[str]:
+        '''
+        Asynchronous version of the `publish` method.
+
+        Example:
+            >>> import asyncio
+            >>> from clove.network import Litecoin, Dash
+            >>> loop = asyncio.get_event_loop()
+            >>> loop.run_until_complete(asyncio.gather(
+            >>>     Litecoin().apublish(litecoin_raw_transaction),
+            >>>     Dash().apublish(dash_raw_transaction),
+            >>> ))
+            ['5e4d8b3f...', '0a1c3e90...']
+        '''
+        for attempt in range(1, TRANSACTION_BROADCASTING_MAX_ATTEMPTS + 1):
+            transaction_address = await self.abroadcast_transaction(raw_transaction, reject_timeout)
 
-    @auto_switch_params()
-    def capture_messages(self, expected_message_types: list, timeout: int=20, buf_size: int=1024,
-                         ignore_empty: bool=False) -> list:
+            if transaction_address is None:
+                logger.warning('Transaction broadcast attempt no. %s failed. Retrying...', attempt)
+                continue
 
-        deadline = time() + timeout
-        found = []
-        partial_message = None
+            logger.info('Transaction broadcast is successful. End of broadcasting process.')
+            return transaction_address
 
-        while expected_message_types and time() < deadline:
+        logger.warning(
+            '%s attempts to broadcast transaction failed. Broadcasting process terminates!',
+            TRANSACTION_BROADCASTING_MAX_ATTEMPTS
+        )
 
-            try:
-                received_data = self.connection.recv(buf_size)
-                if partial_message:
-                    received_data = partial_message + received_data
-            except socket.timeout:
-                continue
+    def broadcast_to_peers(self, raw_transaction: str, peers: int=FAN_OUT_PEERS,
+                           quorum: int=FAN_OUT_QUORUM, reject_timeout: int=REJECT_TIMEOUT) -> BroadcastReport:
+        '''
+        Announcing transaction to many peers at once and returning as soon as `quorum` of them accepted it.
+
+        Peer accepts the transaction when it asked for it and did not reject it within `reject_timeout` seconds.
+
+        Returns:
+            BroadcastReport: transaction address (`None` if broadcast failed) and results for every peer
+
+        Example:
+            >>> from clove.network import Litecoin
+            >>> report = Litecoin().broadcast_to_peers(raw_transaction, peers=8, quorum=2)
+            >>> report.transaction_address
+            '5e4d8b3f...'
+            >>> report.results
+            [PeerBroadcastResult(node='1.2.3.4', status='accepted', reason=None, latency=0.412), ...]
+        '''
+        return run_sync(self.abroadcast_to_peers(raw_transaction, peers, quorum, reject_timeout))
+
+    async def abroadcast_to_peers(self, raw_transaction: str, peers: int=FAN_OUT_PEERS, quorum: int=FAN_OUT_QUORUM,
+                                  reject_timeout: int=REJECT_TIMEOUT) -> BroadcastReport:
+        '''Asynchronous version of the `broadcast_to_peers` method.'''
+        transaction = self.deserialize_raw_transaction(raw_transaction)
+        broadcast = FanOutBroadcast(
+            self, transaction, await self.aget_nodes(), peers, quorum, reject_timeout=reject_timeout
+        )
+        report = await broadcast.run()
+
+        for result in report.results:
+            if result.status == FanOutBroadcast.FAILED:
+                self.update_blacklist(result.node)
+            elif result.status == FanOutBroadcast.ACCEPTED:
+                peer_store.record_accepted(self.name, result.node)
+            elif result.status == FanOutBroadcast.REJECTED:
+                peer_store.record_rejected(self.name, result.node)
+            logger.debug('[%s] Fan-out broadcast result: %s %s', result.node, result.status, result.reason or '')
+
+        if report.transaction_address:
+            logger.info(
+                'Transaction %s has just been sent to %s peers.', report.transaction_address, broadcast.accepted
+            )
+        else:
+            logger.warning(
+                'Fan-out broadcast failed, %s of %s required peers accepted transaction.',
+                broadcast.accepted, broadcast.quorum
+            )
+        return report
 
-            if not received_data:
-                sleep(0.1)
-                continue
+    async def aget_nodes(self) -> list:
+        '''Asynchronous version of the `get_all_nodes` method (seeds are resolved without blocking the event loop).'''
+        if self.nodes:
+            return self.filter_blacklisted_nodes(self.nodes)
 
-            for raw_message in self.split_message(received_data):
+        loop = asyncio.get_event_loop()
+        return self.filter_blacklisted_nodes(await loop.run_in_executor(None, self.get_seed_nodes))
 
-                try:
-                    message = MsgSerializable.from_bytes(raw_message)
-                except (SerializationError, SerializationTruncationError, ValueError):
-                    partial_message = raw_message
-                    continue
+    def get_all_nodes(self) -> list:
+        '''Getting hardcoded nodes or nodes from all seeds, from the best to the worst one.'''
+        return self.filter_blacklisted_nodes(self.nodes or self.get_seed_nodes())
 
-                partial_message = None
-                if not message:
-                    # unknown message type, skipping
-                    continue
+    def get_seed_nodes(self) -> list:
+        '''Resolving all seeds at once, nodes are merged from seeds taken in random order.'''
+        random_seeds = list(self.seeds)
+        shuffle(random_seeds)
 
-                msg_type = type(message)
+        seed_nodes = seed_resolver.resolve_many(random_seeds)
+        nodes = []
+        for seed in random_seeds:
+            nodes.extend(node for node in seed_nodes[seed] if node not in nodes)
+        return nodes
 
-                if msg_type is msg_ping:
-                    logger.debug('Got ping, sending pong.')
-                    self.send_pong(message)
-                elif msg_type is msg_version:
-                    logger.debug('Saving version')
-                    self.protocol_version = message
+    async def abroadcast_transaction(self, raw_transaction: str, reject_timeout: int=REJECT_TIMEOUT) -> Optional[str]:
+        '''
+        Asynchronous version of the `broadcast_transaction` method.
 
-                if msg_type in expected_message_types:
-                    found.append(message)
-                    expected_message_types.remove(msg_type)
-                    logger.debug('Found %s, %s more to catch', msg_type.command.upper(), len(expected_message_types))
+        Nodes are tried one after another until one of them accepts the transaction
+        or `NODE_COMMUNICATION_TIMEOUT` is reached.
+        '''
+        transaction = self.deserialize_raw_transaction(raw_transaction)
+        deadline = time() + NODE_COMMUNICATION_TIMEOUT
 
-        if not expected_message_types:
+        for node in await self.aget_nodes():
+            if time() > deadline:
+                break
+
+            connection = AsyncNodeConnection(self, node)
+            try:
+                transaction_address = await connection.broadcast(transaction, reject_timeout)
+            finally:
+                connection.close()
+
+            if transaction_address:
+                peer_store.record_accepted(self.name, node)
+                return transaction_address
+            self.update_blacklist(node)
+
+        logger.debug(ConnectionProblem('Clove could not get connected with any of the nodes for too long.').message)
+
+    @staticmethod
+    def get_nodes(seed) -> list:
+        return seed_resolver.resolve(seed)
+
+    def capture_messages(self, expected_message_types: list, timeout: int=20, ignore_empty: bool=False) -> list:
+        '''Waiting (without polling) until the message dispatcher receives messages of all given types.'''
+        channel = self.get_channel()
+        future = message_dispatcher.expect(channel, expected_message_types)
+        try:
+            found = future.result(timeout)
+        except FutureTimeoutError:
+            message_dispatcher.cancel(channel, future)
+            found = None
+
+        if channel.protocol_version is not None:
+            self.protocol_version = channel.protocol_version
+
+        if found:
             return found
 
         if not ignore_empty:
             logger.error('Not all messages could be captured')
 
-    @auto_switch_params()
+    def get_decoder(self) -> MessageDecoder:
+        '''Returns messages decoder bound to the current connection.'''
+        if self.decoder is None:
+            self.decoder = MessageDecoder(self.message_start)
+        return self.decoder
+
+    def get_channel(self) -> Channel:
+        '''
+        Returns the current connection registered in the message dispatcher.
+
+        Header chain of the network (if it was created) follows blocks announced on the connection.
+        '''
+        if self.channel is None:
+            self.channel = message_dispatcher.register(self.connection, self.get_decoder(), self.protocol_version)
+            chain = type(self).__dict__.get('_header_chain')
+            if chain is not None:
+                chain.attach(self.channel)
+        return self.channel
+
+    def detach_channel(self):
+        '''Stopping the message dispatcher from reading the current connection.'''
+        if self.channel is not None:
+            message_dispatcher.unregister(self.channel)
+            self.channel = None
+
     def create_connection(self, node, timeout=2):
+        self.detach_channel()
+        self.decoder = None
         try:
             self.connection = socket.create_connection(
                 address=(node, self.port),
@@ -170,97 +466,112 @@ class BitcoinBaseNetwork(BaseNetwork):
         if self.send_version():
             return self.connection
 
-    @auto_switch_params()
     def connect(self) -> str:
 
         if self.connection and self.send_ping():
             # already connected
             return self.get_current_node()
 
-        if self.nodes:
-            # fake seed node to enter the seed nodes loop
-            self.seeds = (None, )
-
-        random_seeds = list(self.seeds)
-        shuffle(random_seeds)
-
-        for seed in random_seeds:
-
-            if seed is None:
-                # get hardcoded nodes
-                nodes = self.nodes
-            else:
-                # get nodes from seed node
-                nodes = self.get_nodes(seed)
-
-            nodes = self.filter_blacklisted_nodes(nodes)
-
-            for node in nodes:
-
-                if not self.create_connection(node):
-                    self.terminate(node)
-                    continue
-
-                messages = self.capture_messages([msg_version, msg_verack])
-                if not messages:
-                    logger.debug('[%s] Failed to get version or version acknowledge message from node', node)
-                    self.terminate(node)
-                    continue
+        if self.borrow_connection():
+            return self.get_current_node()
 
-                logger.debug('[%s] Got version, sending version acknowledge message', node)
+        race = ConnectionRace(self, self.get_all_nodes(), peers=self.connect_race_peers)
+        winner = race.run()
+        for node in race.failed:
+            self.update_blacklist(node)
+        if winner is None:
+            return
 
-                if not self.send_verack():
-                    self.terminate(node)
-                    continue
+        self.connection = winner.candidate.connection
+        self.decoder = winner.candidate.decoder
+        self.channel = winner.candidate.channel
+        self.protocol_version = winner.candidate.protocol_version
+        self.connected_at = time()
+        peer_store.record_handshake(self.name, winner.node, winner.latency)
+        return winner.node
+
+    def borrow_connection(self) -> bool:
+        '''Taking handshaken connection from the connection pool.'''
+        if not self.pooled_connections:
+            return False
+        peer = connection_pool.acquire(self)
+        if peer is None:
+            return False
+        self.connection = peer.connection
+        self.decoder = peer.decoder
+        self.channel = None
+        self.protocol_version = peer.protocol_version
+        self.connected_at = time()
+        return True
 
-                return node
+    def release_connection(self):
+        '''Returning current connection to the connection pool, so it can be reused by other network instances.'''
+        if not self.connection:
+            return
+        if not self.pooled_connections:
+            return self.reset_connection()
+        try:
+            node = self.get_current_node()
+        except OSError:
+            return self.reset_connection()
+        self.record_uptime(node)
+        self.detach_channel()
+        connection_pool.release(self, PeerConnection(node, self.connection, self.get_decoder(), self.protocol_version))
+        self.connection = None
+        self.decoder = None
 
     def filter_blacklisted_nodes(self, nodes, max_tries_number=3):
-        return sorted(
-            [node for node in nodes if self.blacklist_nodes.get(node, 0) <= max_tries_number],
-            key=lambda node: self.blacklist_nodes.get(node, 0)
-        )
+        '''Skipping nodes that failed too many times and sorting the rest by failures and peer score.'''
+        nodes = [node for node in nodes if self.blacklist_nodes.get(node, 0) <= max_tries_number]
+        stats = peer_store.get_stats(self.name, nodes)
+        return sorted(nodes, key=lambda node: (self.blacklist_nodes.get(node, 0), stats[node].score))
+
+    def record_uptime(self, node=None):
+        '''Saving for how long the current connection was alive.'''
+        if not self.connected_at:
+            return
+        if node is None:
+            try:
+                node = self.get_current_node()
+            except OSError:
+                node = None
+        if node:
+            peer_store.record_uptime(self.name, node, time() - self.connected_at)
+        self.connected_at = None
 
     def terminate(self, node=None):
         if node:
             self.update_blacklist(node)
+        self.detach_channel()
         if self.connection:
+            self.record_uptime(node)
             self.connection.close()
             self.connection = None
+        self.decoder = None
 
     def update_blacklist(self, node):
+        peer_store.record_failure(self.name, node)
         try:
             self.blacklist_nodes[node] += 1
         except KeyError:
             logger.warning('Unable to update  blacklist')
             self.blacklist_nodes[node] = 1
 
-    @auto_switch_params()
     def version_packet(self):
         packet = msg_version(170002)
         packet.addrFrom.ip, packet.addrFrom.port = self.connection.getsockname()
         packet.addrTo.ip, packet.addrTo.port = self.connection.getpeername()
         return packet
 
-    @classmethod
-    @auto_switch_params()
-    def split_message(cls, received_data: bytes) -> list:
-        return [
-            bitcoin.params.MESSAGE_START + m for m in received_data.split(bitcoin.params.MESSAGE_START) if m
-        ]
-
-    @auto_switch_params()
     def send_message(self, msg: object, timeout: int=2) -> bool:
         try:
             self.connection.settimeout(timeout)
-            self.connection.send(msg.to_bytes())
-        except (socket.timeout, ConnectionRefusedError, OSError) as e:
+        except OSError as e:
             logger.debug('Failed to send %s message', msg.command.decode())
             logger.debug(e)
             return False
-        return True
+        return self.get_channel().send(msg)
 
-    @auto_switch_params()
     def send_ping(self, timeout: int=1) -> bool:
         if not self.send_message(msg_ping(), timeout):
             return False
@@ -268,13 +579,11 @@ class BitcoinBaseNetwork(BaseNetwork):
             return True
         return False
 
-    @auto_switch_params()
     def send_pong(self, ping, timeout: int=1) -> bool:
         return self.send_message(
             msg_pong(self.protocol_version.nVersion, ping.nonce), timeout
         )
 
-    @auto_switch_params()
     def send_verack(self, timeout: int=2) -> bool:
         return self.send_message(
             msg_verack(self.protocol_version.nVersion), timeout
@@ -285,8 +594,7 @@ class BitcoinBaseNetwork(BaseNetwork):
             self.version_packet(), timeout
         )
 
-    @auto_switch_params()
-    def broadcast_transaction(self, raw_transaction: str):
+    def broadcast_transaction(self, raw_transaction: str, reject_timeout: int=REJECT_TIMEOUT):
         deserialized_transaction = self.deserialize_raw_transaction(raw_transaction)
         serialized_transaction = deserialized_transaction.serialize()
 
@@ -310,17 +618,19 @@ class BitcoinBaseNetwork(BaseNetwork):
             return
 
         logger.info('[%s] Looking for reject message.', node)
-        messages = self.capture_messages([msg_reject, ], timeout=REJECT_TIMEOUT, buf_size=8192, ignore_empty=True)
+        messages = self.capture_messages([msg_reject, ], timeout=reject_timeout, ignore_empty=True)
         if messages:
             logger.debug(TransactionRejected(messages[0], node))
+            peer_store.record_rejected(self.name, node)
             return self.reset_connection()
         logger.info('[%s] Reject message not found.', node)
+        peer_store.record_accepted(self.name, node)
 
         transaction_address = b2lx(deserialized_transaction.GetHash())
         logger.info('[%s] Transaction %s has just been sent.', node, transaction_address)
+        self.release_connection()
         return transaction_address
 
-    @auto_switch_params()
     def send_inventory(self, serialized_transaction) -> msg_getdata:
         message = msg_inv()
         inventory = CInv()
@@ -334,7 +644,9 @@ class BitcoinBaseNetwork(BaseNetwork):
         while time() < timeout:
             node = self.connect()
             if node is None:
+                # every node failed too many times, give them another chance
                 self.reset_connection()
+                self.blacklist_nodes = {}
                 continue
 
             if not self.send_message(message):
@@ -350,10 +662,12 @@ class BitcoinBaseNetwork(BaseNetwork):
             return messages[0]
 
     def reset_connection(self):
+        self.detach_channel()
         if self.connection:
+            self.record_uptime()
             self.connection.close()
             self.connection = None
-        self.blacklist_nodes = {}
+        self.decoder = None
 
     @classmethod
     @auto_switch_params()
@@ -362,7 +676,11 @@ class BitcoinBaseNetwork(BaseNetwork):
 
     @classmethod
     def get_current_fee_per_kb(cls) -> Optional[float]:
-        """Getting current network fee from Clove API"""
+        """Getting current network fee from the fee oracle (if it has a fresh estimate) or from Clove API"""
+
+        fee = fee_oracle.get_fee(cls)
+        if fee is not None:
+            return fee
 
         network = cls.symbols[0].upper()
         if cls.testnet:
@@ -436,14 +754,8 @@ class BitcoinBaseNetwork(BaseNetwork):
         raise ValueError('Unable to extract secret.')
 
     @classmethod
-    @auto_switch_params()
     def is_valid_address(cls, address: str) -> bool:
-        try:
-            CBitcoinAddress(address)
-        except (CBitcoinAddressError, Base58ChecksumError, InvalidBase58Error):
-            return False
-
-        return True
+        return is_valid_address(address, cls.get_params())
 
     @staticmethod
     def deserialize_raw_transaction(raw_transaction: str) -> CTransaction:
@@ -469,6 +781,14 @@ class NoAPI(object):
     def get_utxo(cls, address, amount):
         raise NotImplementedError
 
+    @classmethod
+    def get_utxos_for_addresses(cls, addresses):
+        raise NotImplementedError
+
+    @classmethod
+    def iter_utxo(cls, address):
+        raise NotImplementedError
+
     @classmethod
     def extract_secret_from_redeem_transaction(cls, contract_address: str) -> Optional[str]:
         raise NotImplementedError
@@ -476,3 +796,27 @@ class NoAPI(object):
     @staticmethod
     def get_balance(wallet_address: str) -> float:
         raise NotImplementedError
+
+    @classmethod
+    async def aget_latest_block(cls):
+        raise NotImplementedError
+
+    @staticmethod
+    async def aget_transaction(tx_address: str) -> dict:
+        raise NotImplementedError
+
+    @classmethod
+    async def aget_utxo(cls, address, amount):
+        raise NotImplementedError
+
+    @classmethod
+    async def aget_utxos_for_addresses(cls, addresses):
+        raise NotImplementedError
+
+    @classmethod
+    async def aextract_secret_from_redeem_transaction(cls, contract_address: str) -> Optional[str]:
+        raise NotImplementedError
+
+    @staticmethod
+    async def aget_balance(wallet_address: str) -> float:
+        raise NotImplementedError
@@ -2,11 +2,10 @@ from datetime import datetime
 from typing import Optional
 
 from bitcoin.core import b2lx, b2x, script
-from bitcoin.wallet import CBitcoinAddress, P2PKHBitcoinAddress
 
 from clove.network.bitcoin.transaction import BitcoinTransaction
-from clove.network.bitcoin.utxo import Utxo
-from clove.utils.bitcoin import auto_switch_params, from_base_units
+from clove.utils.bitcoin import auto_switch_params, from_base_units, hash160_to_address, script_pubkey_to_address
+from clove.utxo import Utxo
 
 
 class BitcoinContract(object):
@@ -42,7 +41,7 @@ class BitcoinContract(object):
                 raise ValueError('No transaction found under given address.')
 
             self.vout = self.network.get_first_vout_from_tx_json(tx_json)
-            self.confirmations = self.network.get_confirmations_from_tx_json(tx_json)
+            self.confirmations = self.get_confirmations(tx_json)
 
         if not self.vout:
             raise ValueError('Given transaction has no outputs.')
@@ -51,7 +50,8 @@ class BitcoinContract(object):
         contract_script = script.CScript.fromhex(self.contract)
         script_pub_key = contract_script.to_p2sh_scriptPubKey()
         valid_p2sh = script_pub_key == contract_tx_out.scriptPubKey
-        self.address = str(CBitcoinAddress.from_scriptPubKey(script_pub_key))
+        params = self.network.get_params()
+        self.address = script_pubkey_to_address(script_pub_key, params)
         try:
             self.balance = self.network.get_balance(self.address)
         except NotImplementedError:
@@ -59,8 +59,8 @@ class BitcoinContract(object):
 
         script_ops = list(contract_script)
         if valid_p2sh and self.is_valid_contract_script(script_ops):
-            self.recipient_address = str(P2PKHBitcoinAddress.from_bytes(script_ops[6]))
-            self.refund_address = str(P2PKHBitcoinAddress.from_bytes(script_ops[13]))
+            self.recipient_address = hash160_to_address(script_ops[6], params)
+            self.refund_address = hash160_to_address(script_ops[13], params)
             self.locktime_timestamp = int.from_bytes(script_ops[8], byteorder='little')
             self.locktime = datetime.utcfromtimestamp(self.locktime_timestamp)
             self.secret_hash = b2x(script_ops[2])
@@ -158,6 +158,15 @@ class BitcoinContract(object):
             token_address,
         )
 
+    def get_confirmations(self, tx_json: dict) -> int:
+        '''Counting confirmations from the local header chain when it knows the block, explorer's count otherwise.'''
+        block_hash = self.network.get_block_hash_from_tx_json(tx_json)
+        if block_hash:
+            confirmations = self.network.get_local_confirmations(block_hash)
+            if confirmations is not None:
+                return confirmations
+        return self.network.get_confirmations_from_tx_json(tx_json)
+
     def show_details(self):
         return {
             'contract_address': self.address,
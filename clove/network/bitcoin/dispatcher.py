@@ -0,0 +1,270 @@
+from collections import defaultdict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+import selectors
+import socket
+import threading
+from typing import Callable, Optional
+
+from bitcoin.messages import msg_ping, msg_pong, msg_version
+from bitcoin.net import PROTO_VERSION
+
+from clove.network.bitcoin.p2p import MessageDecoder, serialize_message
+from clove.utils.logging import logger
+
+
+class MessageWaiter(object):
+    '''Messages expected by a single caller, the future is resolved when all of them arrive.'''
+
+    def __init__(self, message_types: list):
+        self.remaining = list(message_types)
+        self.found = []
+        self.future = Future()
+
+    def offer(self, message) -> bool:
+        '''Taking the message if it is expected, returns True if the message was consumed.'''
+        msg_type = type(message)
+        if msg_type not in self.remaining:
+            return False
+        self.found.append(message)
+        self.remaining.remove(msg_type)
+        logger.debug('Found %s, %s more to catch', msg_type.command.upper(), len(self.remaining))
+        if not self.remaining:
+            self.future.set_result(self.found)
+        return True
+
+
+def run_callback(callback: Callable, *args):
+    try:
+        callback(*args)
+    except Exception:
+        logger.exception('Message callback failed')
+
+
+class Channel(object):
+    '''
+    Connection registered in the dispatcher with its decoder, waiters and subscribers.
+
+    Subscribers are called with `call_soon` (inline if it's not given).
+    '''
+
+    def __init__(self, connection: socket.socket, decoder: MessageDecoder, protocol_version=None,
+                 backlog_size: int=100, call_soon: Optional[Callable]=None):
+        self.connection = connection
+        self.decoder = decoder
+        self.protocol_version = protocol_version
+        self.waiters = []
+        self.subscribers = defaultdict(list)
+        self.backlog = deque(maxlen=backlog_size)
+        self.send_lock = threading.Lock()
+        self.call_soon = call_soon or run_callback
+        self.closed = False
+
+    def send(self, message) -> bool:
+        try:
+            with self.send_lock:
+                self.connection.sendall(serialize_message(message, self.decoder.message_start))
+        except OSError as e:
+            logger.debug('Failed to send %s message: %s', message.command.decode(), e)
+            return False
+        return True
+
+    def handle(self, message):
+        msg_type = type(message)
+        if msg_type is msg_ping:
+            logger.debug('Got ping, sending pong.')
+            nVersion = self.protocol_version.nVersion if self.protocol_version else PROTO_VERSION
+            self.send(msg_pong(nVersion, message.nonce))
+            return
+        if msg_type is msg_version:
+            logger.debug('Saving version')
+            self.protocol_version = message
+
+        consumed = False
+        for waiter in list(self.waiters):
+            if waiter.offer(message):
+                consumed = True
+                if waiter.future.done():
+                    self.waiters.remove(waiter)
+                break
+
+        for callback in self.subscribers.get(msg_type, ()):
+            consumed = True
+            self.call_soon(callback, message)
+
+        if not consumed:
+            # keeping messages that arrived before anyone asked for them
+            self.backlog.append(message)
+
+    def close(self):
+        self.closed = True
+        for waiter in self.waiters:
+            if not waiter.future.done():
+                waiter.future.set_result(None)
+        self.waiters = []
+
+
+class MessageDispatcher(object):
+    '''
+    Reading messages from many P2P connections in one thread with the `selectors` module.
+
+    Callers wait for specific message types with futures (or callbacks), `ping` messages are answered
+    right away and messages that nobody waits for are kept in a small backlog, so they can be picked up
+    by the next waiter.
+
+    Subscribers and `expect` callbacks don't run in the reading thread, they are called one by one
+    (in the order of messages) in a separate callback thread. A slow callback delays other callbacks,
+    but reading from the connections goes on. Callbacks can still be called shortly after unsubscribing.
+
+    Example:
+        >>> from bitcoin.messages import msg_getdata
+        >>> from clove.network.bitcoin.dispatcher import message_dispatcher
+        >>> channel = message_dispatcher.register(connection, MessageDecoder(network.message_start))
+        >>> future = message_dispatcher.expect(channel, [msg_getdata])
+        >>> future.result(timeout=20)
+        [msg_getdata(inv=[CInv(type=TX hash=...)])]
+    '''
+
+    def __init__(self, buf_size: int=8192):
+        self.buf_size = buf_size
+        self.selector = selectors.DefaultSelector()
+        self.lock = threading.RLock()
+        self.thread = None
+        self.wakeup_reader, self.wakeup_writer = socket.socketpair()
+        self.wakeup_reader.setblocking(False)
+        self.wakeup_writer.setblocking(False)
+        self.selector.register(self.wakeup_reader, selectors.EVENT_READ)
+        self.callback_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='clove-message-callbacks')
+
+    def call_soon(self, callback: Callable, *args):
+        '''Scheduling the callback in the callback thread (outside of the dispatcher lock).'''
+        self.callback_executor.submit(run_callback, callback, *args)
+
+    def wait_for_callbacks(self, timeout: Optional[float]=None):
+        '''Waiting until callbacks scheduled so far are finished.'''
+        self.callback_executor.submit(lambda: None).result(timeout)
+
+    def register(self, connection: socket.socket, decoder: MessageDecoder, protocol_version=None) -> Channel:
+        channel = Channel(connection, decoder, protocol_version, call_soon=self.call_soon)
+        with self.lock:
+            self.drop_closed_connections()
+            try:
+                self.selector.register(connection, selectors.EVENT_READ, channel)
+            except (ValueError, KeyError, OSError) as e:
+                logger.debug('Unable to watch connection: %s', e)
+                channel.close()
+                return channel
+            self.start()
+        self.wakeup()
+        return channel
+
+    def drop_closed_connections(self):
+        '''Forgetting connections closed without unregistering, so their descriptors can be registered again.'''
+        for key in list(self.selector.get_map().values()):
+            if key.data is not None and key.fileobj.fileno() == -1:
+                logger.debug('Dropping connection closed before it was unregistered')
+                self.unregister(key.data)
+
+    def unregister(self, channel: Channel):
+        with self.lock:
+            try:
+                self.selector.unregister(channel.connection)
+            except (ValueError, KeyError, OSError):
+                pass
+            channel.close()
+        self.wakeup()
+
+    def expect(self, channel: Channel, message_types: list, callback: Optional[Callable]=None) -> Future:
+        '''
+        Waiting for messages of all given types, `callback` is called with the messages in the callback thread.
+
+        Returns:
+            Future: resolved with the list of messages or `None` if the connection was closed
+        '''
+        waiter = MessageWaiter(message_types)
+        with self.lock:
+            for message in list(channel.backlog):
+                if waiter.offer(message):
+                    channel.backlog.remove(message)
+                if waiter.future.done():
+                    break
+            if not waiter.future.done():
+                if channel.closed:
+                    waiter.future.set_result(None)
+                else:
+                    channel.waiters.append(waiter)
+        if callback:
+            waiter.future.add_done_callback(
+                lambda future: None if future.cancelled() else self.call_soon(callback, future.result())
+            )
+        return waiter.future
+
+    def cancel(self, channel: Channel, future: Future):
+        with self.lock:
+            channel.waiters = [waiter for waiter in channel.waiters if waiter.future is not future]
+        future.cancel()
+
+    def subscribe(self, channel: Channel, message_type, callback: Callable):
+        '''Calling `callback` for every message of the given type.'''
+        with self.lock:
+            channel.subscribers[message_type].append(callback)
+
+    def unsubscribe(self, channel: Channel, message_type, callback: Callable):
+        with self.lock:
+            try:
+                channel.subscribers[message_type].remove(callback)
+            except ValueError:
+                pass
+
+    def wakeup(self):
+        try:
+            self.wakeup_writer.send(b'\0')
+        except OSError:
+            pass
+
+    def start(self):
+        if self.thread is not None:
+            return
+        self.thread = threading.Thread(target=self.run, name='clove-message-dispatcher', daemon=True)
+        self.thread.start()
+
+    def run(self):
+        while True:
+            events = self.selector.select(timeout=1)
+            with self.lock:
+                for key, _ in events:
+                    if key.fileobj is self.wakeup_reader:
+                        self.drain_wakeup()
+                    elif key.data is not None:
+                        self.read(key.data)
+                if len(self.selector.get_map()) <= 1:
+                    # only wakeup socket left, thread will be started again by the next registration
+                    self.thread = None
+                    return
+
+    def drain_wakeup(self):
+        try:
+            while self.wakeup_reader.recv(1024):
+                pass
+        except OSError:
+            pass
+
+    def read(self, channel: Channel):
+        try:
+            data = channel.connection.recv(self.buf_size)
+        except (BlockingIOError, socket.timeout):
+            return
+        except OSError:
+            data = b''
+
+        if not data:
+            logger.debug('Connection closed by the node')
+            self.unregister(channel)
+            return
+
+        channel.decoder.feed(data)
+        while channel.decoder.messages:
+            channel.handle(channel.decoder.messages.popleft())
+
+
+message_dispatcher = MessageDispatcher()
+'''Dispatcher shared by all Bitcoin-based network instances.'''
@@ -0,0 +1,180 @@
+from io import BytesIO
+from typing import Iterable
+
+from bitcoin.core import CBlock, script
+from bitcoin.core.serialize import VarIntSerializer
+
+# BIP158 basic filter parameters
+FILTER_P = 19
+FILTER_M = 784931
+
+MASK_64 = 0xffffffffffffffff
+
+
+def _rotl(value: int, bits: int) -> int:
+    return ((value << bits) | (value >> (64 - bits))) & MASK_64
+
+
+def _sipround(v0: int, v1: int, v2: int, v3: int) -> tuple:
+    v0 = (v0 + v1) & MASK_64
+    v1 = _rotl(v1, 13) ^ v0
+    v0 = _rotl(v0, 32)
+    v2 = (v2 + v3) & MASK_64
+    v3 = _rotl(v3, 16) ^ v2
+    v0 = (v0 + v3) & MASK_64
+    v3 = _rotl(v3, 21) ^ v0
+    v2 = (v2 + v1) & MASK_64
+    v1 = _rotl(v1, 17) ^ v2
+    v2 = _rotl(v2, 32)
+    return v0, v1, v2, v3
+
+
+def siphash(k0: int, k1: int, data: bytes) -> int:
+    '''SipHash-2-4 with 128-bit key given as two 64-bit integers.'''
+    v0 = k0 ^ 0x736f6d6570736575
+    v1 = k1 ^ 0x646f72616e646f6d
+    v2 = k0 ^ 0x6c7967656e657261
+    v3 = k1 ^ 0x7465646279746573
+
+    tail_length = len(data) % 8
+    for offset in range(0, len(data) - tail_length, 8):
+        m = int.from_bytes(data[offset:offset + 8], 'little')
+        v3 ^= m
+        v0, v1, v2, v3 = _sipround(v0, v1, v2, v3)
+        v0, v1, v2, v3 = _sipround(v0, v1, v2, v3)
+        v0 ^= m
+
+    m = ((len(data) & 0xff) << 56) | int.from_bytes(data[len(data) - tail_length:], 'little')
+    v3 ^= m
+    v0, v1, v2, v3 = _sipround(v0, v1, v2, v3)
+    v0, v1, v2, v3 = _sipround(v0, v1, v2, v3)
+    v0 ^= m
+
+    v2 ^= 0xff
+    for _ in range(4):
+        v0, v1, v2, v3 = _sipround(v0, v1, v2, v3)
+    return v0 ^ v1 ^ v2 ^ v3
+
+
+class BitWriter(object):
+
+    def __init__(self):
+        self.value = 0
+        self.length = 0
+
+    def write(self, value: int, bits: int):
+        self.value = (self.value << bits) | value
+        self.length += bits
+
+    def write_unary(self, quotient: int):
+        self.write((1 << (quotient + 1)) - 2, quotient + 1)
+
+    def to_bytes(self) -> bytes:
+        padding = -self.length % 8
+        return (self.value << padding).to_bytes((self.length + padding) // 8, 'big')
+
+
+class BitReader(object):
+
+    def __init__(self, data: bytes):
+        self.value = int.from_bytes(data, 'big')
+        self.remaining = len(data) * 8
+
+    def read(self, bits: int) -> int:
+        if bits > self.remaining:
+            raise ValueError('Filter is truncated.')
+        self.remaining -= bits
+        return (self.value >> self.remaining) & ((1 << bits) - 1)
+
+    def read_unary(self) -> int:
+        quotient = 0
+        while self.read(1):
+            quotient += 1
+        return quotient
+
+
+class BlockFilter(object):
+    '''
+    BIP158 Golomb-coded set of the scripts used in a block.
+
+    Example:
+        >>> from clove.network.bitcoin.filters import BlockFilter
+        >>> block_filter = BlockFilter(block_hash, filter_bytes)
+        >>> block_filter.match_any([wallet_script_pubkey, contract_script_pubkey])
+        True
+    '''
+
+    def __init__(self, block_hash: bytes, filter_bytes: bytes, p: int=FILTER_P, m: int=FILTER_M):
+        self.block_hash = block_hash
+        self.filter_bytes = filter_bytes
+        self.p = p
+        self.m = m
+        stream = BytesIO(filter_bytes)
+        self.n = VarIntSerializer.stream_deserialize(stream)
+        self.encoded = stream.read()
+        self.k0 = int.from_bytes(block_hash[0:8], 'little')
+        self.k1 = int.from_bytes(block_hash[8:16], 'little')
+
+    @property
+    def f(self) -> int:
+        return self.n * self.m
+
+    def hash_item(self, item: bytes) -> int:
+        return (siphash(self.k0, self.k1, item) * self.f) >> 64
+
+    def decode(self) -> Iterable[int]:
+        reader = BitReader(self.encoded)
+        value = 0
+        for _ in range(self.n):
+            delta = (reader.read_unary() << self.p) | reader.read(self.p)
+            value += delta
+            yield value
+
+    def match_any(self, items: Iterable[bytes]) -> bool:
+        if not self.n:
+            return False
+        targets = sorted({self.hash_item(bytes(item)) for item in items})
+        if not targets:
+            return False
+        index = 0
+        for value in self.decode():
+            while targets[index] < value:
+                index += 1
+                if index == len(targets):
+                    return False
+            if targets[index] == value:
+                return True
+        return False
+
+    @classmethod
+    def build(cls, block_hash: bytes, items: Iterable[bytes], p: int=FILTER_P, m: int=FILTER_M) -> 'BlockFilter':
+        '''Building filter from raw items (e.g. for tests or local nodes simulation).'''
+        items = {bytes(item) for item in items}
+        k0 = int.from_bytes(block_hash[0:8], 'little')
+        k1 = int.from_bytes(block_hash[8:16], 'little')
+        f = len(items) * m
+        values = sorted((siphash(k0, k1, item) * f) >> 64 for item in items)
+
+        writer = BitWriter()
+        previous = 0
+        for value in values:
+            delta = value - previous
+            writer.write_unary(delta >> p)
+            writer.write(delta & ((1 << p) - 1), p)
+            previous = value
+
+        stream = BytesIO()
+        VarIntSerializer.stream_serialize(len(values), stream)
+        return cls(block_hash, stream.getvalue() + writer.to_bytes(), p, m)
+
+
+def basic_filter_items(block: CBlock, spent_scripts: Iterable[bytes]=()) -> set:
+    '''Items of the BIP158 basic filter: output scripts (without OP_RETURN) and scripts of spent outputs.'''
+    items = set()
+    for tx in block.vtx:
+        for tx_out in tx.vout:
+            output_script = bytes(tx_out.scriptPubKey)
+            if output_script and output_script[0] != script.OP_RETURN:
+                items.add(output_script)
+    items.update(bytes(spent_script) for spent_script in spent_scripts if spent_script)
+    return items
@@ -0,0 +1,404 @@
+from concurrent.futures import TimeoutError as FutureTimeoutError
+import mmap
+import os
+import struct
+import threading
+from time import time
+from typing import Optional
+
+from bitcoin.core import CBlockHeader, b2lx, lx
+from bitcoin.core.serialize import Hash
+from bitcoin.messages import MSG_BLOCK, msg_getheaders, msg_inv
+
+from clove.constants import HEADER_CHAIN_MAX_AGE, HEADERS_SYNC_TIMEOUT
+from clove.network.bitcoin.dispatcher import message_dispatcher
+from clove.network.bitcoin.messages import msg_headers
+from clove.utils.logging import logger
+
+HEADER_SIZE = 80
+
+# nodes never send more headers in a single message
+MAX_HEADERS_RESULTS = 2000
+
+
+def bits_to_target(bits: int) -> int:
+    '''Decoding the compact representation of the proof-of-work target.'''
+    exponent = bits >> 24
+    mantissa = bits & 0x7fffff
+    if exponent <= 3:
+        return mantissa >> (8 * (3 - exponent))
+    return mantissa << (8 * (exponent - 3))
+
+
+def target_to_bits(target: int) -> int:
+    size = (target.bit_length() + 7) // 8
+    if size <= 3:
+        compact = target << (8 * (3 - size))
+    else:
+        compact = target >> (8 * (size - 3))
+    if compact & 0x800000:
+        compact >>= 8
+        size += 1
+    return compact | (size << 24)
+
+
+def header_work(bits: int) -> int:
+    return 2 ** 256 // (bits_to_target(bits) + 1)
+
+
+class HeaderStore(object):
+    '''
+    Raw block headers kept in a memory-mapped file.
+
+    Header of the block at given height is stored at a fixed offset, so reading it is a single slice
+    of the mapped memory. Index of block hashes is built when the store is opened. Without `path`
+    headers are kept in anonymous memory.
+    '''
+
+    prefix = struct.Struct('<4sII32s')
+    magic = b'CLVH'
+
+    def __init__(self, start_height: int, start_hash: bytes, path: Optional[str]=None, capacity: int=4096):
+        self.path = path
+        self.lock = threading.RLock()
+        self.file = None
+        self.memory = None
+        self.start_height = start_height
+        self.start_hash = start_hash
+        self.count = 0
+        self.hashes = []
+        self.heights = {start_hash: start_height}
+
+        if path and os.path.exists(path) and os.path.getsize(path) >= self.prefix.size:
+            self.file = open(path, 'r+b')
+            self.memory = mmap.mmap(self.file.fileno(), 0)
+            magic, stored_height, count, stored_hash = self.prefix.unpack_from(self.memory)
+            if magic == self.magic and (stored_height, stored_hash) == (start_height, start_hash):
+                self.count = count
+                self.load_index()
+                return
+            logger.warning('Headers file %s was created for a different checkpoint, starting over.', path)
+            self.close()
+
+        self.allocate(capacity)
+        self.write_prefix()
+
+    def allocate(self, capacity: int):
+        size = self.prefix.size + capacity * HEADER_SIZE
+        if self.path:
+            if self.file is None:
+                self.file = open(self.path, 'w+b')
+            if self.memory is not None:
+                self.memory.close()
+            self.file.truncate(size)
+            self.memory = mmap.mmap(self.file.fileno(), size)
+            return
+        memory = mmap.mmap(-1, size)
+        if self.memory is not None:
+            used = self.prefix.size + self.count * HEADER_SIZE
+            memory[:used] = self.memory[:used]
+            self.memory.close()
+        self.memory = memory
+
+    @property
+    def capacity(self) -> int:
+        return (len(self.memory) - self.prefix.size) // HEADER_SIZE
+
+    def write_prefix(self):
+        self.prefix.pack_into(self.memory, 0, self.magic, self.start_height, self.count, self.start_hash)
+
+    def load_index(self):
+        for position in range(self.count):
+            block_hash = Hash(self.read(position))
+            self.hashes.append(block_hash)
+            self.heights[block_hash] = self.start_height + position + 1
+
+    def read(self, position: int) -> bytes:
+        offset = self.prefix.size + position * HEADER_SIZE
+        return self.memory[offset:offset + HEADER_SIZE]
+
+    @property
+    def tip_height(self) -> int:
+        return self.start_height + self.count
+
+    @property
+    def tip_hash(self) -> bytes:
+        return self.hashes[-1] if self.hashes else self.start_hash
+
+    def get_height(self, block_hash: bytes) -> Optional[int]:
+        return self.heights.get(block_hash)
+
+    def get_hash(self, height: int) -> Optional[bytes]:
+        if height == self.start_height:
+            return self.start_hash
+        if self.start_height < height <= self.tip_height:
+            return self.hashes[height - self.start_height - 1]
+
+    def get_header(self, height: int) -> Optional[CBlockHeader]:
+        '''Returns header of the block at given height (the checkpoint block itself is not stored).'''
+        if self.start_height < height <= self.tip_height:
+            with self.lock:
+                return CBlockHeader.deserialize(self.read(height - self.start_height - 1))
+
+    def append(self, header: CBlockHeader):
+        with self.lock:
+            if self.count == self.capacity:
+                self.allocate(self.capacity * 2)
+            offset = self.prefix.size + self.count * HEADER_SIZE
+            self.memory[offset:offset + HEADER_SIZE] = header.serialize()
+            block_hash = header.GetHash()
+            self.count += 1
+            self.hashes.append(block_hash)
+            self.heights[block_hash] = self.tip_height
+            self.write_prefix()
+
+    def truncate(self, height: int):
+        '''Forgetting all headers above given height.'''
+        with self.lock:
+            while self.tip_height > max(height, self.start_height):
+                del self.heights[self.hashes.pop()]
+                self.count -= 1
+            self.write_prefix()
+
+    def flush(self):
+        if self.memory is not None and self.path:
+            self.memory.flush()
+
+    def close(self):
+        with self.lock:
+            if self.memory is not None:
+                self.flush()
+                self.memory.close()
+                self.memory = None
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+
+class HeaderChain(object):
+    '''
+    Headers-only view of the network best chain, used for local confirmation counting.
+
+    Headers are verified to connect to each other and, for networks with the `pow_limit` set, to carry
+    enough proof-of-work (including difficulty adjustments). When attached to a connection, the chain
+    follows `headers` announcements and asks for headers of announced blocks, so the tip stays current.
+    The chain is attached to the connection it was synced with. It's stale when it was not synced
+    and got no headers for a while, then its tip may be behind the network.
+
+    Example:
+        >>> from clove.network import Bitcoin
+        >>> chain = Bitcoin.get_header_chain()
+        >>> chain.sync()
+        530461
+        >>> chain.get_confirmations('0000000000000000003c8b3bd3b23b54b6b45b2b5eeb0e4b3f2e49a2e8bcc8a3')
+        12
+    '''
+
+    def __init__(self, network, checkpoint: Optional[tuple]=None, path: Optional[str]=None,
+                 verify_pow: Optional[bool]=None, timeout: int=HEADERS_SYNC_TIMEOUT):
+        self.network = type(network)()
+        if checkpoint is None:
+            if not network.genesis_hash:
+                raise ValueError(f'{network.name} has no genesis hash, header chain needs a checkpoint.')
+            checkpoint = (0, network.genesis_hash)
+        start_height, start_hash = checkpoint
+        self.store = HeaderStore(start_height, lx(start_hash), path)
+        self.verify_pow = network.pow_limit is not None if verify_pow is None else verify_pow
+        self.timeout = timeout
+        self.lock = threading.RLock()
+        self.handlers = {}
+        self.synced_at = None
+
+    @property
+    def start_height(self) -> int:
+        return self.store.start_height
+
+    @property
+    def tip_height(self) -> int:
+        return self.store.tip_height
+
+    @property
+    def tip_hash(self) -> str:
+        return b2lx(self.store.tip_hash)
+
+    def is_stale(self, max_age: float=HEADER_CHAIN_MAX_AGE) -> bool:
+        '''Whether the chain was not synced and got no headers in the last `max_age` seconds.'''
+        return self.synced_at is None or time() - self.synced_at > max_age
+
+    def get_block_hash(self, height: int) -> Optional[bytes]:
+        return self.store.get_hash(height)
+
+    def get_height(self, block_hash: str) -> Optional[int]:
+        return self.store.get_height(lx(block_hash))
+
+    def get_confirmations(self, block_hash: str) -> Optional[int]:
+        '''Returns number of confirmations of the block or None if the block is not in the best chain.'''
+        height = self.get_height(block_hash)
+        if height is not None:
+            return self.tip_height - height + 1
+
+    def locator(self) -> list:
+        '''Block locator with hashes getting exponentially sparser towards the checkpoint.'''
+        hashes = []
+        step = 1
+        height = self.tip_height
+        while height > self.start_height:
+            hashes.append(self.store.get_hash(height))
+            if len(hashes) >= 10:
+                step *= 2
+            height -= step
+        hashes.append(self.store.start_hash)
+        return hashes
+
+    def check_proof_of_work(self, header: CBlockHeader, height: int):
+        target = bits_to_target(header.nBits)
+        if target <= 0 or target > self.network.pow_limit:
+            raise ValueError(f'Header {b2lx(header.GetHash())} has invalid target.')
+        if int.from_bytes(header.GetHash(), 'little') > target:
+            raise ValueError(f'Header {b2lx(header.GetHash())} does not meet its proof-of-work target.')
+
+        if self.network.pow_allow_min_difficulty_blocks:
+            # testnets can drop the difficulty, so only the target itself can be checked
+            return
+        previous = self.store.get_header(height - 1)
+        if previous is None:
+            return
+        interval = self.network.pow_target_timespan // self.network.pow_target_spacing
+        if height % interval:
+            expected_bits = previous.nBits
+        else:
+            first = self.store.get_header(height - interval)
+            if first is None:
+                return
+            timespan = previous.nTime - first.nTime
+            timespan = max(self.network.pow_target_timespan // 4, min(timespan, self.network.pow_target_timespan * 4))
+            new_target = bits_to_target(previous.nBits) * timespan // self.network.pow_target_timespan
+            expected_bits = target_to_bits(min(new_target, self.network.pow_limit))
+        if header.nBits != expected_bits:
+            raise ValueError(f'Header {b2lx(header.GetHash())} has unexpected difficulty.')
+
+    def add_headers(self, headers: list) -> int:
+        '''
+        Connecting headers to the chain, switching to the new branch if it has more work.
+
+        Returns:
+            int: number of headers added to the best chain
+
+        Raises:
+            ValueError: if headers do not connect or fail the proof-of-work check
+        '''
+        with self.lock:
+            headers = [header for header in headers if self.store.get_height(header.GetHash()) is None]
+            if not headers:
+                return 0
+            fork_height = self.store.get_height(headers[0].hashPrevBlock)
+            if fork_height is None:
+                raise ValueError(f'Header {b2lx(headers[0].GetHash())} does not connect to the chain.')
+            for previous, header in zip(headers, headers[1:]):
+                if header.hashPrevBlock != previous.GetHash():
+                    raise ValueError(f'Header {b2lx(header.GetHash())} does not connect to the chain.')
+
+            replaced = [self.store.get_header(height) for height in range(fork_height + 1, self.tip_height + 1)]
+            if replaced:
+                if sum(map(header_work, (h.nBits for h in headers))) <= sum(header_work(h.nBits) for h in replaced):
+                    logger.debug('Ignoring %s headers of a branch with less work', len(headers))
+                    return 0
+                logger.info('Reorganization, %s blocks above height %s replaced', len(replaced), fork_height)
+                self.store.truncate(fork_height)
+
+            try:
+                for header in headers:
+                    if self.verify_pow:
+                        self.check_proof_of_work(header, self.tip_height + 1)
+                    self.store.append(header)
+            except ValueError:
+                # going back to the previous best chain
+                self.store.truncate(fork_height)
+                for header in replaced:
+                    self.store.append(header)
+                raise
+            finally:
+                self.store.flush()
+            return len(headers)
+
+    def request_headers(self, channel):
+        request = msg_getheaders()
+        request.locator.vHave = self.locator()
+        return channel.send(request)
+
+    def sync(self, network=None) -> Optional[int]:
+        '''
+        Downloading headers until the node has no more of them, then following the node's announcements.
+
+        Args:
+            network: network instance with the connection to use, by default chain keeps its own one
+
+        Returns:
+            int, None: height of the chain tip or `None` if sync failed
+        '''
+        network = network or self.network
+        if network.connect() is None:
+            logger.warning('Could not connect to any node to sync headers.')
+            return
+        channel = network.get_channel()
+        while True:
+            future = message_dispatcher.expect(channel, [msg_headers])
+            if not self.request_headers(channel):
+                message_dispatcher.cancel(channel, future)
+                return
+            try:
+                messages = future.result(self.timeout)
+            except FutureTimeoutError:
+                message_dispatcher.cancel(channel, future)
+                messages = None
+            if not messages:
+                logger.warning('Node did not send headers.')
+                return
+            try:
+                self.add_headers(messages[0].headers)
+            except ValueError as e:
+                logger.warning('Invalid headers: %s', e)
+                network.terminate()
+                return
+            if len(messages[0].headers) < MAX_HEADERS_RESULTS:
+                self.synced_at = time()
+                self.attach(channel)
+                return self.tip_height
+
+    def attach(self, channel):
+        '''Following new blocks announced on the connection.'''
+        with self.lock:
+            for closed_channel in [attached for attached in self.handlers if attached.closed]:
+                self.detach(closed_channel)
+            if channel in self.handlers:
+                return
+
+            def handle_headers(message):
+                try:
+                    self.add_headers(message.headers)
+                except ValueError:
+                    # announced header does not connect to our tip, asking for the missing ones
+                    self.request_headers(channel)
+                    return
+                self.synced_at = time()
+
+            def handle_inv(message):
+                if any(inventory.type == MSG_BLOCK for inventory in message.inv):
+                    self.request_headers(channel)
+
+            self.handlers[channel] = (handle_headers, handle_inv)
+            message_dispatcher.subscribe(channel, msg_headers, handle_headers)
+            message_dispatcher.subscribe(channel, msg_inv, handle_inv)
+
+    def detach(self, channel):
+        with self.lock:
+            if channel not in self.handlers:
+                return
+            handle_headers, handle_inv = self.handlers.pop(channel)
+            message_dispatcher.unsubscribe(channel, msg_headers, handle_headers)
+            message_dispatcher.unsubscribe(channel, msg_inv, handle_inv)
+
+    def close(self):
+        for channel in list(self.handlers):
+            self.detach(channel)
+        self.store.close()
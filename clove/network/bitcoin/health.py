@@ -0,0 +1,126 @@
+import asyncio
+import json
+from time import time
+from typing import Iterable
+
+from clove.constants import HEALTH_CHECK_CONCURRENCY, HEALTH_CHECK_CONNECT_TIMEOUT, HEALTH_CHECK_HANDSHAKE_TIMEOUT
+from clove.network.bitcoin.p2p import AsyncNodeConnection, run_sync
+from clove.utils.dns import seed_resolver
+from clove.utils.logging import logger
+
+
+class HealthChecker(object):
+    '''
+    Checking seeds and nodes of many networks concurrently.
+
+    All seeds are resolved at once, then every node is probed with a TCP connection (and optionally
+    with the version/verack handshake) with at most `concurrency` probes in flight. Report is a plain
+    dictionary that can be saved as JSON and imported to the peer store with `PeerStore.import_report`.
+
+    Example:
+        >>> from clove.network import Bitcoin, Litecoin
+        >>> from clove.network.bitcoin.health import HealthChecker
+        >>> report = HealthChecker([Bitcoin, Litecoin], handshake=True).run()
+        >>> report['networks']['litecoin']['alive']
+        21
+        >>> report['networks']['litecoin']['nodes'][0]
+        {'node': '5.9.2.145', 'reachable': True, 'connect_latency': 0.041, 'handshake_latency': 0.093,
+         'user_agent': '/LitecoinCore:0.16.3/', 'start_height': 1536234, 'services': 1037, 'error': None}
+    '''
+
+    def __init__(self, networks: Iterable, handshake: bool=False,
+                 connect_timeout: float=HEALTH_CHECK_CONNECT_TIMEOUT,
+                 handshake_timeout: float=HEALTH_CHECK_HANDSHAKE_TIMEOUT,
+                 concurrency: int=HEALTH_CHECK_CONCURRENCY):
+        self.networks = [network for network in networks if getattr(network, 'bitcoin_based', False)]
+        self.handshake = handshake
+        self.connect_timeout = connect_timeout
+        self.handshake_timeout = handshake_timeout
+        self.concurrency = concurrency
+        self.semaphore = None
+
+    def resolve_seeds(self) -> dict:
+        seeds = {seed for network in self.networks if not network.nodes for seed in network.seeds}
+        return seed_resolver.resolve_many(seeds) if seeds else {}
+
+    async def check_node(self, network, node: str) -> dict:
+        result = {
+            'node': node,
+            'reachable': False,
+            'connect_latency': None,
+            'handshake_latency': None,
+            'user_agent': None,
+            'start_height': None,
+            'services': None,
+            'error': None,
+        }
+        async with self.semaphore:
+            connection = AsyncNodeConnection(network(), node)
+            started = time()
+            try:
+                if not await connection.connect(self.connect_timeout):
+                    result['error'] = 'connection failed'
+                    return result
+                result['reachable'] = True
+                result['connect_latency'] = round(time() - started, 4)
+                if not self.handshake:
+                    return result
+
+                started = time()
+                if not await connection.handshake(self.handshake_timeout, record=False):
+                    result['error'] = 'handshake failed'
+                    return result
+                result['handshake_latency'] = round(time() - started, 4)
+                version = connection.protocol_version
+                result['user_agent'] = version.strSubVer.decode(errors='replace')
+                result['start_height'] = version.nStartingHeight
+                result['services'] = version.nServices
+                return result
+            finally:
+                connection.close()
+
+    async def check_network(self, network, seed_nodes: dict) -> dict:
+        if network.nodes:
+            seeds = {}
+            nodes = list(network.nodes)
+        else:
+            seeds = {seed: seed_nodes.get(seed, []) for seed in network.seeds}
+            nodes = []
+            for seed_result in seeds.values():
+                nodes.extend(node for node in seed_result if node not in nodes)
+
+        results = await asyncio.gather(*(self.check_node(network, node) for node in nodes))
+        alive = [result for result in results if result['reachable'] and not result['error']]
+        logger.debug('[%s] %s of %s nodes alive', network.name, len(alive), len(results))
+        return {
+            'port': network.port,
+            'seeds': seeds,
+            'nodes': sorted(results, key=lambda result: (not result['reachable'], self.latency(result))),
+            'alive': len(alive),
+        }
+
+    def latency(self, result: dict) -> float:
+        latency = result['handshake_latency'] if self.handshake else result['connect_latency']
+        return latency if latency is not None else float('inf')
+
+    async def arun(self) -> dict:
+        '''Asynchronous version of the `run` method.'''
+        self.semaphore = asyncio.Semaphore(self.concurrency)
+        started = time()
+        seed_nodes = await asyncio.get_event_loop().run_in_executor(None, self.resolve_seeds)
+        reports = await asyncio.gather(*(self.check_network(network, seed_nodes) for network in self.networks))
+        return {
+            'generated_at': round(time()),
+            'duration': round(time() - started, 3),
+            'handshake': self.handshake,
+            'networks': {network.name: report for network, report in zip(self.networks, reports)},
+        }
+
+    def run(self) -> dict:
+        return run_sync(self.arun())
+
+
+def save_report(report: dict, path: str):
+    '''Saving the health checker report as JSON (it can be loaded with `PeerStore.import_report`).'''
+    with open(path, 'w') as report_file:
+        json.dump(report, report_file, indent=2, sort_keys=True)
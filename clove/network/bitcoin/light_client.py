@@ -0,0 +1,409 @@
+import os
+import sqlite3
+import threading
+from time import time
+from typing import Iterable, Iterator, Optional
+
+from bitcoin.core import b2lx, b2x, lx, x
+from bitcoin.messages import MSG_BLOCK, msg_block, msg_getdata
+from bitcoin.net import CInv
+
+from clove.constants import (
+    HEADER_CHAIN_CHECKPOINTS,
+    LIGHT_CLIENT_CONNECT_ATTEMPTS,
+    LIGHT_CLIENT_FILTERS_BATCH,
+    LIGHT_CLIENT_SYNC_INTERVAL,
+    LIGHT_CLIENT_TIMEOUT,
+)
+from clove.network.bitcoin.dispatcher import message_dispatcher
+from clove.network.bitcoin.filters import BlockFilter
+from clove.network.bitcoin.headers import HeaderChain
+from clove.network.bitcoin.messages import BASIC_FILTER_TYPE, NODE_COMPACT_FILTERS, msg_cfilter, msg_getcfilters
+from clove.utils.bitcoin import address_to_script_pubkey, from_base_units
+from clove.utils.logging import logger
+from clove.utxo import Utxo
+
+
+class UtxoIndex(object):
+    '''
+    Local index of the outputs paying to the watched scripts, kept in the SQLite database.
+
+    By default the database lives in memory, set the `CLOVE_LIGHT_CLIENT_DB` environment variable
+    to a file path to keep the index between runs.
+    '''
+
+    def __init__(self, path: str=':memory:'):
+        self.path = path
+        self.lock = threading.RLock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.executescript('''
+            CREATE TABLE IF NOT EXISTS scripts (
+                network TEXT NOT NULL,
+                script TEXT NOT NULL,
+                birth_height INTEGER NOT NULL,
+                scanned_height INTEGER NOT NULL,
+                PRIMARY KEY (network, script)
+            );
+            CREATE TABLE IF NOT EXISTS utxos (
+                network TEXT NOT NULL,
+                tx_id TEXT NOT NULL,
+                vout INTEGER NOT NULL,
+                value INTEGER NOT NULL,
+                script TEXT NOT NULL,
+                height INTEGER NOT NULL,
+                PRIMARY KEY (network, tx_id, vout)
+            );
+            CREATE TABLE IF NOT EXISTS sync (
+                network TEXT NOT NULL PRIMARY KEY,
+                height INTEGER NOT NULL,
+                block_hash TEXT NOT NULL
+            );
+        ''')
+        self.connection.commit()
+
+    def execute(self, query: str, params: tuple=()) -> list:
+        with self.lock:
+            rows = self.connection.execute(query, params).fetchall()
+            self.connection.commit()
+            return rows
+
+    def add_script(self, network: str, script_pubkey: bytes, birth_height: int) -> bool:
+        '''Returns True if the script was not watched before, outputs are looked for since `birth_height`.'''
+        with self.lock:
+            cursor = self.connection.execute(
+                'INSERT OR IGNORE INTO scripts (network, script, birth_height, scanned_height) VALUES (?, ?, ?, ?)',
+                (network, b2x(script_pubkey), birth_height, birth_height - 1),
+            )
+            self.connection.commit()
+            return cursor.rowcount > 0
+
+    def get_scripts(self, network: str) -> dict:
+        '''Returns watched scripts with the height of the last block scanned for them.'''
+        return {
+            x(script): scanned_height for script, scanned_height
+            in self.execute('SELECT script, scanned_height FROM scripts WHERE network = ?', (network, ))
+        }
+
+    def set_scanned_height(self, network: str, height: int):
+        '''Marking blocks up to the height as scanned for all scripts that were scanned only below it.'''
+        self.execute(
+            'UPDATE scripts SET scanned_height = ? WHERE network = ? AND scanned_height < ?', (height, network, height)
+        )
+
+    def add_utxo(self, network: str, tx_id: str, vout: int, value: int, script_pubkey: bytes, height: int):
+        self.execute(
+            'INSERT OR REPLACE INTO utxos (network, tx_id, vout, value, script, height) VALUES (?, ?, ?, ?, ?, ?)',
+            (network, tx_id, vout, value, b2x(script_pubkey), height),
+        )
+
+    def spend(self, network: str, tx_id: str, vout: int):
+        self.execute('DELETE FROM utxos WHERE network = ? AND tx_id = ? AND vout = ?', (network, tx_id, vout))
+
+    def is_unspent(self, network: str, tx_id: str, vout: int) -> bool:
+        return bool(self.execute(
+            'SELECT 1 FROM utxos WHERE network = ? AND tx_id = ? AND vout = ?', (network, tx_id, vout)
+        ))
+
+    def get_utxos(self, network: str, script_pubkey: bytes) -> list:
+        '''Returns (tx_id, vout, value, height) tuples sorted from the biggest value.'''
+        return self.execute(
+            'SELECT tx_id, vout, value, height FROM utxos WHERE network = ? AND script = ? ORDER BY value DESC',
+            (network, b2x(script_pubkey)),
+        )
+
+    def get_sync_state(self, network: str) -> Optional[tuple]:
+        rows = self.execute('SELECT height, block_hash FROM sync WHERE network = ?', (network, ))
+        return rows[0] if rows else None
+
+    def set_sync_state(self, network: str, height: int, block_hash: str):
+        self.execute(
+            'INSERT OR REPLACE INTO sync (network, height, block_hash) VALUES (?, ?, ?)', (network, height, block_hash)
+        )
+
+    def reset(self, network: str):
+        '''Forgetting outputs and sync state, so the next sync scans blocks since the birth heights of the scripts.'''
+        self.execute('DELETE FROM utxos WHERE network = ?', (network, ))
+        self.execute('DELETE FROM sync WHERE network = ?', (network, ))
+        self.execute('UPDATE scripts SET scanned_height = birth_height - 1 WHERE network = ?', (network, ))
+
+
+utxo_index = UtxoIndex(os.environ.get('CLOVE_LIGHT_CLIENT_DB', ':memory:'))
+'''UTXO index shared by all light clients.'''
+
+
+class CompactFilterClient(object):
+    '''
+    Light client discovering UTXO with BIP157/158 compact block filters.
+
+    Headers and filters are downloaded over P2P, filters are matched locally against the watched scripts
+    and only blocks with matches are downloaded, so the node never learns which addresses are ours.
+    Outputs paying to the watched scripts (and spending of them) are saved in the local `UtxoIndex`.
+
+    Headers are kept in the `HeaderChain` starting after a `checkpoint` (height, block hash), the network
+    checkpoint from `HEADER_CHAIN_CHECKPOINTS` or the network `genesis_hash`. Outputs created before
+    the checkpoint are not found. Filters sync continues from the last synchronized block next time,
+    scripts watched since the last sync are looked for in the already synchronized blocks first.
+
+    Example:
+        >>> from clove.network import BitcoinTestNet
+        >>> from clove.network.bitcoin.light_client import CompactFilterClient
+        >>> client = CompactFilterClient(BitcoinTestNet(), checkpoint=(1447000, '00000000000000b8...'))
+        >>> client.watch_address('mgRoeWs2CeCEuqQmNfhJjnpX8YvtPACmCX', birth_height=1447500)
+        >>> client.sync()
+        1447815
+        >>> client.get_balance('mgRoeWs2CeCEuqQmNfhJjnpX8YvtPACmCX')
+        0.78956946
+    '''
+
+    def __init__(self, network, checkpoint: Optional[tuple]=None, index: UtxoIndex=None,
+                 timeout: int=LIGHT_CLIENT_TIMEOUT, chain: Optional[HeaderChain]=None):
+        self.network = type(network)()
+        self.index = index or utxo_index
+        self.timeout = timeout
+        self.lock = threading.RLock()
+        self.chain = chain or HeaderChain(network, checkpoint or HEADER_CHAIN_CHECKPOINTS.get(network.name))
+        self.synced_at = None
+
+    @property
+    def name(self) -> str:
+        return self.network.name
+
+    @property
+    def start_height(self) -> int:
+        return self.chain.start_height
+
+    @property
+    def tip_height(self) -> int:
+        return self.chain.tip_height
+
+    def get_block_hash(self, height: int) -> bytes:
+        return self.chain.get_block_hash(height)
+
+    def watch_address(self, address: str, birth_height: Optional[int]=None) -> bool:
+        '''
+        Watching the address, returns True if it was not watched before.
+
+        Outputs of the address are looked for in blocks since `birth_height` (first block after
+        the checkpoint by default), blocks are scanned only for the new address on the next sync.
+        '''
+        return self.watch_script(address_to_script_pubkey(address, self.network.get_params()), birth_height)
+
+    def watch_script(self, script_pubkey: bytes, birth_height: Optional[int]=None) -> bool:
+        birth_height = max(birth_height or 0, self.start_height + 1)
+        return self.index.add_script(self.name, bytes(script_pubkey), birth_height)
+
+    def connect(self) -> bool:
+        '''Connecting to the node that serves compact filters.'''
+        for _ in range(LIGHT_CLIENT_CONNECT_ATTEMPTS):
+            node = self.network.connect()
+            if node is None:
+                return False
+            services = self.network.protocol_version.nServices if self.network.protocol_version else 0
+            if services & NODE_COMPACT_FILTERS:
+                return True
+            logger.debug('[%s] Node does not serve compact block filters', node)
+            self.network.terminate(node)
+        return False
+
+    def collect(self, message_type, count: int, send_message) -> list:
+        '''Sending the request and collecting `count` messages of the given type.'''
+        channel = self.network.get_channel()
+        messages = []
+        done = threading.Event()
+
+        def callback(message):
+            messages.append(message)
+            if len(messages) >= count:
+                done.set()
+
+        message_dispatcher.subscribe(channel, message_type, callback)
+        try:
+            if not self.network.send_message(send_message):
+                return []
+            done.wait(self.timeout)
+        finally:
+            message_dispatcher.unsubscribe(channel, message_type, callback)
+        return messages
+
+    def sync_headers(self) -> int:
+        '''Downloading headers until the node has no more of them, returns the tip height.'''
+        tip_height = self.chain.sync(self.network)
+        if tip_height is None:
+            raise ConnectionError('Headers sync failed.')
+        return tip_height
+
+    def get_filters(self, start_height: int, stop_height: int) -> list:
+        stop_hash = self.get_block_hash(stop_height)
+        request = msg_getcfilters(BASIC_FILTER_TYPE, start_height, stop_hash)
+        messages = self.collect(msg_cfilter, stop_height - start_height + 1, request)
+        by_hash = {message.block_hash: message for message in messages}
+        filters = []
+        for height in range(start_height, stop_height + 1):
+            message = by_hash.get(self.get_block_hash(height))
+            if message is None:
+                raise ConnectionError(f'Node did not send filter for block {height}.')
+            filters.append((height, BlockFilter(message.block_hash, message.filter_bytes)))
+        return filters
+
+    def get_block(self, block_hash: bytes):
+        inventory = CInv()
+        inventory.type = MSG_BLOCK
+        inventory.hash = block_hash
+        request = msg_getdata()
+        request.inv.append(inventory)
+        for message in self.collect(msg_block, 1, request):
+            if message.block.GetHash() == block_hash:
+                return message.block
+        raise ConnectionError(f'Node did not send block {b2lx(block_hash)}.')
+
+    def process_block(self, height: int, block, scripts: set):
+        for tx in block.vtx:
+            tx_id = b2lx(tx.GetHash())
+            for tx_in in tx.vin:
+                spent_tx_id = b2lx(tx_in.prevout.hash)
+                if self.index.is_unspent(self.name, spent_tx_id, tx_in.prevout.n):
+                    logger.debug('Output %s:%s spent in %s', spent_tx_id, tx_in.prevout.n, tx_id)
+                    self.index.spend(self.name, spent_tx_id, tx_in.prevout.n)
+            for vout, tx_out in enumerate(tx.vout):
+                if bytes(tx_out.scriptPubKey) in scripts:
+                    logger.debug('Found output %s:%s at height %s', tx_id, vout, height)
+                    self.index.add_utxo(self.name, tx_id, vout, tx_out.nValue, bytes(tx_out.scriptPubKey), height)
+
+    def scan(self, start_height: int, stop_height: int, scripts: set) -> Iterator[int]:
+        '''Looking for the scripts in blocks between the heights, yields the last height of every scanned batch.'''
+        height = start_height
+        while height <= stop_height:
+            batch_stop_height = min(height + LIGHT_CLIENT_FILTERS_BATCH - 1, stop_height)
+            for block_height, block_filter in self.get_filters(height, batch_stop_height):
+                if scripts and block_filter.match_any(scripts):
+                    self.process_block(block_height, self.get_block(block_filter.block_hash), scripts)
+            yield batch_stop_height
+            height = batch_stop_height + 1
+
+    def sync_filters(self):
+        state = self.index.get_sync_state(self.name)
+        if state and not (state[0] <= self.tip_height and self.get_block_hash(state[0]) == lx(state[1])):
+            # last synchronized block is not in the best chain anymore (reorg), outputs found in orphaned blocks
+            # and spends made by orphaned transactions have to be forgotten, so the index is rebuilt
+            logger.info('Block %s at height %s is not in the best chain, rescanning the scripts', *state[::-1])
+            self.index.reset(self.name)
+            state = None
+
+        scripts = self.index.get_scripts(self.name)
+        if state:
+            synced_height = state[0]
+        else:
+            # nothing was synchronized yet, scan starts at the earliest birth height of the scripts
+            synced_height = min(min(scripts.values(), default=self.tip_height), self.tip_height)
+
+        new_scripts = {script for script, scanned_height in scripts.items() if scanned_height < synced_height}
+        if new_scripts:
+            # scripts watched since the last sync are looked for (alone) in the already synchronized blocks
+            start_height = min(scripts[script] for script in new_scripts) + 1
+            logger.info('Scanning blocks %s-%s for %s new scripts', start_height, synced_height, len(new_scripts))
+            for stop_height in self.scan(start_height, synced_height, new_scripts):
+                self.index.set_scanned_height(self.name, stop_height)
+
+        for stop_height in self.scan(synced_height + 1, self.tip_height, set(scripts)):
+            self.index.set_sync_state(self.name, stop_height, b2lx(self.get_block_hash(stop_height)))
+            self.index.set_scanned_height(self.name, stop_height)
+
+        if self.index.get_sync_state(self.name) is None:
+            # nothing to scan yet
+            self.index.set_sync_state(self.name, synced_height, b2lx(self.get_block_hash(synced_height)))
+
+    def sync(self) -> Optional[int]:
+        '''
+        Synchronizing headers, filters and the local UTXO index.
+
+        Returns:
+            int, None: height of the last synchronized block or `None` if sync failed
+        '''
+        with self.lock:
+            if not self.connect():
+                logger.warning('Could not connect to any node serving compact block filters.')
+                return
+            try:
+                self.sync_headers()
+                self.sync_filters()
+            except (ConnectionError, ValueError) as e:
+                logger.warning('Light client sync failed: %s', e)
+                self.network.reset_connection()
+                return
+            self.synced_at = time()
+            return self.tip_height
+
+    def is_stale(self, max_age: float=LIGHT_CLIENT_SYNC_INTERVAL) -> bool:
+        '''Index needs a sync if it was reset, a new address is watched or it was synced more than `max_age` ago.'''
+        state = self.index.get_sync_state(self.name)
+        if self.synced_at is None or state is None:
+            return True
+        if any(scanned_height < state[0] for scanned_height in self.index.get_scripts(self.name).values()):
+            return True
+        return time() - self.synced_at > max_age
+
+    def close(self):
+        '''Closing the connection, the next sync will connect again.'''
+        with self.lock:
+            self.network.reset_connection()
+
+    def get_utxo(self, address: str, amount: float) -> Optional[list]:
+        '''Returns enough UTXO from the local index to cover the amount (same as block explorers do).'''
+        script_pubkey = address_to_script_pubkey(address, self.network.get_params())
+        utxo = []
+        total = 0
+        for tx_id, vout, value, _ in self.index.get_utxos(self.name, script_pubkey):
+            value = from_base_units(value)
+            utxo.append(Utxo(tx_id=tx_id, vout=vout, value=value, tx_script=b2x(script_pubkey)))
+            total += value
+            if total > amount:
+                return utxo
+        logger.debug('Cannot find enough UTXO\'s. Found %.8f from %.8f.', total, amount)
+
+    def get_balance(self, address: str) -> float:
+        script_pubkey = address_to_script_pubkey(address, self.network.get_params())
+        return from_base_units(sum(row[2] for row in self.index.get_utxos(self.name, script_pubkey)))
+
+
+class LightClientAPI(object):
+    '''
+    Mixin answering UTXO and balance queries from the local compact filters index instead of block explorers.
+
+    Queries sync the index only if it's stale (see `CompactFilterClient.is_stale`), so most of them
+    are answered from the local database. Call `get_light_client().sync()` to sync on demand.
+    If the stale index cannot be synced, queries are answered by the block explorer of the network.
+
+    Example:
+        >>> from clove.network import BitcoinTestNet
+        >>> from clove.network.bitcoin.light_client import LightClientAPI
+        >>> class LightBitcoinTestNet(LightClientAPI, BitcoinTestNet):
+        ...     pass
+        >>> LightBitcoinTestNet.get_utxo('mgRoeWs2CeCEuqQmNfhJjnpX8YvtPACmCX', 0.5)
+    '''
+
+    light_client_sync_interval = LIGHT_CLIENT_SYNC_INTERVAL
+
+    @classmethod
+    def light_client_query(cls, addresses: Iterable[str]) -> Optional[CompactFilterClient]:
+        '''Returns the light client with up-to-date index of the addresses or `None` if it could not be synced.'''
+        client = cls.get_light_client()
+        for address in addresses:
+            client.watch_address(address)
+        if client.is_stale(cls.light_client_sync_interval) and client.sync() is None:
+            logger.warning('Light client index is out of date, using the block explorer.')
+            return
+        return client
+
+    @classmethod
+    def get_utxo(cls, address: str, amount: float) -> Optional[list]:
+        client = cls.light_client_query([address])
+        if client is None:
+            return super().get_utxo(address, amount)
+        return client.get_utxo(address, amount)
+
+    @classmethod
+    def get_balance(cls, wallet_address: str) -> float:
+        client = cls.light_client_query([wallet_address])
+        if client is None:
+            return super().get_balance(wallet_address)
+        return client.get_balance(wallet_address)
@@ -0,0 +1,121 @@
+import struct
+
+from bitcoin.core import CBlockHeader, b2lx
+from bitcoin.core.serialize import BytesSerializer, VarIntSerializer, ser_read
+from bitcoin.messages import MsgSerializable
+from bitcoin.messages import msg_reject as bitcoin_msg_reject
+from bitcoin.net import PROTO_VERSION
+
+# BIP158 basic filter type
+BASIC_FILTER_TYPE = 0
+
+# service bit of nodes serving compact block filters (BIP157)
+NODE_COMPACT_FILTERS = 1 << 6
+
+
+class msg_headers(MsgSerializable):
+    '''Block headers, every header is followed by the (always zero) number of transactions.'''
+    command = b'headers'
+
+    def __init__(self, protover=PROTO_VERSION):
+        super(msg_headers, self).__init__(protover)
+        self.headers = []
+
+    @classmethod
+    def msg_deser(cls, f, protover=PROTO_VERSION):
+        c = cls()
+        for _ in range(VarIntSerializer.stream_deserialize(f)):
+            c.headers.append(CBlockHeader.stream_deserialize(f))
+            VarIntSerializer.stream_deserialize(f)
+        return c
+
+    def msg_ser(self, f):
+        VarIntSerializer.stream_serialize(len(self.headers), f)
+        for header in self.headers:
+            header.stream_serialize(f)
+            VarIntSerializer.stream_serialize(0, f)
+
+    def __repr__(self):
+        return f'msg_headers(headers={len(self.headers)})'
+
+
+class msg_getcfilters(MsgSerializable):
+    '''Request for compact filters of blocks from `start_height` to the block with `stop_hash`.'''
+    command = b'getcfilters'
+
+    def __init__(self, filter_type=BASIC_FILTER_TYPE, start_height=0, stop_hash=b'\x00' * 32, protover=PROTO_VERSION):
+        super(msg_getcfilters, self).__init__(protover)
+        self.filter_type = filter_type
+        self.start_height = start_height
+        self.stop_hash = stop_hash
+
+    @classmethod
+    def msg_deser(cls, f, protover=PROTO_VERSION):
+        filter_type, start_height = struct.unpack(b'<BI', ser_read(f, 5))
+        return cls(filter_type, start_height, ser_read(f, 32))
+
+    def msg_ser(self, f):
+        f.write(struct.pack(b'<BI', self.filter_type, self.start_height))
+        f.write(self.stop_hash)
+
+    def __repr__(self):
+        return f'msg_getcfilters(start_height={self.start_height} stop_hash={b2lx(self.stop_hash)})'
+
+
+class msg_cfilter(MsgSerializable):
+    '''Compact filter of a single block.'''
+    command = b'cfilter'
+
+    def __init__(self, filter_type=BASIC_FILTER_TYPE, block_hash=b'\x00' * 32, filter_bytes=b'',
+                 protover=PROTO_VERSION):
+        super(msg_cfilter, self).__init__(protover)
+        self.filter_type = filter_type
+        self.block_hash = block_hash
+        self.filter_bytes = filter_bytes
+
+    @classmethod
+    def msg_deser(cls, f, protover=PROTO_VERSION):
+        filter_type = struct.unpack(b'<B', ser_read(f, 1))[0]
+        block_hash = ser_read(f, 32)
+        return cls(filter_type, block_hash, BytesSerializer.stream_deserialize(f))
+
+    def msg_ser(self, f):
+        f.write(struct.pack(b'<B', self.filter_type))
+        f.write(self.block_hash)
+        BytesSerializer.stream_serialize(self.filter_bytes, f)
+
+    def __repr__(self):
+        return f'msg_cfilter(block_hash={b2lx(self.block_hash)} size={len(self.filter_bytes)})'
+
+
+class msg_reject(bitcoin_msg_reject):
+    '''Reject message keeping the hash of the rejected transaction or block (BIP61 extra data).'''
+
+    def __init__(self, protover=PROTO_VERSION):
+        super(msg_reject, self).__init__(protover)
+        self.data = b''
+
+    @classmethod
+    def msg_deser(cls, f, protover=PROTO_VERSION):
+        c = super(msg_reject, cls).msg_deser(f, protover)
+        c.data = f.read(32)
+        return c
+
+    def msg_ser(self, f):
+        super(msg_reject, self).msg_ser(f)
+        f.write(self.data)
+
+    @property
+    def rejected_hash(self):
+        '''Hash of the rejected transaction or block, `None` if the node did not send it.'''
+        if len(self.data) == 32:
+            return self.data
+
+    def __repr__(self):
+        return f'msg_reject(message={self.message} ccode={self.ccode} reason={self.reason} data={b2lx(self.data)})'
+
+
+extra_messagemap = {
+    message.command: message for message in (msg_headers, msg_getcfilters, msg_cfilter, msg_reject)
+}
+'''Messages that take precedence over the python-bitcoinlib `messagemap`.'''
@@ -0,0 +1,583 @@
+import asyncio
+from collections import OrderedDict, deque, namedtuple
+import hashlib
+from io import BytesIO
+import struct
+import threading
+from time import time
+from typing import Optional
+
+from bitcoin.core import CTransaction, b2lx
+from bitcoin.core.serialize import Hash, SerializationError, SerializationTruncationError
+from bitcoin.messages import (
+    MSG_TX,
+    messagemap,
+    msg_getdata,
+    msg_inv,
+    msg_ping,
+    msg_pong,
+    msg_tx,
+    msg_verack,
+    msg_version,
+)
+from bitcoin.net import PROTO_VERSION, CInv
+
+from clove.constants import FAN_OUT_PEERS, FAN_OUT_QUORUM, NODE_COMMUNICATION_TIMEOUT, REJECT_TIMEOUT
+from clove.exceptions import TransactionRejected, UnexpectedResponseFromNode
+from clove.network.bitcoin.messages import extra_messagemap, msg_reject
+from clove.network.bitcoin.peers import peer_store
+from clove.utils.logging import logger
+
+HEADER_SIZE = 4 + 12 + 4 + 4
+'''Size of the P2P message header (magic, command, payload length, checksum).'''
+MAX_PAYLOAD_SIZE = 0x02000000
+'''Maximum size of the P2P message payload accepted by nodes (32 MiB).'''
+
+
+def checksum(payload: bytes) -> bytes:
+    return hashlib.sha256(hashlib.sha256(payload).digest()).digest()[:4]
+
+
+def serialize_message(message, message_start: bytes) -> bytes:
+    '''
+    Serializes P2P message for the network with given message start (magic bytes).
+
+    Unlike `MsgSerializable.to_bytes()` this function does not depend on the global `bitcoin.params`,
+    so it is safe to use with many networks in one event loop.
+    '''
+    body = BytesIO()
+    message.msg_ser(body)
+    payload = body.getvalue()
+    return b''.join((
+        message_start,
+        message.command + b'\x00' * (12 - len(message.command)),
+        struct.pack('<I', len(payload)),
+        checksum(payload),
+        payload,
+    ))
+
+
+def parse_header(header: bytes, message_start: bytes) -> (bytes, int, bytes):
+    '''
+    Parses P2P message header.
+
+    Returns:
+        tuple: command, payload length and payload checksum
+
+    Raises:
+        ValueError: if the header does not start with network magic bytes
+    '''
+    if header[:4] != message_start:
+        raise ValueError(f'Invalid message start {header[:4].hex()}, expected {message_start.hex()}')
+    command = bytes(header[4:16]).split(b'\x00', 1)[0]
+    length = struct.unpack('<I', header[16:20])[0]
+    return command, length, bytes(header[20:24])
+
+
+def deserialize_payload(command: bytes, payload: bytes, payload_checksum: bytes):
+    '''
+    Deserializes message payload.
+
+    Returns:
+        MsgSerializable, None: message object or `None` for unknown or malformed messages
+    '''
+    if checksum(payload) != payload_checksum:
+        logger.debug('Got bad checksum for %s message, skipping', command)
+        return
+    message_class = extra_messagemap.get(command) or messagemap.get(command)
+    if message_class is None:
+        # unknown message type, skipping
+        return
+    try:
+        return message_class.msg_deser(BytesIO(payload))
+    except (SerializationError, SerializationTruncationError, ValueError, struct.error):
+        logger.debug('Could not deserialize %s message, skipping', command)
+
+
+class MessageDecoder(object):
+    '''
+    Incremental decoder of the P2P messages stream.
+
+    Received data is appended to a growable buffer and only complete frames (24 bytes header plus
+    the payload length declared in the header) are deserialized, so data is never parsed twice and the
+    network magic bytes appearing inside of a payload cannot break the framing.
+
+    Example:
+        >>> decoder = MessageDecoder(b'\x0b\x11\x09\x07')
+        >>> decoder.feed(data[:10])
+        0
+        >>> decoder.feed(data[10:])
+        2
+        >>> decoder.messages.popleft()
+        msg_version(...)
+    '''
+
+    def __init__(self, message_start: bytes):
+        self.message_start = message_start
+        self.buffer = bytearray()
+        self.messages = deque()
+
+    def __len__(self) -> int:
+        return len(self.messages)
+
+    def reset(self):
+        self.buffer.clear()
+        self.messages.clear()
+
+    def feed(self, data: bytes) -> int:
+        '''
+        Adding received data to the buffer and decoding all complete messages.
+
+        Returns:
+            int: number of decoded messages waiting in the `messages` queue
+        '''
+        self.buffer += data
+        offset = 0
+        buffer_size = len(self.buffer)
+
+        with memoryview(self.buffer) as view:
+            while buffer_size - offset >= HEADER_SIZE:
+                header = bytes(view[offset:offset + HEADER_SIZE])
+                try:
+                    command, length, payload_checksum = parse_header(header, self.message_start)
+                except ValueError:
+                    offset = self.resync(offset + 1)
+                    continue
+
+                if length > MAX_PAYLOAD_SIZE:
+                    logger.debug('Message %s is too big (%s bytes), skipping', command, length)
+                    offset = self.resync(offset + 1)
+                    continue
+
+                frame_end = offset + HEADER_SIZE + length
+                if frame_end > buffer_size:
+                    # waiting for the rest of the payload
+                    break
+
+                payload = bytes(view[offset + HEADER_SIZE:frame_end])
+                message = deserialize_payload(command, payload, payload_checksum)
+                if message is not None:
+                    self.messages.append(message)
+                offset = frame_end
+
+        del self.buffer[:offset]
+        return len(self.messages)
+
+    def resync(self, offset: int) -> int:
+        '''Looking for the next message start after a corrupted frame.'''
+        logger.debug('Unexpected data in the messages stream, looking for the next message start')
+        position = self.buffer.find(self.message_start, offset)
+        if position == -1:
+            # keeping the tail that can be a beginning of the message start
+            return max(offset, len(self.buffer) - len(self.message_start) + 1)
+        return position
+
+
+class AsyncNodeConnection(object):
+    '''
+    Asynchronous (asyncio) connection with a single node of the Bitcoin-based network.
+
+    It follows the same version/verack, inv/getdata/tx flow as `BitcoinBaseNetwork` but it never blocks
+    the thread, so one event loop can drive many broadcasts across many networks concurrently.
+
+    Example:
+        >>> import asyncio
+        >>> from clove.network import Litecoin
+        >>> connection = AsyncNodeConnection(Litecoin(), '127.0.0.1')
+        >>> asyncio.get_event_loop().run_until_complete(connection.broadcast(transaction))
+        'a9c0f5e7ab3a0a8bf3d0b4d7c3ffa08a81b15b50bb7c7ac1a0d4c3a5f8be5f4c'
+    '''
+
+    def __init__(self, network, node: str, port: int=None):
+        self.network = network
+        self.node = node
+        self.port = port or network.port
+        self.reader = None
+        self.writer = None
+        self.protocol_version = None
+
+    @property
+    def connected(self) -> bool:
+        return self.writer is not None
+
+    async def connect(self, timeout: int=2) -> bool:
+        try:
+            self.reader, self.writer = await asyncio.wait_for(
+                asyncio.open_connection(self.node, self.port),
+                timeout,
+            )
+        except (asyncio.TimeoutError, OSError):
+            logger.debug('[%s] Could not establish connection to this node', self.node)
+            return False
+        logger.debug('[%s] Connection established', self.node)
+        return True
+
+    def close(self):
+        if self.writer:
+            self.writer.close()
+        self.reader = self.writer = None
+
+    def version_packet(self) -> msg_version:
+        packet = msg_version(170002)
+        packet.addrFrom.ip, packet.addrFrom.port = self.writer.get_extra_info('sockname')[:2]
+        packet.addrTo.ip, packet.addrTo.port = self.writer.get_extra_info('peername')[:2]
+        return packet
+
+    async def handshake(self, timeout: int=20, record: bool=True) -> bool:
+        '''
+        Exchanging version and version acknowledge messages with the node.
+
+        Successful handshakes are saved in the peer store unless `record` is False.
+        '''
+        started = time()
+        if not await self.send_message(self.version_packet()):
+            return False
+
+        if not await self.capture_messages([msg_version, msg_verack], timeout):
+            logger.debug('[%s] Failed to get version or version acknowledge message from node', self.node)
+            return False
+
+        logger.debug('[%s] Got version, sending version acknowledge message', self.node)
+        if not await self.send_message(msg_verack(self.protocol_version.nVersion)):
+            return False
+        if record:
+            peer_store.record_handshake(self.network.name, self.node, time() - started)
+        return True
+
+    async def send_message(self, msg, timeout: int=2) -> bool:
+        if not self.connected:
+            return False
+        try:
+            self.writer.write(serialize_message(msg, self.network.message_start))
+            await asyncio.wait_for(self.writer.drain(), timeout)
+        except (asyncio.TimeoutError, OSError) as e:
+            logger.debug('[%s] Failed to send %s message', self.node, msg.command.decode())
+            logger.debug(e)
+            return False
+        return True
+
+    async def read_message(self):
+        '''
+        Reading single message from the node.
+
+        Returns:
+            MsgSerializable, None: message object or `None` for unknown or malformed messages
+
+        Raises:
+            asyncio.IncompleteReadError: if connection was closed by the node
+            ValueError: if the node is talking in another network
+        '''
+        header = await self.reader.readexactly(HEADER_SIZE)
+        command, length, payload_checksum = parse_header(header, self.network.message_start)
+        payload = await self.reader.readexactly(length)
+        return deserialize_payload(command, payload, payload_checksum)
+
+    async def handle_message(self, message):
+        msg_type = type(message)
+        if msg_type is msg_ping:
+            logger.debug('[%s] Got ping, sending pong.', self.node)
+            nVersion = self.protocol_version.nVersion if self.protocol_version else PROTO_VERSION
+            await self.send_message(msg_pong(nVersion, message.nonce))
+        elif msg_type is msg_version:
+            logger.debug('[%s] Saving version', self.node)
+            self.protocol_version = message
+
+    async def capture_messages(self, expected_message_types: list, timeout: int=20,
+                               ignore_empty: bool=False) -> Optional[list]:
+        expected_message_types = list(expected_message_types)
+        deadline = time() + timeout
+        found = []
+
+        while expected_message_types and self.connected:
+            remaining = deadline - time()
+            if remaining <= 0:
+                break
+
+            try:
+                message = await asyncio.wait_for(self.read_message(), remaining)
+            except asyncio.TimeoutError:
+                break
+            except (asyncio.IncompleteReadError, OSError, ValueError) as e:
+                logger.debug('[%s] Connection broken: %s', self.node, e)
+                self.close()
+                break
+
+            if not message:
+                continue
+
+            await self.handle_message(message)
+
+            msg_type = type(message)
+            if msg_type in expected_message_types:
+                found.append(message)
+                expected_message_types.remove(msg_type)
+                logger.debug(
+                    '[%s] Found %s, %s more to catch',
+                    self.node, msg_type.command.upper(), len(expected_message_types)
+                )
+
+        if not expected_message_types:
+            return found
+
+        if not ignore_empty:
+            logger.debug('[%s] Not all messages could be captured', self.node)
+
+    async def send_inventory(self, serialized_transaction: bytes, timeout: int=20) -> Optional[msg_getdata]:
+        message = msg_inv()
+        inventory = CInv()
+        inventory.type = MSG_TX
+        inventory.hash = Hash(serialized_transaction)
+        message.inv.append(inventory)
+
+        if not await self.send_message(message):
+            return
+
+        messages = await self.capture_messages([msg_getdata, ], timeout)
+        if messages:
+            logger.info('[%s] Node responded correctly.', self.node)
+            return messages[0]
+
+    async def broadcast(self, transaction: CTransaction, reject_timeout: int=None) -> Optional[str]:
+        '''
+        Connecting to the node (if needed) and pushing transaction through the inv/getdata/tx flow.
+
+        Returns:
+            str, None: transaction address or `None` if the node did not accept the transaction
+        '''
+        if not self.connected:
+            if not await self.connect() or not await self.handshake():
+                return
+
+        serialized_transaction = transaction.serialize()
+        get_data = await self.send_inventory(serialized_transaction)
+        if not get_data:
+            return
+
+        if all(el.hash != Hash(serialized_transaction) for el in get_data.inv):
+            logger.debug(UnexpectedResponseFromNode('Node did not ask for our transaction', self.node).message)
+            return
+
+        message = msg_tx()
+        message.tx = transaction
+        if not await self.send_message(message, 20):
+            return
+
+        logger.info('[%s] Looking for reject message.', self.node)
+        messages = await self.capture_messages(
+            [msg_reject, ], timeout=reject_timeout or REJECT_TIMEOUT, ignore_empty=True
+        )
+        if messages:
+            logger.debug(TransactionRejected(messages[0], self.node).message)
+            return
+        logger.info('[%s] Reject message not found.', self.node)
+
+        transaction_address = b2lx(transaction.GetHash())
+        logger.info('[%s] Transaction %s has just been sent.', self.node, transaction_address)
+        return transaction_address
+
+
+PeerBroadcastResult = namedtuple('PeerBroadcastResult', ['node', 'status', 'reason', 'latency'])
+'''Result of the transaction announcement to a single peer (latency in seconds).'''
+
+BroadcastReport = namedtuple('BroadcastReport', ['transaction_address', 'results'])
+'''Result of the fan-out broadcast, `transaction_address` is `None` if the quorum was not reached.'''
+
+
+class FanOutBroadcast(object):
+    '''
+    Announcing transaction to many peers at once.
+
+    Broadcast is finished as soon as `quorum` peers asked for the transaction (`getdata`), got it and
+    did not reject it within `reject_timeout`, while no other peer rejected it. If some peer fails, the next
+    candidate node is used in its place, so there are up to `peers` announcements in flight all the time.
+    '''
+
+    ACCEPTED = 'accepted'
+    REJECTED = 'rejected'
+    FAILED = 'failed'
+    CANCELLED = 'cancelled'
+
+    def __init__(self, network, transaction: CTransaction, nodes: list, peers: int=FAN_OUT_PEERS,
+                 quorum: int=FAN_OUT_QUORUM, timeout: int=NODE_COMMUNICATION_TIMEOUT,
+                 reject_timeout: int=REJECT_TIMEOUT):
+        self.network = network
+        self.transaction = transaction
+        self.serialized_transaction = transaction.serialize()
+        self.nodes = list(nodes)
+        self.peers = peers
+        self.quorum = min(quorum, peers)
+        self.timeout = timeout
+        self.reject_timeout = reject_timeout
+        self.results = {}
+        self.decision = None
+
+    @property
+    def accepted(self) -> int:
+        return sum(1 for result in self.results.values() if result.status == self.ACCEPTED)
+
+    @property
+    def rejected(self) -> bool:
+        return any(result.status == self.REJECTED for result in self.results.values())
+
+    def record(self, node: str, status: str, started: float, reason: str=None):
+        self.results[node] = PeerBroadcastResult(node, status, reason, round(time() - started, 3))
+        if self.decision.done():
+            return
+        if status == self.REJECTED or self.accepted >= self.quorum:
+            self.decision.set_result(status)
+
+    async def announce(self, node: str):
+        started = time()
+        connection = AsyncNodeConnection(self.network, node)
+        try:
+            if not await connection.connect() or not await connection.handshake():
+                return self.record(node, self.FAILED, started, 'handshake failed')
+
+            get_data = await connection.send_inventory(self.serialized_transaction)
+            if not get_data or all(el.hash != Hash(self.serialized_transaction) for el in get_data.inv):
+                return self.record(node, self.FAILED, started, 'node did not ask for our transaction')
+
+            message = msg_tx()
+            message.tx = self.transaction
+            if not await connection.send_message(message, 20):
+                return self.record(node, self.FAILED, started, 'could not send transaction')
+
+            # peer counts as accepted only when it didn't reject the transaction in time
+            messages = await connection.capture_messages(
+                [msg_reject, ], timeout=self.reject_timeout, ignore_empty=True
+            )
+            if messages:
+                return self.record(node, self.REJECTED, started, messages[0].reason.decode(errors='replace'))
+            self.record(node, self.ACCEPTED, started)
+        finally:
+            connection.close()
+
+    async def run(self) -> BroadcastReport:
+        self.decision = asyncio.get_event_loop().create_future()
+        deadline = time() + self.timeout
+        candidates = iter(self.nodes)
+        pending = {}
+
+        while not self.decision.done():
+            while len(pending) < self.peers:
+                node = next(candidates, None)
+                if node is None:
+                    break
+                pending[asyncio.ensure_future(self.announce(node))] = node
+
+            remaining = deadline - time()
+            if not pending or remaining <= 0:
+                break
+
+            done, _ = await asyncio.wait(
+                list(pending) + [self.decision], timeout=remaining, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                pending.pop(task, None)
+
+        for task, node in pending.items():
+            task.cancel()
+            if node not in self.results:
+                self.results[node] = PeerBroadcastResult(node, self.CANCELLED, None, None)
+        if pending:
+            await asyncio.wait(list(pending))
+
+        transaction_address = None
+        if not self.rejected and self.accepted >= self.quorum:
+            transaction_address = b2lx(self.transaction.GetHash())
+        return BroadcastReport(transaction_address, list(self.results.values()))
+
+
+TransactionPublishResult = namedtuple('TransactionPublishResult', ['transaction_address', 'status', 'reason'])
+'''Result of publishing a single transaction from the batch.'''
+
+
+class BatchBroadcast(object):
+    '''
+    Announcing many transactions to a single node with one `inv` message.
+
+    Transactions are sent as soon as the node asks for them (the node can split its `getdata` requests)
+    and `reject` messages are matched with transactions by the hash they carry.
+    '''
+
+    SENT = 'sent'
+    ACCEPTED = FanOutBroadcast.ACCEPTED
+    REJECTED = FanOutBroadcast.REJECTED
+    FAILED = FanOutBroadcast.FAILED
+
+    def __init__(self, transactions: list):
+        self.transactions = OrderedDict((transaction.GetHash(), transaction) for transaction in transactions)
+        self.statuses = {}
+        self.reasons = {}
+        self.lock = threading.Lock()
+        self.all_requested = threading.Event()
+        self.last_activity = time()
+
+    def inventory_message(self) -> msg_inv:
+        message = msg_inv()
+        for tx_hash in self.transactions:
+            inventory = CInv()
+            inventory.type = MSG_TX
+            inventory.hash = tx_hash
+            message.inv.append(inventory)
+        return message
+
+    def handle_getdata(self, message: msg_getdata, send) -> int:
+        '''Sending requested transactions with the `send` callable, returns number of sent transactions.'''
+        sent = 0
+        for inventory in message.inv:
+            transaction = self.transactions.get(inventory.hash)
+            with self.lock:
+                if transaction is None or inventory.hash in self.statuses:
+                    continue
+                self.statuses[inventory.hash] = self.SENT
+            tx_message = msg_tx()
+            tx_message.tx = transaction
+            if send(tx_message):
+                sent += 1
+            else:
+                self.reject(inventory.hash, self.FAILED, 'could not send transaction')
+        self.last_activity = time()
+        if len(self.statuses) == len(self.transactions):
+            self.all_requested.set()
+        return sent
+
+    def handle_reject(self, message: msg_reject):
+        if message.message != b'tx':
+            return
+        reason = message.reason.decode(errors='replace')
+        if message.rejected_hash in self.transactions:
+            self.reject(message.rejected_hash, self.REJECTED, reason)
+            return
+        # older nodes do not send the hash, rejection can be matched only when one transaction is in flight
+        in_flight = [tx_hash for tx_hash, status in self.statuses.items() if status == self.SENT]
+        if len(in_flight) == 1:
+            self.reject(in_flight[0], self.REJECTED, reason)
+        else:
+            logger.debug('Reject message without transaction hash: %s', reason)
+
+    def reject(self, tx_hash: bytes, status: str, reason: str):
+        with self.lock:
+            self.statuses[tx_hash] = status
+            self.reasons[tx_hash] = reason
+
+    def results(self) -> list:
+        results = []
+        for tx_hash in self.transactions:
+            status = self.statuses.get(tx_hash)
+            if status == self.SENT:
+                results.append(TransactionPublishResult(b2lx(tx_hash), self.ACCEPTED, None))
+            elif status is None:
+                results.append(TransactionPublishResult(None, self.FAILED, 'node did not ask for the transaction'))
+            else:
+                results.append(TransactionPublishResult(None, status, self.reasons.get(tx_hash)))
+        return results
+
+
+def run_sync(coroutine):
+    '''Running coroutine to completion in a new event loop (for synchronous callers).'''
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
@@ -0,0 +1,183 @@
+import json
+import os
+import sqlite3
+import threading
+from time import time
+from typing import Iterable, Union
+
+from clove.constants import PEER_FAILURE_PENALTY, PEER_LATENCY_SMOOTHING, PEER_REJECT_PENALTY, PEER_UNKNOWN_LATENCY
+from clove.utils.logging import logger
+
+
+class PeerStats(object):
+    '''Statistics collected for a single node.'''
+
+    def __init__(self, node: str, handshakes: int=0, failures: int=0, latency: float=None, accepted: int=0,
+                 rejected: int=0, uptime: float=0.0, last_seen: float=None):
+        self.node = node
+        self.handshakes = handshakes
+        self.failures = failures
+        self.latency = latency
+        self.accepted = accepted
+        self.rejected = rejected
+        self.uptime = uptime
+        self.last_seen = last_seen
+
+    @property
+    def failure_rate(self) -> float:
+        attempts = self.handshakes + self.failures
+        return self.failures / attempts if attempts else 0.0
+
+    @property
+    def reject_rate(self) -> float:
+        announcements = self.accepted + self.rejected
+        return self.rejected / announcements if announcements else 0.0
+
+    @property
+    def score(self) -> float:
+        '''Expected cost of using this node (lower is better), unknown nodes get an average latency.'''
+        latency = PEER_UNKNOWN_LATENCY if self.latency is None else self.latency
+        return latency + PEER_FAILURE_PENALTY * self.failure_rate + PEER_REJECT_PENALTY * self.reject_rate
+
+    def __repr__(self):
+        return f'PeerStats(node={self.node}, score={self.score:.3f})'
+
+
+class PeerStore(object):
+    '''
+    Reputation of the nodes (handshake latency, failures, reject rate and uptime) kept in the SQLite database.
+
+    By default the database lives in memory, set the `CLOVE_PEERS_DB` environment variable to a file path
+    to keep the statistics between runs.
+
+    Example:
+        >>> from clove.network.bitcoin.peers import peer_store
+        >>> peer_store.record_handshake('litecoin', '1.2.3.4', latency=0.21)
+        >>> peer_store.rank('litecoin', ['5.6.7.8', '1.2.3.4'])
+        ['1.2.3.4', '5.6.7.8']
+    '''
+
+    columns = ('handshakes', 'failures', 'latency', 'accepted', 'rejected', 'uptime', 'last_seen')
+
+    def __init__(self, path: str=':memory:'):
+        self.path = path
+        self.lock = threading.RLock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute('''
+            CREATE TABLE IF NOT EXISTS peers (
+                network TEXT NOT NULL,
+                node TEXT NOT NULL,
+                handshakes INTEGER NOT NULL DEFAULT 0,
+                failures INTEGER NOT NULL DEFAULT 0,
+                latency REAL,
+                accepted INTEGER NOT NULL DEFAULT 0,
+                rejected INTEGER NOT NULL DEFAULT 0,
+                uptime REAL NOT NULL DEFAULT 0,
+                last_seen REAL,
+                PRIMARY KEY (network, node)
+            )
+        ''')
+        self.connection.commit()
+
+    def execute(self, network: str, node: str, update: str, *params):
+        with self.lock:
+            try:
+                self.connection.execute('INSERT OR IGNORE INTO peers (network, node) VALUES (?, ?)', (network, node))
+                self.connection.execute(
+                    f'UPDATE peers SET {update} WHERE network = ? AND node = ?', params + (network, node)
+                )
+                self.connection.commit()
+            except sqlite3.Error as e:
+                logger.warning('Unable to update peer statistics: %s', e)
+
+    def record_handshake(self, network: str, node: str, latency: float):
+        '''Saving successful handshake, latency is an exponential moving average.'''
+        self.execute(
+            network, node,
+            'handshakes = handshakes + 1, last_seen = ?, '
+            'latency = CASE WHEN latency IS NULL THEN ? ELSE latency + ? * (? - latency) END',
+            time(), latency, PEER_LATENCY_SMOOTHING, latency,
+        )
+
+    def record_failure(self, network: str, node: str):
+        self.execute(network, node, 'failures = failures + 1')
+
+    def record_accepted(self, network: str, node: str):
+        self.execute(network, node, 'accepted = accepted + 1, last_seen = ?', time())
+
+    def record_rejected(self, network: str, node: str):
+        self.execute(network, node, 'rejected = rejected + 1, last_seen = ?', time())
+
+    def record_uptime(self, network: str, node: str, seconds: float):
+        self.execute(network, node, 'uptime = uptime + ?, last_seen = ?', seconds, time())
+
+    def get_stats(self, network: str, nodes: Iterable[str]) -> dict:
+        '''Returning statistics for the given nodes (nodes without history get empty statistics).'''
+        nodes = list(nodes)
+        stats = {node: PeerStats(node) for node in nodes}
+        if not nodes:
+            return stats
+        with self.lock:
+            try:
+                rows = self.connection.execute(
+                    f'SELECT node, {", ".join(self.columns)} FROM peers WHERE network = ?', (network, )
+                ).fetchall()
+            except sqlite3.Error as e:
+                logger.warning('Unable to read peer statistics: %s', e)
+                return stats
+        for row in rows:
+            if row[0] in stats:
+                stats[row[0]] = PeerStats(*row)
+        return stats
+
+    def rank(self, network: str, nodes: Iterable[str]) -> list:
+        '''Sorting nodes from the fastest healthy one, order of nodes with equal score is kept.'''
+        nodes = list(nodes)
+        stats = self.get_stats(network, nodes)
+        return sorted(nodes, key=lambda node: stats[node].score)
+
+    def import_report(self, report: Union[dict, str]) -> int:
+        '''
+        Seeding statistics from the health checker report.
+
+        Reachable nodes are saved as successful handshakes (handshake latency is used when the report
+        has it, connect latency otherwise), unreachable nodes as failures.
+
+        Args:
+            report (dict, str): report returned by `HealthChecker.run` or path to its JSON file
+
+        Returns:
+            int: number of imported nodes
+
+        Example:
+            >>> from clove.network.bitcoin.peers import peer_store
+            >>> peer_store.import_report('health.json')
+            184
+        '''
+        if isinstance(report, str):
+            try:
+                with open(report) as report_file:
+                    report = json.load(report_file)
+            except (OSError, ValueError) as e:
+                logger.warning('Unable to read health report %s: %s', report, e)
+                return 0
+
+        imported = 0
+        for network, network_report in report.get('networks', {}).items():
+            for result in network_report.get('nodes', []):
+                latency = result.get('handshake_latency') or result.get('connect_latency')
+                if result.get('reachable') and not result.get('error') and latency is not None:
+                    self.record_handshake(network, result['node'], latency)
+                else:
+                    self.record_failure(network, result['node'])
+                imported += 1
+        return imported
+
+    def clear(self):
+        with self.lock:
+            self.connection.execute('DELETE FROM peers')
+            self.connection.commit()
+
+
+peer_store = PeerStore(os.environ.get('CLOVE_PEERS_DB', ':memory:'))
+'''Peer statistics shared by all Bitcoin-based network instances.'''
@@ -0,0 +1,169 @@
+from collections import defaultdict
+import random
+import select
+import socket
+import threading
+from time import sleep, time
+from typing import Optional
+
+from bitcoin.messages import msg_ping, msg_pong
+
+from clove.constants import (
+    CONNECTION_POOL_IDLE_TIMEOUT,
+    CONNECTION_POOL_MAX_IDLE_CONNECTIONS,
+    CONNECTION_POOL_PING_INTERVAL,
+)
+from clove.network.bitcoin.p2p import MessageDecoder, serialize_message
+from clove.utils.logging import logger
+
+
+class PeerConnection(object):
+    '''Handshaken connection with a single node, ready to be reused by any network instance.'''
+
+    def __init__(self, node: str, connection: socket.socket, decoder: MessageDecoder, protocol_version):
+        self.node = node
+        self.connection = connection
+        self.decoder = decoder
+        self.protocol_version = protocol_version
+        self.released_at = time()
+        self.pinged_at = time()
+
+    def fileno(self) -> int:
+        return self.connection.fileno()
+
+    def send(self, message) -> bool:
+        try:
+            self.connection.sendall(serialize_message(message, self.decoder.message_start))
+        except OSError:
+            return False
+        return True
+
+    def close(self):
+        try:
+            self.connection.close()
+        except OSError:
+            pass
+
+    def __repr__(self):
+        return f'PeerConnection(node={self.node})'
+
+
+class ConnectionPool(object):
+    '''
+    Process-wide pool of handshaken connections, keyed by network name.
+
+    Idle connections are watched by a background thread that answers `ping` messages, pings the nodes
+    from time to time and drops connections that were closed or not used for too long.
+
+    Example:
+        >>> from clove.network.bitcoin.pool import connection_pool
+        >>> peer = connection_pool.acquire(network)
+        >>> ...
+        >>> connection_pool.release(network, peer)
+    '''
+
+    def __init__(
+        self,
+        max_idle_connections: int=CONNECTION_POOL_MAX_IDLE_CONNECTIONS,
+        idle_timeout: int=CONNECTION_POOL_IDLE_TIMEOUT,
+        ping_interval: int=CONNECTION_POOL_PING_INTERVAL,
+        poll_interval: float=0.5,
+    ):
+        self.max_idle_connections = max_idle_connections
+        self.idle_timeout = idle_timeout
+        self.ping_interval = ping_interval
+        self.poll_interval = poll_interval
+        self.idle = defaultdict(list)
+        self.lock = threading.RLock()
+        self.keepalive_thread = None
+
+    @staticmethod
+    def get_key(network) -> str:
+        return network.name
+
+    def acquire(self, network) -> Optional[PeerConnection]:
+        '''Borrowing the most recently used connection for the network (if there is any).'''
+        with self.lock:
+            connections = self.idle.get(self.get_key(network))
+            if not connections:
+                return
+            peer = connections.pop()
+        logger.debug('[%s] Reusing connection from the pool', peer.node)
+        return peer
+
+    def release(self, network, peer: PeerConnection):
+        '''Returning connection to the pool, so it can be used by other network instances.'''
+        with self.lock:
+            connections = self.idle[self.get_key(network)]
+            if len(connections) >= self.max_idle_connections or any(c.node == peer.node for c in connections):
+                peer.close()
+                return
+            peer.released_at = time()
+            connections.append(peer)
+            self.start_keepalive()
+
+    def close_all(self):
+        with self.lock:
+            for connections in self.idle.values():
+                for peer in connections:
+                    peer.close()
+            self.idle.clear()
+
+    def __len__(self) -> int:
+        with self.lock:
+            return sum(len(connections) for connections in self.idle.values())
+
+    def start_keepalive(self):
+        if self.keepalive_thread and self.keepalive_thread.is_alive():
+            return
+        self.keepalive_thread = threading.Thread(target=self.keepalive, name='clove-connection-pool', daemon=True)
+        self.keepalive_thread.start()
+
+    def keepalive(self):
+        while len(self):
+            with self.lock:
+                self.keepalive_step()
+            sleep(self.poll_interval)
+
+    def keepalive_step(self):
+        now = time()
+        for key, connections in list(self.idle.items()):
+            for peer in list(connections):
+                if now - peer.released_at > self.idle_timeout or not self.handle_incoming(peer):
+                    logger.debug('[%s] Dropping idle connection', peer.node)
+                    connections.remove(peer)
+                    peer.close()
+                    continue
+                if now - peer.pinged_at > self.ping_interval:
+                    peer.pinged_at = now
+                    if not peer.send(msg_ping(nonce=random.getrandbits(64))):
+                        connections.remove(peer)
+                        peer.close()
+            if not connections:
+                del self.idle[key]
+
+    def handle_incoming(self, peer: PeerConnection) -> bool:
+        '''Reading data waiting on the idle connection and answering pings. Returns False if it's broken.'''
+        try:
+            readable, _, _ = select.select([peer], [], [], 0)
+            if not readable:
+                return True
+            data = peer.connection.recv(8192)
+        except (OSError, ValueError, TypeError):
+            return False
+
+        if not data:
+            return False
+
+        peer.decoder.feed(data)
+        while peer.decoder.messages:
+            message = peer.decoder.messages.popleft()
+            if type(message) is msg_ping:
+                logger.debug('[%s] Got ping on idle connection, sending pong.', peer.node)
+                if not peer.send(msg_pong(peer.protocol_version.nVersion, message.nonce)):
+                    return False
+        return True
+
+
+connection_pool = ConnectionPool()
+'''Connection pool shared by all Bitcoin-based network instances.'''
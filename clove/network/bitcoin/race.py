@@ -0,0 +1,156 @@
+from queue import Empty, Queue
+import socket
+import threading
+from time import time
+from typing import Optional
+
+from bitcoin.messages import msg_verack, msg_version
+
+from clove.constants import CONNECT_RACE_PEERS, CONNECT_RACE_STAGGER
+from clove.utils.logging import logger
+
+
+class HandshakeAttempt(object):
+    '''Connection and version handshake with a single node, done on a separate network instance.'''
+
+    def __init__(self, network, node: str, handshake_timeout: int):
+        self.node = node
+        self.handshake_timeout = handshake_timeout
+        self.candidate = type(network)()
+        self.candidate.pooled_connections = False
+        self.latency = None
+        self.cancelled = False
+
+    def run(self) -> bool:
+        started = time()
+        try:
+            if not self.candidate.create_connection(self.node):
+                return False
+            if self.cancelled:
+                return False
+            if not self.candidate.capture_messages([msg_version, msg_verack], timeout=self.handshake_timeout):
+                logger.debug('[%s] Failed to get version or version acknowledge message from node', self.node)
+                return False
+            if self.cancelled or not self.candidate.send_verack():
+                return False
+        except OSError:
+            # connection was closed by the cancel() method
+            return False
+        self.latency = time() - started
+        return True
+
+    def cancel(self):
+        self.cancelled = True
+        # the socket has to leave the dispatcher before it's closed, its descriptor can be reused right away
+        self.candidate.detach_channel()
+        connection = self.candidate.connection
+        if connection is None:
+            return
+        try:
+            # waking up the blocked recv() call, next one will fail on the closed socket
+            connection.shutdown(socket.SHUT_RDWR)
+            connection.close()
+        except OSError:
+            pass
+
+    def close(self):
+        self.candidate.reset_connection()
+
+
+class ConnectionRace(object):
+    '''
+    Connecting to many nodes at once and keeping the first one that completes the version handshake.
+
+    Attempts are started every `stagger` seconds (or right away when some attempt fails) with up to
+    `peers` attempts in flight, so an unresponsive node doesn't hold up the whole connection process.
+    All other attempts are cancelled as soon as there is a winner.
+
+    Example:
+        >>> from clove.network import Litecoin
+        >>> from clove.network.bitcoin.race import ConnectionRace
+        >>> race = ConnectionRace(Litecoin(), ['1.2.3.4', '5.6.7.8', '9.10.11.12'])
+        >>> winner = race.run()
+        >>> winner.node, race.failed
+        ('5.6.7.8', ['1.2.3.4'])
+    '''
+
+    def __init__(self, network, nodes: list, peers: int=CONNECT_RACE_PEERS, stagger: float=CONNECT_RACE_STAGGER,
+                 handshake_timeout: int=20):
+        self.network = network
+        self.nodes = list(nodes)
+        self.peers = max(peers, 1)
+        self.stagger = stagger
+        self.handshake_timeout = handshake_timeout
+        self.results = Queue()
+        self.running = []
+        self.failed = []
+        self.lock = threading.Lock()
+
+    def start(self, node: str):
+        attempt = HandshakeAttempt(self.network, node, self.handshake_timeout)
+        with self.lock:
+            self.running.append(attempt)
+
+        def target():
+            succeeded = attempt.run()
+            self.results.put((attempt, succeeded))
+
+        threading.Thread(target=target, name=f'clove-connect-{node}', daemon=True).start()
+
+    def cancel_all(self):
+        with self.lock:
+            running, self.running = self.running, []
+        for attempt in running:
+            attempt.cancel()
+
+        def cleanup():
+            # closing cancelled attempts when they notice cancellation
+            for _ in running:
+                attempt, _ = self.results.get()
+                attempt.close()
+
+        if running:
+            threading.Thread(target=cleanup, name='clove-connect-cleanup', daemon=True).start()
+
+    def run(self) -> Optional[HandshakeAttempt]:
+        '''Returns attempt with the handshaken connection or `None` if all nodes failed.'''
+        candidates = iter(self.nodes)
+        exhausted = False
+        next_start = 0.0
+
+        while True:
+            with self.lock:
+                in_flight = len(self.running)
+
+            now = time()
+            if not exhausted and in_flight < self.peers and now >= next_start:
+                node = next(candidates, None)
+                if node is None:
+                    exhausted = True
+                else:
+                    self.start(node)
+                    next_start = now + self.stagger
+                continue
+
+            if not in_flight and exhausted:
+                return
+
+            wait = None if exhausted or in_flight >= self.peers else max(next_start - now, 0)
+            try:
+                attempt, succeeded = self.results.get(timeout=wait)
+            except Empty:
+                continue
+
+            with self.lock:
+                self.running.remove(attempt)
+
+            if not succeeded:
+                attempt.close()
+                self.failed.append(attempt.node)
+                # start another node right away
+                next_start = 0.0
+                continue
+
+            logger.debug('[%s] Won the connection race in %.3f seconds', attempt.node, attempt.latency)
+            self.cancel_all()
+            return attempt
@@ -0,0 +1,243 @@
+import asyncio
+from collections import Counter
+import random
+import threading
+from typing import Callable, Optional
+
+from bitcoin.messages import MSG_TX, msg_getdata, msg_inv, msg_ping, msg_pong, msg_tx, msg_verack, msg_version
+from bitcoin.net import CInv
+
+from clove.network.bitcoin.messages import msg_reject
+from clove.network.bitcoin.p2p import MessageDecoder, serialize_message
+from clove.utils.logging import logger
+
+# service bit of full nodes
+NODE_NETWORK = 1
+
+# reject code for transactions not accepted to the mempool (BIP61)
+REJECT_INSUFFICIENTFEE = b'\x42'
+
+
+class NodeSimulator(object):
+    '''
+    Local Bitcoin P2P node speaking the python-bitcoinlib message set over real loopback sockets.
+
+    Simulator answers handshakes, pings and asks for every announced transaction. Its behaviour can
+    be tuned (latency before every response, rejected transactions, fragmented writes, disconnects,
+    announced services) and any message type can be scripted with a custom handler. Server runs
+    its own event loop in a background thread, so it can be used by synchronous code as well.
+
+    Args:
+        network: network class (its `message_start` is used)
+        host (str): loopback address to listen on
+        port (int): port to listen on, random free port by default
+        latency (float): seconds to wait before sending every response
+        reject (float, Callable): probability of rejecting received transaction or function
+            that takes the transaction and returns True if it should be rejected
+        reject_reason (bytes): reason sent in reject messages
+        fragment_size (int): if given, messages are written in chunks of this size
+        fragment_delay (float): seconds to wait between chunks
+        disconnect_after (int): number of received messages after which the connection is closed
+        silent (bool): never ask for announced transactions
+        services (int): services announced in the version message
+        seed (int): seed of the random generator used for rejects (for deterministic runs)
+
+    Example:
+        >>> from clove.network import BitcoinTestNet
+        >>> from clove.network.bitcoin.simulator import NodeSimulator
+        >>> with NodeSimulator(BitcoinTestNet, latency=0.05, reject=0.1) as simulator:
+        ...     network = simulator.network_class()()
+        ...     network.publish(raw_transaction)
+        '5e4d8b3f...'
+        >>> simulator.transactions
+        [CTransaction(...)]
+    '''
+
+    def __init__(self, network, host: str='127.0.0.1', port: int=0, latency: float=0, reject=0,
+                 reject_reason: bytes=b'insufficient fee', fragment_size: Optional[int]=None,
+                 fragment_delay: float=0, disconnect_after: Optional[int]=None, silent: bool=False,
+                 services: int=NODE_NETWORK, seed: int=0):
+        self.network = network
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.reject = reject
+        self.reject_reason = reject_reason
+        self.fragment_size = fragment_size
+        self.fragment_delay = fragment_delay
+        self.disconnect_after = disconnect_after
+        self.silent = silent
+        self.services = services
+        self.random = random.Random(seed)
+        self.scripts = {}
+
+        self.connections = 0
+        self.messages = Counter()
+        self.transactions = []
+        self.rejected = []
+
+        self.loop = None
+        self.server = None
+        self.writers = set()
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def script(self, message_type, handler: Callable):
+        '''
+        Replacing the default response for the message type.
+
+        Handler takes received message and returns a list of messages to send back.
+        '''
+        self.scripts[message_type] = handler
+
+    def should_reject(self, transaction) -> bool:
+        if callable(self.reject):
+            return self.reject(transaction)
+        return self.reject and self.random.random() < self.reject
+
+    def respond(self, message) -> list:
+        msg_type = type(message)
+        with self.lock:
+            self.messages[msg_type.command.decode()] += 1
+        if msg_type in self.scripts:
+            return self.scripts[msg_type](message) or []
+
+        if msg_type is msg_version:
+            version = msg_version()
+            version.nServices = self.services
+            return [version, msg_verack()]
+        if msg_type is msg_ping:
+            return [msg_pong(nonce=message.nonce)]
+        if msg_type is msg_inv:
+            if self.silent:
+                return []
+            getdata = msg_getdata()
+            for inventory in message.inv:
+                if inventory.type == MSG_TX:
+                    item = CInv()
+                    item.type = MSG_TX
+                    item.hash = inventory.hash
+                    getdata.inv.append(item)
+            return [getdata] if getdata.inv else []
+        if msg_type is msg_tx:
+            with self.lock:
+                self.transactions.append(message.tx)
+            if self.should_reject(message.tx):
+                with self.lock:
+                    self.rejected.append(message.tx)
+                reject = msg_reject()
+                reject.message = b'tx'
+                reject.ccode = REJECT_INSUFFICIENTFEE
+                reject.reason = self.reject_reason
+                reject.data = message.tx.GetHash()
+                return [reject]
+        return []
+
+    async def send(self, writer, message):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        data = serialize_message(message, self.network.message_start)
+        if not self.fragment_size:
+            writer.write(data)
+            await writer.drain()
+            return
+        for offset in range(0, len(data), self.fragment_size):
+            writer.write(data[offset:offset + self.fragment_size])
+            await writer.drain()
+            if self.fragment_delay:
+                await asyncio.sleep(self.fragment_delay)
+
+    async def handle(self, reader, writer):
+        with self.lock:
+            self.connections += 1
+        self.writers.add(writer)
+        decoder = MessageDecoder(self.network.message_start)
+        received = 0
+        try:
+            while True:
+                data = await reader.read(65536)
+                if not data:
+                    return
+                decoder.feed(data)
+                while decoder.messages:
+                    message = decoder.messages.popleft()
+                    received += 1
+                    for response in self.respond(message):
+                        await self.send(writer, response)
+                    if self.disconnect_after and received >= self.disconnect_after:
+                        logger.debug('Simulator closes connection after %s messages', received)
+                        return
+        except ConnectionError:
+            pass
+        finally:
+            self.writers.discard(writer)
+            writer.close()
+
+    def start(self) -> int:
+        '''Starting the server in a background thread, returns the port.'''
+        started = threading.Event()
+
+        def run():
+            self.loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self.loop)
+            self.server = self.loop.run_until_complete(
+                asyncio.start_server(self.handle, self.host, self.port, reuse_address=True)
+            )
+            self.port = self.server.sockets[0].getsockname()[1]
+            started.set()
+            self.loop.run_forever()
+            self.server.close()
+            for writer in list(self.writers):
+                writer.close()
+            self.loop.run_until_complete(self.server.wait_closed())
+            # letting connection handlers notice closed connections
+            self.loop.run_until_complete(asyncio.sleep(0.01))
+            self.loop.close()
+
+        self.thread = threading.Thread(target=run, name=f'clove-simulator-{self.host}', daemon=True)
+        self.thread.start()
+        started.wait()
+        return self.port
+
+    def stop(self):
+        if self.loop is not None and self.loop.is_running():
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join()
+
+    def network_class(self, **attributes):
+        '''Returns subclass of the network connecting only to this simulator.'''
+        return simulated_network(self.network, [self], **attributes)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    @classmethod
+    def cluster(cls, network, size: int, **options) -> list:
+        '''
+        Starting simulators on consecutive loopback addresses (127.0.0.1, 127.0.0.2, ...) with the same port,
+        as all nodes of the network have to listen on the same port.
+        '''
+        simulators = [cls(network, host='127.0.0.1', **options)]
+        port = simulators[0].start()
+        for number in range(2, size + 1):
+            simulator = cls(network, host=f'127.0.0.{number}', port=port, **options)
+            simulator.start()
+            simulators.append(simulator)
+        return simulators
+
+
+def simulated_network(network, simulators: list, **attributes):
+    '''Returns subclass of the network with simulators as the only nodes.'''
+    ports = {simulator.port for simulator in simulators}
+    if len(ports) != 1:
+        raise ValueError('All simulators have to listen on the same port.')
+    attributes.update(
+        nodes=tuple(simulator.host for simulator in simulators),
+        seeds=(),
+        port=ports.pop(),
+    )
+    return type(f'Simulated{network.__name__}', (network, ), attributes)
@@ -4,11 +4,16 @@ from typing import Optional
 
 from bitcoin.core import CMutableTransaction, CMutableTxOut, b2lx, b2x, script, x
 from bitcoin.core.scripteval import SCRIPT_VERIFY_P2SH, VerifyScript
-from bitcoin.wallet import CBitcoinAddress
 
 from clove.constants import SIGNATURE_SIZE
 from clove.network.bitcoin.wallet import BitcoinWallet
-from clove.utils.bitcoin import auto_switch_params, to_base_units
+from clove.utils.bitcoin import (
+    address_to_hash160,
+    address_to_script_pubkey,
+    auto_switch_params,
+    script_pubkey_to_address,
+    to_base_units,
+)
 from clove.utils.hashing import generate_secret_with_hash
 
 
@@ -41,7 +46,10 @@ class BitcoinTransaction(object):
 
     def build_outputs(self):
         self.tx_out_list = [
-            CMutableTxOut(to_base_units(self.value), CBitcoinAddress(self.recipient_address).to_scriptPubKey())
+            CMutableTxOut(
+                to_base_units(self.value),
+                address_to_script_pubkey(self.recipient_address, self.network.get_params()),
+            )
         ]
 
     def add_fee_and_sign(self, default_wallet=None):
@@ -191,6 +199,9 @@ class BitcoinAtomicSwapTransaction(BitcoinTransaction):
             raise ValueError('Given sender address is invalid.')
 
     def build_atomic_swap_contract(self):
+        params = self.network.get_params()
+        recipient_hash160, _ = address_to_hash160(self.recipient_address, params)
+        sender_hash160, _ = address_to_hash160(self.sender_address, params)
         self.contract = script.CScript([
             script.OP_IF,
             script.OP_RIPEMD160,
@@ -198,14 +209,14 @@ class BitcoinAtomicSwapTransaction(BitcoinTransaction):
             script.OP_EQUALVERIFY,
             script.OP_DUP,
             script.OP_HASH160,
-            CBitcoinAddress(self.recipient_address),
+            recipient_hash160,
             script.OP_ELSE,
             int(self.locktime.replace(tzinfo=timezone.utc).timestamp()),
             script.OP_CHECKLOCKTIMEVERIFY,
             script.OP_DROP,
             script.OP_DUP,
             script.OP_HASH160,
-            CBitcoinAddress(self.sender_address),
+            sender_hash160,
             script.OP_ENDIF,
             script.OP_EQUALVERIFY,
             script.OP_CHECKSIG,
@@ -232,7 +243,10 @@ class BitcoinAtomicSwapTransaction(BitcoinTransaction):
         if self.utxo_value > self.value:
             change = self.utxo_value - self.value
             self.tx_out_list.append(
-                CMutableTxOut(to_base_units(change), CBitcoinAddress(self.sender_address).to_scriptPubKey())
+                CMutableTxOut(
+                    to_base_units(change),
+                    address_to_script_pubkey(self.sender_address, self.network.get_params()),
+                )
             )
 
     def add_fee(self):
@@ -247,7 +261,9 @@ class BitcoinAtomicSwapTransaction(BitcoinTransaction):
     def show_details(self):
         details = {
             'contract': self.contract.hex(),
-            'contract_address': str(CBitcoinAddress.from_scriptPubKey(self.contract.to_p2sh_scriptPubKey())),
+            'contract_address': script_pubkey_to_address(
+                self.contract.to_p2sh_scriptPubKey(), self.network.get_params()
+            ),
             'contract_transaction': self.raw_transaction,
             'transaction_address': self.address,
             'fee': self.fee,
@@ -0,0 +1,188 @@
+from collections import OrderedDict
+from concurrent.futures import Future
+import hashlib
+import threading
+from typing import Callable, Optional
+
+from bitcoin.core import b2lx, b2x, lx, x
+from bitcoin.messages import MSG_TX, msg_getdata, msg_inv, msg_tx
+from bitcoin.net import CInv
+
+from clove.constants import MEMPOOL_WATCHER_RECONNECT_INTERVAL, MEMPOOL_WATCHER_SEEN_INVENTORY
+from clove.network.bitcoin.dispatcher import message_dispatcher
+from clove.utils.logging import logger
+
+
+class WatchedOutpoint(object):
+
+    def __init__(self, tx_id: str, vout: int, secret_hash: Optional[str]=None, callback: Optional[Callable]=None):
+        self.tx_id = tx_id
+        self.vout = vout
+        self.secret_hash = secret_hash
+        self.callback = callback
+        self.future = Future()
+
+    def resolve(self, secret: str, spending_tx_id: str):
+        if self.future.done():
+            return
+        logger.info('Secret for %s:%s revealed in transaction %s', self.tx_id, self.vout, spending_tx_id)
+        self.future.set_result(secret)
+        if self.callback:
+            try:
+                self.callback(secret)
+            except Exception:
+                logger.exception('Secret callback failed')
+
+    def fail(self, error: Exception):
+        if not self.future.done():
+            self.future.set_exception(error)
+
+
+class MempoolWatcher(object):
+    '''
+    Listening for new transactions announced by a node and extracting secrets from the ones that are
+    spending watched contract outputs.
+
+    Watcher keeps its own connection to the network (reconnecting when it's lost), asks for every announced
+    transaction and checks its inputs, so the secret is known as soon as the redeem transaction reaches
+    the mempool, without waiting for block explorers.
+
+    Example:
+        >>> from clove.network import Litecoin
+        >>> from clove.network.bitcoin.watcher import MempoolWatcher
+        >>> watcher = MempoolWatcher(Litecoin())
+        >>> watcher.start()
+        >>> future = watcher.watch_contract(contract)
+        >>> future.result(timeout=3600)
+        '6f2a1a5d10ab0d5a37f8b8c3b7dbe14a6d5c4e5a9ab8e1d63e79c6e5f8e2c91b'
+        >>> watcher.stop()
+    '''
+
+    def __init__(self, network, reconnect_interval: int=MEMPOOL_WATCHER_RECONNECT_INTERVAL):
+        self.network = type(network)()
+        self.reconnect_interval = reconnect_interval
+        self.watched = {}
+        self.seen = OrderedDict()
+        self.lock = threading.RLock()
+        self.channel = None
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def watch(self, tx_id: str, vout: int, secret_hash: Optional[str]=None,
+              callback: Optional[Callable]=None) -> Future:
+        '''
+        Watching for the transaction spending given output.
+
+        Args:
+            tx_id (str): address of the transaction with the contract
+            vout (int): index of the contract output
+            secret_hash (str): optional hash (hex) used to verify found secret
+            callback (Callable): function called with the secret
+
+        Returns:
+            Future: resolved with the secret, `ValueError` is raised if the output was spent
+            without revealing the secret (e.g. refunded)
+        '''
+        outpoint = WatchedOutpoint(tx_id, vout, secret_hash, callback)
+        with self.lock:
+            self.watched[(lx(tx_id), vout)] = outpoint
+        return outpoint.future
+
+    def watch_contract(self, contract, callback: Optional[Callable]=None) -> Future:
+        '''Watching for the redeem transaction of the given `BitcoinContract`.'''
+        return self.watch(contract.transaction_address, 0, contract.secret_hash, callback)
+
+    def unwatch(self, tx_id: str, vout: int):
+        with self.lock:
+            outpoint = self.watched.pop((lx(tx_id), vout), None)
+        if outpoint:
+            outpoint.future.cancel()
+
+    def start(self):
+        if self.thread and self.thread.is_alive():
+            return
+        self.stopped.clear()
+        self.thread = threading.Thread(target=self.keep_connected, name=f'clove-watcher-{self.network.name}',
+                                       daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        self.detach()
+        self.network.reset_connection()
+
+    def keep_connected(self):
+        while not self.stopped.is_set():
+            if self.channel is None or self.channel.closed:
+                self.detach()
+                self.attach()
+            self.stopped.wait(self.reconnect_interval)
+        # stop() could be called while connecting
+        self.detach()
+        self.network.reset_connection()
+
+    def attach(self) -> bool:
+        self.network.reset_connection()
+        node = self.network.connect()
+        if node is None:
+            logger.warning('Mempool watcher could not connect to any node, retrying.')
+            return False
+        logger.info('[%s] Mempool watcher connected.', node)
+        self.channel = self.network.get_channel()
+        message_dispatcher.subscribe(self.channel, msg_inv, self.handle_inv)
+        message_dispatcher.subscribe(self.channel, msg_tx, self.handle_tx)
+        return True
+
+    def detach(self):
+        if self.channel is None:
+            return
+        message_dispatcher.unsubscribe(self.channel, msg_inv, self.handle_inv)
+        message_dispatcher.unsubscribe(self.channel, msg_tx, self.handle_tx)
+        self.channel = None
+
+    def remember(self, tx_hash: bytes) -> bool:
+        '''Returns False if the transaction was already seen.'''
+        with self.lock:
+            if tx_hash in self.seen:
+                return False
+            self.seen[tx_hash] = True
+            if len(self.seen) > MEMPOOL_WATCHER_SEEN_INVENTORY:
+                self.seen.popitem(last=False)
+            return True
+
+    def handle_inv(self, message: msg_inv):
+        if not self.watched:
+            return
+        request = msg_getdata()
+        for inventory in message.inv:
+            if inventory.type == MSG_TX and self.remember(inventory.hash):
+                item = CInv()
+                item.type = MSG_TX
+                item.hash = inventory.hash
+                request.inv.append(item)
+        if request.inv and self.channel:
+            self.channel.send(request)
+
+    def handle_tx(self, message: msg_tx):
+        self.check_transaction(message.tx)
+
+    def check_transaction(self, transaction):
+        '''Extracting secrets from the inputs spending watched outputs.'''
+        for tx_in in transaction.vin:
+            with self.lock:
+                outpoint = self.watched.pop((tx_in.prevout.hash, tx_in.prevout.n), None)
+            if outpoint is None:
+                continue
+
+            spending_tx_id = b2lx(transaction.GetHash())
+            try:
+                secret = self.network.extract_secret(scriptsig=b2x(tx_in.scriptSig))
+            except (ValueError, IndexError):
+                outpoint.fail(ValueError(f'Output was spent in {spending_tx_id} without revealing the secret.'))
+                continue
+
+            if outpoint.secret_hash and hashlib.new('ripemd160', x(secret)).hexdigest() != outpoint.secret_hash:
+                outpoint.fail(ValueError(f'Secret from {spending_tx_id} does not match the secret hash.'))
+                continue
+
+            outpoint.resolve(secret, spending_tx_id)
@@ -1,9 +1,11 @@
 from typing import Optional
 
+from clove.block_explorer.fees import served_by_fee_oracle
 from clove.block_explorer.insight import InsightAPIv4
 from clove.network.bitcoin.base import BitcoinBaseNetwork, NoAPI
 from clove.utils.bitcoin import from_base_units
-from clove.utils.external_source import clove_req_json
+from clove.utils.cache import cached
+from clove.utils.external_source import aclove_req_json, clove_req_json
 from clove.utils.logging import logger
 
 
@@ -33,9 +35,21 @@ class Dash(InsightAPIv4, BitcoinBaseNetwork):
     ui_url = 'https://insight.dash.org/insight'
 
     @classmethod
+    @served_by_fee_oracle
+    @cached('fee')
     def get_fee(cls) -> Optional[float]:
         '''Returns actual fee per kb.'''
-        response = clove_req_json('https://api.blockcypher.com/v1/dash/main')
+        return cls._parse_blockcypher_fee(clove_req_json('https://api.blockcypher.com/v1/dash/main'))
+
+    @classmethod
+    @served_by_fee_oracle
+    @cached('fee')
+    async def aget_fee(cls) -> Optional[float]:
+        '''Asynchronous version of the `get_fee` method.'''
+        return cls._parse_blockcypher_fee(await aclove_req_json('https://api.blockcypher.com/v1/dash/main'))
+
+    @classmethod
+    def _parse_blockcypher_fee(cls, response: dict) -> Optional[float]:
         fee = response.get('high_fee_per_kb')
         if not fee:
             logger.error('Cannot find the right key (high_fee_per_kb) while getting fee in blockcypher.')
@@ -36,6 +36,7 @@ class Monacoin(InsightAPIv4, BitcoinBaseNetwork):
         except CBitcoinSecretError:
             cls.base58_prefixes['SECRET_KEY'], cls.alternative_secret_key = \
                 cls.alternative_secret_key, cls.base58_prefixes['SECRET_KEY']
+            cls.reset_params()
             return super().get_wallet(*args, **kwargs)
 
 
@@ -1,6 +1,10 @@
+from typing import Optional
+
+from clove.block_explorer.fees import served_by_fee_oracle
 from clove.block_explorer.insight import InsightAPIv4
 from clove.network.bitcoin.base import BitcoinBaseNetwork
-from clove.utils.external_source import clove_req_json
+from clove.utils.cache import cached
+from clove.utils.external_source import aclove_req_json, clove_req_json
 from clove.utils.logging import logger
 
 
@@ -28,19 +32,33 @@ class Ravencoin(InsightAPIv4, BitcoinBaseNetwork):
     ui_url = 'https://ravencoin.network'
 
     @classmethod
+    @served_by_fee_oracle
+    @cached('fee')
     def get_fee(cls) -> float:
         """Ravencoin has a different endpoint for fee (estimatesmartfee, not estimatefee)"""
+        fee = cls._parse_smart_fee(clove_req_json(f'{cls.api_url}/utils/estimatesmartfee?nbBlocks=1'))
+        return fee if fee is not None else cls._calculate_fee()
+
+    @classmethod
+    @served_by_fee_oracle
+    @cached('fee')
+    async def aget_fee(cls) -> float:
+        '''Asynchronous version of the `get_fee` method.'''
+        fee = cls._parse_smart_fee(await aclove_req_json(f'{cls.api_url}/utils/estimatesmartfee?nbBlocks=1'))
+        return fee if fee is not None else await cls._acalculate_fee()
+
+    @classmethod
+    def _parse_smart_fee(cls, response: dict) -> Optional[float]:
         try:
-            fee = clove_req_json(f'{cls.api_url}/utils/estimatesmartfee?nbBlocks=1')['1']
+            fee = response['1']
         except (TypeError, KeyError):
             logger.error(
                 f'Incorrect response from API when getting fee from {cls.api_url}/utils/estimatefee?nbBlocks=1'
             )
-            return cls._calculate_fee()
+            return
         if fee > 0:
             return fee
         logger.warning(f'({cls.symbols[0]}) Got fee = 0, calculating manually')
-        return cls._calculate_fee()
 
 
 class RavencoinTestNet(Ravencoin):
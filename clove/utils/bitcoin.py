@@ -1,6 +1,10 @@
 from functools import wraps
+import threading
 
-from bitcoin.core import COIN
+import bitcoin
+from bitcoin.base58 import Base58Error, CBase58Data
+from bitcoin.core import COIN, Hash160, script
+from bitcoin.wallet import CBitcoinAddressError
 
 
 def from_base_units(value):
@@ -11,6 +15,42 @@ def to_base_units(value):
     return round(value * COIN)
 
 
+class ThreadLocalParams(object):
+    '''
+    Replacement for the global python-bitcoinlib params (`bitcoin.params` and `bitcoin.core.coreparams`).
+
+    Every attribute is read from the params selected in the current thread, so switching params for
+    one network does not affect the code that is working with another network in a different thread.
+    '''
+
+    def __init__(self, default):
+        object.__setattr__(self, 'default', default)
+        object.__setattr__(self, 'local', threading.local())
+
+    def select(self, params):
+        self.local.params = params
+
+    @property
+    def selected(self):
+        return getattr(self.local, 'params', None) or self.default
+
+    def __getattr__(self, name):
+        return getattr(self.selected, name)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('Use select_params() to change chain params.')
+
+
+thread_local_params = ThreadLocalParams(bitcoin.MainParams())
+
+
+def select_params(params):
+    '''Selecting chain params for python-bitcoinlib in the current thread only.'''
+    if bitcoin.params is not thread_local_params or bitcoin.core.coreparams is not thread_local_params:
+        bitcoin.params = bitcoin.core.coreparams = thread_local_params
+    thread_local_params.select(params)
+
+
 def auto_switch_params(args_index: int = 0):
     def wrap(f):
         @wraps(f)
@@ -22,3 +62,75 @@ def auto_switch_params(args_index: int = 0):
             return f(*args, **kwargs)
         return wrapped
     return wrap
+
+
+def address_to_hash160(address: str, params) -> (bytes, bool):
+    '''
+    Decoding base58 address with the given chain params.
+
+    Returns:
+        tuple: 20 bytes hash and flag for P2SH addresses
+
+    Raises:
+        CBitcoinAddressError: if address is not valid in the network with given params
+    '''
+    try:
+        data = CBase58Data(address)
+    except (Base58Error, ValueError) as e:
+        raise CBitcoinAddressError(str(e))
+
+    if len(data) != 20:
+        raise CBitcoinAddressError(f'Address should contain 20 bytes, got {len(data)}')
+    if data.nVersion == params.BASE58_PREFIXES['PUBKEY_ADDR']:
+        return data.to_bytes(), False
+    if data.nVersion == params.BASE58_PREFIXES['SCRIPT_ADDR']:
+        return data.to_bytes(), True
+    raise CBitcoinAddressError(f'Version {data.nVersion} not a recognized address version in {params.NAME}')
+
+
+def hash160_to_address(hash160: bytes, params, p2sh: bool=False) -> str:
+    '''Encoding 20 bytes hash into base58 address with the given chain params.'''
+    prefix = params.BASE58_PREFIXES['SCRIPT_ADDR' if p2sh else 'PUBKEY_ADDR']
+    return str(CBase58Data.from_bytes(hash160, prefix))
+
+
+def pubkey_to_address(pubkey: bytes, params) -> str:
+    return hash160_to_address(Hash160(pubkey), params)
+
+
+def address_to_script_pubkey(address: str, params) -> script.CScript:
+    '''Building P2PKH or P2SH scriptPubKey for the given address.'''
+    hash160, p2sh = address_to_hash160(address, params)
+    if p2sh:
+        return script.CScript([script.OP_HASH160, hash160, script.OP_EQUAL])
+    return script.CScript([script.OP_DUP, script.OP_HASH160, hash160, script.OP_EQUALVERIFY, script.OP_CHECKSIG])
+
+
+def script_pubkey_to_address(script_pubkey: script.CScript, params) -> str:
+    '''
+    Converting P2PKH or P2SH scriptPubKey into address.
+
+    Raises:
+        CBitcoinAddressError: for other types of scripts
+    '''
+    script_pubkey = script.CScript(script_pubkey)
+    if script_pubkey.is_p2sh():
+        return hash160_to_address(script_pubkey[2:22], params, p2sh=True)
+    if (
+        len(script_pubkey) == 25
+        and script_pubkey[0] == script.OP_DUP
+        and script_pubkey[1] == script.OP_HASH160
+        and script_pubkey[2] == 0x14
+        and script_pubkey[23] == script.OP_EQUALVERIFY
+        and script_pubkey[24] == script.OP_CHECKSIG
+    ):
+        return hash160_to_address(script_pubkey[3:23], params)
+    raise CBitcoinAddressError('Script is not a P2PKH or P2SH scriptPubKey')
+
+
+def is_valid_address(address: str, params) -> bool:
+    try:
+        address_to_hash160(address, params)
+    except CBitcoinAddressError:
+        return False
+    return True
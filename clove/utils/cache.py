@@ -0,0 +1,369 @@
+import asyncio
+from collections import OrderedDict
+from concurrent.futures import Future
+from functools import wraps
+import json
+import os
+import sqlite3
+import threading
+from time import time
+from typing import Any, Callable, Optional, Tuple
+
+from clove.constants import RESPONSE_CACHE_IMMUTABLE_CONFIRMATIONS, RESPONSE_CACHE_MAX_SIZE, RESPONSE_CACHE_TTL
+from clove.utils.logging import logger
+
+MISSING = object()
+'''Marker of the cache miss (None is a valid cached value for backends).'''
+
+
+class MemoryCache(object):
+    '''
+    In-memory LRU cache with expiring entries, least recently used entries are dropped above `max_size`.
+
+    Entries stored without `ttl` never expire.
+    '''
+
+    def __init__(self, max_size: int=RESPONSE_CACHE_MAX_SIZE):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key: str) -> Any:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return MISSING
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time():
+                del self.entries[key]
+                return MISSING
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float]=None):
+        with self.lock:
+            self.entries[key] = (value, time() + ttl if ttl is not None else None)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def delete(self, key: str):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class DiskCache(object):
+    '''
+    Cache kept in the SQLite database, values are stored as JSON.
+
+    Expired entries are removed when they are read or when `purge` is called.
+    '''
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.RLock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute('''
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                expires_at REAL
+            )
+        ''')
+        self.connection.commit()
+
+    def get(self, key: str) -> Any:
+        with self.lock:
+            try:
+                row = self.connection.execute(
+                    'SELECT value, expires_at FROM responses WHERE key = ?', (key, )
+                ).fetchone()
+            except sqlite3.Error as e:
+                logger.warning('Unable to read cached response: %s', e)
+                return MISSING
+            if row is None:
+                return MISSING
+            value, expires_at = row
+            if expires_at is not None and expires_at <= time():
+                self.delete(key)
+                return MISSING
+        return json.loads(value)
+
+    def set(self, key: str, value: Any, ttl: Optional[float]=None):
+        try:
+            serialized = json.dumps(value)
+        except (TypeError, ValueError):
+            logger.debug('Response for %s cannot be serialized, skipping the cache', key)
+            return
+        with self.lock:
+            try:
+                self.connection.execute(
+                    'INSERT OR REPLACE INTO responses (key, value, expires_at) VALUES (?, ?, ?)',
+                    (key, serialized, time() + ttl if ttl is not None else None),
+                )
+                self.connection.commit()
+            except sqlite3.Error as e:
+                logger.warning('Unable to cache response: %s', e)
+
+    def delete(self, key: str):
+        with self.lock:
+            self.connection.execute('DELETE FROM responses WHERE key = ?', (key, ))
+            self.connection.commit()
+
+    def purge(self):
+        '''Removing expired entries.'''
+        with self.lock:
+            self.connection.execute('DELETE FROM responses WHERE expires_at <= ?', (time(), ))
+            self.connection.commit()
+
+    def clear(self):
+        with self.lock:
+            self.connection.execute('DELETE FROM responses')
+            self.connection.commit()
+
+
+class ResponseCache(object):
+    '''
+    Caching block explorer responses with protection against cache stampedes.
+
+    Concurrent lookups of the same missing key make only one request, other callers wait for its result.
+    Empty (`None`) responses are never cached, so failed requests are retried on the next call.
+
+    Args:
+        backend: `MemoryCache`, `DiskCache` or any object with the same `get`/`set`/`delete`/`clear` methods
+        enabled (bool): caching can be turned off (e.g. with the `CLOVE_CACHE_DISABLED` environment variable)
+
+    Example:
+        >>> from clove.utils.cache import response_cache
+        >>> response_cache.get_or_fetch('btc:fee', lambda: 0.0002, ttl=60)
+        0.0002
+        >>> response_cache.get_or_fetch('btc:fee', lambda: 0.0005, ttl=60)
+        0.0002
+    '''
+
+    def __init__(self, backend=None, enabled: bool=True):
+        self.backend = backend if backend is not None else MemoryCache()
+        self.enabled = enabled
+        self.pending = {}
+        self.async_pending = {}
+        self.lock = threading.Lock()
+
+    def get_or_fetch(self, key: str, fetch: Callable, ttl: Optional[float]=None,
+                     immutable: Optional[Callable[[Any], bool]]=None, refresh: Optional[Callable]=None) -> Any:
+        '''
+        Returning cached value or fetching and storing it.
+
+        Args:
+            key (str): cache key
+            fetch (Callable): function returning the fresh value
+            ttl (float): seconds after which the value expires
+            immutable (Callable): function that takes the value and returns True if it will never change,
+                such values are cached without expiration
+            refresh (Callable): function that takes the cached value and updates its changing parts,
+                it's called on cache hits only (outside of the lock)
+
+        Returns:
+            cached or fetched value
+        '''
+        if not self.enabled:
+            return fetch()
+
+        with self.lock:
+            value = self.backend.get(key)
+            hit = value is not MISSING
+            if hit:
+                logger.debug('Cache hit: %s', key)
+            else:
+                future = self.pending.get(key)
+                leader = future is None
+                if leader:
+                    future = self.pending[key] = Future()
+
+        if hit:
+            return refresh(value) if refresh is not None else value
+
+        if not leader:
+            logger.debug('Waiting for the pending request: %s', key)
+            return future.result()
+
+        try:
+            value = fetch()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            if value is not None:
+                forever = immutable is not None and immutable(value)
+                self.backend.set(key, value, None if forever else ttl)
+            future.set_result(value)
+            return value
+        finally:
+            with self.lock:
+                self.pending.pop(key, None)
+
+    async def aget_or_fetch(self, key: str, fetch: Callable, ttl: Optional[float]=None,
+                            immutable: Optional[Callable[[Any], bool]]=None, refresh: Optional[Callable]=None) -> Any:
+        '''
+        Asynchronous version of the `get_or_fetch` method, `fetch` and `refresh` are coroutine functions.
+
+        Concurrent lookups in the same event loop wait for the single pending request.
+        '''
+        if not self.enabled:
+            return await fetch()
+
+        value = self.backend.get(key)
+        if value is not MISSING:
+            logger.debug('Cache hit: %s', key)
+            return await refresh(value) if refresh is not None else value
+
+        pending_key = (asyncio.get_event_loop(), key)
+        future = self.async_pending.get(pending_key)
+        if future is not None:
+            logger.debug('Waiting for the pending request: %s', key)
+            return await asyncio.shield(future)
+
+        future = self.async_pending[pending_key] = asyncio.get_event_loop().create_future()
+        try:
+            value = await fetch()
+        except BaseException as e:
+            future.set_exception(e)
+            # waiters get the exception, do not report it as never retrieved
+            future.exception()
+            raise
+        else:
+            if value is not None:
+                forever = immutable is not None and immutable(value)
+                self.backend.set(key, value, None if forever else ttl)
+            future.set_result(value)
+            return value
+        finally:
+            self.async_pending.pop(pending_key, None)
+
+    def invalidate(self, key: str):
+        self.backend.delete(key)
+
+    def clear(self):
+        self.backend.clear()
+
+
+def get_default_backend():
+    path = os.environ.get('CLOVE_CACHE_PATH')
+    return DiskCache(path) if path else MemoryCache()
+
+
+response_cache = ResponseCache(get_default_backend(), enabled=not os.environ.get('CLOVE_CACHE_DISABLED'))
+'''Block explorer responses cache shared by all networks.'''
+
+
+def is_confirmed_transaction(cls, tx_json: dict) -> bool:
+    '''Transactions with enough confirmations will not change anymore.'''
+    try:
+        confirmations = cls.get_confirmations_from_tx_json(tx_json)
+    except (KeyError, TypeError, AttributeError):
+        return False
+    return bool(confirmations) and confirmations >= RESPONSE_CACHE_IMMUTABLE_CONFIRMATIONS
+
+
+def _with_confirmations(cls, tx_json: dict, latest_block: Optional[int]) -> dict:
+    if not isinstance(latest_block, int):
+        return tx_json
+    confirmations = latest_block - cls.get_block_height_from_tx_json(tx_json) + 1
+    return dict(tx_json, confirmations=max(confirmations, cls.get_confirmations_from_tx_json(tx_json)))
+
+
+def refresh_confirmations(cls, tx_json: dict) -> dict:
+    '''
+    Counting confirmations of the transaction cached without expiration from its block height.
+
+    Confirmed transactions are cached forever but their `confirmations` field keeps changing,
+    so it's recounted from the latest block every time the cached transaction is returned.
+    '''
+    if not is_confirmed_transaction(cls, tx_json) or cls.get_block_height_from_tx_json(tx_json) is None:
+        return tx_json
+    try:
+        latest_block = cls.get_latest_block()
+    except Exception:
+        logger.warning('Cannot get latest block, returning cached confirmations (%s)', cls.symbols[0])
+        return tx_json
+    return _with_confirmations(cls, tx_json, latest_block)
+
+
+async def arefresh_confirmations(cls, tx_json: dict) -> dict:
+    '''Asynchronous version of the `refresh_confirmations` function.'''
+    if not is_confirmed_transaction(cls, tx_json) or cls.get_block_height_from_tx_json(tx_json) is None:
+        return tx_json
+    try:
+        latest_block = await cls.aget_latest_block()
+    except Exception:
+        logger.warning('Cannot get latest block, returning cached confirmations (%s)', cls.symbols[0])
+        return tx_json
+    return _with_confirmations(cls, tx_json, latest_block)
+
+
+def cached(endpoint: str, immutable: Optional[Callable[[Any, Any], bool]]=None,
+           refresh: Optional[Callable[[Any, Any], Any]]=None):
+    '''
+    Decorator caching results of the block explorer class method.
+
+    Cache key is built from the network name, endpoint name and call arguments, so synchronous
+    and asynchronous (coroutine) methods of the same endpoint share cached values.
+    Expiration time is taken from the `RESPONSE_CACHE_TTL` setting for the endpoint.
+
+    Args:
+        endpoint (str): endpoint name, key of the `RESPONSE_CACHE_TTL` setting
+        immutable (Callable): function that takes the class and returned value and returns True
+            if value should be cached without expiration
+        refresh (Callable): function that takes the class and cached value and updates the parts of the value
+            that can change, called on cache hits (it's a coroutine function for asynchronous methods)
+
+    Example:
+        >>> class Explorer(BaseAPI):
+        ...     @classmethod
+        ...     @cached('transaction', immutable=is_confirmed_transaction, refresh=refresh_confirmations)
+        ...     def get_transaction(cls, tx_address: str) -> dict:
+        ...         return clove_req_json(f'{cls.api_url}/tx/{tx_address}')
+    '''
+
+    def decorator(method: Callable) -> Callable:
+
+        if asyncio.iscoroutinefunction(method):
+            @wraps(method)
+            async def async_wrapper(cls, *args, **kwargs):
+                return await response_cache.aget_or_fetch(
+                    cache_key(cls, endpoint, args, kwargs),
+                    lambda: method(cls, *args, **kwargs),
+                    ttl=RESPONSE_CACHE_TTL.get(endpoint),
+                    immutable=(lambda value: immutable(cls, value)) if immutable else None,
+                    refresh=(lambda value: refresh(cls, value)) if refresh else None,
+                )
+            return async_wrapper
+
+        @wraps(method)
+        def wrapper(cls, *args, **kwargs):
+            return response_cache.get_or_fetch(
+                cache_key(cls, endpoint, args, kwargs),
+                lambda: method(cls, *args, **kwargs),
+                ttl=RESPONSE_CACHE_TTL.get(endpoint),
+                immutable=(lambda value: immutable(cls, value)) if immutable else None,
+                refresh=(lambda value: refresh(cls, value)) if refresh else None,
+            )
+        return wrapper
+
+    return decorator
+
+
+def cache_key(cls, endpoint: str, args: Tuple, kwargs: dict) -> str:
+    network = getattr(cls, 'name', None) or cls.__name__
+    # backends of the composite explorer share the network name but return differently shaped responses
+    explorer = getattr(cls, 'explorer_name', None)
+    if explorer:
+        network = f'{network}:{explorer}'
+    arguments = [str(argument) for argument in args] + [f'{k}={v}' for k, v in sorted(kwargs.items())]
+    return ':'.join([network, endpoint] + arguments)
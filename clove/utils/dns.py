@@ -0,0 +1,182 @@
+from concurrent.futures import ThreadPoolExecutor, wait
+import json
+import os
+import socket
+import threading
+from time import time
+from typing import Iterable, Optional
+
+from clove.constants import DNS_RESOLVE_MAX_WORKERS, DNS_RESOLVE_TIMEOUT, DNS_SEED_NEGATIVE_TTL, DNS_SEED_TTL
+from clove.utils.logging import logger
+
+
+class CacheEntry(object):
+
+    def __init__(self, nodes: list, expires_at: float, failures: int=0):
+        self.nodes = nodes
+        self.expires_at = expires_at
+        self.failures = failures
+
+    def is_expired(self, now: Optional[float]=None) -> bool:
+        return (now or time()) >= self.expires_at
+
+    def to_dict(self) -> dict:
+        return {'nodes': self.nodes, 'expires_at': self.expires_at, 'failures': self.failures}
+
+
+class SeedResolver(object):
+    '''
+    Resolving DNS seeds concurrently and keeping results in a TTL cache.
+
+    Seeds that did not resolve (or resolved to nothing) are cached as well, for `negative_ttl` seconds
+    doubled with every consecutive failure (but never longer than `ttl`), so dead seeds don't cost
+    a resolver timeout on every connection attempt.
+
+    If `cache_path` is given (by default taken from the `CLOVE_DNS_CACHE` environment variable) the cache
+    is loaded from and saved to this JSON file.
+
+    Example:
+        >>> from clove.utils.dns import seed_resolver
+        >>> seed_resolver.resolve_many(['seed.bitcoin.sipa.be', 'dnsseed.bluematt.me'])
+        {'seed.bitcoin.sipa.be': ['5.9.2.145', ...], 'dnsseed.bluematt.me': []}
+    '''
+
+    def __init__(
+        self,
+        ttl: int=DNS_SEED_TTL,
+        negative_ttl: int=DNS_SEED_NEGATIVE_TTL,
+        timeout: float=DNS_RESOLVE_TIMEOUT,
+        max_workers: int=DNS_RESOLVE_MAX_WORKERS,
+        cache_path: Optional[str]=None,
+    ):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.timeout = timeout
+        self.max_workers = max_workers
+        self.cache_path = cache_path
+        self.cache = {}
+        self.pending = {}
+        self.lock = threading.RLock()
+        self.executor = None
+        if cache_path:
+            self.load()
+
+    def get_executor(self) -> ThreadPoolExecutor:
+        with self.lock:
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(max_workers=self.max_workers)
+            return self.executor
+
+    def get_cached(self, seed: str) -> Optional[list]:
+        with self.lock:
+            entry = self.cache.get(seed)
+            if entry is None or entry.is_expired():
+                return
+            return entry.nodes
+
+    def store(self, seed: str, nodes: list):
+        with self.lock:
+            if nodes:
+                self.cache[seed] = CacheEntry(nodes, time() + self.ttl)
+                return
+            previous = self.cache.get(seed)
+            failures = previous.failures + 1 if previous else 1
+            negative_ttl = min(self.negative_ttl * 2 ** (failures - 1), self.ttl)
+            logger.debug('Seed %s is not responding, skipping it for %s seconds', seed, negative_ttl)
+            self.cache[seed] = CacheEntry([], time() + negative_ttl, failures)
+
+    @staticmethod
+    def lookup(seed: str) -> list:
+        logger.debug('Getting nodes from seed node %s', seed)
+        try:
+            hostname, alias, nodes = socket.gethostbyname_ex(seed)
+        except (socket.herror, socket.gaierror, socket.timeout, UnicodeError):
+            return []
+        logger.debug('Got %s nodes from %s', len(nodes), seed)
+        return nodes
+
+    def lookup_and_store(self, seed: str) -> list:
+        nodes = []
+        try:
+            nodes = self.lookup(seed)
+        finally:
+            with self.lock:
+                self.store(seed, nodes)
+                self.pending.pop(seed, None)
+        return nodes
+
+    def submit(self, seed: str):
+        '''Starting the lookup in the background, unless there is one in progress for this seed already.'''
+        with self.lock:
+            future = self.pending.get(seed)
+            if future is None:
+                future = self.pending[seed] = self.get_executor().submit(self.lookup_and_store, seed)
+            return future
+
+    def resolve(self, seed: str) -> list:
+        return self.resolve_many([seed])[seed]
+
+    def resolve_many(self, seeds: Iterable[str]) -> dict:
+        '''
+        Resolving seeds that are not in the cache in parallel.
+
+        Lookups that didn't finish in `timeout` seconds are returned as empty lists,
+        their results will be cached when they finish.
+
+        Args:
+            seeds (Iterable[str]): seed hostnames
+
+        Returns:
+            dict: nodes for every seed
+        '''
+        seeds = list(dict.fromkeys(seeds))
+        results = {}
+        futures = {}
+        for seed in seeds:
+            nodes = self.get_cached(seed)
+            if nodes is None:
+                futures[seed] = self.submit(seed)
+            else:
+                results[seed] = nodes
+
+        if futures:
+            wait(futures.values(), timeout=self.timeout)
+            for seed, future in futures.items():
+                results[seed] = future.result() if future.done() and not future.exception() else []
+            self.save()
+
+        return {seed: results[seed] for seed in seeds}
+
+    def clear(self):
+        with self.lock:
+            self.cache.clear()
+
+    def load(self):
+        try:
+            with open(self.cache_path) as cache_file:
+                data = json.load(cache_file)
+        except (OSError, ValueError):
+            return
+        with self.lock:
+            for seed, entry in data.items():
+                try:
+                    self.cache[seed] = CacheEntry(list(entry['nodes']), float(entry['expires_at']), entry['failures'])
+                except (KeyError, TypeError, ValueError):
+                    continue
+
+    def save(self):
+        if not self.cache_path:
+            return
+        with self.lock:
+            data = {seed: entry.to_dict() for seed, entry in self.cache.items() if not entry.is_expired()}
+        temporary_path = f'{self.cache_path}.tmp'
+        try:
+            with open(temporary_path, 'w') as cache_file:
+                json.dump(data, cache_file)
+            os.replace(temporary_path, self.cache_path)
+        except OSError as e:
+            logger.warning('Unable to save DNS seeds cache: %s', e)
+
+
+seed_resolver = SeedResolver(cache_path=os.environ.get('CLOVE_DNS_CACHE'))
+'''DNS seeds resolver shared by all Bitcoin-based networks.'''
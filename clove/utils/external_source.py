@@ -1,23 +1,168 @@
+import asyncio
+import threading
 import time
+from typing import Optional, Tuple, Union
+from urllib.parse import urlparse
+import weakref
 
 import requests
+from requests.adapters import HTTPAdapter
 
+from clove.constants import (
+    HTTP_CONNECT_TIMEOUT,
+    HTTP_POOL_CONNECTIONS,
+    HTTP_POOL_MAXSIZE,
+    HTTP_READ_TIMEOUT,
+    RATE_LIMIT_MAX_RETRIES,
+)
 from clove.exceptions import ExternalApiRequestLimitExceeded
 from clove.utils.logging import logger
+from clove.utils.rate_limit import rate_limiter
 
 
-def clove_req_json(url: str, post_data={}):
+class HttpSessions(object):
+    '''
+    Keep-alive HTTP session shared by all block explorer requests (from all threads).
+
+    The session keeps a thread-safe connection pool per host, so subsequent requests to the same explorer
+    reuse the TCP (and TLS) connection, also when they are made from short-lived worker threads.
+    Requests don't change the session state (headers, cookies are not used by explorers), so it's safe
+    to share it between threads.
+
+    Args:
+        pool_connections (int): number of hosts with pooled connections
+        pool_maxsize (int): number of connections kept per host
+        timeout (tuple): connect and read timeout in seconds used by default
+
+    Example:
+        >>> from clove.utils.external_source import http_sessions
+        >>> http_sessions.get().get('https://api.blockcypher.com/v1/btc/main', timeout=http_sessions.timeout)
+        <Response [200]>
+    '''
+
+    def __init__(
+        self,
+        pool_connections: int=HTTP_POOL_CONNECTIONS,
+        pool_maxsize: int=HTTP_POOL_MAXSIZE,
+        timeout: Tuple[float, float]=(HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT),
+    ):
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.timeout = timeout
+        self.session = None
+        self.lock = threading.Lock()
+
+    def create_session(self) -> requests.Session:
+        session = requests.Session()
+        session.headers.update({
+            'User-Agent': 'Clove',
+            'Accept': 'application/json',
+            'Accept-Encoding': 'gzip, deflate',
+            'Connection': 'keep-alive',
+        })
+        adapter = HTTPAdapter(pool_connections=self.pool_connections, pool_maxsize=self.pool_maxsize)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+
+    def get(self) -> requests.Session:
+        '''Returns the shared session.'''
+        with self.lock:
+            if self.session is None:
+                self.session = self.create_session()
+            return self.session
+
+    def close(self):
+        '''Closing all pooled connections, the session is created again on the next request.'''
+        with self.lock:
+            session, self.session = self.session, None
+        if session is not None:
+            session.close()
+
+
+http_sessions = HttpSessions()
+'''HTTP session used by `clove_req_json`.'''
+
+
+def import_aiohttp():
+    try:
+        import aiohttp
+    except ImportError:
+        raise ImportError('Asynchronous block explorers require aiohttp, install clove with the "async" extra.')
+    return aiohttp
+
+
+class AsyncHttpSessions(object):
+    '''
+    Keep-alive `aiohttp` sessions shared by asynchronous block explorer requests.
+
+    `aiohttp.ClientSession` is bound to the event loop, so every loop gets its own session.
+    Sessions of loops that were garbage collected are dropped automatically.
+
+    Args:
+        limit_per_host (int): number of connections kept per host
+        timeout (tuple): connect and read timeout in seconds used by default
+    '''
+
+    def __init__(
+        self,
+        limit_per_host: int=HTTP_POOL_MAXSIZE,
+        timeout: Tuple[float, float]=(HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT),
+    ):
+        self.limit_per_host = limit_per_host
+        self.timeout = timeout
+        self.sessions = weakref.WeakKeyDictionary()
+
+    def get(self):
+        '''Returns session of the current event loop.'''
+        aiohttp = import_aiohttp()
+        loop = asyncio.get_event_loop()
+        session = self.sessions.get(loop)
+        if session is None or session.closed:
+            session = self.sessions[loop] = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit_per_host=self.limit_per_host),
+                headers={'User-Agent': 'Clove', 'Accept': 'application/json'},
+                auto_decompress=True,
+            )
+        return session
+
+    def client_timeout(self, timeout: Optional[Union[float, Tuple[float, float]]]=None):
+        aiohttp = import_aiohttp()
+        timeout = timeout or self.timeout
+        if isinstance(timeout, tuple):
+            return aiohttp.ClientTimeout(sock_connect=timeout[0], sock_read=timeout[1])
+        return aiohttp.ClientTimeout(total=timeout)
+
+    async def close(self):
+        '''Closing the session of the current event loop.'''
+        session = self.sessions.pop(asyncio.get_event_loop(), None)
+        if session is not None:
+            await session.close()
+
+
+async_http_sessions = AsyncHttpSessions()
+'''aiohttp sessions used by `aclove_req_json`.'''
+
+
+def clove_req_json(url: str, post_data={}, timeout: Optional[Union[float, Tuple[float, float]]]=None):
     """
     Make a request with Clove user-agent header and return json response
 
+    Requests go through the pooled keep-alive session, so connections to the same host are reused.
+    Requests are throttled per host by the `rate_limiter`, responses with status code 429 are retried
+    after the backoff (Retry-After header is respected).
+
     Args:
         url (str): url to get data from
+        post_data (dict): data to send with POST request, GET request is made if empty
+        timeout (float, tuple): connect and read timeout, `HTTP_CONNECT_TIMEOUT` and `HTTP_READ_TIMEOUT`
+            by default
 
     Returns:
         dict: response data
 
     Raises:
-        ExternalApiRequestLimitExceeded: if response status code is 429
+        ExternalApiRequestLimitExceeded: if response status code is still 429 after `RATE_LIMIT_MAX_RETRIES` retries
 
     Example:
         >>> from clove.utils.external_source import clove_req_json
@@ -39,21 +184,79 @@ def clove_req_json(url: str, post_data={}):
     logger.debug('  Requesting: %s', url)
     request_start = time.time()
 
-    if post_data:
-        resp = requests.post(url, data=post_data)
-    else:
-        resp = requests.get(url, headers={'User-Agent': 'Clove'})
+    session = http_sessions.get()
+    timeout = timeout or http_sessions.timeout
+    host = urlparse(url).netloc
+    for attempt in range(RATE_LIMIT_MAX_RETRIES + 1):
+        rate_limiter.acquire(host)
+        if post_data:
+            resp = session.post(url, data=post_data, timeout=timeout)
+        else:
+            resp = session.get(url, timeout=timeout)
+        if resp.status_code != 429:
+            rate_limiter.succeeded(host)
+            break
+        if attempt == RATE_LIMIT_MAX_RETRIES:
+            logger.error(f'Requests limit exceeded when requesting url: {url}')
+            raise ExternalApiRequestLimitExceeded(f'url: {url}')
+        delay = rate_limiter.throttled(host, attempt, resp.headers.get('Retry-After'))
+        logger.warning(f'Requests limit exceeded when requesting url: {url}, retrying in {delay:.1f}s')
 
     response_time = time.time() - request_start
     logger.debug('Got response: %s [%.2fs]', url, response_time)
 
-    if resp.status_code == 429:
-        logger.error(f'Requests limit exceeded when requesting url: {url}')
-        raise ExternalApiRequestLimitExceeded(f'url: {url}')
-
     if resp.status_code != 200:
         logger.error(f'Unexpected status code when requesting url: {url}')
         logger.debug(resp.content)
         return
 
     return resp.json()
+
+
+async def aclove_req_json(url: str, post_data={}, timeout: Optional[Union[float, Tuple[float, float]]]=None):
+    '''
+    Asynchronous version of the `clove_req_json` function (requires aiohttp).
+
+    Example:
+        >>> from clove.utils.external_source import aclove_req_json
+        >>> await aclove_req_json('https://insight.bitpay.com/api/status?q=getInfo')
+        {'info': {'blocks': 541783, ...}}
+    '''
+    logger.debug('  Requesting: %s', url)
+    request_start = time.time()
+
+    session = async_http_sessions.get()
+    timeout = async_http_sessions.client_timeout(timeout)
+    host = urlparse(url).netloc
+    for attempt in range(RATE_LIMIT_MAX_RETRIES + 1):
+        await rate_limiter.aacquire(host)
+        if post_data:
+            request = session.post(url, data=post_data, timeout=timeout)
+        else:
+            request = session.get(url, timeout=timeout)
+        async with request as resp:
+            status_code = resp.status
+            if status_code == 200:
+                data = await resp.json(content_type=None)
+            elif status_code == 429:
+                retry_after = resp.headers.get('Retry-After')
+            else:
+                content = await resp.read()
+        if status_code != 429:
+            rate_limiter.succeeded(host)
+            break
+        if attempt == RATE_LIMIT_MAX_RETRIES:
+            logger.error(f'Requests limit exceeded when requesting url: {url}')
+            raise ExternalApiRequestLimitExceeded(f'url: {url}')
+        delay = rate_limiter.throttled(host, attempt, retry_after)
+        logger.warning(f'Requests limit exceeded when requesting url: {url}, retrying in {delay:.1f}s')
+
+    response_time = time.time() - request_start
+    logger.debug('Got response: %s [%.2fs]', url, response_time)
+
+    if status_code != 200:
+        logger.error(f'Unexpected status code when requesting url: {url}')
+        logger.debug(content)
+        return
+
+    return data
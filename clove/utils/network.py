@@ -1,22 +1,63 @@
+from types import MappingProxyType
+
 from bitcoin import GenericParams
 
 
+class ChainParams(GenericParams):
+    '''
+    Immutable chain params of a single network.
+
+    Objects of this class are created once per network class (see `BitcoinBaseNetwork.get_params`),
+    so they can be safely shared between threads.
+    '''
+
+    def __init__(self, **params):
+        for key, value in params.items():
+            if isinstance(value, dict):
+                value = MappingProxyType(dict(value))
+            object.__setattr__(self, key, value)
+
+    def __setattr__(self, key, value):
+        raise AttributeError('Chain params are immutable.')
+
+    def __delattr__(self, key):
+        raise AttributeError('Chain params are immutable.')
+
+    def __repr__(self):
+        return f'ChainParams(name={self.NAME})'
+
+
 def generate_params_object(
     message_start=b'', default_port=None, rpc_port=None,
     dns_seeds=(), base58_prefixes={}, max_money=None, genesis_block=None,
     proof_of_work_limit=None, subsidy_halving_interval=None, name=None
-) -> GenericParams:
-
-    params_obj = GenericParams()
-    params_obj.MESSAGE_START = message_start
-    params_obj.DEFAULT_PORT = default_port
-    params_obj.RPC_PORT = rpc_port
-    params_obj.DNS_SEEDS = dns_seeds
-    params_obj.BASE58_PREFIXES = base58_prefixes
-    params_obj.MAX_MONEY = max_money
-    params_obj.GENESIS_BLOCK = genesis_block
-    params_obj.PROOF_OF_WORK_LIMIT = proof_of_work_limit
-    params_obj.SUBSIDY_HALVING_INTERVAL = subsidy_halving_interval
-    params_obj.NAME = name
-
-    return params_obj
+) -> ChainParams:
+
+    return ChainParams(
+        MESSAGE_START=message_start,
+        DEFAULT_PORT=default_port,
+        RPC_PORT=rpc_port,
+        DNS_SEEDS=dns_seeds,
+        BASE58_PREFIXES=base58_prefixes,
+        MAX_MONEY=max_money,
+        GENESIS_BLOCK=genesis_block,
+        PROOF_OF_WORK_LIMIT=proof_of_work_limit,
+        SUBSIDY_HALVING_INTERVAL=subsidy_halving_interval,
+        NAME=name,
+    )
+
+
+def convert_params_object(params_obj: GenericParams) -> ChainParams:
+    '''Converting python-bitcoinlib params (eg. `bitcoin.MainParams()`) into immutable params object.'''
+    return generate_params_object(
+        message_start=params_obj.MESSAGE_START,
+        default_port=params_obj.DEFAULT_PORT,
+        rpc_port=params_obj.RPC_PORT,
+        dns_seeds=params_obj.DNS_SEEDS,
+        base58_prefixes=params_obj.BASE58_PREFIXES,
+        max_money=params_obj.MAX_MONEY,
+        genesis_block=params_obj.GENESIS_BLOCK,
+        proof_of_work_limit=params_obj.PROOF_OF_WORK_LIMIT,
+        subsidy_halving_interval=params_obj.SUBSIDY_HALVING_INTERVAL,
+        name=params_obj.NAME,
+    )
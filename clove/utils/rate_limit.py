@@ -0,0 +1,160 @@
+import asyncio
+from email.utils import parsedate_to_datetime
+import threading
+from time import sleep, time
+from typing import Optional, Tuple
+
+from clove.constants import (
+    RATE_LIMIT_BACKOFF_BASE,
+    RATE_LIMIT_BACKOFF_MAX,
+    RATE_LIMIT_DEFAULT,
+    RATE_LIMIT_MIN_RATE_RATIO,
+    RATE_LIMIT_QUOTAS,
+    RATE_LIMIT_RECOVERY,
+)
+from clove.utils.logging import logger
+
+
+class TokenBucket(object):
+    '''
+    Token bucket handing out requests at `rate` per second with bursts up to `capacity`.
+
+    Callers reserve their token under the lock and wait outside of it, so they are served in the order
+    of arrival. Tokens can go negative, which is the queue of waiting callers. When the provider
+    throttles us the rate is halved and it grows back slowly with every successful request.
+    '''
+
+    def __init__(self, rate: float, capacity: float):
+        self.configured_rate = rate
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time()
+        self.blocked_until = 0.0
+        self.lock = threading.Lock()
+
+    def refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def reserve(self) -> float:
+        '''Taking a token, returns number of seconds the caller has to wait before using it.'''
+        with self.lock:
+            now = time()
+            self.refill(now)
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+            return max(wait, self.blocked_until - now)
+
+    def acquire(self):
+        wait = self.reserve()
+        if wait > 0:
+            sleep(wait)
+        # backoff could be started by the other caller in the meantime
+        while True:
+            wait = self.blocked_until - time()
+            if wait <= 0:
+                return
+            sleep(wait)
+
+    async def aacquire(self):
+        '''Asynchronous version of the `acquire` method, sharing the queue with synchronous callers.'''
+        wait = self.reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+        while True:
+            wait = self.blocked_until - time()
+            if wait <= 0:
+                return
+            await asyncio.sleep(wait)
+
+    def backoff(self, seconds: float):
+        '''Stopping all requests for the given time and slowing down afterwards.'''
+        with self.lock:
+            self.blocked_until = max(self.blocked_until, time() + seconds)
+            self.rate = max(self.rate / 2, self.configured_rate * RATE_LIMIT_MIN_RATE_RATIO)
+            self.tokens = min(self.tokens, 0)
+
+    def recover(self):
+        with self.lock:
+            self.rate = min(self.configured_rate, self.rate + self.configured_rate * RATE_LIMIT_RECOVERY)
+
+
+class RateLimiter(object):
+    '''
+    Token buckets per explorer host with Retry-After aware exponential backoff.
+
+    Args:
+        quotas (dict): host -> (requests per second, burst size)
+        default (tuple): quota for hosts without configuration
+
+    Example:
+        >>> from clove.utils.rate_limit import rate_limiter
+        >>> rate_limiter.acquire('api.blockcypher.com')
+        >>> # got HTTP 429 response
+        >>> rate_limiter.throttled('api.blockcypher.com', attempt=0, retry_after='2')
+        2.0
+    '''
+
+    def __init__(self, quotas: dict=None, default: Tuple[float, float]=RATE_LIMIT_DEFAULT):
+        self.quotas = dict(RATE_LIMIT_QUOTAS if quotas is None else quotas)
+        self.default = default
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def get_bucket(self, host: str) -> TokenBucket:
+        with self.lock:
+            bucket = self.buckets.get(host)
+            if bucket is None:
+                bucket = self.buckets[host] = TokenBucket(*self.quotas.get(host, self.default))
+            return bucket
+
+    def acquire(self, host: str):
+        '''Waiting for the turn to send request to the host.'''
+        self.get_bucket(host).acquire()
+
+    async def aacquire(self, host: str):
+        await self.get_bucket(host).aacquire()
+
+    def succeeded(self, host: str):
+        self.get_bucket(host).recover()
+
+    def throttled(self, host: str, attempt: int, retry_after: Optional[str]=None) -> float:
+        '''
+        Starting backoff after the host responded with HTTP 429.
+
+        Args:
+            host (str): explorer host
+            attempt (int): number of the failed attempt, starting from 0
+            retry_after (str): value of the Retry-After header (seconds or HTTP date)
+
+        Returns:
+            float: number of seconds before the next request to this host
+        '''
+        delay = parse_retry_after(retry_after)
+        if delay is None:
+            delay = min(RATE_LIMIT_BACKOFF_BASE * 2 ** attempt, RATE_LIMIT_BACKOFF_MAX)
+        self.get_bucket(host).backoff(delay)
+        logger.debug('Backing off %s for %.2fs', host, delay)
+        return delay
+
+    def clear(self):
+        with self.lock:
+            self.buckets.clear()
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return
+    try:
+        return min(max(float(value), 0.0), RATE_LIMIT_BACKOFF_MAX)
+    except ValueError:
+        pass
+    try:
+        return min(max(parsedate_to_datetime(value).timestamp() - time(), 0.0), RATE_LIMIT_BACKOFF_MAX)
+    except (TypeError, ValueError):
+        return
+
+
+rate_limiter = RateLimiter()
+'''Rate limiter used by `clove_req_json`.'''
@@ -44,6 +44,9 @@ setup(
             'pytest-cov==2.5.1',
             'requests==2.18.4',
         ],
+        'async': [
+            'aiohttp==3.4.4',
+        ],
         'dev': [
             'pyquery==1.4.0',
             'bumpversion==0.5.3',
@@ -0,0 +1,100 @@
+import asyncio
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from clove.network import DashTestNet, Litecoin, Monacoin, Ravencoin
+from clove.network.bitcoin.p2p import run_sync
+
+
+def async_json(*responses, **responses_by_url):
+    '''Replacement of `aclove_req_json` returning responses in order or by the url fragment.'''
+    mock = MagicMock(side_effect=list(responses) if responses else None)
+
+    async def request(url, post_data={}, timeout=None):
+        await asyncio.sleep(0)
+        if responses_by_url:
+            mock(url)
+            for fragment, response in responses_by_url.items():
+                if fragment in url:
+                    return response
+            return
+        return mock(url)
+
+    request.mock = mock
+    return request
+
+
+def test_insight_async_methods():
+    request = async_json(
+        {'info': {'blocks': 360681}},
+        [{'txid': 'abc', 'vout': 0, 'satoshis': 5000, 'scriptPubKey': '76a9'}],
+        1899000000,
+        {'1': 0.00020451},
+    )
+    with patch('clove.block_explorer.insight.aclove_req_json', request):
+        assert run_sync(Ravencoin.aget_latest_block()) == 360681
+        utxo = run_sync(Ravencoin.aget_utxo('RM7w75BcC21LzxRe62jy8JhFYykRedqu8k', 0.00001))
+        assert run_sync(Ravencoin.aget_balance('RM7w75BcC21LzxRe62jy8JhFYykRedqu8k')) == 18.99
+        assert run_sync(Monacoin.aget_fee()) == 0.00020451
+    assert [(output.tx_id, output.value) for output in utxo] == [('abc', 0.00005)]
+
+
+def test_insight_async_fee_falls_back_to_block_transactions():
+    request = async_json(**{
+        'estimatefee': {'1': -1},
+        'status': {'info': {'blocks': 100}},
+        'block-index': {'blockHash': '00ab'},
+        'txs/?block=': {'txs': [{'fees': 0.0002}] * 5 + [{'fees': 0.0004}] * 5},
+    })
+    with patch('clove.block_explorer.insight.aclove_req_json', request):
+        assert run_sync(Monacoin.aget_fee()) == pytest.approx(0.0003)
+
+
+def test_insight_async_extract_secret():
+    request = async_json(**{
+        'txids/': ['fund_tx', 'redeem_tx'],
+        'tx/redeem_tx': {'hex': 'redeem_hex', 'confirmations': 1},
+    })
+    with patch('clove.block_explorer.insight.aclove_req_json', request), \
+            patch.object(Ravencoin, 'extract_secret', return_value='secret') as extract_mock:
+        assert run_sync(Ravencoin.aextract_secret_from_redeem_transaction('contract')) == 'secret'
+    extract_mock.assert_called_once_with('redeem_hex')
+
+
+def test_cryptoid_async_fee_checks_transactions_concurrently():
+    request = async_json(**{
+        'lasttxs': [{'hash': 'a'}, {'hash': 'b'}],
+        'tx.raw.dws': {'size': 250},
+        'txinfo': {'fees': 0.0005},
+    })
+    with patch('clove.block_explorer.cryptoid.aclove_req_json', request):
+        assert run_sync(Litecoin.aget_fee()) == 0.002
+    assert request.mock.call_count == 5
+
+
+def test_async_methods_share_the_cache_with_synchronous_ones():
+    transaction = {'txid': 'abc', 'confirmations': 10}
+    request = async_json(transaction)
+    with patch('clove.block_explorer.insight.clove_req_json', return_value=transaction) as sync_mock, \
+            patch('clove.block_explorer.insight.aclove_req_json', request):
+        assert Ravencoin.get_transaction('abc') == transaction
+        assert run_sync(Ravencoin.aget_transaction('abc')) == transaction
+    assert sync_mock.call_count == 1
+    assert request.mock.call_count == 0
+
+
+def test_concurrent_async_lookups_make_single_request():
+    request = async_json({'txid': 'abc', 'confirmations': 1})
+
+    async def lookups():
+        return await asyncio.gather(*(Ravencoin.aget_transaction('abc') for _ in range(5)))
+
+    with patch('clove.block_explorer.insight.aclove_req_json', request):
+        assert run_sync(lookups()) == [{'txid': 'abc', 'confirmations': 1}] * 5
+    assert request.mock.call_count == 1
+
+
+def test_networks_without_api():
+    with pytest.raises(NotImplementedError):
+        run_sync(DashTestNet.aget_balance('address'))
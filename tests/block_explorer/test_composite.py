@@ -0,0 +1,240 @@
+import asyncio
+from time import sleep, time
+from unittest.mock import patch
+
+from pytest import raises
+
+from clove.block_explorer.base import BaseAPI
+from clove.block_explorer.composite import CompositeAPI, ExplorerHealth
+from clove.exceptions import NoBackendAvailable
+from clove.network import Bitcoin, BitcoinTestNet
+from clove.network.bitcoin.base import BitcoinBaseNetwork
+from clove.network.bitcoin.p2p import run_sync
+
+
+class SlowExplorer(BaseAPI):
+
+    delay = 0.5
+    calls = []
+
+    @classmethod
+    def get_latest_block(cls):
+        cls.calls.append(cls.explorer_name)
+        sleep(cls.delay)
+        return 100
+
+    @classmethod
+    async def aget_latest_block(cls):
+        cls.calls.append(cls.explorer_name)
+        await asyncio.sleep(cls.delay)
+        return 100
+
+    @classmethod
+    def get_transaction(cls, tx_address):
+        return {'confirmations': 1, 'blockhash': 'slow'}
+
+
+class FastExplorer(BaseAPI):
+
+    calls = []
+
+    @classmethod
+    def get_latest_block(cls):
+        cls.calls.append(cls.explorer_name)
+        return 200
+
+    @classmethod
+    async def aget_latest_block(cls):
+        cls.calls.append(cls.explorer_name)
+        return 200
+
+    @classmethod
+    def get_transaction(cls, tx_address):
+        return {'block_height': 5, 'confirmations': 2}
+
+    @classmethod
+    def get_block_hash_from_tx_json(cls, tx_json):
+        return 'fast'
+
+
+class BrokenExplorer(BaseAPI):
+
+    calls = []
+
+    @classmethod
+    def get_latest_block(cls):
+        cls.calls.append(cls.explorer_name)
+        raise ValueError('broken')
+
+
+class EmptyExplorer(BaseAPI):
+
+    @classmethod
+    def get_latest_block(cls):
+        return None
+
+
+def network(*backends, hedge_delay=0.1):
+    return type('Testcoin', (CompositeAPI, BitcoinBaseNetwork), {
+        'name': 'testcoin',
+        'symbols': ('TST', ),
+        'explorer_backends': backends,
+        'explorer_hedge_delay': hedge_delay,
+    })
+
+
+def setup_function():
+    SlowExplorer.calls = []
+    FastExplorer.calls = []
+    BrokenExplorer.calls = []
+
+
+def test_first_backend_answering_in_time_is_used():
+    coin = network(FastExplorer, SlowExplorer)
+    assert coin.get_latest_block() == 200
+    assert FastExplorer.calls == ['FastExplorer']
+    assert SlowExplorer.calls == []
+
+
+def test_hedged_request_after_delay():
+    coin = network(SlowExplorer, FastExplorer)
+    started = time()
+    assert coin.get_latest_block() == 200
+    assert time() - started < SlowExplorer.delay
+    assert SlowExplorer.calls == ['SlowExplorer']
+    assert FastExplorer.calls == ['FastExplorer']
+
+
+def test_failover_on_exception_and_empty_answer():
+    coin = network(BrokenExplorer, EmptyExplorer, FastExplorer, hedge_delay=10)
+    assert coin.get_latest_block() == 200
+    assert BrokenExplorer.calls == ['BrokenExplorer']
+
+
+def test_exception_raised_when_all_backends_failed():
+    coin = network(BrokenExplorer)
+    with raises(ValueError):
+        coin.get_latest_block()
+
+
+def test_none_returned_when_no_backend_has_the_answer():
+    assert network(BrokenExplorer, EmptyExplorer).get_latest_block() is None
+
+
+def test_circuit_breaker_skips_failing_backend():
+    coin = network(BrokenExplorer)
+    for _ in range(3):
+        with raises(ValueError):
+            coin.get_latest_block()
+    assert coin.get_explorer_health()['BrokenExplorer']['state'] == ExplorerHealth.OPEN
+
+    with raises(NoBackendAvailable):
+        coin.get_latest_block()
+    assert len(BrokenExplorer.calls) == 3
+
+
+def test_no_backend_available_when_all_circuits_are_open():
+    coin = network(BrokenExplorer, FastExplorer)
+    for backend in coin.get_backends():
+        for _ in range(3):
+            backend.health.record_failure()
+
+    with raises(NoBackendAvailable):
+        coin.get_latest_block()
+    with raises(NoBackendAvailable):
+        run_sync(coin.aget_latest_block())
+    with raises(NoBackendAvailable):
+        list(coin.iter_utxo('address'))
+    assert BrokenExplorer.calls == FastExplorer.calls == []
+
+
+def test_circuit_breaker_half_open():
+    health = ExplorerHealth(failures=1, reset_timeout=0)
+    health.record_failure()
+    assert health.state == ExplorerHealth.HALF_OPEN
+    assert health.allow_request() is True
+    assert health.allow_request() is False
+    health.record_success(0.1)
+    assert health.state == ExplorerHealth.CLOSED
+    assert health.allow_request() is True
+
+
+def test_fastest_backend_is_asked_first():
+    coin = network(SlowExplorer, FastExplorer)
+    coin.get_latest_block()
+    SlowExplorer.calls = []
+    assert coin.get_latest_block() == 200
+    assert SlowExplorer.calls == []
+    assert [backend.explorer_name for backend in coin.ordered_backends()] == ['FastExplorer', 'SlowExplorer']
+
+
+def test_transaction_json_is_handled_by_its_backend():
+    coin = network(FastExplorer, SlowExplorer)
+    transaction = coin.get_transaction('abc')
+    assert transaction['explorer'] == 'FastExplorer'
+    assert coin.get_block_hash_from_tx_json(transaction) == 'fast'
+    assert coin.get_block_hash_from_tx_json({'blockhash': 'slow', 'explorer': 'SlowExplorer'}) == 'slow'
+    assert coin.get_confirmations_from_tx_json(transaction) == 2
+
+
+def test_async_hedged_request():
+    coin = network(SlowExplorer, FastExplorer)
+    assert run_sync(coin.aget_latest_block()) == 200
+    assert FastExplorer.calls == ['FastExplorer']
+
+
+def test_bitcoin_backends():
+    insight, blockcypher = BitcoinTestNet.get_backends()
+    assert insight.api_url == BitcoinTestNet.api_url
+    assert insight.get_transaction_url('abc') == f'{BitcoinTestNet.ui_url}/tx/abc'
+    assert blockcypher.blockcypher_url() == 'https://api.blockcypher.com/v1/btc/test3'
+    assert Bitcoin.get_backends()[1].blockcypher_url() == 'https://api.blockcypher.com/v1/btc/main'
+
+
+@patch('clove.block_explorer.blockcypher.clove_req_json', return_value={'height': 540001})
+@patch('clove.block_explorer.insight.clove_req_json', side_effect=ValueError('Insight is down'))
+def test_bitcoin_falls_back_to_blockcypher(insight_mock, blockcypher_mock):
+    assert Bitcoin.get_latest_block() == 540001
+    insight_mock.assert_called_once()
+
+
+@patch('clove.block_explorer.blockcypher.clove_req_json')
+@patch('clove.block_explorer.insight.clove_req_json', return_value=None)
+def test_bitcoin_utxos_for_addresses_from_blockcypher(insight_mock, blockcypher_mock):
+    blockcypher_mock.return_value = [
+        {
+            'address': 'msJ2ucZ2NDhpVzsiNE5mGUFzqFDggjBVTM',
+            'txrefs': [{
+                'tx_hash': 'b8a5453a038f11080a346f63f5c0154dfef8a1b4d36ec6f587066ef2e86f1e30',
+                'tx_output_n': 1,
+                'value': 99497174,
+                'script': '76a914812ff3e5afea281eb3dd7fce9b077e4ec6fba08b88ac',
+            }],
+        },
+        {'address': 'mmJtKA92Mxqfi3XdyGReza69GjhkwAcBN1'},
+    ]
+
+    addresses = ['msJ2ucZ2NDhpVzsiNE5mGUFzqFDggjBVTM', 'mmJtKA92Mxqfi3XdyGReza69GjhkwAcBN1']
+    utxo = BitcoinTestNet.get_utxos_for_addresses(addresses)
+    assert [(output.tx_id, output.value) for output in utxo] == [
+        ('b8a5453a038f11080a346f63f5c0154dfef8a1b4d36ec6f587066ef2e86f1e30', 0.99497174),
+    ]
+    assert f'/addrs/{addresses[0]};{addresses[1]}?' in blockcypher_mock.call_args[0][0]
+
+
+def blockcypher_txref(tx_hash, block_height, value=1000):
+    return {'tx_hash': tx_hash, 'tx_output_n': 0, 'block_height': block_height, 'value': value, 'script': '76a914'}
+
+
+@patch('clove.block_explorer.blockcypher.clove_req_json')
+@patch('clove.block_explorer.insight.clove_req_json', return_value=None)
+def test_bitcoin_iter_utxo_follows_blockcypher_pages(insight_mock, blockcypher_mock):
+    blockcypher_mock.side_effect = [
+        {'hasMore': True, 'txrefs': [blockcypher_txref('a' * 64, 120), blockcypher_txref('b' * 64, 110)]},
+        {'hasMore': False, 'txrefs': [blockcypher_txref('b' * 64, 110), blockcypher_txref('c' * 64, 100)]},
+    ]
+
+    utxo = list(BitcoinTestNet.iter_utxo('msJ2ucZ2NDhpVzsiNE5mGUFzqFDggjBVTM'))
+    assert [output.tx_id for output in utxo] == ['a' * 64, 'b' * 64, 'c' * 64]
+    assert blockcypher_mock.call_args[0][0].endswith('&before=111')
+    assert BitcoinTestNet.get_explorer_health()['InsightAPIv4']['failures'] == 1
@@ -173,3 +173,37 @@ def test_get_balance(request_mock, fake_cryptoid_token):
 def test_get_transaction_url():
     url = Litecoin().get_transaction_url('123')
     assert url == 'https://chainz.cryptoid.info/ltc/tx.dws?123.htm'
+
+
+@patch('clove.block_explorer.cryptoid.clove_req_json')
+def test_get_utxos_for_addresses(request_mock, fake_cryptoid_token):
+    request_mock.return_value = {
+        "unspent_outputs": [
+            {
+                "tx_hash": "c3f6835036dbf88152821927b76069e390a8876ecb7b509cf24702468736f89a",
+                "tx_ouput_n": 1,
+                "value": "93209",
+                "script": "76a914621f617c765c3caa5ce1bb67f6a3e51382b8da2988ac"
+            },
+        ]
+    }
+
+    addresses = ['LUAn5PWmsPavgz32mGkqsUuAKncftS37Jq', 'LWGcQ2b8T9ccmMxGGUMTB8qUuLTjPmT1Dh']
+    utxo = Litecoin.get_utxos_for_addresses(addresses)
+    assert len(utxo) == 1
+    assert utxo[0].value == 0.00093209
+    assert request_mock.call_args[0][0].endswith(f'active={addresses[0]}|{addresses[1]}')
+
+
+@patch('clove.block_explorer.cryptoid.clove_req_json')
+def test_get_fee_from_latest_transactions(request_mock):
+    def response(url):
+        if 'lasttxs' in url:
+            return [{'hash': 'a'}, {'hash': 'b'}, {'hash': 'c'}]
+        if 'tx.raw.dws' in url:
+            return {'size': 250}
+        return {'fees': 0.0005 if 't=a' in url or 't=c' in url else 0.001}
+
+    request_mock.side_effect = response
+    assert Litecoin.get_fee(tx_limit=2) == 0.003
+    assert request_mock.call_count == 5
@@ -0,0 +1,113 @@
+import json
+from unittest.mock import patch
+
+from pytest import raises
+
+from clove.block_explorer.graphql import REDEEM_QUERY, TRANSACTION_QUERY, GraphQLBatch, compile_query
+from clove.network import DrivechainTestDrive
+from clove.network.bitcoin.p2p import run_sync
+
+
+def vout(tx_id, value=0.5):
+    return {'txId': tx_id, 'n': 0, 'value': value, 'scriptPubKey': '76a914'}
+
+
+def test_compile_query():
+    fields = (
+        ('allBlocks', 'allBlocks', (('first', '1'), ), '{ nodes { height } }'),
+        ('tx', 'txByTxId', (('txId', '$txId'), ), '{ txId }'),
+    )
+    assert compile_query('Test', (('txId', 'String!'), ), fields) == (
+        'query Test($txId: String!) { allBlocks(first: 1) { nodes { height } } tx: txByTxId(txId: $txId) { txId } }'
+    )
+    variables = (('txId', 'String!'), )
+    assert compile_query('Test', variables, fields) is compile_query('Test', variables, fields)
+
+
+def test_documents_use_variables():
+    assert TRANSACTION_QUERY.startswith('query Transaction($txId: String!) { txByTxId(txId: $txId) {')
+    assert 'condition: { address: $address }' in REDEEM_QUERY
+
+
+@patch('clove.block_explorer.graphql.clove_req_json', return_value={'data': {'txByTxId': {'txId': 'abc'}}})
+def test_transaction_is_sent_as_variable(request_mock):
+    assert DrivechainTestDrive.get_transaction('abc') == {'txId': 'abc'}
+    post_data = request_mock.call_args[1]['post_data']
+    assert post_data['query'] == TRANSACTION_QUERY
+    assert json.loads(post_data['variables']) == {'txId': 'abc'}
+
+
+def test_batch_is_split_into_requests():
+    batch = GraphQLBatch(DrivechainTestDrive, 'Transactions', max_size=2)
+    aliases = [batch.add('txByTxId', {'txId': ('String!', tx_id)}, '{ txId }') for tx_id in 'abc']
+    assert aliases == ['q0', 'q1', 'q2']
+
+    requests = batch.requests()
+    assert [(start, variables) for start, _, variables in requests] == [
+        (0, {'txId0': 'a', 'txId1': 'b'}),
+        (2, {'txId0': 'c'}),
+    ]
+    assert requests[1][1] == 'query Transactions($txId0: String!) { q0: txByTxId(txId: $txId0) { txId } }'
+
+
+@patch('clove.block_explorer.graphql.clove_req_json')
+def test_get_transactions(request_mock):
+    request_mock.return_value = {'data': {'q0': {'txId': 'a'}, 'q1': None}}
+    assert DrivechainTestDrive.get_transactions(['a', 'b']) == {'a': {'txId': 'a'}, 'b': None}
+    request_mock.assert_called_once()
+
+
+@patch('clove.block_explorer.graphql.aclove_req_json')
+def test_aget_transactions(request_mock):
+    async def response(*args, **kwargs):
+        return {'data': {'q0': {'txId': 'a'}}}
+    request_mock.side_effect = response
+    assert run_sync(DrivechainTestDrive.aget_transactions(['a'])) == {'a': {'txId': 'a'}}
+
+
+@patch('clove.block_explorer.graphql.clove_req_json')
+def test_utxos_for_addresses_in_one_request(request_mock):
+    request_mock.return_value = {'data': {
+        'q0': {'nodes': [{'voutsByTxId': {'nodes': [vout('a' * 64)]}}]},
+        'q1': {'nodes': [{'voutsByTxId': {'nodes': [vout('b' * 64, 0.25)]}}]},
+    }}
+    utxo = DrivechainTestDrive.get_utxos_for_addresses(['address1', 'address2'])
+    assert [(output.tx_id, output.value) for output in utxo] == [('a' * 64, 0.5), ('b' * 64, 0.25)]
+    request_mock.assert_called_once()
+    post_data = request_mock.call_args[1]['post_data']
+    assert json.loads(post_data['variables']) == {'address0': 'address1', 'address1': 'address2'}
+
+
+@patch('clove.block_explorer.graphql.clove_req_json')
+def test_utxos_for_repeated_address(request_mock):
+    request_mock.return_value = {'data': {
+        'q0': {'nodes': [{'voutsByTxId': {'nodes': [vout('a' * 64, 1.0), vout('b' * 64, 2.0)]}}]},
+    }}
+    utxo = DrivechainTestDrive.get_utxos_for_addresses(['address1', 'address1'])
+    assert [(output.tx_id, output.value) for output in utxo] == [('b' * 64, 2.0), ('a' * 64, 1.0)]
+    post_data = request_mock.call_args[1]['post_data']
+    assert json.loads(post_data['variables']) == {'address0': 'address1'}
+
+
+@patch('clove.block_explorer.graphql.clove_req_json', return_value={'errors': [{'message': 'syntax error'}]})
+def test_utxos_bad_response(request_mock):
+    with raises(ValueError):
+        DrivechainTestDrive.get_utxos_for_addresses(['address1'])
+
+
+@patch('clove.block_explorer.graphql.clove_req_json')
+@patch.object(DrivechainTestDrive, 'extract_secret', return_value='secret')
+def test_extract_secret_in_one_request(extract_secret_mock, request_mock):
+    request_mock.return_value = {'data': {'allAddressTxes': {'nodes': [
+        {'txId': 'contract', 'txByTxId': {'vinsByTxId': {'nodes': [{'scriptSig': 'contract_script'}]}}},
+        {'txId': 'redeem', 'txByTxId': {'vinsByTxId': {'nodes': [{'scriptSig': 'redeem_script'}]}}},
+    ]}}}
+    assert DrivechainTestDrive.extract_secret_from_redeem_transaction('contract_address') == 'secret'
+    request_mock.assert_called_once()
+    extract_secret_mock.assert_called_once_with(scriptsig='redeem_script')
+
+
+@patch('clove.block_explorer.graphql.clove_req_json')
+def test_extract_secret_not_redeemed_yet(request_mock):
+    request_mock.return_value = {'data': {'allAddressTxes': {'nodes': [{'txId': 'contract', 'txByTxId': {}}]}}}
+    assert DrivechainTestDrive.extract_secret_from_redeem_transaction('contract_address') is None
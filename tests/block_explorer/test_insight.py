@@ -1,8 +1,9 @@
 from unittest.mock import patch
 
-from pytest import mark
+from pytest import mark, raises
 
-from clove.block_explorer.insight import InsightAPIv4
+from clove.block_explorer.insight import BlockScanner, InsightAPIv4, get_executor
+from clove.constants import INSIGHT_SCAN_MAX_THREADS
 from clove.network import BITCOIN_BASED as networks
 from clove.network import Monacoin, Ravencoin
 
@@ -166,3 +167,163 @@ def test_get_fee(request_mock):
     request_mock.return_value = {"1": 0.00020451}
     balance = Monacoin.get_fee()
     assert balance == 0.00020451
+
+
+@patch('clove.block_explorer.insight.clove_req_json')
+def test_get_utxos_for_addresses(request_mock):
+    output = {
+        "address": "RM7w75BcC21LzxRe62jy8JhFYykRedqu8k",
+        "txid": "8a673e9fcf5ea469e7c4180846834905e8d4c0f16c6e6ab9531efbb9112bc5e1",
+        "vout": 1,
+        "scriptPubKey": "76a91481e1444c2585307171a36822e0dac6be8994a02588ac",
+        "satoshis": 899000000,
+    }
+    request_mock.side_effect = [
+        [output, dict(output, vout=0, satoshis=100000000)],
+        [output, dict(output, txid='9aad6d94d91353ff1ef6206e25364741978e8ec8ae19a6435754d6acd583e52c', satoshis=5)],
+    ]
+    addresses = [f'RM7w75BcC21LzxRe62jy8JhFYykRedqu{index:02}' for index in range(60)]
+
+    utxo = Ravencoin.get_utxos_for_addresses(addresses + addresses[:5])
+
+    assert request_mock.call_count == 2
+    # 51 addresses joined with commas fit into UTXO_BATCH_MAX_URL_LENGTH
+    first_url = request_mock.call_args_list[0][0][0]
+    assert first_url == f'{Ravencoin.api_url}/addrs/{",".join(addresses[:51])}/utxo'
+    assert [(output.vout, output.value) for output in utxo] == [(1, 8.99), (0, 1), (1, 0.00000005)]
+
+
+def test_chunk_addresses():
+    addresses = ['a' * 10, 'b' * 10, 'c' * 10, 'a' * 10, 'd' * 10]
+    assert list(InsightAPIv4._chunk_addresses(addresses, ',', max_addresses=3, max_length=100)) == [
+        ['a' * 10, 'b' * 10, 'c' * 10],
+        ['d' * 10],
+    ]
+    assert list(InsightAPIv4._chunk_addresses(addresses, ',', max_addresses=10, max_length=21)) == [
+        ['a' * 10, 'b' * 10],
+        ['c' * 10, 'd' * 10],
+    ]
+
+
+def insight_transaction(txid, outputs, address='RM7w75BcC21LzxRe62jy8JhFYykRedqu8k'):
+    return {
+        'txid': txid,
+        'vout': [
+            {
+                'value': value,
+                'n': n,
+                'scriptPubKey': {'hex': '76a914', 'addresses': [address]},
+                'spentTxId': spent_by,
+            } for n, (value, spent_by) in enumerate(outputs)
+        ],
+    }
+
+
+@patch('clove.block_explorer.insight.clove_req_json')
+def test_iter_utxo(request_mock):
+    request_mock.side_effect = [
+        {'totalItems': 3, 'items': [
+            insight_transaction('a' * 64, [('1.5', None), ('2.0', 'b' * 64)]),
+            insight_transaction('c' * 64, [('0.1', None)], address='RHmYdMhTQ4kxDEy5QfMZyZ7GSg4jMhqDa5'),
+        ]},
+        {'totalItems': 3, 'items': [
+            insight_transaction('d' * 64, [('3.0', None)]),
+        ]},
+    ]
+
+    with patch.object(Ravencoin, 'utxo_page_size', 2):
+        stream = Ravencoin.iter_utxo('RM7w75BcC21LzxRe62jy8JhFYykRedqu8k')
+        assert request_mock.call_count == 0
+        first = next(stream)
+        assert (first.tx_id, first.vout, first.value) == ('a' * 64, 0, 1.5)
+        assert request_mock.call_count == 1
+        assert [utxo.tx_id for utxo in stream] == ['d' * 64]
+
+    assert request_mock.call_args[0][0] == (
+        f'{Ravencoin.api_url}/addrs/RM7w75BcC21LzxRe62jy8JhFYykRedqu8k/txs?from=2&to=4'
+    )
+
+
+@patch('clove.block_explorer.insight.clove_req_json')
+def test_select_utxo_from_stream_stops_early(request_mock):
+    request_mock.return_value = {'totalItems': 100, 'items': [
+        insight_transaction('a' * 64, [('1.5', None), ('2.0', None)]),
+    ]}
+
+    utxo = Ravencoin.select_utxo_from_stream('RM7w75BcC21LzxRe62jy8JhFYykRedqu8k', 3)
+    assert [output.value for output in utxo] == [1.5, 2.0]
+    request_mock.assert_called_once()
+
+
+def block_scanner_responses(failing_blocks=()):
+    def response(url):
+        if 'block-index' in url:
+            block_number = int(url.rsplit('/', 1)[1])
+            return None if block_number in failing_blocks else {'blockHash': f'hash{block_number}'}
+        page = int(url.split('pageNum=')[1]) if 'pageNum' in url else 0
+        return {'pagesTotal': 3, 'txs': [{'fees': 0.0001 * (page + 1), 'size': 250}] * 4}
+    return response
+
+
+@patch('clove.block_explorer.insight.clove_req_json')
+def test_block_scanner_follows_pages_and_stops_early(request_mock):
+    request_mock.side_effect = block_scanner_responses()
+
+    transactions = BlockScanner(Ravencoin, 100, samples=10, workers=1).run()
+
+    assert len(transactions) == 12
+    assert [call[0][0].replace(Ravencoin.api_url, '') for call in request_mock.call_args_list] == [
+        '/block-index/100',
+        '/txs/?block=hash100',
+        '/txs/?block=hash100&pageNum=1',
+        '/txs/?block=hash100&pageNum=2',
+    ]
+
+
+@patch('clove.block_explorer.insight.clove_req_json')
+def test_block_scanner_skips_failed_blocks(request_mock):
+    request_mock.side_effect = block_scanner_responses(failing_blocks=(100, 99))
+
+    transactions = BlockScanner(Ravencoin, 100, samples=4, workers=4).run()
+
+    assert len(transactions) >= 4
+    requested = [call[0][0] for call in request_mock.call_args_list]
+    assert f'{Ravencoin.api_url}/txs/?block=hash100' not in requested
+    assert f'{Ravencoin.api_url}/block-index/98' in requested
+
+
+@patch('clove.block_explorer.insight.clove_req_json')
+def test_block_scans_share_thread_pool(request_mock):
+    request_mock.side_effect = block_scanner_responses()
+
+    BlockScanner(Ravencoin, 100, samples=4, workers=4).run()
+    executor = get_executor()
+    BlockScanner(Ravencoin, 100, samples=4, workers=4).run()
+
+    assert get_executor() is executor
+    assert len(executor._threads) <= INSIGHT_SCAN_MAX_THREADS
+
+
+@patch('clove.block_explorer.insight.clove_req_json')
+def test_block_scanner_gives_up_after_errors(request_mock):
+    request_mock.side_effect = block_scanner_responses(failing_blocks=range(100))
+
+    with raises(RuntimeError):
+        BlockScanner(Ravencoin, 99, samples=4, max_errors=3).run()
+    assert request_mock.call_count < 10
+
+
+@patch.object(Ravencoin, 'get_latest_block', return_value=99)
+@patch.object(BlockScanner, 'run', side_effect=RuntimeError('Cannot get transactions from block (RVN)'))
+def test_fee_rates_when_blocks_cannot_be_scanned(run_mock, latest_block_mock):
+    assert Ravencoin.get_fee_rates() is None
+    run_mock.assert_called_once()
+
+
+@patch('clove.block_explorer.insight.clove_req_json')
+def test_calculate_fee_scans_blocks_concurrently(request_mock):
+    responses = block_scanner_responses()
+    request_mock.side_effect = lambda url: {'info': {'blocks': 100}} if 'status' in url else responses(url)
+
+    # fees of the pages are 0.0001, 0.0002 and 0.0003
+    assert 0.0001 <= Ravencoin._calculate_fee() <= 0.0003
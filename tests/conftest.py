@@ -2,21 +2,70 @@ from collections import namedtuple
 from contextlib import contextmanager
 from io import BytesIO
 import os
+import socket
 from unittest.mock import MagicMock, patch
 
-from bitcoin.messages import msg_getdata, msg_reject, msg_verack, msg_version
+from bitcoin.messages import msg_getdata, msg_verack, msg_version
 from eth_abi import encode_abi
 from hexbytes import HexBytes
 import pytest
 
 from .constants import abi_swaps_types, non_zero_balance_abi_contract
 
+from clove.block_explorer.composite import reset_explorer_health
+from clove.block_explorer.fees import fee_oracle
 from clove.network.bitcoin import BitcoinTestNet
-from clove.network.bitcoin.utxo import Utxo
+from clove.network.bitcoin.messages import msg_reject
+from clove.network.bitcoin.peers import peer_store
+from clove.network.bitcoin.pool import connection_pool
+from clove.network.bitcoin.simulator import NodeSimulator
+from clove.utils.cache import response_cache
+from clove.utils.dns import seed_resolver
+from clove.utils.rate_limit import rate_limiter
+from clove.utxo import Utxo
 
 Key = namedtuple('Key', ['secret', 'address'])
 
 
+@pytest.fixture(autouse=True)
+def clear_seed_resolver_cache():
+    seed_resolver.clear()
+    yield
+    seed_resolver.clear()
+
+
+@pytest.fixture(autouse=True)
+def clear_response_cache():
+    response_cache.clear()
+    yield
+    response_cache.clear()
+
+
+@pytest.fixture(autouse=True)
+def clear_rate_limiter():
+    yield
+    rate_limiter.clear()
+
+
+@pytest.fixture(autouse=True)
+def clear_explorer_health():
+    yield
+    reset_explorer_health()
+
+
+@pytest.fixture(autouse=True)
+def clear_fee_oracle():
+    yield
+    fee_oracle.stop()
+    fee_oracle.clear()
+
+
+@pytest.fixture(autouse=True)
+def clear_peer_store():
+    yield
+    peer_store.clear()
+
+
 @pytest.fixture
 def alice_wallet():
     return BitcoinTestNet.get_wallet(private_key='cSYq9JswNm79GUdyz6TiNKajRTiJEKgv4RxSWGthP3SmUHiX9WKe')
@@ -86,11 +135,11 @@ def btc_testnet_contract(signed_transaction):
 @contextmanager
 @pytest.fixture
 def connection_mock(signed_transaction):
-    connection = MagicMock()
+    local, remote = socket.socketpair()
+    connection = MagicMock(wraps=local)
 
     connection.getsockname.return_value = ('127.0.0.1', 8800)
     connection.getpeername.return_value = ('127.0.0.1', 8800)
-    connection.getpeername.return_value = ('127.0.0.1', 8800)
 
     protocol_version = 6002
     version = msg_version(protocol_version).to_bytes()
@@ -99,10 +148,8 @@ def connection_mock(signed_transaction):
     getdata = msg_getdata(protocol_version)
     getdata = getdata.msg_deser(BytesIO(b'\x01\x01\x00\x00\x00' + signed_transaction.tx.GetHash())).to_bytes()
 
-    connection.recv.side_effect = (
-        version + verack,
-        getdata,
-    )
+    # node answers the handshake and asks for the transaction
+    remote.sendall(version + verack + getdata)
 
     capture = BitcoinTestNet.capture_messages
 
@@ -116,6 +163,17 @@ def connection_mock(signed_transaction):
         with patch('socket.gethostbyname_ex', return_value=(None, None, ['127.0.0.1'])):
             with patch.object(BitcoinTestNet, 'capture_messages', new=capture_messages_mock):
                 yield
+    connection_pool.close_all()
+    local.close()
+    remote.close()
+
+
+@pytest.fixture
+def node_simulator():
+    '''Local P2P node for BitcoinTestNet, `node_simulator.network_class()` connects only to it.'''
+    with NodeSimulator(BitcoinTestNet) as simulator:
+        yield simulator
+    connection_pool.close_all()
 
 
 def web3_request_side_effect(method, params):
@@ -0,0 +1,153 @@
+import socket
+import threading
+from time import time
+
+from bitcoin.messages import msg_getdata, msg_inv, msg_ping, msg_pong, msg_verack, msg_version
+
+from clove.network import BitcoinTestNet
+from clove.network.bitcoin.dispatcher import MessageDispatcher
+from clove.network.bitcoin.p2p import MessageDecoder, serialize_message
+
+message_start = BitcoinTestNet.message_start
+
+
+def open_channel(dispatcher):
+    local, remote = socket.socketpair()
+    remote.settimeout(1)
+    return dispatcher.register(local, MessageDecoder(message_start)), remote
+
+
+def send(remote, *messages):
+    remote.sendall(b''.join(serialize_message(message, message_start) for message in messages))
+
+
+def test_expect_resolves_future_with_all_messages():
+    dispatcher = MessageDispatcher()
+    channel, remote = open_channel(dispatcher)
+
+    future = dispatcher.expect(channel, [msg_version, msg_verack])
+    send(remote, msg_version(), msg_verack())
+
+    assert [type(message) for message in future.result(1)] == [msg_version, msg_verack]
+    assert channel.protocol_version is not None
+    dispatcher.unregister(channel)
+
+
+def test_ping_is_answered_inline():
+    dispatcher = MessageDispatcher()
+    channel, remote = open_channel(dispatcher)
+
+    send(remote, msg_ping(nonce=11))
+    decoder = MessageDecoder(message_start)
+    decoder.feed(remote.recv(1024))
+
+    assert type(decoder.messages[0]) is msg_pong
+    assert decoder.messages[0].nonce == 11
+    dispatcher.unregister(channel)
+
+
+def test_messages_are_kept_until_someone_asks_for_them():
+    dispatcher = MessageDispatcher()
+    channel, remote = open_channel(dispatcher)
+
+    future = dispatcher.expect(channel, [msg_verack])
+    send(remote, msg_getdata(), msg_verack())
+    future.result(1)
+
+    assert type(dispatcher.expect(channel, [msg_getdata]).result(0)[0]) is msg_getdata
+    dispatcher.unregister(channel)
+
+
+def test_callbacks_and_subscribers():
+    dispatcher = MessageDispatcher()
+    channel, remote = open_channel(dispatcher)
+    inventories, results = [], []
+
+    dispatcher.subscribe(channel, msg_inv, inventories.append)
+    future = dispatcher.expect(channel, [msg_verack], callback=results.append)
+    send(remote, msg_inv(), msg_inv(), msg_verack())
+    future.result(1)
+    dispatcher.wait_for_callbacks(1)
+
+    assert len(inventories) == 2
+    assert type(results[0][0]) is msg_verack
+    dispatcher.unregister(channel)
+
+
+def test_slow_callback_does_not_block_reading():
+    dispatcher = MessageDispatcher()
+    channel, remote = open_channel(dispatcher)
+    release = threading.Event()
+
+    dispatcher.subscribe(channel, msg_inv, lambda message: release.wait(2))
+    future = dispatcher.expect(channel, [msg_verack])
+    started = time()
+    send(remote, msg_inv(), msg_verack())
+
+    assert future.result(1)
+    assert time() - started < 1
+    release.set()
+    dispatcher.unregister(channel)
+
+
+def test_closed_connection_resolves_waiters():
+    dispatcher = MessageDispatcher()
+    channel, remote = open_channel(dispatcher)
+
+    future = dispatcher.expect(channel, [msg_verack])
+    remote.close()
+
+    assert future.result(1) is None
+    assert channel.closed
+    assert dispatcher.expect(channel, [msg_verack]).result(0) is None
+
+
+def test_many_connections_in_one_thread():
+    dispatcher = MessageDispatcher()
+    channels = [open_channel(dispatcher) for _ in range(20)]
+    futures = [dispatcher.expect(channel, [msg_verack]) for channel, _ in channels]
+
+    for _, remote in reversed(channels):
+        send(remote, msg_verack())
+
+    assert all(future.result(1) for future in futures)
+    for channel, _ in channels:
+        dispatcher.unregister(channel)
+
+
+def test_capture_messages_does_not_wait_for_timeout():
+    network = BitcoinTestNet()
+    network.connection, remote = socket.socketpair()
+
+    send(remote, msg_version(), msg_verack())
+    started = time()
+    assert network.capture_messages([msg_version, msg_verack], timeout=5)
+    assert time() - started < 1
+    assert network.protocol_version is not None
+
+    started = time()
+    assert network.capture_messages([msg_verack], timeout=0.2, ignore_empty=True) is None
+    assert time() - started < 1
+    network.reset_connection()
+    remote.close()
+
+
+def test_descriptor_of_connection_closed_without_unregistering_can_be_reused():
+    dispatcher = MessageDispatcher()
+    stale_channel, stale_remote = open_channel(dispatcher)
+    descriptor = stale_channel.connection.fileno()
+    stale_channel.connection.close()
+    stale_remote.close()
+
+    local, remote = socket.socketpair()
+    remote.settimeout(1)
+    if descriptor not in (local.fileno(), remote.fileno()):
+        local, remote = remote, local
+    channel = dispatcher.register(local, MessageDecoder(message_start))
+    future = dispatcher.expect(channel, [msg_verack])
+    send(remote, msg_verack())
+
+    assert not channel.closed
+    assert type(future.result(1)[0]) is msg_verack
+    assert stale_channel.closed
+    dispatcher.unregister(channel)
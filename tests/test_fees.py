@@ -0,0 +1,127 @@
+from time import sleep, time
+from unittest.mock import patch
+
+from pytest import approx
+
+from clove.block_explorer.fees import FeeEstimate, FeeOracle, fee_oracle, percentile
+from clove.network import Bitcoin, Litecoin, Ravencoin
+from clove.network.bitcoin.p2p import run_sync
+
+
+def test_percentile():
+    values = [5, 1, 4, 2, 3]
+    assert percentile(values, 0) == 1
+    assert percentile(values, 50) == 3
+    assert percentile(values, 100) == 5
+    assert percentile(values, 25) == 2
+    assert percentile(values, 90) == approx(4.6)
+    assert percentile([7], 75) == 7
+
+
+def test_fee_estimate():
+    estimate = FeeEstimate.from_fee_rates([0.001, 0.002, 0.003, 0.004, 0.005], percentiles=(10, 50, 90))
+    assert estimate.rates == {10: 0.0014, 50: 0.003, 90: 0.0046}
+    assert estimate.samples == 5
+    assert estimate.fee_per_kb() == 0.003
+    assert estimate.fee_per_kb(75) == 0.0046
+    assert estimate.fee_per_kb(95) == 0.0046
+
+
+@patch.object(Ravencoin, 'get_fee_rates', return_value=[0.01, 0.02, 0.03])
+def test_refresh_with_fee_rates(fee_rates_mock):
+    oracle = FeeOracle()
+    oracle.register(Ravencoin())
+    oracle.refresh_all()
+    assert oracle.get_fee(Ravencoin) == 0.02
+    assert oracle.get_fee(Ravencoin(), 90) == 0.028
+    assert oracle.get_estimate(Ravencoin).samples == 3
+
+
+@patch.object(Ravencoin, 'get_fee_rates', return_value=[0.01])
+def test_refresh_all_reuses_threads(fee_rates_mock):
+    oracle = FeeOracle(max_workers=2)
+    oracle.register(Ravencoin())
+    oracle.refresh_all()
+    executor = oracle.executor
+    oracle.refresh_all()
+    assert oracle.executor is executor
+    assert len(executor._threads) <= 2
+
+
+@patch('clove.network.Bitcoin.get_fee', return_value=0.0005)
+def test_refresh_with_explorer_fee(fee_mock):
+    oracle = FeeOracle()
+    assert oracle.refresh(Bitcoin).rates[50] == 0.0005
+    assert oracle.get_fee(Bitcoin, 10) == 0.0005
+
+
+@patch.object(Ravencoin, 'get_fee_rates', side_effect=[[0.01], ValueError('API is down')])
+def test_failed_refresh_keeps_previous_estimate(fee_rates_mock):
+    oracle = FeeOracle()
+    oracle.refresh(Ravencoin)
+    assert oracle.refresh(Ravencoin) is None
+    assert oracle.get_fee(Ravencoin) == 0.01
+
+
+def test_stale_estimate_is_not_served():
+    oracle = FeeOracle(max_age=60)
+    oracle.estimates[Ravencoin] = FeeEstimate({50: 0.01}, 1, updated_at=time() - 61)
+    assert oracle.get_estimate(Ravencoin) is None
+    assert oracle.get_fee(Ravencoin) is None
+
+
+@patch('clove.block_explorer.cryptoid.clove_req_json')
+def test_get_fee_served_from_memory(request_mock):
+    fee_oracle.estimates[Litecoin] = FeeEstimate({50: 0.0012}, 10)
+    assert Litecoin.get_fee() == 0.0012
+    assert Litecoin.get_current_fee_per_kb() == 0.0012
+    request_mock.assert_not_called()
+
+
+@patch('clove.network.bitcoin_based.ravencoin.clove_req_json', side_effect=ValueError('API is down'))
+@patch('clove.network.bitcoin.clove_req_json', side_effect=ValueError('API is down'))
+def test_network_fee_overrides_served_from_memory(bitcoin_request_mock, ravencoin_request_mock):
+    fee_oracle.estimates[Ravencoin] = FeeEstimate({50: 0.01}, 10)
+    fee_oracle.estimates[Bitcoin] = FeeEstimate({50: 0.0005}, 1)
+    assert Ravencoin.get_fee() == 0.01
+    assert Bitcoin.get_fee() == 0.0005
+    assert run_sync(Bitcoin.aget_fee()) == 0.0005
+    bitcoin_request_mock.assert_not_called()
+    ravencoin_request_mock.assert_not_called()
+
+
+@patch('clove.network.bitcoin.clove_req_json', return_value={'high_fee_per_kb': 60000})
+def test_refresh_reaches_explorer_when_estimate_is_fresh(request_mock):
+    oracle = FeeOracle()
+    oracle.register(Bitcoin)
+    fee_oracle.estimates[Bitcoin] = FeeEstimate({50: 0.0005}, 1)
+    assert oracle.refresh(Bitcoin).rates[50] == 0.0006
+    request_mock.assert_called_once()
+
+
+@patch('clove.block_explorer.insight.clove_req_json')
+def test_insight_fee_rates_from_latest_blocks(request_mock):
+    def response(url):
+        if 'status' in url:
+            return {'info': {'blocks': 100}}
+        if 'block-index' in url:
+            return {'blockHash': url.rsplit('/', 1)[1]}
+        block = int(url.rsplit('=', 1)[1])
+        return {'txs': [
+            {'fees': 0.0001 * block / 100, 'size': 250},
+            {'isCoinBase': True, 'size': 100},
+        ]}
+
+    request_mock.side_effect = response
+    assert sorted(Ravencoin.get_fee_rates(blocks=3)) == approx([0.000392, 0.000396, 0.0004])
+
+
+@patch.object(Ravencoin, 'get_fee_rates', return_value=[0.01])
+def test_background_refresh(fee_rates_mock):
+    oracle = FeeOracle(interval=0.01)
+    oracle.register(Ravencoin)
+    oracle.start()
+    sleep(0.1)
+    oracle.stop()
+    assert oracle.get_fee(Ravencoin) == 0.01
+    assert fee_rates_mock.call_count > 1
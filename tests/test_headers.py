@@ -0,0 +1,212 @@
+import socket
+import threading
+from time import time
+from unittest.mock import patch
+
+from bitcoin.core import CBlockHeader, b2lx, x
+from bitcoin.messages import MSG_BLOCK, msg_getheaders, msg_inv
+from bitcoin.net import CInv
+import pytest
+
+from clove.constants import HEADER_CHAIN_MAX_AGE
+from clove.network import Bitcoin, BitcoinTestNet
+from clove.network.bitcoin.headers import HeaderChain, HeaderStore, bits_to_target, target_to_bits
+from clove.network.bitcoin.messages import msg_headers
+from clove.network.bitcoin.p2p import MessageDecoder, run_sync, serialize_message
+
+message_start = BitcoinTestNet.message_start
+
+mainnet_headers = [
+    CBlockHeader.deserialize(x(
+        '010000006fe28c0ab6f1b372c1a6a246ae63f74f931e8365e15a089c68d6190000000000982051fd1e4ba744bbbe680e1fee14677b'
+        'a1a3c3540bf7b1cdb606e857233e0e61bc6649ffff001d01e36299'
+    )),
+    CBlockHeader.deserialize(x(
+        '010000004860eb18bf1b1620e37e9490fc8a427514416fd75159ab86688e9a8300000000d5fdcc541e25de1c7a5addedf24858b8bb'
+        '665c9f36ef744ee42c316022c90f9bb0bc6649ffff001d08d2bd61'
+    )),
+]
+
+checkpoint_hash = b'\x22' * 32
+
+
+def make_headers(previous_hash: bytes, count: int, salt: int=0) -> list:
+    headers = []
+    for number in range(count):
+        header = CBlockHeader(hashPrevBlock=previous_hash, nTime=number, nBits=0x207fffff, nNonce=salt)
+        headers.append(header)
+        previous_hash = header.GetHash()
+    return headers
+
+
+def unverified_chain(path: str=None) -> HeaderChain:
+    return HeaderChain(BitcoinTestNet(), checkpoint=(0, b2lx(checkpoint_hash)), path=path, verify_pow=False)
+
+
+def test_compact_target_conversion():
+    assert bits_to_target(0x1d00ffff) == 0xffff << 208
+    assert target_to_bits(bits_to_target(0x1d00ffff)) == 0x1d00ffff
+    assert target_to_bits(bits_to_target(0x1b0404cb)) == 0x1b0404cb
+
+
+def test_chain_verifies_proof_of_work():
+    chain = HeaderChain(Bitcoin())
+    assert chain.verify_pow
+
+    header = mainnet_headers[0]
+    tampered = CBlockHeader(header.nVersion, header.hashPrevBlock, header.hashMerkleRoot, header.nTime, header.nBits,
+                            header.nNonce + 1)
+    with pytest.raises(ValueError):
+        chain.add_headers([tampered])
+    assert chain.tip_height == 0
+
+    assert chain.add_headers(mainnet_headers) == 2
+    assert chain.tip_hash == '000000006a625f06636b8bb6ac7b960a8d03705d1ace08b1a19da3fdcc99ddbd'
+    assert chain.get_confirmations('00000000839a8e6886ab5951d76f411475428afc90947ee320161bbf18eb6048') == 2
+    assert chain.get_confirmations(Bitcoin.genesis_hash) == 3
+    assert chain.get_confirmations('00' * 32) is None
+
+    # known headers are skipped
+    assert chain.add_headers(mainnet_headers) == 0
+
+
+def test_chain_rejects_headers_not_connecting():
+    chain = unverified_chain()
+    with pytest.raises(ValueError):
+        chain.add_headers(make_headers(b'\x33' * 32, 3))
+    headers = make_headers(checkpoint_hash, 3)
+    with pytest.raises(ValueError):
+        chain.add_headers([headers[0], headers[2]])
+    assert chain.tip_height == 0
+
+
+def test_chain_switches_to_branch_with_more_work():
+    chain = unverified_chain()
+    main_branch = make_headers(checkpoint_hash, 5)
+    chain.add_headers(main_branch)
+
+    short_fork = make_headers(main_branch[1].GetHash(), 2, salt=1)
+    assert chain.add_headers(short_fork) == 0
+    assert chain.tip_hash == b2lx(main_branch[-1].GetHash())
+
+    long_fork = make_headers(main_branch[1].GetHash(), 4, salt=2)
+    assert chain.add_headers(long_fork) == 4
+    assert chain.tip_height == 6
+    assert chain.tip_hash == b2lx(long_fork[-1].GetHash())
+    assert chain.get_height(b2lx(main_branch[4].GetHash())) is None
+    assert chain.get_confirmations(b2lx(main_branch[1].GetHash())) == 5
+
+
+def test_store_grows_and_persists(tmpdir):
+    path = str(tmpdir.join('test-bitcoin.headers'))
+    store = HeaderStore(0, checkpoint_hash, path, capacity=2)
+    headers = make_headers(checkpoint_hash, 5)
+    for header in headers:
+        store.append(header)
+    assert store.capacity == 8
+    store.close()
+
+    store = HeaderStore(0, checkpoint_hash, path)
+    assert store.tip_height == 5
+    assert store.get_height(headers[2].GetHash()) == 3
+    assert store.get_header(4).GetHash() == headers[3].GetHash()
+
+    store.truncate(2)
+    store.close()
+    assert HeaderStore(0, checkpoint_hash, path).tip_hash == headers[1].GetHash()
+
+    # different checkpoint starts the file over
+    assert HeaderStore(10, b'\x44' * 32, path).tip_height == 10
+
+
+def test_anonymous_store_grows():
+    store = HeaderStore(0, checkpoint_hash, capacity=1)
+    headers = make_headers(checkpoint_hash, 3)
+    for header in headers:
+        store.append(header)
+    assert [store.get_header(height).GetHash() for height in (1, 2, 3)] == [h.GetHash() for h in headers]
+
+
+def test_chain_syncs_and_follows_announcements():
+    chain = unverified_chain()
+    headers = make_headers(checkpoint_hash, 4)
+    local, remote = socket.socketpair()
+    remote.settimeout(1)
+
+    def connect():
+        chain.network.connection = local
+        return '127.0.0.1'
+
+    def respond(new_headers):
+        decoder = MessageDecoder(message_start)
+        decoder.feed(remote.recv(4096))
+        request = decoder.messages[0]
+        assert type(request) is msg_getheaders
+        response = msg_headers()
+        response.headers = new_headers
+        remote.sendall(serialize_message(response, message_start))
+        return request
+
+    chain.network.connect = connect
+    connect()
+    channel = chain.network.get_channel()
+    result = []
+    thread = threading.Thread(target=lambda: result.append(chain.sync()))
+    with patch('clove.network.bitcoin.headers.MAX_HEADERS_RESULTS', 3):
+        thread.start()
+        respond(headers[:3])
+        request = respond(headers[3:])
+        thread.join(2)
+    assert request.locator.vHave[0] == headers[2].GetHash()
+    assert result == [4]
+    assert not chain.is_stale()
+    # chain follows the connection it was synced with
+    assert channel in chain.handlers
+
+    chain.synced_at -= HEADER_CHAIN_MAX_AGE
+    announced = make_headers(headers[-1].GetHash(), 1)
+    response = msg_headers()
+    response.headers = announced
+    remote.sendall(serialize_message(response, message_start))
+
+    # block announced by inventory makes the chain ask for headers
+    inventory = CInv()
+    inventory.type = MSG_BLOCK
+    inventory.hash = b'\x55' * 32
+    announcement = msg_inv()
+    announcement.inv.append(inventory)
+    remote.sendall(serialize_message(announcement, message_start))
+    decoder = MessageDecoder(message_start)
+    decoder.feed(remote.recv(4096))
+    assert type(decoder.messages[0]) is msg_getheaders
+    assert chain.tip_height == 5
+    assert not chain.is_stale()
+
+    chain.detach(channel)
+    chain.network.reset_connection()
+    remote.close()
+
+
+def test_local_confirmations_of_the_network():
+    with patch.object(BitcoinTestNet, '_header_chain', unverified_chain(), create=True):
+        headers = make_headers(checkpoint_hash, 3)
+        BitcoinTestNet._header_chain.add_headers(headers)
+        # chain that was never synced may be behind the network
+        assert BitcoinTestNet.get_local_latest_block() is None
+
+        BitcoinTestNet._header_chain.synced_at = time()
+        assert BitcoinTestNet.get_local_latest_block() == 3
+        assert BitcoinTestNet.get_local_confirmations(b2lx(headers[0].GetHash())) == 3
+        assert BitcoinTestNet.get_local_confirmations('00' * 32) is None
+        with patch.object(BitcoinTestNet, 'race') as race_mock:
+            assert BitcoinTestNet.get_latest_block() == 3
+            assert run_sync(BitcoinTestNet.aget_latest_block()) == 3
+        race_mock.assert_not_called()
+
+        BitcoinTestNet._header_chain.synced_at -= HEADER_CHAIN_MAX_AGE + 1
+        assert BitcoinTestNet.get_local_latest_block() is None
+        assert BitcoinTestNet.get_local_confirmations(b2lx(headers[0].GetHash())) is None
+        with patch.object(BitcoinTestNet, 'race', return_value=7):
+            assert BitcoinTestNet.get_latest_block() == 7
+    assert BitcoinTestNet.get_local_confirmations(b2lx(headers[0].GetHash())) is None
+    assert BitcoinTestNet.get_local_latest_block() is None
@@ -0,0 +1,89 @@
+import json
+
+from bitcoin.messages import msg_version
+
+from clove.network import BitcoinTestNet, Ethereum
+from clove.network.bitcoin.health import HealthChecker, save_report
+from clove.network.bitcoin.peers import PeerStore
+from clove.network.bitcoin.simulator import NodeSimulator, simulated_network
+
+
+def check(simulators, handshake=True, unreachable=()):
+    network = simulated_network(BitcoinTestNet, simulators)
+    network.nodes += tuple(unreachable)
+    return HealthChecker([network, Ethereum], handshake=handshake, connect_timeout=0.5).run()
+
+
+def test_health_report_with_handshake():
+    with NodeSimulator(BitcoinTestNet, latency=0.05) as simulator:
+        report = check([simulator], unreachable=['127.0.0.9'])
+
+    assert report['handshake'] is True
+    assert list(report['networks']) == ['test-bitcoin']
+    network_report = report['networks']['test-bitcoin']
+    assert network_report['port'] == simulator.port
+    assert network_report['alive'] == 1
+
+    alive, dead = network_report['nodes']
+    assert alive['node'] == '127.0.0.1'
+    assert alive['reachable'] is True
+    assert alive['handshake_latency'] >= 0.05
+    assert alive['services'] == 1
+    assert alive['error'] is None
+    assert dead == {
+        'node': '127.0.0.9',
+        'reachable': False,
+        'connect_latency': None,
+        'handshake_latency': None,
+        'user_agent': None,
+        'start_height': None,
+        'services': None,
+        'error': 'connection failed',
+    }
+    assert simulator.messages['version'] == 1
+
+
+def test_health_report_without_handshake():
+    with NodeSimulator(BitcoinTestNet) as simulator:
+        report = check([simulator], handshake=False)
+    result = report['networks']['test-bitcoin']['nodes'][0]
+    assert result['reachable'] is True
+    assert result['connect_latency'] is not None
+    assert result['handshake_latency'] is None
+    assert simulator.messages['version'] == 0
+
+
+def test_failed_handshake_is_reported():
+    with NodeSimulator(BitcoinTestNet) as simulator:
+        simulator.script(msg_version, lambda message: [])
+        report = HealthChecker(
+            [simulator.network_class()], handshake=True, handshake_timeout=0.5
+        ).run()
+    network_report = report['networks']['test-bitcoin']
+    assert network_report['nodes'][0]['error'] == 'handshake failed'
+    assert network_report['alive'] == 0
+
+
+def test_report_is_imported_to_peer_store(tmpdir):
+    simulators = NodeSimulator.cluster(BitcoinTestNet, 2)
+    try:
+        report = check(simulators, unreachable=['127.0.0.9'])
+    finally:
+        for simulator in simulators:
+            simulator.stop()
+
+    path = str(tmpdir.join('health.json'))
+    save_report(report, path)
+    with open(path) as report_file:
+        assert json.load(report_file)['networks']['test-bitcoin']['alive'] == 2
+
+    store = PeerStore()
+    assert store.import_report(path) == 3
+    nodes = ['127.0.0.9', '127.0.0.2', '127.0.0.1']
+    stats = store.get_stats('test-bitcoin', nodes)
+    assert stats['127.0.0.9'].failures == 1
+    assert stats['127.0.0.1'].handshakes == 1
+    assert stats['127.0.0.1'].latency is not None
+    assert store.rank('test-bitcoin', nodes)[-1] == '127.0.0.9'
+
+    assert store.import_report(str(tmpdir.join('missing.json'))) == 0
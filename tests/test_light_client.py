@@ -0,0 +1,298 @@
+import socket
+import threading
+from unittest.mock import patch
+
+from bitcoin.core import CBlock, CMutableTransaction, CMutableTxIn, CMutableTxOut, COutPoint, b2lx, lx, x
+from bitcoin.messages import msg_block, msg_getdata, msg_getheaders, msg_version
+import pytest
+
+from clove.constants import HEADER_CHAIN_CHECKPOINTS
+from clove.network import BitcoinTestNet
+from clove.network.bitcoin.filters import BlockFilter, basic_filter_items, siphash
+from clove.network.bitcoin.headers import HeaderChain
+from clove.network.bitcoin.light_client import CompactFilterClient, LightClientAPI, UtxoIndex
+from clove.network.bitcoin.messages import NODE_COMPACT_FILTERS, msg_cfilter, msg_getcfilters, msg_headers
+from clove.network.bitcoin.p2p import MessageDecoder, serialize_message
+from clove.utils.bitcoin import address_to_script_pubkey
+
+message_start = BitcoinTestNet.message_start
+address = 'mgRoeWs2CeCEuqQmNfhJjnpX8YvtPACmCX'
+other_address = 'msJ2ucZ2NDhpVzsiNE5mGUFzqFDggjBVTM'
+
+
+def make_block(previous_hash: bytes, transactions: list) -> CBlock:
+    block = CBlock(hashPrevBlock=previous_hash, vtx=transactions)
+    return CBlock(
+        hashPrevBlock=previous_hash,
+        hashMerkleRoot=block.calc_merkle_root(),
+        nTime=len(transactions),
+        vtx=transactions,
+    )
+
+
+def make_transaction(outputs: list, inputs: list=()) -> CMutableTransaction:
+    vin = [CMutableTxIn(COutPoint(lx(tx_id), vout)) for tx_id, vout in inputs] or [CMutableTxIn()]
+    vout = [
+        CMutableTxOut(value, address_to_script_pubkey(output_address, BitcoinTestNet.get_params()))
+        for output_address, value in outputs
+    ]
+    return CMutableTransaction(vin, vout)
+
+
+class FakeNode(object):
+    '''Node serving headers, compact filters and blocks of a tiny chain.'''
+
+    def __init__(self, checkpoint_hash: bytes, blocks: list):
+        self.local, self.remote = socket.socketpair()
+        self.checkpoint_hash = checkpoint_hash
+        self.blocks = blocks
+        self.hashes = [checkpoint_hash] + [block.GetHash() for block in blocks]
+        self.filters = {block.GetHash(): BlockFilter.build(block.GetHash(), basic_filter_items(block))
+                        for block in blocks}
+        self.requested_blocks = []
+        self.thread = threading.Thread(target=self.serve, daemon=True)
+        self.thread.start()
+
+    def send(self, message):
+        self.remote.sendall(serialize_message(message, message_start))
+
+    def serve(self):
+        decoder = MessageDecoder(message_start)
+        while True:
+            try:
+                data = self.remote.recv(4096)
+            except OSError:
+                return
+            if not data:
+                return
+            decoder.feed(data)
+            while decoder.messages:
+                self.handle(decoder.messages.popleft())
+
+    def handle(self, message):
+        if isinstance(message, msg_getheaders):
+            start = self.hashes.index(message.locator.vHave[0])
+            response = msg_headers()
+            response.headers = [block.get_header() for block in self.blocks[start:]]
+            self.send(response)
+        elif isinstance(message, msg_getcfilters):
+            stop = self.hashes.index(message.stop_hash)
+            for block_hash in self.hashes[message.start_height:stop + 1]:
+                self.send(msg_cfilter(block_hash=block_hash, filter_bytes=self.filters[block_hash].filter_bytes))
+        elif isinstance(message, msg_getdata):
+            for inventory in message.inv:
+                self.requested_blocks.append(inventory.hash)
+                response = msg_block()
+                response.block = self.blocks[self.hashes.index(inventory.hash) - 1]
+                self.send(response)
+
+    def close(self):
+        self.remote.close()
+        self.local.close()
+
+
+@pytest.fixture
+def light_client():
+    clients = []
+
+    def factory(node: FakeNode, services: int=NODE_COMPACT_FILTERS) -> CompactFilterClient:
+        client = connected_client(node, services)
+        clients.append(client)
+        return client
+
+    yield factory
+    for client in clients:
+        client.close()
+
+
+def connected_client(node: FakeNode, services: int) -> CompactFilterClient:
+    chain = HeaderChain(BitcoinTestNet(), checkpoint=(0, b2lx(node.checkpoint_hash)), verify_pow=False)
+    client = CompactFilterClient(BitcoinTestNet(), index=UtxoIndex(), timeout=2, chain=chain)
+
+    def connect():
+        client.network.connection = node.local
+        client.network.protocol_version = msg_version()
+        client.network.protocol_version.nServices = services
+        return '127.0.0.1'
+
+    client.network.connect = connect
+    return client
+
+
+@pytest.fixture
+def chain():
+    checkpoint_hash = b'\x11' * 32
+    funding = make_transaction([(address, 50000000), (other_address, 10000000)])
+    block_1 = make_block(checkpoint_hash, [funding])
+    unrelated = make_transaction([(other_address, 20000000)])
+    block_2 = make_block(block_1.GetHash(), [unrelated])
+    spending = make_transaction([(other_address, 30000000), (address, 19990000)], [(b2lx(funding.GetHash()), 0)])
+    block_3 = make_block(block_2.GetHash(), [spending, make_transaction([(address, 1000000)])])
+    node = FakeNode(checkpoint_hash, [block_1, block_2, block_3])
+    yield node
+    node.close()
+
+
+def test_siphash_test_vectors():
+    k0 = int.from_bytes(bytes(range(8)), 'little')
+    k1 = int.from_bytes(bytes(range(8, 16)), 'little')
+    assert siphash(k0, k1, b'') == 0x726fdb47dd0e0e31
+    assert siphash(k0, k1, bytes(range(15))) == 0xa129ca6149be45e5
+
+
+def test_testnet_genesis_block_filter():
+    genesis_hash = lx(BitcoinTestNet.genesis_hash)
+    block_filter = BlockFilter(genesis_hash, x('019dfca8'))
+    genesis_script = x(
+        '4104678afdb0fe5548271967f1a67130b7105cd6a828e03909a67962e0ea1f61deb649f6bc3f4cef38c4f35504e51ec112de5c'
+        '384df7ba0b8d578a4c702b6bf11d5fac'
+    )
+    assert block_filter.n == 1
+    assert block_filter.match_any([genesis_script])
+    assert not block_filter.match_any([b'\x51'])
+    assert BlockFilter.build(genesis_hash, [genesis_script]).filter_bytes == x('019dfca8')
+
+
+def test_block_filter_matches_only_included_items():
+    block_hash = b'\x01' * 32
+    items = [bytes([i]) * 25 for i in range(50)]
+    block_filter = BlockFilter.build(block_hash, items)
+    assert block_filter.n == 50
+    assert all(block_filter.match_any([item]) for item in items)
+    assert not block_filter.match_any([b'\xff' * 25, b'\xfe' * 25])
+    assert not BlockFilter.build(block_hash, []).match_any(items)
+
+
+def test_light_client_discovers_utxo(chain, light_client):
+    client = light_client(chain)
+    assert client.watch_address(address)
+    assert not client.watch_address(address)
+
+    assert client.sync() == 3
+    # second block has no outputs for the watched address
+    assert chain.requested_blocks == [chain.hashes[1], chain.hashes[3]]
+
+    assert client.get_balance(address) == 0.2099
+    utxo = client.get_utxo(address, 0.15)
+    assert len(utxo) == 1
+    assert utxo[0].value == 0.1999
+    assert utxo[0].vout == 1
+    assert client.get_utxo(address, 0.5) is None
+
+    # nothing new to download on the next sync
+    assert client.sync() == 3
+    assert len(chain.requested_blocks) == 2
+
+
+def test_light_client_rescans_after_new_address(chain, light_client):
+    client = light_client(chain)
+    client.watch_address(address)
+    client.sync()
+    assert client.get_balance(other_address) == 0
+
+    client.watch_address(other_address)
+    assert client.sync() == 3
+    assert client.get_balance(other_address) == 0.6
+    assert client.get_balance(address) == 0.2099
+
+
+def test_light_client_scans_new_address_since_its_birth_height(chain, light_client):
+    client = light_client(chain)
+    client.watch_address(address)
+    client.sync()
+    requested_blocks = len(chain.requested_blocks)
+
+    client.watch_address(other_address, birth_height=3)
+    assert client.is_stale()
+    assert client.sync() == 3
+    # only the new address was looked for and only in blocks since its birth height
+    assert chain.requested_blocks[requested_blocks:] == [chain.hashes[3]]
+    assert client.get_balance(other_address) == 0.3
+    assert client.get_balance(address) == 0.2099
+    assert not client.is_stale()
+
+
+def test_light_client_first_sync_starts_at_birth_height(chain, light_client):
+    client = light_client(chain)
+    client.watch_address(address, birth_height=3)
+
+    assert client.sync() == 3
+    assert chain.requested_blocks == [chain.hashes[3]]
+    assert client.get_balance(address) == 0.2099
+
+
+def test_light_client_starts_at_network_checkpoint():
+    class CheckpointBitcoinTestNet(BitcoinTestNet):
+        pass
+
+    height, block_hash = HEADER_CHAIN_CHECKPOINTS['test-bitcoin']
+    assert CompactFilterClient(BitcoinTestNet()).start_height == height
+    chain = CheckpointBitcoinTestNet.get_header_chain()
+    assert (chain.start_height, chain.tip_hash) == (height, block_hash)
+
+
+def test_light_client_rescans_after_reorg(chain, light_client):
+    client = light_client(chain)
+    client.watch_address(address)
+    client.sync()
+
+    # state and outputs left by a block which was reorged away
+    script_pubkey = address_to_script_pubkey(address, BitcoinTestNet.get_params())
+    client.index.add_utxo(client.name, 'ab' * 32, 0, 70000000, script_pubkey, 3)
+    client.index.set_sync_state(client.name, 3, 'cd' * 32)
+
+    assert client.sync() == 3
+    assert not client.index.is_unspent(client.name, 'ab' * 32, 0)
+    assert client.get_balance(address) == 0.2099
+    assert client.index.get_sync_state(client.name) == (3, b2lx(chain.hashes[3]))
+
+
+def test_light_client_api_syncs_only_stale_index(chain, light_client):
+    client = light_client(chain)
+    syncs = []
+    sync = client.sync
+    client.sync = lambda: syncs.append(1) or sync()
+
+    class LightBitcoinTestNet(LightClientAPI, BitcoinTestNet):
+        get_light_client = classmethod(lambda cls: client)
+
+    assert LightBitcoinTestNet.get_balance(address) == 0.2099
+    assert len(LightBitcoinTestNet.get_utxo(address, 0.15)) == 1
+    assert len(syncs) == 1
+
+    # new address has to be looked for in synchronized blocks
+    assert LightBitcoinTestNet.get_balance(other_address) == 0.6
+    assert len(syncs) == 2
+
+    client.synced_at -= LightBitcoinTestNet.light_client_sync_interval + 1
+    LightBitcoinTestNet.get_balance(address)
+    assert len(syncs) == 3
+
+
+def test_light_client_api_falls_back_to_explorer_when_sync_fails(chain, light_client):
+    client = light_client(chain, services=1)
+    client.network.terminate = lambda node=None: None
+
+    class LightBitcoinTestNet(LightClientAPI, BitcoinTestNet):
+        get_light_client = classmethod(lambda cls: client)
+
+    with patch.object(BitcoinTestNet, 'get_balance', return_value=1.5) as balance_mock:
+        assert LightBitcoinTestNet.get_balance(address) == 1.5
+    balance_mock.assert_called_once_with(address)
+    with patch.object(BitcoinTestNet, 'get_utxo', return_value=None) as utxo_mock:
+        assert LightBitcoinTestNet.get_utxo(address, 0.1) is None
+    utxo_mock.assert_called_once_with(address, 0.1)
+
+
+def test_light_client_requires_compact_filters_service(chain, light_client):
+    client = light_client(chain, services=1)
+    client.network.terminate = lambda node=None: None
+    client.watch_address(address)
+    assert client.sync() is None
+    assert chain.requested_blocks == []
+
+
+def test_light_client_needs_checkpoint_without_genesis_hash():
+    from clove.network import Litecoin
+    with pytest.raises(ValueError):
+        CompactFilterClient(Litecoin())
@@ -1,7 +1,12 @@
 import ipaddress
+import socket
+import threading
+from unittest.mock import patch
 
 import bitcoin
-from bitcoin.core import CTransaction
+from bitcoin.core import CMutableTransaction, CMutableTxIn, CMutableTxOut, CTransaction, b2lx, b2x
+from bitcoin.core.script import CScript
+from bitcoin.messages import msg_getdata
 from pytest import mark, raises
 from validators import domain
 
@@ -9,6 +14,8 @@ from clove.exceptions import ImpossibleDeserialization
 from clove.network import BITCOIN_BASED as networks
 from clove.network import BitcoinTestNet
 from clove.network.bitcoin.base import BitcoinBaseNetwork
+from clove.network.bitcoin.messages import msg_reject
+from clove.network.bitcoin.p2p import MessageDecoder, serialize_message
 from clove.utils.bitcoin import auto_switch_params
 from clove.utils.search import get_network_by_symbol
 
@@ -123,6 +130,104 @@ def test_publish_transaction_from_transaction(signed_transaction, connection_moc
         assert signed_transaction.address == signed_transaction.publish()
 
 
+def make_raw_transactions(count: int) -> list:
+    return [
+        b2x(CMutableTransaction([CMutableTxIn()], [CMutableTxOut(number, CScript([number]))]).serialize())
+        for number in range(1, count + 1)
+    ]
+
+
+def serve_batch(remote, request_halves: bool=False, reject_index: int=None):
+    '''Node asking for announced transactions and rejecting one of them.'''
+    decoder = MessageDecoder(BitcoinTestNet.message_start)
+    while not decoder.messages:
+        decoder.feed(remote.recv(65536))
+    inventory = decoder.messages.popleft().inv
+    requests = [inventory[:len(inventory) // 2], inventory[len(inventory) // 2:]] if request_halves else [inventory]
+
+    received = []
+    for request in requests:
+        getdata = msg_getdata()
+        getdata.inv = request
+        remote.sendall(serialize_message(getdata, BitcoinTestNet.message_start))
+        while len(decoder.messages) < len(request):
+            decoder.feed(remote.recv(65536))
+        received.extend(decoder.messages.popleft().tx for _ in request)
+
+    if reject_index is not None:
+        reject = msg_reject()
+        reject.message, reject.ccode, reject.reason = b'tx', b'\x42', b'insufficient fee'
+        reject.data = received[reject_index].GetHash()
+        remote.sendall(serialize_message(reject, BitcoinTestNet.message_start))
+    return received
+
+
+def test_publish_many_announces_all_transactions_at_once():
+    network = BitcoinTestNet()
+    network.pooled_connections = False
+    local, remote = socket.socketpair()
+    remote.settimeout(2)
+
+    def connect():
+        network.connection = local
+        return '127.0.0.1'
+
+    network.connect = connect
+    raw_transactions = make_raw_transactions(4)
+    received = []
+    node = threading.Thread(target=lambda: received.extend(serve_batch(remote, request_halves=True, reject_index=1)))
+    node.start()
+    results = network.publish_many(raw_transactions, timeout=2, reject_timeout=0.3)
+    node.join(2)
+
+    assert [b2x(transaction.serialize()) for transaction in received] == raw_transactions
+    assert [result.status for result in results] == ['accepted', 'rejected', 'accepted', 'accepted']
+    assert results[1] == (None, 'rejected', 'insufficient fee')
+    assert results[0].transaction_address == b2lx(received[0].GetHash())
+    remote.close()
+
+
+def test_publish_many_reports_transactions_not_requested():
+    network = BitcoinTestNet()
+    network.pooled_connections = False
+    local, remote = socket.socketpair()
+    remote.settimeout(2)
+
+    def connect():
+        network.connection = local
+        return '127.0.0.1'
+
+    network.connect = connect
+    raw_transactions = make_raw_transactions(2)
+
+    def serve():
+        decoder = MessageDecoder(BitcoinTestNet.message_start)
+        while not decoder.messages:
+            decoder.feed(remote.recv(65536))
+        getdata = msg_getdata()
+        getdata.inv = decoder.messages.popleft().inv[:1]
+        remote.sendall(serialize_message(getdata, BitcoinTestNet.message_start))
+
+    node = threading.Thread(target=serve)
+    node.start()
+    results = network.publish_many(raw_transactions, timeout=0.5, reject_timeout=0.1)
+    node.join(2)
+
+    assert [result.status for result in results] == ['accepted', 'failed']
+    assert results[1].reason == 'node did not ask for the transaction'
+    network.reset_connection()
+    remote.close()
+
+
+def test_publish_many_splits_inventory_above_protocol_limit():
+    network = BitcoinTestNet()
+    raw_transactions = make_raw_transactions(5)
+    with patch('clove.network.bitcoin.base.MAX_INV_SIZE', 2):
+        with patch.object(BitcoinTestNet, 'broadcast_batch', side_effect=lambda txs, *args: txs) as broadcast_batch:
+            assert len(network.publish_many(raw_transactions)) == 5
+    assert [len(call[0][0]) for call in broadcast_batch.call_args_list] == [2, 2, 1]
+
+
 def test_deserialize_raw_transaction():
     valid_transaction = '0100000001350ff23c56027e3f7b8206d01a8fa2302d7ef82898e7ac795674a4e6450dd427000000008a47' \
                         '3044022033a4d693aedc99fea12d03acb07d3fbd2c26eb1da88df2820a2544058010a750022032195aaed8' \
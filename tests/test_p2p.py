@@ -0,0 +1,329 @@
+import asyncio
+import socket
+from time import sleep
+from unittest.mock import patch
+
+from bitcoin.messages import msg_getdata, msg_inv, msg_ping, msg_pong, msg_tx, msg_verack, msg_version
+import pytest
+
+from clove.network import BitcoinTestNet
+from clove.network.bitcoin.messages import msg_reject
+from clove.network.bitcoin.p2p import (
+    HEADER_SIZE,
+    AsyncNodeConnection,
+    FanOutBroadcast,
+    MessageDecoder,
+    deserialize_payload,
+    parse_header,
+    serialize_message,
+)
+from clove.network.bitcoin.pool import ConnectionPool, PeerConnection
+
+
+class FakeNode(object):
+    '''Minimal node answering handshake and asking for every announced transaction.'''
+
+    def __init__(self, network, ping=False, reject=False, silent=False, reject_delay=0):
+        self.network = network
+        self.ping = ping
+        self.reject = reject
+        self.reject_delay = reject_delay
+        self.silent = silent
+        self.transactions = []
+        self.server = None
+
+    async def read(self, reader):
+        command, length, payload_checksum = parse_header(
+            await reader.readexactly(HEADER_SIZE), self.network.message_start
+        )
+        return deserialize_payload(command, await reader.readexactly(length), payload_checksum)
+
+    def write(self, writer, message):
+        writer.write(serialize_message(message, self.network.message_start))
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                message = await self.read(reader)
+                if isinstance(message, msg_version):
+                    self.write(writer, msg_version())
+                    if self.ping:
+                        self.write(writer, msg_ping(nonce=7))
+                    self.write(writer, msg_verack())
+                elif isinstance(message, msg_inv) and not self.silent:
+                    getdata = msg_getdata()
+                    getdata.inv = message.inv
+                    self.write(writer, getdata)
+                elif isinstance(message, msg_tx):
+                    self.transactions.append(message.tx)
+                    if self.reject:
+                        await asyncio.sleep(self.reject_delay)
+                        reject = msg_reject()
+                        reject.message, reject.ccode, reject.reason = b'tx', b'\x42', b'insufficient fee'
+                        self.write(writer, reject)
+                elif isinstance(message, msg_pong):
+                    self.pong = message.nonce
+        except (asyncio.IncompleteReadError, ConnectionError):
+            writer.close()
+
+    async def start(self, host='127.0.0.1', port=0):
+        self.server = await asyncio.start_server(self.handle, host, port)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+        # let connection handlers notice closed connections
+        await asyncio.sleep(0.01)
+
+
+@pytest.fixture
+def event_loop():
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    yield loop
+    loop.close()
+
+
+def test_serialize_message_is_compatible_with_bitcoinlib():
+    network = BitcoinTestNet()
+    network.switch_params()
+    message = msg_ping(nonce=123)
+
+    serialized = serialize_message(message, network.message_start)
+    assert serialized == message.to_bytes()
+
+    command, length, payload_checksum = parse_header(serialized[:HEADER_SIZE], network.message_start)
+    assert command == b'ping'
+    assert length == 8
+    assert deserialize_payload(command, serialized[HEADER_SIZE:], payload_checksum).nonce == 123
+
+
+def test_parse_header_from_another_network():
+    serialized = serialize_message(msg_verack(), b'\xf9\xbe\xb4\xd9')
+    with pytest.raises(ValueError):
+        parse_header(serialized[:HEADER_SIZE], BitcoinTestNet.message_start)
+
+
+def test_decoder_handles_fragmented_stream():
+    message_start = BitcoinTestNet.message_start
+    stream = b''.join(serialize_message(msg, message_start) for msg in (msg_version(), msg_verack(), msg_ping(nonce=1)))
+    decoder = MessageDecoder(message_start)
+
+    for byte in range(len(stream) - 1):
+        decoder.feed(stream[byte:byte + 1])
+    assert [type(msg) for msg in decoder.messages] == [msg_version, msg_verack]
+
+    assert decoder.feed(stream[-1:]) == 3
+    assert decoder.messages[-1].nonce == 1
+    assert not decoder.buffer
+
+
+def test_decoder_with_message_start_inside_of_payload():
+    message_start = BitcoinTestNet.message_start
+    ping = msg_ping(nonce=int.from_bytes(message_start * 2, 'little'))
+    decoder = MessageDecoder(message_start)
+
+    assert decoder.feed(serialize_message(ping, message_start) * 2) == 2
+    assert [msg.nonce for msg in decoder.messages] == [ping.nonce] * 2
+
+
+def test_decoder_skips_garbage_and_unknown_messages():
+    message_start = BitcoinTestNet.message_start
+    unknown = serialize_message(msg_verack(), message_start).replace(b'verack', b'foobar')
+    decoder = MessageDecoder(message_start)
+
+    decoder.feed(b'garbage' + unknown + b'\x0b\x11' + serialize_message(msg_ping(nonce=5), message_start))
+    assert len(decoder) == 1
+    assert decoder.messages[0].nonce == 5
+
+
+def test_async_handshake_answers_ping(event_loop):
+    network = BitcoinTestNet()
+    node = FakeNode(network, ping=True)
+
+    async def scenario():
+        port = await node.start()
+        connection = AsyncNodeConnection(network, '127.0.0.1', port)
+        assert await connection.connect()
+        assert await connection.handshake(timeout=2)
+        await asyncio.sleep(0.05)
+        connection.close()
+        await node.stop()
+
+    event_loop.run_until_complete(scenario())
+    assert node.pong == 7
+
+
+def test_async_broadcast(signed_transaction, event_loop):
+    network = BitcoinTestNet()
+    nodes = [FakeNode(network) for _ in range(3)]
+
+    async def scenario():
+        ports = [await node.start() for node in nodes]
+        connections = [AsyncNodeConnection(network, '127.0.0.1', port) for port in ports]
+        results = await asyncio.gather(*[
+            connection.broadcast(signed_transaction.tx, reject_timeout=0.1) for connection in connections
+        ])
+        for connection in connections:
+            connection.close()
+        for node in nodes:
+            await node.stop()
+        return results
+
+    assert event_loop.run_until_complete(scenario()) == [signed_transaction.address] * 3
+    for node in nodes:
+        assert node.transactions[0].GetHash() == signed_transaction.tx.GetHash()
+
+
+def test_async_broadcast_without_node(signed_transaction, event_loop):
+    connection = AsyncNodeConnection(BitcoinTestNet(), '127.0.0.1', 1)
+    assert event_loop.run_until_complete(connection.broadcast(signed_transaction.tx)) is None
+
+
+def test_network_apublish(signed_transaction, event_loop):
+    network = BitcoinTestNet()
+    node = FakeNode(network)
+
+    async def scenario():
+        network.port = await node.start()
+        with patch('socket.gethostbyname_ex', return_value=(None, None, ['127.0.0.1'])):
+            transaction_address = await network.apublish(signed_transaction.raw_transaction, reject_timeout=0.1)
+        await node.stop()
+        return transaction_address
+
+    assert event_loop.run_until_complete(scenario()) == signed_transaction.address
+
+
+def run_fan_out(event_loop, network, transaction, fake_nodes, nodes, peers, quorum):
+    async def scenario():
+        network.port = await fake_nodes[0].start(nodes[0])
+        for host, node in zip(nodes[1:], fake_nodes[1:]):
+            await node.start(host, network.port)
+        report = await FanOutBroadcast(network, transaction, nodes, peers, quorum, reject_timeout=0.5).run()
+        for node in fake_nodes:
+            await node.stop()
+        return report
+
+    return event_loop.run_until_complete(scenario())
+
+
+def test_fan_out_broadcast_reaches_quorum(signed_transaction, event_loop):
+    network = BitcoinTestNet()
+    nodes = ['127.0.0.1', '127.0.0.2', '127.0.0.3', '127.0.0.4']
+    fake_nodes = [FakeNode(network) for _ in range(3)]
+
+    report = run_fan_out(event_loop, network, signed_transaction.tx, fake_nodes, nodes, peers=4, quorum=2)
+
+    assert report.transaction_address == signed_transaction.address
+    statuses = {result.node: result.status for result in report.results}
+    assert list(statuses.values()).count(FanOutBroadcast.ACCEPTED) >= 2
+    assert statuses.get('127.0.0.4') in (FanOutBroadcast.FAILED, FanOutBroadcast.CANCELLED)
+
+
+def test_fan_out_broadcast_replaces_failed_peers(signed_transaction, event_loop):
+    network = BitcoinTestNet()
+    nodes = ['127.0.0.1', '127.0.0.5', '127.0.0.2']
+    fake_nodes = [FakeNode(network), FakeNode(network)]
+    nodes_with_servers = ['127.0.0.1', '127.0.0.2']
+
+    async def scenario():
+        network.port = await fake_nodes[0].start(nodes_with_servers[0])
+        await fake_nodes[1].start(nodes_with_servers[1], network.port)
+        report = await FanOutBroadcast(
+            network, signed_transaction.tx, nodes, peers=2, quorum=2, reject_timeout=0.5
+        ).run()
+        for node in fake_nodes:
+            await node.stop()
+        return report
+
+    report = event_loop.run_until_complete(scenario())
+    statuses = {result.node: result.status for result in report.results}
+
+    assert report.transaction_address == signed_transaction.address
+    assert statuses == {
+        '127.0.0.1': FanOutBroadcast.ACCEPTED,
+        '127.0.0.5': FanOutBroadcast.FAILED,
+        '127.0.0.2': FanOutBroadcast.ACCEPTED,
+    }
+
+
+def test_fan_out_broadcast_rejected(signed_transaction, event_loop):
+    network = BitcoinTestNet()
+    nodes = ['127.0.0.1', '127.0.0.2']
+    fake_nodes = [FakeNode(network, reject=True), FakeNode(network, silent=True)]
+
+    report = run_fan_out(event_loop, network, signed_transaction.tx, fake_nodes, nodes, peers=2, quorum=2)
+
+    assert report.transaction_address is None
+    rejected = [result for result in report.results if result.status == FanOutBroadcast.REJECTED]
+    assert rejected
+    assert rejected[0].reason == 'insufficient fee'
+
+
+def test_fan_out_broadcast_late_reject_after_quorum(signed_transaction, event_loop):
+    network = BitcoinTestNet()
+    nodes = ['127.0.0.1', '127.0.0.2', '127.0.0.3']
+    fake_nodes = [FakeNode(network), FakeNode(network), FakeNode(network, reject=True, reject_delay=0.2)]
+
+    report = run_fan_out(event_loop, network, signed_transaction.tx, fake_nodes, nodes, peers=3, quorum=2)
+
+    assert report.transaction_address is None
+    statuses = {result.node: result.status for result in report.results}
+    assert statuses['127.0.0.3'] == FanOutBroadcast.REJECTED
+
+
+def pooled_peer(network):
+    local, remote = socket.socketpair()
+    remote.settimeout(1)
+    peer = PeerConnection('127.0.0.1', local, MessageDecoder(network.message_start), msg_version())
+    return peer, remote
+
+
+def test_connection_pool_answers_ping_on_idle_connection():
+    network = BitcoinTestNet()
+    pool = ConnectionPool(poll_interval=0.01)
+    peer, remote = pooled_peer(network)
+
+    pool.release(network, peer)
+    remote.sendall(serialize_message(msg_ping(nonce=42), network.message_start))
+
+    decoder = MessageDecoder(network.message_start)
+    decoder.feed(remote.recv(1024))
+    assert decoder.messages[0].nonce == 42
+
+    assert pool.acquire(network) is peer
+    assert pool.acquire(network) is None
+    remote.close()
+    peer.close()
+
+
+def test_connection_pool_drops_closed_connections():
+    network = BitcoinTestNet()
+    pool = ConnectionPool(poll_interval=0.01)
+    peer, remote = pooled_peer(network)
+
+    pool.release(network, peer)
+    assert len(pool) == 1
+    remote.close()
+    sleep(0.1)
+
+    assert len(pool) == 0
+    assert pool.acquire(network) is None
+
+
+def test_network_borrows_connection_from_pool():
+    network = BitcoinTestNet()
+    peer, remote = pooled_peer(network)
+    network.connection, network.decoder, network.protocol_version = peer.connection, peer.decoder, peer.protocol_version
+    network.get_current_node = lambda: peer.node
+
+    network.release_connection()
+    assert network.connection is None
+
+    other_network = BitcoinTestNet()
+    other_network.get_current_node = lambda: peer.node
+    assert other_network.connect() == '127.0.0.1'
+    assert other_network.connection is peer.connection
+    other_network.reset_connection()
+    remote.close()
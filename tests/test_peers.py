@@ -0,0 +1,71 @@
+from clove.network import BitcoinTestNet, Litecoin
+from clove.network.bitcoin.peers import PeerStore, peer_store
+
+
+def test_rank_prefers_fast_and_healthy_peers():
+    store = PeerStore()
+    store.record_handshake('litecoin', 'fast', 0.1)
+    store.record_handshake('litecoin', 'slow', 2.0)
+    store.record_handshake('litecoin', 'flaky', 0.05)
+    store.record_failure('litecoin', 'flaky')
+    store.record_handshake('litecoin', 'rejecting', 0.05)
+    store.record_rejected('litecoin', 'rejecting')
+
+    assert store.rank('litecoin', ['slow', 'unknown', 'rejecting', 'flaky', 'fast']) == [
+        'fast', 'unknown', 'slow', 'flaky', 'rejecting'
+    ]
+    assert store.rank('dash', ['slow', 'fast']) == ['slow', 'fast']
+
+
+def test_latency_is_smoothed():
+    store = PeerStore()
+    store.record_handshake('litecoin', 'node', 1.0)
+    store.record_handshake('litecoin', 'node', 2.0)
+
+    stats = store.get_stats('litecoin', ['node'])['node']
+    assert stats.handshakes == 2
+    assert 1.0 < stats.latency < 2.0
+
+
+def test_stats_are_persisted(tmpdir):
+    path = str(tmpdir.join('peers.db'))
+    store = PeerStore(path)
+    store.record_handshake('litecoin', 'node', 0.5)
+    store.record_uptime('litecoin', 'node', 30)
+    store.connection.close()
+
+    stats = PeerStore(path).get_stats('litecoin', ['node'])['node']
+    assert stats.latency == 0.5
+    assert stats.uptime == 30
+
+
+def test_blacklist_is_not_shared_between_instances():
+    network = Litecoin()
+    network.update_blacklist('1.2.3.4')
+
+    assert network.blacklist_nodes == {'1.2.3.4': 1}
+    assert Litecoin().blacklist_nodes == {}
+    assert peer_store.get_stats(network.name, ['1.2.3.4'])['1.2.3.4'].failures == 1
+
+
+def test_filter_blacklisted_nodes_prefers_fast_peers():
+    network = Litecoin()
+    peer_store.record_handshake(network.name, '2.2.2.2', 0.1)
+    peer_store.record_handshake(network.name, '3.3.3.3', 3.0)
+    network.blacklist_nodes = {'4.4.4.4': 1}
+
+    assert network.filter_blacklisted_nodes(['3.3.3.3', '4.4.4.4', '1.1.1.1', '2.2.2.2']) == [
+        '2.2.2.2', '1.1.1.1', '3.3.3.3', '4.4.4.4'
+    ]
+
+
+def test_connect_records_handshake_and_broadcast(signed_transaction, connection_mock):
+    network = BitcoinTestNet()
+
+    with connection_mock:
+        assert network.broadcast_transaction(signed_transaction.raw_transaction) == signed_transaction.address
+
+    stats = peer_store.get_stats(network.name, ['127.0.0.1'])['127.0.0.1']
+    assert stats.handshakes == 1
+    assert stats.latency is not None
+    assert stats.accepted == 1
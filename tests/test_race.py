@@ -0,0 +1,88 @@
+import socket
+import threading
+from time import sleep, time
+
+from bitcoin.messages import msg_verack, msg_version
+
+from clove.network import BitcoinTestNet
+from clove.network.bitcoin.p2p import serialize_message
+from clove.network.bitcoin.dispatcher import message_dispatcher
+from clove.network.bitcoin.race import ConnectionRace, HandshakeAttempt
+
+
+def listen(host, port=0):
+    server = socket.socket()
+    server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    server.bind((host, port))
+    server.listen(5)
+    return server
+
+
+def answer_handshake(server, message_start):
+    def handle():
+        connection, _ = server.accept()
+        connection.recv(1024)
+        connection.sendall(
+            serialize_message(msg_version(), message_start) + serialize_message(msg_verack(), message_start)
+        )
+        connection.recv(1024)
+        connection.close()
+
+    threading.Thread(target=handle, daemon=True).start()
+
+
+def test_connection_race_keeps_first_handshaken_node(monkeypatch):
+    silent = listen('127.0.0.2')
+    port = silent.getsockname()[1]
+    monkeypatch.setattr(BitcoinTestNet, 'port', port)
+    responsive = listen('127.0.0.3', port)
+    answer_handshake(responsive, BitcoinTestNet.message_start)
+
+    network = BitcoinTestNet()
+    started = time()
+    race = ConnectionRace(network, ['127.0.0.2', '127.0.0.4', '127.0.0.3'], peers=3, stagger=0.05)
+    winner = race.run()
+
+    assert time() - started < 2
+    assert winner.node == '127.0.0.3'
+    assert winner.candidate.protocol_version is not None
+    assert race.failed == ['127.0.0.4']
+    winner.close()
+    silent.close()
+    responsive.close()
+
+
+def test_cancelled_attempt_leaves_dispatcher_before_closing_socket(monkeypatch):
+    silent = listen('127.0.0.2')
+    monkeypatch.setattr(BitcoinTestNet, 'port', silent.getsockname()[1])
+    attempt = HandshakeAttempt(BitcoinTestNet(), '127.0.0.2', handshake_timeout=5)
+    results = []
+    thread = threading.Thread(target=lambda: results.append(attempt.run()), daemon=True)
+    thread.start()
+    started = time()
+    while attempt.candidate.channel is None and time() - started < 2:
+        sleep(0.01)
+    connection = attempt.candidate.connection
+
+    attempt.cancel()
+    thread.join(2)
+
+    assert results == [False]
+    assert attempt.candidate.channel is None
+    assert all(key.fileobj is not connection for key in message_dispatcher.selector.get_map().values())
+    attempt.close()
+    silent.close()
+
+
+def test_connection_race_without_nodes():
+    race = ConnectionRace(BitcoinTestNet(), [])
+    assert race.run() is None
+
+
+def test_connect_blacklists_failed_nodes(monkeypatch):
+    monkeypatch.setattr(BitcoinTestNet, 'port', 1)
+    network = BitcoinTestNet()
+    network.nodes = ('127.0.0.5', '127.0.0.6')
+
+    assert network.connect() is None
+    assert network.blacklist_nodes == {'127.0.0.5': 1, '127.0.0.6': 1}
@@ -0,0 +1,104 @@
+from time import time
+
+from bitcoin.core import CMutableTransaction, CMutableTxIn, CMutableTxOut, b2lx, b2x
+from bitcoin.core.script import CScript
+from bitcoin.messages import msg_inv
+
+from clove.network import BitcoinTestNet
+from clove.network.bitcoin.simulator import NodeSimulator, simulated_network
+
+
+def make_raw_transactions(count: int) -> list:
+    return [
+        b2x(CMutableTransaction([CMutableTxIn()], [CMutableTxOut(number, CScript([number]))]).serialize())
+        for number in range(1, count + 1)
+    ]
+
+
+def simulated(simulator: NodeSimulator):
+    return simulator.network_class(pooled_connections=False)()
+
+
+def test_broadcast_through_simulator(node_simulator):
+    raw_transaction = make_raw_transactions(1)[0]
+    network = simulated(node_simulator)
+    transaction_address = network.broadcast_transaction(raw_transaction, reject_timeout=0.1)
+
+    assert transaction_address == b2lx(node_simulator.transactions[0].GetHash())
+    assert node_simulator.connections == 1
+    assert node_simulator.messages['version'] == 1
+    assert node_simulator.messages['verack'] == 1
+    assert node_simulator.messages['inv'] == 1
+    assert node_simulator.messages['tx'] == 1
+
+
+def test_pooled_connection_is_reused(node_simulator):
+    network_class = node_simulator.network_class()
+    for raw_transaction in make_raw_transactions(3):
+        assert network_class().broadcast_transaction(raw_transaction, reject_timeout=0.1)
+    assert node_simulator.connections == 1
+    assert node_simulator.messages['inv'] == 3
+
+
+def test_simulator_rejects_transactions():
+    raw_transactions = make_raw_transactions(4)
+    rejected_value = 2
+    with NodeSimulator(BitcoinTestNet, reject=lambda tx: tx.vout[0].nValue == rejected_value) as simulator:
+        network = simulated(simulator)
+        assert network.broadcast_transaction(raw_transactions[1], reject_timeout=0.1) is None
+        results = simulated(simulator).publish_many(raw_transactions, timeout=2, reject_timeout=0.2)
+
+    assert [result.status for result in results] == ['accepted', 'rejected', 'accepted', 'accepted']
+    assert results[1].reason == 'insufficient fee'
+    assert len(simulator.rejected) == 2
+
+
+def test_random_rejects_are_deterministic():
+    raw_transactions = make_raw_transactions(20)
+    statuses = []
+    for _ in range(2):
+        with NodeSimulator(BitcoinTestNet, reject=0.5, seed=7) as simulator:
+            results = simulated(simulator).publish_many(raw_transactions, timeout=2, reject_timeout=0.2)
+        statuses.append([result.status for result in results])
+    assert statuses[0] == statuses[1]
+    assert 'rejected' in statuses[0] and 'accepted' in statuses[0]
+
+
+def test_fragmented_and_delayed_messages():
+    raw_transaction = make_raw_transactions(1)[0]
+    with NodeSimulator(BitcoinTestNet, fragment_size=7, latency=0.05) as simulator:
+        started = time()
+        assert simulated(simulator).broadcast_transaction(raw_transaction, reject_timeout=0.1)
+    # version, verack and getdata are delayed
+    assert time() - started >= 0.15
+
+
+def test_simulator_disconnects():
+    with NodeSimulator(BitcoinTestNet, disconnect_after=2) as simulator:
+        results = simulated(simulator).publish_many(make_raw_transactions(2), timeout=1, reject_timeout=0.1)
+    assert [result.status for result in results] == ['failed', 'failed']
+    assert simulator.transactions == []
+
+
+def test_scripted_response():
+    with NodeSimulator(BitcoinTestNet) as simulator:
+        announced = []
+        simulator.script(msg_inv, lambda message: announced.extend(message.inv))
+        results = simulated(simulator).publish_many(make_raw_transactions(3), timeout=0.3, reject_timeout=0.1)
+    assert len(announced) == 3
+    assert [result.reason for result in results] == ['node did not ask for the transaction'] * 3
+
+
+def test_fan_out_broadcast_to_cluster():
+    raw_transaction = make_raw_transactions(1)[0]
+    simulators = NodeSimulator.cluster(BitcoinTestNet, 3)
+    try:
+        network = simulated_network(BitcoinTestNet, simulators)()
+        report = network.broadcast_to_peers(raw_transaction, peers=3, quorum=3, reject_timeout=0.1)
+    finally:
+        for simulator in simulators:
+            simulator.stop()
+
+    assert report.transaction_address == b2lx(simulators[0].transactions[0].GetHash())
+    assert sorted(result.node for result in report.results) == ['127.0.0.1', '127.0.0.2', '127.0.0.3']
+    assert all(len(simulator.transactions) == 1 for simulator in simulators)
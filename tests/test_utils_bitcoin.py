@@ -1,7 +1,19 @@
+import threading
+
+import bitcoin
 from bitcoin.core import COIN
-from pytest import mark
+from bitcoin.wallet import CBitcoinAddressError
+from pytest import mark, raises
 
-from clove.utils.bitcoin import from_base_units, to_base_units
+from clove.utils.bitcoin import (
+    address_to_hash160,
+    address_to_script_pubkey,
+    from_base_units,
+    hash160_to_address,
+    script_pubkey_to_address,
+    to_base_units,
+)
+from clove.utils.search import get_network_by_symbol
 
 
 @mark.parametrize('btc_value', [0, 1, 10**(-9)])
@@ -18,3 +30,42 @@ def test_from_base_units(satoshi_value):
 
     assert isinstance(btc_value, float)
     assert btc_value == satoshi_value / COIN
+
+
+@mark.parametrize('network_symbol,address', [
+    ('BTC', '13iNsKgMfVJQaYVFqp5ojuudxKkVCMtkoa'),
+    ('LTC', 'LUAn5PWmsPavgz32mGkqsUuAKncftS37Jq'),
+    ('MONA', 'MBriWYyfWNdrAmycN5otoUDWDMrdFK33DQ'),
+])
+def test_address_codecs_round_trip(network_symbol, address):
+    params = get_network_by_symbol(network_symbol).get_params()
+    hash160, p2sh = address_to_hash160(address, params)
+
+    assert len(hash160) == 20
+    assert not p2sh
+    assert hash160_to_address(hash160, params) == address
+    assert script_pubkey_to_address(address_to_script_pubkey(address, params), params) == address
+
+
+def test_address_to_hash160_from_another_network():
+    with raises(CBitcoinAddressError):
+        address_to_hash160('LUAn5PWmsPavgz32mGkqsUuAKncftS37Jq', get_network_by_symbol('BTC').get_params())
+
+
+def test_params_are_selected_per_thread():
+    litecoin, dash = get_network_by_symbol('LTC'), get_network_by_symbol('DASH')
+    barrier = threading.Barrier(2)
+    selected = {}
+
+    def work(network):
+        network.switch_params()
+        barrier.wait()
+        selected[network.name] = bitcoin.params.NAME
+
+    threads = [threading.Thread(target=work, args=(network, )) for network in (litecoin, dash)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert selected == {'litecoin': 'litecoin', 'dash': 'dash'}
@@ -0,0 +1,125 @@
+from concurrent.futures import ThreadPoolExecutor
+import threading
+from time import sleep
+from unittest.mock import patch
+
+import pytest
+
+from clove.network import Bitcoin, BitcoinTestNet, Ravencoin
+from clove.utils.cache import MISSING, DiskCache, MemoryCache, ResponseCache, response_cache
+
+
+def test_memory_cache_drops_least_recently_used():
+    cache = MemoryCache(max_size=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1
+    cache.set('c', 3)
+    assert cache.get('b') is MISSING
+    assert cache.get('a') == 1
+    assert len(cache) == 2
+
+
+def test_entries_expire():
+    cache = ResponseCache(MemoryCache())
+    assert cache.get_or_fetch('key', lambda: 1, ttl=0.05) == 1
+    assert cache.get_or_fetch('key', lambda: 2, ttl=0.05) == 1
+    sleep(0.06)
+    assert cache.get_or_fetch('key', lambda: 3, ttl=0.05) == 3
+
+
+def test_immutable_values_never_expire(tmpdir):
+    cache = ResponseCache(DiskCache(str(tmpdir.join('cache.db'))))
+    assert cache.get_or_fetch('key', lambda: {'confirmations': 10}, ttl=0, immutable=lambda value: True)
+    assert cache.get_or_fetch('key', lambda: None, ttl=0) == {'confirmations': 10}
+
+    # values are persisted
+    assert ResponseCache(DiskCache(str(tmpdir.join('cache.db')))).get_or_fetch('key', lambda: None) == {
+        'confirmations': 10
+    }
+
+
+def test_empty_responses_are_not_cached():
+    cache = ResponseCache(MemoryCache())
+    assert cache.get_or_fetch('key', lambda: None, ttl=10) is None
+    assert cache.get_or_fetch('key', lambda: 1, ttl=10) == 1
+
+
+def test_concurrent_lookups_make_single_request():
+    cache = ResponseCache(MemoryCache())
+    calls = []
+    release = threading.Event()
+
+    def fetch():
+        calls.append(1)
+        release.wait(1)
+        return 'response'
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        futures = [executor.submit(cache.get_or_fetch, 'key', fetch, 10) for _ in range(8)]
+        sleep(0.05)
+        release.set()
+        assert [future.result() for future in futures] == ['response'] * 8
+    assert len(calls) == 1
+
+
+def test_failed_request_is_raised_to_all_waiters():
+    cache = ResponseCache(MemoryCache())
+
+    def fetch():
+        raise ValueError('explorer is down')
+
+    with pytest.raises(ValueError):
+        cache.get_or_fetch('key', fetch, 10)
+    assert cache.pending == {}
+
+
+def test_disabled_cache_always_fetches():
+    cache = ResponseCache(MemoryCache(), enabled=False)
+    assert cache.get_or_fetch('key', lambda: 1) == 1
+    assert cache.get_or_fetch('key', lambda: 2) == 2
+
+
+@patch('clove.block_explorer.insight.clove_req_json')
+def test_explorer_caches_confirmed_transactions(json_mock):
+    json_mock.return_value = {'txid': 'abc', 'confirmations': 100}
+    assert Ravencoin.get_transaction('abc') == Ravencoin.get_transaction('abc')
+    assert json_mock.call_count == 1
+    assert response_cache.backend.entries['raven:transaction:abc'][1] is None
+
+    json_mock.return_value = {'txid': 'def', 'confirmations': 1}
+    Ravencoin.get_transaction('def')
+    assert response_cache.backend.entries['raven:transaction:def'][1] is not None
+
+
+@patch.object(Ravencoin, 'get_latest_block')
+@patch('clove.block_explorer.insight.clove_req_json')
+def test_cached_transaction_confirmations_follow_latest_block(json_mock, latest_block_mock):
+    json_mock.return_value = {'txid': 'abc', 'blockheight': 100, 'confirmations': 10}
+    assert Ravencoin.get_transaction('abc')['confirmations'] == 10
+    latest_block_mock.assert_not_called()
+
+    latest_block_mock.return_value = 119
+    assert Ravencoin.get_confirmations_from_tx_json(Ravencoin.get_transaction('abc')) == 20
+    assert response_cache.backend.entries['raven:transaction:abc'][0]['confirmations'] == 10
+    assert json_mock.call_count == 1
+
+    latest_block_mock.side_effect = ValueError('API is down')
+    assert Ravencoin.get_transaction('abc')['confirmations'] == 10
+
+
+@patch('clove.network.bitcoin.clove_req_json')
+def test_network_caches_fee(json_mock):
+    json_mock.return_value = {'high_fee_per_kb': 100000}
+    assert Bitcoin.get_fee() == Bitcoin.get_fee() == 0.001
+    assert json_mock.call_count == 1
+
+
+@patch('clove.block_explorer.insight.clove_req_json')
+def test_networks_have_separate_entries(json_mock):
+    json_mock.return_value = {'info': {'blocks': 540000}}
+    assert Bitcoin.get_latest_block() == 540000
+    json_mock.return_value = {'info': {'blocks': 1400000}}
+    assert BitcoinTestNet.get_latest_block() == 1400000
+    assert Bitcoin.get_latest_block() == 540000
+    assert json_mock.call_count == 2
@@ -0,0 +1,80 @@
+import json
+import socket
+from threading import Event
+from time import time
+from unittest.mock import patch
+
+from clove.utils.dns import SeedResolver
+
+
+def fake_lookup(seed):
+    if seed.startswith('dead'):
+        raise socket.gaierror()
+    return (seed, [], [f'10.0.0.{len(seed)}'])
+
+
+def test_resolve_many_uses_cache():
+    resolver = SeedResolver()
+
+    with patch('socket.gethostbyname_ex', side_effect=fake_lookup) as lookup:
+        assert resolver.resolve_many(['seed.one', 'dead.seed']) == {'seed.one': ['10.0.0.8'], 'dead.seed': []}
+        assert resolver.resolve_many(['dead.seed', 'seed.one']) == {'dead.seed': [], 'seed.one': ['10.0.0.8']}
+
+    assert lookup.call_count == 2
+
+
+def test_dead_seeds_are_cached_with_growing_ttl():
+    resolver = SeedResolver(ttl=100, negative_ttl=10)
+
+    with patch('socket.gethostbyname_ex', side_effect=fake_lookup):
+        resolver.resolve('dead.seed')
+        assert 9 < resolver.cache['dead.seed'].expires_at - time() <= 10
+
+        resolver.cache['dead.seed'].expires_at = 0
+        resolver.resolve('dead.seed')
+        assert 19 < resolver.cache['dead.seed'].expires_at - time() <= 20
+        assert resolver.cache['dead.seed'].failures == 2
+
+
+def test_expired_entries_are_resolved_again():
+    resolver = SeedResolver()
+
+    with patch('socket.gethostbyname_ex', side_effect=fake_lookup) as lookup:
+        resolver.resolve('seed.one')
+        resolver.cache['seed.one'].expires_at = 0
+        resolver.resolve('seed.one')
+
+    assert lookup.call_count == 2
+
+
+def test_slow_seed_does_not_block_resolution():
+    resolver = SeedResolver(timeout=0.1)
+    release = Event()
+
+    def slow_lookup(seed):
+        if seed == 'slow.seed':
+            release.wait(1)
+        return fake_lookup(seed)
+
+    with patch('socket.gethostbyname_ex', side_effect=slow_lookup):
+        assert resolver.resolve_many(['slow.seed', 'seed.one']) == {'slow.seed': [], 'seed.one': ['10.0.0.8']}
+        lookup = resolver.pending['slow.seed']
+        release.set()
+        lookup.result()
+
+    assert resolver.get_cached('slow.seed') == ['10.0.0.9']
+
+
+def test_cache_persistence(tmpdir):
+    cache_path = str(tmpdir.join('seeds.json'))
+    resolver = SeedResolver(cache_path=cache_path)
+
+    with patch('socket.gethostbyname_ex', side_effect=fake_lookup):
+        resolver.resolve_many(['seed.one', 'dead.seed'])
+
+    with open(cache_path) as cache_file:
+        assert set(json.load(cache_file)) == {'seed.one', 'dead.seed'}
+
+    with patch('socket.gethostbyname_ex') as lookup:
+        assert SeedResolver(cache_path=cache_path).resolve('seed.one') == ['10.0.0.8']
+    lookup.assert_not_called()
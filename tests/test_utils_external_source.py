@@ -1,9 +1,12 @@
+import threading
+from time import time
 from unittest.mock import patch
 
 import pytest
 
 from clove.exceptions import ExternalApiRequestLimitExceeded
-from clove.utils.external_source import clove_req_json
+from clove.network.bitcoin.p2p import run_sync
+from clove.utils.external_source import HttpSessions, aclove_req_json, clove_req_json, http_sessions
 
 
 class FakeResponseOk:
@@ -15,19 +18,78 @@ class FakeResponseOk:
 
 class FakeResponseLimitExceeded:
     status_code = 429
+    headers = {'Retry-After': '0.05'}
 
 
-@patch('requests.get')
+@patch('requests.Session.get')
 def test_clove_req_json_ok(request_mock):
     request_mock.return_value = FakeResponseOk()
 
     data = clove_req_json('https://testnet.blockexplorer.com/api/status?q=getInfo')
     assert data == {'abc': 123}
+    request_mock.assert_called_once_with(
+        'https://testnet.blockexplorer.com/api/status?q=getInfo', timeout=http_sessions.timeout
+    )
 
 
-@patch('requests.get')
+@patch('clove.utils.external_source.RATE_LIMIT_MAX_RETRIES', 2)
+@patch('requests.Session.get')
 def test_clove_req_json_limit(request_mock):
     request_mock.return_value = FakeResponseLimitExceeded()
 
     with pytest.raises(ExternalApiRequestLimitExceeded):
         clove_req_json('https://testnet.blockexplorer.com/api/status?q=getInfo')
+    assert request_mock.call_count == 3
+
+
+@patch('requests.Session.get')
+def test_clove_req_json_retries_after_limit(request_mock):
+    request_mock.side_effect = [FakeResponseLimitExceeded(), FakeResponseOk()]
+
+    started = time()
+    assert clove_req_json('https://testnet.blockexplorer.com/api/status?q=getInfo') == {'abc': 123}
+    assert time() - started >= 0.05
+    assert request_mock.call_count == 2
+
+
+@patch('requests.Session.post')
+def test_clove_req_json_post_with_timeout(request_mock):
+    request_mock.return_value = FakeResponseOk()
+
+    assert clove_req_json('https://example.com/graphql', post_data={'query': '{}'}, timeout=3) == {'abc': 123}
+    request_mock.assert_called_once_with('https://example.com/graphql', data={'query': '{}'}, timeout=3)
+
+
+def test_session_is_shared_between_threads():
+    sessions = HttpSessions(pool_connections=2, pool_maxsize=4)
+    session = sessions.get()
+    assert sessions.get() is session
+    assert session.headers['User-Agent'] == 'Clove'
+    assert 'gzip' in session.headers['Accept-Encoding']
+    adapter = session.get_adapter('https://api.blockcypher.com')
+    assert adapter._pool_connections == 2
+    assert adapter._pool_maxsize == 4
+
+    other_sessions = []
+    threads = [threading.Thread(target=lambda: other_sessions.append(sessions.get())) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert all(other_session is session for other_session in other_sessions)
+
+    sessions.close()
+    assert sessions.session is None
+    assert sessions.get() is not session
+
+
+def test_async_requests_require_aiohttp():
+    try:
+        import aiohttp  # noqa: F401
+    except ImportError:
+        pass
+    else:
+        pytest.skip('aiohttp is installed')
+
+    with pytest.raises(ImportError, match='async'):
+        run_sync(aclove_req_json('https://insight.bitpay.com/api/status'))
@@ -0,0 +1,82 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import formatdate
+from time import sleep, time
+
+import pytest
+
+from clove.network.bitcoin.p2p import run_sync
+from clove.utils.rate_limit import RateLimiter, TokenBucket, parse_retry_after
+
+
+def test_bucket_allows_bursts_and_then_keeps_the_rate():
+    bucket = TokenBucket(rate=20, capacity=2)
+    started = time()
+    for _ in range(4):
+        bucket.acquire()
+    # two requests from the burst, two more at 20 per second
+    assert 0.09 <= time() - started < 0.3
+
+
+def test_callers_are_served_in_order():
+    bucket = TokenBucket(rate=50, capacity=1)
+    served = []
+
+    def request(number):
+        bucket.acquire()
+        served.append(number)
+
+    with ThreadPoolExecutor(max_workers=5) as executor:
+        for number in range(5):
+            executor.submit(request, number)
+            sleep(0.005)
+    assert served == [0, 1, 2, 3, 4]
+
+
+def test_backoff_blocks_and_slows_down():
+    bucket = TokenBucket(rate=100, capacity=10)
+    bucket.backoff(0.1)
+    assert bucket.rate == 50
+    started = time()
+    bucket.acquire()
+    assert time() - started >= 0.1
+
+    for _ in range(20):
+        bucket.recover()
+    assert bucket.rate == 100
+
+
+def test_limiter_uses_host_quotas():
+    limiter = RateLimiter(quotas={'api.blockcypher.com': (3, 3)}, default=(10, 5))
+    assert limiter.get_bucket('api.blockcypher.com').rate == 3
+    assert limiter.get_bucket('insight.bitpay.com').capacity == 5
+    assert limiter.get_bucket('api.blockcypher.com') is limiter.get_bucket('api.blockcypher.com')
+
+
+@pytest.mark.parametrize('attempt,retry_after,expected', [
+    (0, None, 1),
+    (3, None, 8),
+    (10, None, 60),
+    (3, '2', 2),
+    (0, 'invalid', 1),
+])
+def test_throttled_backoff(attempt, retry_after, expected):
+    limiter = RateLimiter()
+    assert limiter.throttled('api.blockcypher.com', attempt, retry_after) == expected
+    assert limiter.get_bucket('api.blockcypher.com').blocked_until > time()
+
+
+def test_retry_after_date():
+    assert 8 <= parse_retry_after(formatdate(time() + 10, usegmt=True)) <= 10
+    assert parse_retry_after(formatdate(time() - 10, usegmt=True)) == 0
+
+
+def test_async_callers_share_the_queue():
+    bucket = TokenBucket(rate=20, capacity=1)
+
+    async def acquire():
+        await asyncio.gather(*(bucket.aacquire() for _ in range(3)))
+
+    started = time()
+    run_sync(acquire())
+    assert time() - started >= 0.09
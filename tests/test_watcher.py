@@ -0,0 +1,102 @@
+import socket
+from unittest.mock import patch
+
+from bitcoin.core import CMutableTransaction, CMutableTxIn, COutPoint, lx
+from bitcoin.messages import MSG_TX, msg_getdata, msg_inv, msg_tx
+from bitcoin.net import CInv
+import pytest
+
+from clove.network import BitcoinTestNet
+from clove.network.bitcoin.p2p import MessageDecoder, serialize_message
+from clove.network.bitcoin.watcher import MempoolWatcher
+
+message_start = BitcoinTestNet.message_start
+
+
+@pytest.fixture
+def redeem_transaction(bob_wallet, signed_transaction):
+    transaction_details = signed_transaction.show_details()
+    with patch('clove.network.BitcoinTestNet.get_balance', return_value=0.01):
+        contract = BitcoinTestNet().audit_contract(
+            transaction_details['contract'],
+            transaction_details['contract_transaction']
+        )
+    redeem_transaction = contract.redeem(bob_wallet, transaction_details['secret'])
+    redeem_transaction.fee_per_kb = 0.002
+    redeem_transaction.add_fee_and_sign()
+    return contract, redeem_transaction.tx, transaction_details['secret']
+
+
+def connected_watcher():
+    watcher = MempoolWatcher(BitcoinTestNet())
+    local, remote = socket.socketpair()
+    remote.settimeout(1)
+
+    def connect():
+        watcher.network.connection = local
+        return '127.0.0.1'
+
+    watcher.network.connect = connect
+    assert watcher.attach()
+    return watcher, remote
+
+
+def test_watcher_extracts_secret_from_announced_transaction(redeem_transaction):
+    contract, transaction, secret = redeem_transaction
+    watcher, remote = connected_watcher()
+    secrets = []
+    future = watcher.watch_contract(contract, callback=secrets.append)
+
+    inventory = CInv()
+    inventory.type = MSG_TX
+    inventory.hash = transaction.GetHash()
+    announcement = msg_inv()
+    announcement.inv.append(inventory)
+    remote.sendall(serialize_message(announcement, message_start))
+
+    decoder = MessageDecoder(message_start)
+    decoder.feed(remote.recv(1024))
+    request = decoder.messages[0]
+    assert type(request) is msg_getdata
+    assert request.inv[0].hash == transaction.GetHash()
+
+    message = msg_tx()
+    message.tx = transaction
+    remote.sendall(serialize_message(message, message_start))
+
+    assert future.result(1) == secret
+    assert secrets == [secret]
+    assert not watcher.watched
+
+    # the same transaction announced again is not requested
+    remote.sendall(serialize_message(announcement, message_start))
+    watcher.watch('00' * 32, 0)
+    with pytest.raises(socket.timeout):
+        remote.settimeout(0.2)
+        remote.recv(1024)
+
+    watcher.stop()
+    remote.close()
+
+
+def test_watcher_with_spend_without_secret(redeem_transaction):
+    contract, _, _ = redeem_transaction
+    watcher = MempoolWatcher(BitcoinTestNet())
+    future = watcher.watch_contract(contract)
+
+    refund = CMutableTransaction([CMutableTxIn(COutPoint(lx(contract.transaction_address), 0))], [])
+    watcher.check_transaction(refund)
+
+    with pytest.raises(ValueError):
+        future.result(0)
+
+
+def test_watcher_rejects_secret_not_matching_hash(redeem_transaction):
+    contract, transaction, _ = redeem_transaction
+    watcher = MempoolWatcher(BitcoinTestNet())
+    future = watcher.watch(contract.transaction_address, 0, secret_hash='00' * 20)
+
+    watcher.check_transaction(transaction)
+
+    with pytest.raises(ValueError):
+        future.result(0)